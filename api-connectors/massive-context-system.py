@@ -4,7 +4,12 @@ MASSIVE CONTEXT SYSTEM - Fuck Cursor Limits!
 Uses unlimited RAM + GPU + SQL for infinite context
 """
 
+import argparse
+import io
+import os
+import time
 import psycopg2
+from psycopg2.extras import execute_values
 import json
 import asyncio
 import aiohttp
@@ -25,6 +30,39 @@ DB_CONFIG = {
 # Local LLM config
 OLLAMA_URL = "http://localhost:11434"
 
+EMBEDDING_DIM = 384
+
+# Vector index: 'hnsw' (incremental, good recall from the first row) or
+# 'ivfflat' (cheaper to build, but its lists are trained on whatever rows
+# exist at build time, so it's only built after a load and rebuilt as the
+# table grows)
+VECTOR_INDEX = os.getenv("CONTEXT_VECTOR_INDEX", "hnsw")
+HNSW_M = int(os.getenv("CONTEXT_HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("CONTEXT_HNSW_EF_CONSTRUCTION", "64"))
+HNSW_EF_SEARCH = int(os.getenv("CONTEXT_HNSW_EF_SEARCH", "100"))
+IVF_PROBES = int(os.getenv("CONTEXT_IVF_PROBES", "10"))
+IVF_MIN_ROWS = 10000      # below this a sequential scan is fast and lists would be noise
+IVF_REBUILD_GROWTH = 2.0  # rebuild once the table doubles past the last build
+INGEST_BATCH_SIZE = int(os.getenv("CONTEXT_INGEST_BATCH_SIZE", "500"))
+
+VECTOR_TABLES = {
+    "conversation_context": "idx_context_embedding",
+    "knowledge_base": "idx_knowledge_embedding"
+}
+
+
+def vector_literal(embedding) -> str:
+    """pgvector text form, so queries compare vector <=> vector rather than numeric[]"""
+    return "[" + ",".join(f"{float(x):.7g}" for x in embedding) + "]"
+
+
+def _json(value):
+    """JSONB comes back already decoded; plain JSON text doesn't"""
+    if value is None:
+        return {}
+    return value if isinstance(value, (dict, list)) else json.loads(value)
+
+
 class MassiveContextSystem:
     def __init__(self):
         self.conn = None
@@ -49,6 +87,14 @@ class MassiveContextSystem:
         """Create massive context storage tables"""
         cursor = self.conn.cursor()
         
+        # The VECTOR columns below need the extension first
+        try:
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS vector;")
+            self.conn.commit()
+        except Exception as e:
+            self.conn.rollback()
+            print(f"⚠️ Vector search not available: {e}")
+        
         # Conversation context table
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS conversation_context (
@@ -88,92 +134,244 @@ class MassiveContextSystem:
             )
         """)
         
+        # Which vector index each table has, and how many rows it was built over
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS context_vector_indexes (
+                table_name VARCHAR(255) PRIMARY KEY,
+                index_type VARCHAR(20),
+                built_rows BIGINT,
+                lists INTEGER,
+                built_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        
         # Create indexes for performance
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_context_session ON conversation_context(session_id);")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_context_timestamp ON conversation_context(timestamp);")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_context_type ON conversation_context(context_type);")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_knowledge_source ON knowledge_base(source);")
         
-        # Enable vector similarity search
-        try:
-            cursor.execute("CREATE EXTENSION IF NOT EXISTS vector;")
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_context_embedding ON conversation_context USING ivfflat (embedding vector_cosine_ops);")
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_knowledge_embedding ON knowledge_base USING ivfflat (embedding vector_cosine_ops);")
-            print("✅ Vector search enabled")
-        except Exception as e:
-            print(f"⚠️ Vector search not available: {e}")
-        
         self.conn.commit()
         cursor.close()
         print("✅ Context tables created")
+        
+        self.ensure_vector_indexes()
+    
+    # ============================================
+    # VECTOR INDEX LIFECYCLE
+    # ============================================
+    
+    def _build_vector_index(self, cursor, table, rows):
+        """(Re)build one table's ANN index for the configured index type"""
+        index = VECTOR_TABLES[table]
+        cursor.execute(f"DROP INDEX IF EXISTS {index}")
+        # Index builds are memory-hungry; give this one session room
+        cursor.execute("SET LOCAL maintenance_work_mem = '1GB'")
+        
+        lists = None
+        if VECTOR_INDEX == "ivfflat":
+            # pgvector guidance: rows/1000 lists up to 1M rows, sqrt(rows) beyond
+            lists = max(10, rows // 1000 if rows <= 1_000_000 else int(rows ** 0.5))
+            cursor.execute(f"""
+                CREATE INDEX {index} ON {table}
+                USING ivfflat (embedding vector_cosine_ops) WITH (lists = {lists})
+            """)
+        else:
+            cursor.execute(f"""
+                CREATE INDEX {index} ON {table}
+                USING hnsw (embedding vector_cosine_ops)
+                WITH (m = {HNSW_M}, ef_construction = {HNSW_EF_CONSTRUCTION})
+            """)
+        
+        cursor.execute("""
+            INSERT INTO context_vector_indexes (table_name, index_type, built_rows, lists, built_at)
+            VALUES (%s, %s, %s, %s, NOW())
+            ON CONFLICT (table_name) DO UPDATE SET
+                index_type = EXCLUDED.index_type, built_rows = EXCLUDED.built_rows,
+                lists = EXCLUDED.lists, built_at = EXCLUDED.built_at
+        """, (table, VECTOR_INDEX, rows, lists))
+        print(f"🧭 Built {VECTOR_INDEX} index on {table} ({rows:,} rows{f', {lists} lists' if lists else ''})")
+    
+    def ensure_vector_indexes(self, force=False):
+        """
+        Make sure each table has the right ANN index, building it if needed
+        
+        Call after bulk loads. HNSW is built once (it stays good as rows
+        are added). IVFFlat waits until a table has IVF_MIN_ROWS rows, then
+        is rebuilt whenever the table has grown IVF_REBUILD_GROWTH-fold,
+        because its lists only reflect the rows present when it was built.
+        """
+        cursor = self.conn.cursor()
+        try:
+            for table in VECTOR_TABLES:
+                # reltuples is 0 or stale until the table is analyzed, and this runs right
+                # after bulk loads; ANALYZE samples, so the estimate stays cheap to get
+                cursor.execute(f"ANALYZE {table}")
+                cursor.execute("SELECT GREATEST(reltuples, 0)::bigint FROM pg_class WHERE oid = %s::regclass", (table,))
+                rows = cursor.fetchone()[0]
+                cursor.execute(
+                    "SELECT index_type, built_rows FROM context_vector_indexes WHERE table_name = %s", (table,)
+                )
+                state = cursor.fetchone()
+                
+                if VECTOR_INDEX == "ivfflat" and rows < IVF_MIN_ROWS and not force:
+                    continue
+                if state and state[0] == VECTOR_INDEX and not force:
+                    if VECTOR_INDEX == "hnsw" or rows < state[1] * IVF_REBUILD_GROWTH:
+                        continue
+                
+                self._build_vector_index(cursor, table, rows)
+                self.conn.commit()
+            print("✅ Vector search enabled")
+        except Exception as e:
+            self.conn.rollback()
+            print(f"⚠️ Vector index maintenance failed: {e}")
+        finally:
+            cursor.close()
+    
+    def _search_settings(self):
+        """SET LOCAL statement for the query-time recall/speed knob"""
+        if VECTOR_INDEX == "ivfflat":
+            return f"SET LOCAL ivfflat.probes = {IVF_PROBES};"
+        return f"SET LOCAL hnsw.ef_search = {HNSW_EF_SEARCH};"
+    
+    # ============================================
+    # EMBEDDING + INGESTION
+    # ============================================
     
     def embed_text(self, text):
         """Generate embedding for text"""
+        return self.embed_texts([text])[0]
+    
+    def embed_texts(self, texts):
+        """Embed a batch in one encode call"""
         if self.embedding_model:
-            return self.embedding_model.encode(text).tolist()
-        else:
-            # Simple fallback - just use word count as embedding
+            return self.embedding_model.encode(list(texts), batch_size=64, convert_to_numpy=True).tolist()
+        
+        # Simple fallback - just use word count as embedding (padded to the column width)
+        embeddings = []
+        for text in texts:
             words = text.lower().split()
-            return [len(words)] + [words.count(word) for word in set(words)][:383]
+            vector = ([len(words)] + [words.count(word) for word in set(words)])[:EMBEDDING_DIM]
+            embeddings.append(vector + [0] * (EMBEDDING_DIM - len(vector)))
+        return embeddings
     
     def store_context(self, session_id, role, content, context_type="general", metadata=None):
         """Store conversation context with embedding"""
-        cursor = self.conn.cursor()
-        
-        embedding = self.embed_text(content)
-        
-        cursor.execute("""
-            INSERT INTO conversation_context (
-                session_id, role, content, metadata, embedding, context_type
-            ) VALUES (%s, %s, %s, %s, %s, %s)
-        """, (session_id, role, content, json.dumps(metadata or {}), embedding, context_type))
-        
-        self.conn.commit()
-        cursor.close()
+        self.store_contexts([{
+            "session_id": session_id, "role": role, "content": content,
+            "context_type": context_type, "metadata": metadata
+        }])
         print(f"💾 Stored context: {role} - {content[:50]}...")
     
-    def search_relevant_context(self, query, session_id=None, limit=50):
-        """Search for relevant context using vector similarity"""
-        cursor = self.conn.cursor()
+    def store_contexts(self, items):
+        """
+        Store many conversation context items
         
-        query_embedding = self.embed_text(query)
-        
-        # Search conversation context
-        cursor.execute("""
-            SELECT id, role, content, metadata, context_type, timestamp,
-                   embedding <=> %s as distance
-            FROM conversation_context
-            WHERE session_id = %s OR session_id IS NULL
-            ORDER BY embedding <=> %s
-            LIMIT %s
-        """, (query_embedding, session_id, query_embedding, limit))
+        Items are dicts with session_id, role, content and optional
+        context_type/metadata. Each INGEST_BATCH_SIZE slice is embedded in
+        one encode call and written with one execute_values.
+        """
+        cursor = self.conn.cursor()
+        try:
+            for start in range(0, len(items), INGEST_BATCH_SIZE):
+                batch = items[start:start + INGEST_BATCH_SIZE]
+                embeddings = self.embed_texts([item["content"] for item in batch])
+                execute_values(cursor, """
+                    INSERT INTO conversation_context (
+                        session_id, role, content, metadata, embedding, context_type
+                    ) VALUES %s
+                """, [
+                    (item["session_id"], item["role"], item["content"],
+                     json.dumps(item.get("metadata") or {}), vector_literal(embedding),
+                     item.get("context_type", "general"))
+                    for item, embedding in zip(batch, embeddings)
+                ], template="(%s, %s, %s, %s, %s::vector, %s)", page_size=INGEST_BATCH_SIZE)
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        finally:
+            cursor.close()
+        return len(items)
+    
+    def store_knowledge(self, items):
+        """Store many knowledge base entries (dicts with source, content, optional metadata)"""
+        cursor = self.conn.cursor()
+        try:
+            for start in range(0, len(items), INGEST_BATCH_SIZE):
+                batch = items[start:start + INGEST_BATCH_SIZE]
+                embeddings = self.embed_texts([item["content"] for item in batch])
+                execute_values(cursor, """
+                    INSERT INTO knowledge_base (source, content, metadata, embedding) VALUES %s
+                """, [
+                    (item["source"], item["content"], json.dumps(item.get("metadata") or {}),
+                     vector_literal(embedding))
+                    for item, embedding in zip(batch, embeddings)
+                ], template="(%s, %s, %s, %s::vector)", page_size=INGEST_BATCH_SIZE)
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        finally:
+            cursor.close()
+        return len(items)
+    
+    # ============================================
+    # SEARCH
+    # ============================================
+    
+    def search_relevant_context(self, query, session_id=None, limit=50, query_embedding=None):
+        """Search for relevant context using vector similarity"""
+        if query_embedding is None:
+            query_embedding = self.embed_text(query)
+        query_vector = vector_literal(query_embedding)
         
-        results = cursor.fetchall()
-        cursor.close()
+        with self.conn, self.conn.cursor() as cursor:
+            # Search conversation context
+            cursor.execute(self._search_settings() + """
+                SELECT id, role, content, metadata, context_type, timestamp,
+                       embedding <=> %(q)s::vector as distance
+                FROM conversation_context
+                WHERE session_id = %(session)s OR session_id IS NULL
+                ORDER BY embedding <=> %(q)s::vector
+                LIMIT %(limit)s
+            """, {"q": query_vector, "session": session_id, "limit": limit})
+            return cursor.fetchall()
+    
+    def _search_both(self, query_vector, session_id, context_limit, knowledge_limit):
+        """
+        Conversation and knowledge ANN searches in one round trip
         
-        return results
+        Each branch orders by `embedding <=> <parameter>` so it can use its
+        table's ANN index; the query vector is bound once and reused.
+        """
+        with self.conn, self.conn.cursor() as cursor:
+            cursor.execute(self._search_settings() + """
+                (SELECT 'conversation' AS kind, role AS label, content, metadata, context_type,
+                        timestamp AS at, embedding <=> %(q)s::vector AS distance
+                 FROM conversation_context
+                 WHERE session_id = %(session)s OR session_id IS NULL
+                 ORDER BY embedding <=> %(q)s::vector
+                 LIMIT %(context_limit)s)
+                UNION ALL
+                (SELECT 'knowledge', source, content, metadata, NULL,
+                        created_at, embedding <=> %(q)s::vector
+                 FROM knowledge_base
+                 ORDER BY embedding <=> %(q)s::vector
+                 LIMIT %(knowledge_limit)s)
+            """, {"q": query_vector, "session": session_id,
+                  "context_limit": context_limit, "knowledge_limit": knowledge_limit})
+            rows = cursor.fetchall()
+        return [r for r in rows if r[0] == "conversation"], [r for r in rows if r[0] == "knowledge"]
     
     def get_massive_context(self, query, session_id=None):
         """Get massive context for any query"""
         print(f"🔍 Searching massive context for: {query[:50]}...")
         
-        # Get relevant conversation context
-        context_results = self.search_relevant_context(query, session_id, 30)
-        
-        # Get relevant knowledge base
-        cursor = self.conn.cursor()
-        query_embedding = self.embed_text(query)
-        
-        cursor.execute("""
-            SELECT content, metadata, source, created_at,
-                   embedding <=> %s as distance
-            FROM knowledge_base
-            ORDER BY embedding <=> %s
-            LIMIT 20
-        """, (query_embedding, query_embedding))
-        
-        knowledge_results = cursor.fetchall()
-        cursor.close()
+        # Embed once; both searches share the vector and the round trip
+        query_vector = vector_literal(self.embed_text(query))
+        context_results, knowledge_results = self._search_both(query_vector, session_id, 30, 20)
         
         # Build massive context
         context = {
@@ -185,24 +383,24 @@ class MassiveContextSystem:
         }
         
         # Add conversation context
-        for result in context_results:
+        for _, role, content, metadata, context_type, at, distance in context_results:
             context["conversation_context"].append({
-                "role": result[1],
-                "content": result[2],
-                "metadata": json.loads(result[3]) if result[3] else {},
-                "context_type": result[4],
-                "timestamp": result[5].isoformat(),
-                "relevance": 1 - result[6]  # Convert distance to relevance
+                "role": role,
+                "content": content,
+                "metadata": _json(metadata),
+                "context_type": context_type,
+                "timestamp": at.isoformat(),
+                "relevance": 1 - distance  # Convert distance to relevance
             })
         
         # Add knowledge base
-        for result in knowledge_results:
+        for _, source, content, metadata, _, at, distance in knowledge_results:
             context["knowledge_base"].append({
-                "content": result[0],
-                "metadata": json.loads(result[1]) if result[1] else {},
-                "source": result[2],
-                "created_at": result[3].isoformat(),
-                "relevance": 1 - result[4]
+                "content": content,
+                "metadata": _json(metadata),
+                "source": source,
+                "created_at": at.isoformat(),
+                "relevance": 1 - distance
             })
         
         # Calculate total context size
@@ -266,7 +464,107 @@ CONVERSATION CONTEXT:
         except Exception as e:
             return f"Error calling Ollama: {e}"
 
+def run_benchmark(conn, rows, queries=100, k=10, clusters=1000, seed=42):
+    """
+    Recall and latency of the configured ANN index at `rows` vectors
+    
+    Loads clustered synthetic 384-d vectors into a scratch table
+    (context_benchmark, reused if it already holds `rows`), builds the
+    index the same way ensure_vector_indexes does, takes exact top-k by
+    sequential scan as ground truth, then sweeps the search knob.
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, EMBEDDING_DIM)).astype(np.float32)
+    
+    def sample(n):
+        vectors = centers[rng.integers(0, clusters, n)] + 0.35 * rng.standard_normal((n, EMBEDDING_DIM)).astype(np.float32)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    
+    cursor = conn.cursor()
+    cursor.execute("CREATE TABLE IF NOT EXISTS context_benchmark (id BIGINT PRIMARY KEY, embedding VECTOR(384))")
+    cursor.execute("SELECT COUNT(*) FROM context_benchmark")
+    if cursor.fetchone()[0] != rows:
+        print(f"📥 Loading {rows:,} vectors...")
+        started = time.time()
+        cursor.execute("TRUNCATE context_benchmark")
+        cursor.execute("DROP INDEX IF EXISTS idx_benchmark_embedding")
+        for offset in range(0, rows, 50000):
+            chunk = sample(min(50000, rows - offset))
+            buffer = io.StringIO("".join(
+                f"{offset + i}\t{vector_literal(vector)}\n" for i, vector in enumerate(chunk)
+            ))
+            cursor.copy_expert("COPY context_benchmark (id, embedding) FROM STDIN", buffer)
+        conn.commit()
+        print(f"   loaded in {time.time() - started:.1f}s")
+    
+    print(f"🧭 Building {VECTOR_INDEX} index...")
+    started = time.time()
+    cursor.execute("DROP INDEX IF EXISTS idx_benchmark_embedding")
+    cursor.execute("SET maintenance_work_mem = '2GB'")
+    if VECTOR_INDEX == "ivfflat":
+        lists = max(10, rows // 1000 if rows <= 1_000_000 else int(rows ** 0.5))
+        cursor.execute(f"CREATE INDEX idx_benchmark_embedding ON context_benchmark "
+                       f"USING ivfflat (embedding vector_cosine_ops) WITH (lists = {lists})")
+        knob, values = "ivfflat.probes", [1, 5, IVF_PROBES, 20, 40]
+    else:
+        cursor.execute(f"CREATE INDEX idx_benchmark_embedding ON context_benchmark "
+                       f"USING hnsw (embedding vector_cosine_ops) "
+                       f"WITH (m = {HNSW_M}, ef_construction = {HNSW_EF_CONSTRUCTION})")
+        knob, values = "hnsw.ef_search", [20, 40, HNSW_EF_SEARCH, 200, 400]
+    conn.commit()
+    cursor.execute("ANALYZE context_benchmark")
+    conn.commit()
+    print(f"   built in {time.time() - started:.1f}s")
+    
+    search = "SELECT id FROM context_benchmark ORDER BY embedding <=> %s::vector LIMIT %s"
+    query_vectors = [vector_literal(v) for v in sample(queries)]
+    
+    print(f"🎯 Exact top-{k} for {queries} queries (sequential scan)...")
+    truth = []
+    for q in query_vectors:
+        cursor.execute("SET LOCAL enable_indexscan = off")
+        cursor.execute(search, (q, k))
+        truth.append({row[0] for row in cursor.fetchall()})
+        conn.rollback()
+    
+    print(f"\n{'rows':>10} {'index':>8} {knob:>16} {'recall@' + str(k):>10} {'p50 ms':>8} {'p95 ms':>8}")
+    for value in sorted(set(values)):
+        latencies, hits = [], 0
+        for q, expected in zip(query_vectors, truth):
+            started = time.perf_counter()
+            cursor.execute(f"SET LOCAL {knob} = {value};" + search, (q, k))
+            found = {row[0] for row in cursor.fetchall()}
+            latencies.append((time.perf_counter() - started) * 1000)
+            conn.rollback()
+            hits += len(found & expected)
+        p50, p95 = np.percentile(latencies, [50, 95])
+        print(f"{rows:>10,} {VECTOR_INDEX:>8} {value:>16} {hits / (k * queries):>10.3f} {p50:>8.2f} {p95:>8.2f}")
+    cursor.close()
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Massive context system")
+    parser.add_argument("--benchmark", type=int, metavar="ROWS",
+                        help="measure ANN recall/latency at ROWS synthetic vectors (e.g. 1000000)")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--reindex", action="store_true", help="rebuild the vector indexes and exit")
+    args = parser.parse_args()
+    
+    if args.benchmark:
+        conn = psycopg2.connect(**DB_CONFIG)
+        conn.cursor().execute("CREATE EXTENSION IF NOT EXISTS vector")
+        conn.commit()
+        run_benchmark(conn, args.benchmark, args.queries)
+        conn.close()
+        return
+    
+    if args.reindex:
+        context_system = MassiveContextSystem()
+        context_system.connect_db()
+        context_system.create_context_tables()
+        context_system.ensure_vector_indexes(force=True)
+        return
+    
     print("🚀 MASSIVE CONTEXT SYSTEM - FUCK CURSOR LIMITS!")
     print("=" * 60)
     print("🔥 Using unlimited RAM + GPU + SQL for infinite context")
@@ -279,8 +577,11 @@ def main():
     context_system.create_context_tables()
     
     # Store some test context
-    context_system.store_context("test", "user", "I want to sync Google data with GPU acceleration", "general")
-    context_system.store_context("test", "assistant", "Let's use Ollama + RTX 4090 for massive data processing!", "general")
+    context_system.store_contexts([
+        {"session_id": "test", "role": "user", "content": "I want to sync Google data with GPU acceleration"},
+        {"session_id": "test", "role": "assistant", "content": "Let's use Ollama + RTX 4090 for massive data processing!"}
+    ])
+    context_system.ensure_vector_indexes()
     
     # Test massive context search
     print("\n🧪 Testing massive context search...")
@@ -8,6 +8,7 @@ import os
 import sys
 import json
 import time
+import sqlite3
 import logging
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
@@ -27,6 +28,30 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Elephant tables mirrored into the local cache: result key, natural key, columns
+ELEPHANT_TABLES = {
+    "google_emails": {
+        "result": "emails",
+        "key": "gmail_id",
+        "columns": ["gmail_id", "subject", "from_email", "to_email", "email_date",
+                    "body_preview", "is_business", "updated_at"]
+    },
+    "google_calendar_events": {
+        "result": "events",
+        "key": "google_event_id",
+        "columns": ["google_event_id", "title", "start_time", "end_time",
+                    "location", "attendees", "updated_at"]
+    }
+}
+
+def _to_sqlite(value):
+    """Postgres values → something SQLite stores as-is"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, default=str)
+    return value
+
 class RobbieBookSync:
     def __init__(self):
         # Database configurations
@@ -46,6 +71,10 @@ class RobbieBookSync:
         # Sync state tracking
         self.last_sync_file = "/Users/allanperetz/aurora-ai-robbiverse/data/last-sync.json"
         self.sync_state = self._load_sync_state()
+        
+        # Local cache of Elephant data (and its per-table pull watermarks)
+        self.local_cache_path = "/Users/allanperetz/aurora-ai-robbiverse/data/robbiebook-cache.db"
+        self.pull_batch_size = 1000
     
     def _load_sync_state(self) -> Dict:
         """Load sync state from file"""
@@ -135,120 +164,137 @@ class RobbieBookSync:
             logger.error(f"❌ Google API sync failed: {e}")
             return {"emails": 0, "events": 0, "files": 0}
     
+    def _get_local_cache(self) -> sqlite3.Connection:
+        """Open the local cache, creating its tables on first use"""
+        os.makedirs(os.path.dirname(self.local_cache_path), exist_ok=True)
+        cache = sqlite3.connect(self.local_cache_path)
+        cache.execute("PRAGMA journal_mode=WAL")
+        for table, spec in ELEPHANT_TABLES.items():
+            columns = ", ".join(
+                f"{col} TEXT PRIMARY KEY" if col == spec["key"] else col
+                for col in spec["columns"]
+            )
+            cache.execute(f"CREATE TABLE IF NOT EXISTS {table} ({columns}, elephant_id INTEGER)")
+        cache.execute("""
+            CREATE TABLE IF NOT EXISTS sync_watermarks (
+                source_table TEXT PRIMARY KEY,
+                updated_at TEXT NOT NULL,
+                last_id INTEGER NOT NULL
+            )
+        """)
+        cache.commit()
+        return cache
+
+    def _pull_table(self, conn, cache: sqlite3.Connection, table: str) -> int:
+        """
+        Stream rows changed since the (updated_at, id) watermark into the cache
+
+        Rows come through a server-side cursor in (updated_at, id) order and
+        are applied in batches. Each batch's upsert and the watermark move to
+        its last row commit together, so a failed pull resumes right after
+        the last row that actually landed.
+        """
+        spec = ELEPHANT_TABLES[table]
+        key, columns = spec["key"], spec["columns"]
+
+        watermark = cache.execute(
+            "SELECT updated_at, last_id FROM sync_watermarks WHERE source_table = ?", (table,)
+        ).fetchone() or ("1970-01-01", 0)
+
+        placeholders = ", ".join("?" for _ in range(len(columns) + 1))
+        updates = ", ".join(f"{col} = excluded.{col}" for col in columns if col != key)
+        upsert = f"""
+            INSERT INTO {table} ({", ".join(columns)}, elephant_id) VALUES ({placeholders})
+            ON CONFLICT({key}) DO UPDATE SET {updates}, elephant_id = excluded.elephant_id
+            WHERE excluded.updated_at >= {table}.updated_at
+        """
+
+        pulled = 0
+        with conn.cursor(name=f"robbiebook_pull_{table}") as cur:
+            cur.itersize = self.pull_batch_size
+            cur.execute(f"""
+                SELECT {", ".join(columns)}, id
+                FROM {table}
+                WHERE (updated_at, id) > (%s, %s)
+                ORDER BY updated_at, id
+            """, watermark)
+
+            while True:
+                rows = cur.fetchmany(self.pull_batch_size)
+                if not rows:
+                    break
+
+                last = rows[-1]
+                with cache:
+                    cache.executemany(upsert, [[_to_sqlite(v) for v in row] for row in rows])
+                    cache.execute("""
+                        INSERT INTO sync_watermarks (source_table, updated_at, last_id) VALUES (?, ?, ?)
+                        ON CONFLICT(source_table) DO UPDATE SET
+                            updated_at = excluded.updated_at, last_id = excluded.last_id
+                    """, (table, _to_sqlite(last[columns.index("updated_at")]), last[-1]))
+                pulled += len(rows)
+
+        conn.commit()
+        return pulled
+
     def _sync_from_elephant(self) -> Dict:
         """Sync data FROM Elephant TO RobbieBook1 (local cache)"""
         logger.info("🐘 Syncing from Elephant to RobbieBook1...")
-        
+
+        results = {spec["result"]: 0 for spec in ELEPHANT_TABLES.values()}
+        conn = cache = None
         try:
             conn = self._get_db_connection()
-            
-            # Get recent data from elephant
-            with conn.cursor() as cur:
-                # Recent emails
-                cur.execute("""
-                    SELECT gmail_id, subject, from_email, to_email, email_date, 
-                           body_preview, is_business, updated_at
-                    FROM google_emails 
-                    WHERE updated_at > %s
-                    ORDER BY updated_at DESC
-                    LIMIT 100
-                """, (self.sync_state.get("last_elephant_pull", "2024-01-01"),))
-                
-                emails = cur.fetchall()
-                
-                # Recent calendar events
-                cur.execute("""
-                    SELECT google_event_id, title, start_time, end_time, 
-                           location, attendees, updated_at
-                    FROM google_calendar_events 
-                    WHERE updated_at > %s
-                    ORDER BY updated_at DESC
-                    LIMIT 50
-                """, (self.sync_state.get("last_elephant_pull", "2024-01-01"),))
-                
-                events = cur.fetchall()
-            
-            conn.close()
-            
-            # Update sync state
+            conn.set_session(readonly=True)
+            cache = self._get_local_cache()
+
+            for table, spec in ELEPHANT_TABLES.items():
+                results[spec["result"]] = self._pull_table(conn, cache, table)
+
             self.sync_state["last_elephant_pull"] = datetime.now().isoformat()
-            
-            logger.info(f"✅ Pulled {len(emails)} emails, {len(events)} events from Elephant")
-            return {"emails": len(emails), "events": len(events)}
-            
+            logger.info(f"✅ Pulled {results['emails']} emails, {results['events']} events from Elephant")
+
         except Exception as e:
             logger.error(f"❌ Elephant sync failed: {e}")
-            return {"emails": 0, "events": 0}
-    
+        finally:
+            if conn:
+                conn.close()
+            if cache:
+                cache.close()
+
+        return results
+
     def _resolve_sync_conflicts(self):
         """Resolve sync conflicts using timestamps"""
         logger.info("🔧 Checking for sync conflicts...")
-        
+
         try:
             conn = self._get_db_connection()
-            
+
             with conn.cursor() as cur:
-                # Check for duplicate emails
-                cur.execute("""
-                    SELECT gmail_id, COUNT(*) as count
-                    FROM google_emails 
-                    GROUP BY gmail_id 
-                    HAVING COUNT(*) > 1
-                """)
-                
-                duplicates = cur.fetchall()
-                
-                if duplicates:
-                    logger.warning(f"⚠️ Found {len(duplicates)} duplicate emails")
-                    
-                    # Keep the most recent version
-                    for gmail_id, count in duplicates:
-                        cur.execute("""
-                            DELETE FROM google_emails 
-                            WHERE gmail_id = %s 
-                            AND id NOT IN (
-                                SELECT id FROM google_emails 
-                                WHERE gmail_id = %s 
-                                ORDER BY updated_at DESC 
-                                LIMIT 1
-                            )
-                        """, (gmail_id, gmail_id))
-                    
-                    logger.info("✅ Duplicate emails resolved")
-                
-                # Similar for calendar events
-                cur.execute("""
-                    SELECT google_event_id, COUNT(*) as count
-                    FROM google_calendar_events 
-                    GROUP BY google_event_id 
-                    HAVING COUNT(*) > 1
-                """)
-                
-                duplicate_events = cur.fetchall()
-                
-                if duplicate_events:
-                    logger.warning(f"⚠️ Found {len(duplicate_events)} duplicate events")
-                    
-                    for event_id, count in duplicate_events:
-                        cur.execute("""
-                            DELETE FROM google_calendar_events 
-                            WHERE google_event_id = %s 
-                            AND id NOT IN (
-                                SELECT id FROM google_calendar_events 
-                                WHERE google_event_id = %s 
-                                ORDER BY updated_at DESC 
-                                LIMIT 1
-                            )
-                        """, (event_id, event_id))
-                    
-                    logger.info("✅ Duplicate events resolved")
-            
+                # Keep the most recent version of each email/event in one pass per table
+                for table, spec in ELEPHANT_TABLES.items():
+                    cur.execute(f"""
+                        DELETE FROM {table} t
+                        USING (
+                            SELECT id, ROW_NUMBER() OVER (
+                                PARTITION BY {spec["key"]}
+                                ORDER BY updated_at DESC, id DESC
+                            ) AS version
+                            FROM {table}
+                        ) ranked
+                        WHERE t.id = ranked.id AND ranked.version > 1
+                    """)
+
+                    if cur.rowcount:
+                        logger.warning(f"⚠️ Removed {cur.rowcount} duplicate {spec['result']}")
+
             conn.commit()
             conn.close()
-            
+
         except Exception as e:
             logger.error(f"❌ Conflict resolution failed: {e}")
-    
+
     def run_sync_cycle(self) -> Dict:
         """Run complete sync cycle"""
         logger.info("🚀 Starting RobbieBook1 sync cycle...")
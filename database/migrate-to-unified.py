@@ -2,16 +2,26 @@
 """
 Aurora Database Migration Script
 Migrates from scattered schemas to unified schema
-Version: 1.0.0
+Version: 1.1.0
+
+Streams every table instead of loading it: server-side cursors on the
+read side, chunked COPY FROM STDIN on the write side, binary COPY files
+for the backup. Per-table work runs in parallel on separate connections,
+and a checkpoint file lets an interrupted run resume where it stopped.
 """
 
+import io
 import os
 import sys
+import threading
+import time
 import psycopg2
 from psycopg2.extras import RealDictCursor
 import sqlite3
 import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
+from functools import partial
 from pathlib import Path
 import logging
 from typing import Dict, List, Any, Optional
@@ -23,14 +33,138 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+BACKUP_DIR = Path(os.getenv('MIGRATION_BACKUP_DIR', '/workspace/aurora/backups/migration'))
+CHECKPOINT_FILE = Path(os.getenv('MIGRATION_CHECKPOINT', str(BACKUP_DIR / 'checkpoint.json')))
+CHUNK_SIZE = int(os.getenv('MIGRATION_CHUNK_SIZE', '10000'))
+WORKERS = int(os.getenv('MIGRATION_WORKERS', '4'))
+
+
+def _copy_text(value: Any) -> str:
+    """One value in COPY text format"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return '\\\\x' + bytes(value).hex()
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value, default=str)
+    elif isinstance(value, datetime):
+        value = value.isoformat()
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+class MigrationCheckpoint:
+    """
+    Resume state, one entry per task: the keyset position of the last
+    committed chunk, rows so far, and whether the task finished. Saved
+    (atomically) after every chunk commit.
+    """
+    
+    def __init__(self, path: Path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.tasks: Dict[str, Dict[str, Any]] = {}
+        if path.exists():
+            self.tasks = json.loads(path.read_text()).get('tasks', {})
+            logger.info(f"📌 Resuming from checkpoint {path} ({len(self.tasks)} task(s) recorded)")
+    
+    def is_done(self, task: str) -> bool:
+        return self.tasks.get(task, {}).get('done', False)
+    
+    def last_key(self, task: str) -> Optional[Any]:
+        return self.tasks.get(task, {}).get('last_key')
+    
+    def rows(self, task: str) -> int:
+        return self.tasks.get(task, {}).get('rows', 0)
+    
+    def advance(self, task: str, last_key: Any, rows: int):
+        with self.lock:
+            entry = self.tasks.setdefault(task, {'rows': 0})
+            entry['last_key'] = last_key
+            entry['rows'] += rows
+            self._save()
+    
+    def mark_done(self, task: str):
+        with self.lock:
+            self.tasks.setdefault(task, {'rows': 0})['done'] = True
+            self._save()
+    
+    def clear(self):
+        with self.lock:
+            self.tasks = {}
+            self.path.unlink(missing_ok=True)
+    
+    def _save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix('.tmp')
+        tmp.write_text(json.dumps({'updated_at': datetime.now().isoformat(), 'tasks': self.tasks}))
+        tmp.replace(self.path)
+
+
+class TaskProgress:
+    """Row/byte counters for one task, logged as it goes"""
+    
+    def __init__(self, name: str, rows: int = 0):
+        self.name = name
+        self.rows = rows
+        self.resumed_rows = rows
+        self.bytes = 0
+        self.started = time.monotonic()
+        self.seconds = 0.0
+    
+    def add(self, rows: int, nbytes: int = 0):
+        self.rows += rows
+        self.bytes += nbytes
+        elapsed = time.monotonic() - self.started
+        rate = (self.rows - self.resumed_rows) / elapsed if elapsed else 0
+        logger.info(f"  📦 {self.name}: {self.rows:,} rows ({rate:,.0f} rows/s)")
+    
+    def finish(self):
+        self.seconds = time.monotonic() - self.started
+
+
+class MigrationProgress:
+    """Collects per-task progress for the final throughput report"""
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tasks: List[TaskProgress] = []
+        self.started = time.monotonic()
+    
+    def start(self, name: str, rows: int = 0) -> TaskProgress:
+        task = TaskProgress(name, rows)
+        with self.lock:
+            self.tasks.append(task)
+        return task
+    
+    def report(self):
+        elapsed = time.monotonic() - self.started
+        logger.info("Throughput:")
+        for task in sorted(self.tasks, key=lambda t: t.seconds, reverse=True):
+            moved = task.rows - task.resumed_rows
+            rate = moved / task.seconds if task.seconds else 0
+            size = f", {task.bytes / 1e6:,.1f} MB" if task.bytes else ""
+            logger.info(f"  {task.name}: {moved:,} rows in {task.seconds:,.1f}s ({rate:,.0f} rows/s{size})")
+        total = sum(task.rows - task.resumed_rows for task in self.tasks)
+        logger.info(f"  total: {total:,} rows in {elapsed:,.1f}s ({total / elapsed if elapsed else 0:,.0f} rows/s)")
+
+
 class DatabaseMigrator:
     """Handles migration from multiple database schemas to unified schema"""
     
-    def __init__(self, pg_config: Dict[str, str], sqlite_paths: List[str]):
+    def __init__(self, pg_config: Dict[str, str], sqlite_paths: List[str],
+                 chunk_size: int = CHUNK_SIZE, workers: int = WORKERS):
         """Initialize migrator with database connections"""
         self.pg_config = pg_config
         self.sqlite_paths = sqlite_paths
         self.pg_conn = None
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.checkpoint = MigrationCheckpoint(CHECKPOINT_FILE)
+        self.progress = MigrationProgress()
+        self.stats_lock = threading.Lock()
         self.stats = {
             'tables_migrated': 0,
             'records_migrated': 0,
@@ -54,45 +188,172 @@ class DatabaseMigrator:
             logger.error(f"Failed to connect to PostgreSQL: {e}")
             return False
     
-    def backup_existing_data(self):
-        """Create backup of existing data before migration"""
-        logger.info("Creating backup of existing data...")
+    def _pg_connect(self):
+        """Open a separate connection for one worker"""
+        return psycopg2.connect(
+            host=self.pg_config.get('host', 'localhost'),
+            port=self.pg_config.get('port', 5432),
+            database=self.pg_config.get('database', 'aurora'),
+            user=self.pg_config.get('user', 'aurora_app'),
+            password=self.pg_config.get('password')
+        )
+    
+    def _run_parallel(self, label: str, tasks: Dict[str, Any]):
+        """Run {task key: callable} across the worker pool, each on its own connections"""
+        pending = {key: fn for key, fn in tasks.items() if not self.checkpoint.is_done(key)}
+        skipped = len(tasks) - len(pending)
+        if skipped:
+            logger.info(f"⏭️  {label}: {skipped} task(s) already done in a previous run")
+        if not pending:
+            return
         
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='migrate') as pool:
+            futures = {pool.submit(fn): key for key, fn in pending.items()}
+            for future in as_completed(futures):
+                key = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.error(f"Failed {key}: {e}")
+                    self._count('errors')
+    
+    def _count(self, stat: str, amount: int = 1):
+        with self.stats_lock:
+            self.stats[stat] += amount
+    
+    def _public_tables(self) -> List[str]:
         with self.pg_conn.cursor() as cur:
-            # Get list of tables to backup
             cur.execute("""
                 SELECT table_name 
                 FROM information_schema.tables 
                 WHERE table_schema = 'public' 
                 AND table_type = 'BASE TABLE'
             """)
-            tables = [row[0] for row in cur.fetchall()]
+            return [row[0] for row in cur.fetchall()]
+    
+    def backup_existing_data(self):
+        """Create backup of existing data before migration"""
+        logger.info("Creating backup of existing data...")
+        
+        BACKUP_DIR.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        self._run_parallel('Backup', {
+            f"backup:{table}": partial(self.backup_table, table, stamp)
+            for table in self._public_tables()
+        })
+    
+    def backup_table(self, table: str, stamp: str):
+        """
+        Stream one table to a binary COPY file plus a small JSON manifest
+        
+        The server writes the rows straight into the file, so memory stays
+        flat however big the table is. Restore with
+        COPY <table> FROM STDIN WITH (FORMAT binary).
+        """
+        progress = self.progress.start(f"backup {table}")
+        conn = self._pg_connect()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(f"SELECT * FROM {table} LIMIT 0")
+                columns = [desc[0] for desc in cur.description]
+                
+                backup_file = BACKUP_DIR / f"{table}_{stamp}.pgcopy"
+                with open(backup_file, 'wb') as f:
+                    cur.copy_expert(f"COPY {table} TO STDOUT WITH (FORMAT binary)", f)
+                rows = cur.rowcount
             
-            backup_dir = Path('/workspace/aurora/backups/migration')
-            backup_dir.mkdir(parents=True, exist_ok=True)
+            with open(BACKUP_DIR / f"{table}_{stamp}.json", 'w') as f:
+                json.dump({
+                    'table': table,
+                    'columns': columns,
+                    'rows': rows,
+                    'format': 'pgcopy-binary',
+                    'file': backup_file.name,
+                    'timestamp': datetime.now().isoformat()
+                }, f, indent=2)
             
-            for table in tables:
-                try:
-                    # Export table to JSON
-                    cur.execute(f"SELECT * FROM {table}")
-                    data = cur.fetchall()
-                    columns = [desc[0] for desc in cur.description]
-                    
-                    backup_file = backup_dir / f"{table}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-                    
-                    with open(backup_file, 'w') as f:
-                        json.dump({
-                            'table': table,
-                            'columns': columns,
-                            'data': data,
-                            'timestamp': datetime.now().isoformat()
-                        }, f, default=str, indent=2)
-                    
-                    logger.info(f"Backed up table {table} to {backup_file}")
-                    
-                except Exception as e:
-                    logger.warning(f"Failed to backup table {table}: {e}")
-                    self.stats['warnings'].append(f"Backup failed for {table}")
+            progress.add(rows, backup_file.stat().st_size)
+            self.checkpoint.mark_done(f"backup:{table}")
+            logger.info(f"Backed up table {table} to {backup_file} ({rows:,} rows)")
+            
+        except Exception as e:
+            logger.warning(f"Failed to backup table {table}: {e}")
+            with self.stats_lock:
+                self.stats['warnings'].append(f"Backup failed for {table}")
+        finally:
+            progress.finish()
+            conn.close()
+    
+    def _keyset_column(self, cur, table: str) -> str:
+        """Single-column primary key to page by, else the physical row id"""
+        cur.execute("""
+            SELECT a.attname
+            FROM pg_index i
+            JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)
+            WHERE i.indrelid = %s::regclass AND i.indisprimary
+        """, (table,))
+        keys = cur.fetchall()
+        return keys[0][0] if len(keys) == 1 else 'ctid'
+    
+    def _stream_postgres(self, conn, table: str, task: str):
+        """
+        Yield chunks of (keyset value, row dict) from a server-side cursor,
+        starting after the checkpointed key
+        """
+        with conn.cursor() as cur:
+            key = self._keyset_column(cur, table)
+        key_expr = 'ctid' if key == 'ctid' else f'"{key}"'
+        key_cast = '::tid' if key == 'ctid' else ''
+        last_key = self.checkpoint.last_key(task)
+        
+        with conn.cursor(name=f"migrate_{table}", cursor_factory=RealDictCursor) as cur:
+            cur.itersize = self.chunk_size
+            if last_key is None:
+                cur.execute(f"SELECT {key_expr}::text AS _migration_key, * FROM {table} ORDER BY {key_expr}")
+            else:
+                cur.execute(
+                    f"SELECT {key_expr}::text AS _migration_key, * FROM {table} "
+                    f"WHERE {key_expr} > %s{key_cast} ORDER BY {key_expr}",
+                    (last_key,)
+                )
+            while True:
+                rows = cur.fetchmany(self.chunk_size)
+                if not rows:
+                    break
+                yield [(row.pop('_migration_key'), row) for row in rows]
+    
+    def _copy_chunk(self, cur, target: str, columns: List[str], rows: List[tuple],
+                    skip_matching: Optional[str] = None) -> int:
+        """
+        COPY a chunk into a staging table, then merge it into the target
+        
+        COPY can't skip conflicting rows, so the chunk lands in a temp table
+        shaped like the target's columns and goes across with one
+        INSERT ... SELECT ... ON CONFLICT DO NOTHING. For targets without a
+        conflict key, skip_matching is a condition between an existing row
+        (t) and a staged row (s) that marks the staged row as already
+        copied. Returns rows inserted.
+        """
+        stage = f"_migration_stage_{target}"
+        column_list = ', '.join(columns)
+        cur.execute(f"CREATE TEMP TABLE IF NOT EXISTS {stage} AS SELECT {column_list} FROM {target} WITH NO DATA")
+        cur.execute(f"TRUNCATE {stage}")
+        
+        buffer = io.StringIO()
+        for row in rows:
+            buffer.write('\t'.join(_copy_text(value) for value in row))
+            buffer.write('\n')
+        buffer.seek(0)
+        cur.copy_expert(f"COPY {stage} ({column_list}) FROM STDIN", buffer)
+        
+        unless = f"WHERE NOT EXISTS (SELECT 1 FROM {target} t WHERE {skip_matching})" if skip_matching else ""
+        cur.execute(f"""
+            INSERT INTO {target} ({column_list})
+            SELECT {column_list} FROM {stage} s
+            {unless}
+            ON CONFLICT DO NOTHING
+        """)
+        return cur.rowcount
     
     def migrate_conversations(self):
         """Migrate conversations from multiple sources to unified schema"""
@@ -106,29 +367,41 @@ class DatabaseMigrator:
                 WHERE table_schema = 'public' 
                 AND table_name LIKE '%conversation%'
                 AND table_name != 'conversations'
+                AND table_name NOT LIKE '\\_%'
             """)
             
             old_tables = [row['table_name'] for row in cur.fetchall()]
-            
-            for old_table in old_tables:
-                logger.info(f"Migrating from {old_table}...")
-                
-                try:
-                    # Get data from old table
-                    cur.execute(f"SELECT * FROM {old_table}")
-                    old_data = cur.fetchall()
-                    
-                    for row in old_data:
+        
+        self._run_parallel('Conversations', {
+            f"conversations:{old_table}": partial(self.migrate_conversation_table, old_table)
+            for old_table in old_tables
+        })
+    
+    def migrate_conversation_table(self, old_table: str):
+        """Stream one old conversations table into the unified table, checkpointing each chunk"""
+        logger.info(f"Migrating from {old_table}...")
+        task = f"conversations:{old_table}"
+        columns = ['user_id', 'title', 'type', 'status', 'created_at', 'metadata']
+        progress = self.progress.start(old_table, self.checkpoint.rows(task))
+        # conversations has no conflict key: a chunk committed just before a
+        # crash (checkpoint not yet advanced) is matched on its source key
+        resuming = self.checkpoint.last_key(task) is not None
+        already_copied = (
+            "t.metadata->>'source_table' = s.metadata->>'source_table' "
+            "AND t.metadata->>'source_key' = s.metadata->>'source_key'"
+        )
+        
+        source, target = self._pg_connect(), self._pg_connect()
+        source.set_session(readonly=True)
+        try:
+            with target.cursor() as cur:
+                for chunk in self._stream_postgres(source, old_table, task):
+                    rows = []
+                    for key, row in chunk:
                         # Map old schema to new unified schema
                         new_row = self.map_conversation_row(row, old_table)
-                        
-                        # Insert into new unified table
-                        cur.execute("""
-                            INSERT INTO conversations 
-                            (user_id, title, type, status, created_at, metadata)
-                            VALUES (%s, %s, %s, %s, %s, %s)
-                            ON CONFLICT DO NOTHING
-                        """, (
+                        new_row['metadata']['source_key'] = key
+                        rows.append((
                             new_row.get('user_id'),
                             new_row.get('title', 'Migrated Conversation'),
                             new_row.get('type', 'chat'),
@@ -136,20 +409,35 @@ class DatabaseMigrator:
                             new_row.get('created_at', datetime.now()),
                             json.dumps(new_row.get('metadata', {}))
                         ))
-                        
-                        self.stats['records_migrated'] += 1
-                    
-                    self.pg_conn.commit()
-                    logger.info(f"Migrated {len(old_data)} records from {old_table}")
                     
-                    # Optionally rename old table
-                    cur.execute(f"ALTER TABLE {old_table} RENAME TO _migrated_{old_table}")
-                    self.pg_conn.commit()
-                    
-                except Exception as e:
-                    logger.error(f"Failed to migrate {old_table}: {e}")
-                    self.stats['errors'] += 1
-                    self.pg_conn.rollback()
+                    self._copy_chunk(cur, 'conversations', columns, rows,
+                                     skip_matching=already_copied if resuming else None)
+                    resuming = False
+                    target.commit()
+                    self.checkpoint.advance(task, chunk[-1][0], len(chunk))
+                    self._count('records_migrated', len(chunk))
+                    progress.add(len(chunk))
+                
+                logger.info(f"Migrated {progress.rows:,} records from {old_table}")
+                
+                # End the read transaction: its lock on the old table would block the rename
+                source.commit()
+                
+                # Optionally rename old table
+                cur.execute(f"ALTER TABLE {old_table} RENAME TO _migrated_{old_table}")
+                target.commit()
+            
+            self.checkpoint.mark_done(task)
+            self._count('tables_migrated')
+            
+        except Exception as e:
+            logger.error(f"Failed to migrate {old_table}: {e}")
+            self._count('errors')
+            target.rollback()
+        finally:
+            progress.finish()
+            source.close()
+            target.close()
     
     def map_conversation_row(self, old_row: Dict, source_table: str) -> Dict:
         """Map old conversation row to new unified schema"""
@@ -182,6 +470,7 @@ class DatabaseMigrator:
         """Migrate data from SQLite databases to PostgreSQL"""
         logger.info("Migrating SQLite databases...")
         
+        tasks = {}
         for sqlite_path in self.sqlite_paths:
             if not os.path.exists(sqlite_path):
                 logger.warning(f"SQLite file not found: {sqlite_path}")
@@ -191,70 +480,96 @@ class DatabaseMigrator:
             
             try:
                 sqlite_conn = sqlite3.connect(sqlite_path)
-                sqlite_conn.row_factory = sqlite3.Row
-                cursor = sqlite_conn.cursor()
                 
                 # Get list of tables
-                cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-                tables = [row['name'] for row in cursor.fetchall()]
-                
-                for table in tables:
-                    self.migrate_sqlite_table(sqlite_conn, table)
+                cursor = sqlite_conn.execute("SELECT name FROM sqlite_master WHERE type='table'")
+                for (table,) in cursor.fetchall():
+                    tasks[f"sqlite:{sqlite_path}:{table}"] = partial(self.migrate_sqlite_table, sqlite_path, table)
                 
                 sqlite_conn.close()
                 
             except Exception as e:
                 logger.error(f"Failed to process SQLite database {sqlite_path}: {e}")
-                self.stats['errors'] += 1
+                self._count('errors')
+        
+        self._run_parallel('SQLite', tasks)
     
-    def migrate_sqlite_table(self, sqlite_conn, table_name: str):
-        """Migrate a single SQLite table to PostgreSQL"""
-        cursor = sqlite_conn.cursor()
+    def migrate_sqlite_table(self, sqlite_path: str, table_name: str):
+        """Stream a single SQLite table to PostgreSQL in rowid order, checkpointing each chunk"""
+        task = f"sqlite:{sqlite_path}:{table_name}"
+        sqlite_conn = sqlite3.connect(sqlite_path)
+        sqlite_conn.row_factory = sqlite3.Row
+        pg_conn = None
+        progress = None
         
         try:
-            # Get data from SQLite
-            cursor.execute(f"SELECT * FROM {table_name}")
-            rows = cursor.fetchall()
+            cursor = sqlite_conn.execute(
+                f"SELECT rowid AS _migration_key, * FROM {table_name} WHERE rowid > ? ORDER BY rowid",
+                (self.checkpoint.last_key(task) or 0,)
+            )
+            rows = cursor.fetchmany(self.chunk_size)
             
             if not rows:
+                self.checkpoint.mark_done(task)
                 return
             
             # Determine target PostgreSQL table based on content
-            pg_table = self.determine_target_table(table_name, dict(rows[0]))
+            sample = {key: rows[0][key] for key in rows[0].keys() if key != '_migration_key'}
+            pg_table = self.determine_target_table(table_name, sample)
             
             if not pg_table:
                 logger.warning(f"No mapping for SQLite table {table_name}")
-                self.stats['warnings'].append(f"Unmapped SQLite table: {table_name}")
+                with self.stats_lock:
+                    self.stats['warnings'].append(f"Unmapped SQLite table: {table_name}")
                 return
             
-            logger.info(f"Migrating {table_name} -> {pg_table} ({len(rows)} rows)")
+            total = sqlite_conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+            logger.info(f"Migrating {table_name} -> {pg_table} ({total:,} rows)")
+            progress = self.progress.start(f"{table_name} -> {pg_table}", self.checkpoint.rows(task))
+            columns = list(self.map_sqlite_row(sample, table_name, pg_table).keys())
+            # Targets like messages and embeddings have no conflict key: a chunk committed
+            # just before a crash (checkpoint not yet advanced) is matched on its source key
+            resuming = self.checkpoint.last_key(task) is not None
+            already_copied = (
+                "t.metadata->>'source_path' = s.metadata->>'source_path' "
+                "AND t.metadata->>'source_table' = s.metadata->>'source_table' "
+                "AND t.metadata->>'source_key' = s.metadata->>'source_key'"
+            )
             
-            with self.pg_conn.cursor() as pg_cursor:
-                for row in rows:
-                    row_dict = dict(row)
-                    mapped_row = self.map_sqlite_row(row_dict, table_name, pg_table)
+            pg_conn = self._pg_connect()
+            with pg_conn.cursor() as pg_cursor:
+                while rows:
+                    mapped = []
+                    for row in rows:
+                        row_dict = {key: row[key] for key in row.keys() if key != '_migration_key'}
+                        mapped_row = self.map_sqlite_row(row_dict, table_name, pg_table,
+                                                         source=(sqlite_path, row['_migration_key']))
+                        mapped.append(tuple(mapped_row.get(column) for column in columns))
                     
-                    # Build dynamic INSERT query
-                    columns = list(mapped_row.keys())
-                    values = list(mapped_row.values())
-                    placeholders = ','.join(['%s'] * len(columns))
+                    self._copy_chunk(pg_cursor, pg_table, columns, mapped,
+                                     skip_matching=already_copied if resuming else None)
+                    resuming = False
+                    pg_conn.commit()
+                    self.checkpoint.advance(task, rows[-1]['_migration_key'], len(rows))
+                    self._count('records_migrated', len(rows))
+                    progress.add(len(rows))
                     
-                    query = f"""
-                        INSERT INTO {pg_table} ({','.join(columns)})
-                        VALUES ({placeholders})
-                        ON CONFLICT DO NOTHING
-                    """
-                    
-                    pg_cursor.execute(query, values)
-                    self.stats['records_migrated'] += 1
-                
-                self.pg_conn.commit()
-                self.stats['tables_migrated'] += 1
+                    rows = cursor.fetchmany(self.chunk_size)
+            
+            self.checkpoint.mark_done(task)
+            self._count('tables_migrated')
                 
         except Exception as e:
             logger.error(f"Failed to migrate SQLite table {table_name}: {e}")
-            self.stats['errors'] += 1
-            self.pg_conn.rollback()
+            self._count('errors')
+            if pg_conn:
+                pg_conn.rollback()
+        finally:
+            if progress:
+                progress.finish()
+            if pg_conn:
+                pg_conn.close()
+            sqlite_conn.close()
     
     def determine_target_table(self, sqlite_table: str, sample_row: Dict) -> Optional[str]:
         """Determine target PostgreSQL table based on SQLite table name and content"""
@@ -282,16 +597,20 @@ class DatabaseMigrator:
         
         return None
     
-    def map_sqlite_row(self, row: Dict, source_table: str, target_table: str) -> Dict:
-        """Map SQLite row to PostgreSQL schema"""
+    def map_sqlite_row(self, row: Dict, source_table: str, target_table: str,
+                       source: Optional[tuple] = None) -> Dict:
+        """Map SQLite row to PostgreSQL schema; source is (sqlite path, rowid) when known"""
         mapped = {}
         
         # Add metadata
-        mapped['metadata'] = json.dumps({
+        metadata = {
             'source': 'sqlite',
             'source_table': source_table,
             'migration_date': datetime.now().isoformat()
-        })
+        }
+        if source:
+            metadata['source_path'], metadata['source_key'] = source
+        mapped['metadata'] = json.dumps(metadata)
         
         # Table-specific mappings
         if target_table == 'users':
@@ -397,6 +716,11 @@ class DatabaseMigrator:
             logger.info(f"Tables migrated: {self.stats['tables_migrated']}")
             logger.info(f"Records migrated: {self.stats['records_migrated']}")
             logger.info(f"Errors: {self.stats['errors']}")
+            self.progress.report()
+            
+            # A clean run starts the next one from scratch; otherwise keep the checkpoint to resume
+            if not self.stats['errors']:
+                self.checkpoint.clear()
             
             if self.stats['warnings']:
                 logger.warning(f"Warnings: {len(self.stats['warnings'])}")
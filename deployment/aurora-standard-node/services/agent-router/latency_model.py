@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Agent Router Latency Model
+Learns per-node, per-model generation speed from completed requests and
+predicts completion time for routing decisions
+
+Every completed generation reports its per-token generation time,
+time-to-first-token, output length and network overhead. Each is tracked
+as an EWMA plus quantiles over a window of recent samples. Predictions
+start from the old static constants and shift toward measurements as
+they arrive. Speed is blended as ms/token rather than tokens/sec so a far-off
+prior (1000 tok/s for any GPU) can't outweigh real observations of a slow node.
+"""
+
+import itertools
+import os
+import time
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+EWMA_ALPHA = float(os.getenv("LATENCY_EWMA_ALPHA", "0.2"))
+QUANTILE_WINDOW = int(os.getenv("LATENCY_QUANTILE_WINDOW", "256"))
+
+# How many observations the prior is worth when blending
+PRIOR_WEIGHT = float(os.getenv("LATENCY_PRIOR_WEIGHT", "3"))
+
+# Priors (the previous static model) for nodes/models with no history
+PRIOR_GPU_TOKENS_PER_SEC = 1000.0
+PRIOR_CPU_TOKENS_PER_SEC = 100.0
+PRIOR_TTFT_MS = 250.0
+PRIOR_OUTPUT_RATIO = 1.0
+PRIOR_NETWORK_MS = 20.0
+
+# A node that just failed is skipped for this long (unless nothing else is left)
+FAILURE_COOLDOWN_SECONDS = float(os.getenv("LATENCY_FAILURE_COOLDOWN", "60"))
+
+
+class StreamingStat:
+    """EWMA plus quantiles over a sliding window of recent samples"""
+
+    __slots__ = ("alpha", "ewma", "count", "window")
+
+    def __init__(self, alpha: float = EWMA_ALPHA, window: int = QUANTILE_WINDOW):
+        self.alpha = alpha
+        self.ewma: Optional[float] = None
+        self.count = 0
+        self.window: deque = deque(maxlen=window)
+
+    def add(self, value: float):
+        self.ewma = value if self.ewma is None else self.ewma + self.alpha * (value - self.ewma)
+        self.count += 1
+        self.window.append(value)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.window:
+            return None
+        ordered = sorted(self.window)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def blended(self, prior: float, prior_weight: float = PRIOR_WEIGHT) -> float:
+        """EWMA shrunk toward the prior while there are few observations"""
+        if self.ewma is None:
+            return prior
+        return (prior * prior_weight + self.ewma * self.count) / (prior_weight + self.count)
+
+    def to_dict(self) -> Dict:
+        return {
+            "ewma": round(self.ewma, 2) if self.ewma is not None else None,
+            "count": self.count,
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+            "window": list(self.window)
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "StreamingStat":
+        stat = cls()
+        stat.ewma = data.get("ewma")
+        stat.count = data.get("count", 0)
+        stat.window.extend(data.get("window", []))
+        return stat
+
+
+class NodeModelStats:
+    """What we've measured for one model on one node"""
+
+    FIELDS = ("ms_per_token", "ttft_ms", "output_ratio")
+
+    def __init__(self):
+        self.ms_per_token = StreamingStat()
+        self.ttft_ms = StreamingStat()
+        self.output_ratio = StreamingStat()
+        self.failures = 0
+        self.last_seen: Optional[float] = None
+
+    def to_dict(self) -> Dict:
+        data = {field: getattr(self, field).to_dict() for field in self.FIELDS}
+        data.update({"failures": self.failures, "last_seen": self.last_seen})
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "NodeModelStats":
+        stats = cls()
+        for field in cls.FIELDS:
+            if field in data:
+                setattr(stats, field, StreamingStat.from_dict(data[field]))
+        stats.failures = data.get("failures", 0)
+        stats.last_seen = data.get("last_seen")
+        return stats
+
+
+class LatencyModel:
+    """Per-node, per-model service time model plus router-local queue depth"""
+
+    def __init__(self):
+        self.stats: Dict[Tuple[str, str], NodeModelStats] = {}
+        self.network_ms: Dict[str, StreamingStat] = {}
+        # node -> {ticket: (started_at, predicted service ms)} for requests in flight
+        self.inflight: Dict[str, Dict[int, Tuple[float, float]]] = {}
+        self.last_finished: Dict[str, float] = {}
+        self.failed_until: Dict[str, float] = {}
+        self._tickets = itertools.count()
+
+    # ============================================
+    # OBSERVATIONS
+    # ============================================
+
+    def begin(self, node: str, service_ms: float, now: Optional[float] = None) -> int:
+        """A request expected to take service_ms was sent to node; returns its ticket"""
+        ticket = next(self._tickets)
+        self.inflight.setdefault(node, {})[ticket] = (now or time.time(), service_ms)
+        return ticket
+
+    def end(self, node: str, ticket: int, now: Optional[float] = None):
+        if self.inflight.get(node, {}).pop(ticket, None) is not None:
+            self.last_finished[node] = now or time.time()
+
+    def queue_depth(self, node: str) -> int:
+        return len(self.inflight.get(node, ()))
+
+    def backlog_ms(self, node: str, now: Optional[float] = None) -> float:
+        """
+        Work still ahead of a new request on node
+
+        The request at the head started when it was sent or when the previous
+        one finished, whichever is later; remaining work is the predicted
+        total minus the time elapsed since then.
+        """
+        entries = self.inflight.get(node)
+        if not entries:
+            return 0.0
+        busy_since = max(min(started for started, _ in entries.values()),
+                         self.last_finished.get(node, 0.0))
+        elapsed_ms = ((now or time.time()) - busy_since) * 1000
+        return max(0.0, sum(service for _, service in entries.values()) - elapsed_ms)
+
+    def record(self, node: str, model: str, max_tokens: int, eval_count: int,
+               eval_ms: float, ttft_ms: float, network_ms: Optional[float] = None,
+               now: Optional[float] = None):
+        """Fold one completed generation into the node/model stats"""
+        stats = self.stats.setdefault((node, model), NodeModelStats())
+        if eval_count > 0 and eval_ms > 0:
+            stats.ms_per_token.add(eval_ms / eval_count)
+        if ttft_ms >= 0:
+            stats.ttft_ms.add(ttft_ms)
+        if max_tokens > 0:
+            stats.output_ratio.add(min(1.0, eval_count / max_tokens))
+        if network_ms is not None and network_ms >= 0:
+            self.network_ms.setdefault(node, StreamingStat()).add(network_ms)
+        stats.last_seen = now or time.time()
+        self.failed_until.pop(node, None)
+
+    def record_failure(self, node: str, model: str, now: Optional[float] = None):
+        self.stats.setdefault((node, model), NodeModelStats()).failures += 1
+        self.failed_until[node] = (now or time.time()) + FAILURE_COOLDOWN_SECONDS
+
+    # ============================================
+    # PREDICTION
+    # ============================================
+
+    def _node_model_stats(self, node: str, model: str) -> Optional[NodeModelStats]:
+        return self.stats.get((node, model))
+
+    def predict(self, node: str, model: str, max_tokens: int, has_gpu: bool,
+                pessimistic: bool = False, now: Optional[float] = None) -> Dict:
+        """
+        Predicted completion time (ms) with its breakdown
+
+        pessimistic uses slow-tail quantiles (p90 ms/token, p90 TTFT),
+        which is what hedging waits for before firing a second request.
+        """
+        prior_ms_per_token = 1000 / (PRIOR_GPU_TOKENS_PER_SEC if has_gpu else PRIOR_CPU_TOKENS_PER_SEC)
+        stats = self._node_model_stats(node, model)
+
+        if stats is None:
+            ms_per_token, ttft_ms, output_ratio = prior_ms_per_token, PRIOR_TTFT_MS, PRIOR_OUTPUT_RATIO
+        else:
+            ms_per_token = stats.ms_per_token.blended(prior_ms_per_token)
+            ttft_ms = stats.ttft_ms.blended(PRIOR_TTFT_MS)
+            output_ratio = stats.output_ratio.blended(PRIOR_OUTPUT_RATIO)
+            if pessimistic:
+                ms_per_token = stats.ms_per_token.quantile(0.9) or ms_per_token
+                ttft_ms = stats.ttft_ms.quantile(0.9) or ttft_ms
+
+        network = self.network_ms.get(node)
+        network_ms = network.blended(PRIOR_NETWORK_MS) if network else PRIOR_NETWORK_MS
+
+        expected_tokens = max_tokens * output_ratio
+        service_ms = ttft_ms + expected_tokens * ms_per_token
+
+        # Router-local queue: predicted work still ahead on this node
+        queue_depth = self.queue_depth(node)
+        queue_ms = self.backlog_ms(node, now)
+
+        total_ms = queue_ms + service_ms + network_ms
+        return {
+            "node_name": node,
+            "estimated_time_ms": int(total_ms),
+            "observations": stats.ms_per_token.count if stats else 0,
+            "breakdown": {
+                "tokens_per_sec": round(1000 / max(ms_per_token, 1e-6), 1),
+                "ttft_ms": round(ttft_ms, 1),
+                "expected_tokens": round(expected_tokens, 1),
+                "service_time": int(service_ms),
+                "queue_depth": queue_depth,
+                "queue_time": int(queue_ms),
+                "network_latency": round(network_ms, 1)
+            }
+        }
+
+    def rank(self, nodes: Iterable[Dict], model: str, max_tokens: int,
+             now: Optional[float] = None) -> List[Dict]:
+        """Predictions for every node, fastest first; cooling-down nodes go last"""
+        now = now or time.time()
+        ranked = []
+        for node in nodes:
+            name = node["name"]
+            has_gpu = bool(node.get("capabilities", {}).get("gpu", False))
+            prediction = self.predict(name, model, max_tokens, has_gpu, now=now)
+            prediction["has_gpu"] = has_gpu
+            prediction["cooling_down"] = self.failed_until.get(name, 0) > now
+            ranked.append(prediction)
+
+        ranked.sort(key=lambda p: (p["cooling_down"], p["estimated_time_ms"]))
+        return ranked
+
+    # ============================================
+    # SNAPSHOTS
+    # ============================================
+
+    def snapshot(self) -> Dict:
+        return {
+            "stats": {f"{node}|{model}": s.to_dict() for (node, model), s in self.stats.items()},
+            "network_ms": {node: s.to_dict() for node, s in self.network_ms.items()}
+        }
+
+    def load(self, snapshot: Dict):
+        for key, data in snapshot.get("stats", {}).items():
+            node, _, model = key.partition("|")
+            self.stats[(node, model)] = NodeModelStats.from_dict(data)
+        for node, data in snapshot.get("network_ms", {}).items():
+            self.network_ms[node] = StreamingStat.from_dict(data)
+
+    def summary(self) -> Dict:
+        """Snapshot without the raw sample windows"""
+        def trim(stat: Dict) -> Dict:
+            return {k: v for k, v in stat.items() if k != "window"}
+
+        return {
+            "nodes": {
+                f"{node}|{model}": {
+                    **{field: trim(getattr(s, field).to_dict()) for field in NodeModelStats.FIELDS},
+                    "failures": s.failures,
+                    "last_seen": s.last_seen
+                }
+                for (node, model), s in self.stats.items()
+            },
+            "network_ms": {node: trim(s.to_dict()) for node, s in self.network_ms.items()},
+            "inflight": {node: len(entries) for node, entries in self.inflight.items()}
+        }
@@ -16,17 +16,22 @@ Example: Allan on RobbieBook1, Aurora has 10x power
 
 import os
 import asyncio
+import json
 import logging
+import time
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 import httpx
 import redis
+import redis.asyncio as aioredis
 import psutil
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from circuitbreaker import circuit
 
+from latency_model import LatencyModel, PRIOR_NETWORK_MS
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -50,6 +55,31 @@ REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
 REDIS_PASSWORD = os.getenv("REDIS_PASSWORD", "")
 NODE_REGISTRY_URL = os.getenv("NODE_REGISTRY_URL", "http://node-registry:9999")
 
+# Registry layout (see node-registry) and liveness windows
+REGISTRY_NODES_KEY = "aurora:registry:nodes"
+REGISTRY_HEARTBEATS_KEY = "aurora:registry:heartbeats"
+EVENTS_CHANNEL = "aurora:events:global"
+NODE_ACTIVE_WINDOW = int(os.getenv("REGISTRY_ACTIVE_WINDOW", "120"))
+NODE_WARNING_WINDOW = int(os.getenv("REGISTRY_WARNING_WINDOW", "180"))
+REGISTRY_RESYNC_SECONDS = int(os.getenv("REGISTRY_RESYNC_SECONDS", "60"))
+
+# Learned latency model, request traces and hedging
+OLLAMA_PORT = int(os.getenv("OLLAMA_PORT", "11434"))
+LATENCY_MODEL_KEY = f"aurora:router:latency_model:{NODE_NAME}"
+TRACES_KEY = "aurora:router:traces"
+TRACE_RETENTION = int(os.getenv("ROUTER_TRACE_RETENTION", "10000"))
+MODEL_SAVE_SECONDS = int(os.getenv("ROUTER_MODEL_SAVE_SECONDS", "60"))
+HEDGE_ENABLED = os.getenv("ROUTER_HEDGE_ENABLED", "false").lower() == "true"
+HEDGE_MIN_DELAY_MS = int(os.getenv("ROUTER_HEDGE_MIN_DELAY_MS", "500"))
+
+# Used only for nodes whose registry entry has no ollama_url or vpn_ip
+FALLBACK_NODE_ENDPOINTS = {
+    "aurora": "http://10.0.0.1:11434",
+    "runpod-tx": "http://10.0.0.3:11434",
+    "vengeance": "http://10.0.0.4:11434",
+    "robbiebook1": "http://10.0.0.5:11434"
+}
+
 # Redis client
 redis_client = redis.Redis(
     host=REDIS_HOST,
@@ -59,6 +89,166 @@ redis_client = redis.Redis(
 )
 
 
+class RegistryCache:
+    """
+    Local copy of the node registry, kept current by pushes
+
+    Loaded from the registry hash + heartbeat ZSET in one pipelined read,
+    then updated from node_heartbeat / node_registered events on the
+    global channel. A periodic resync covers any missed messages, so
+    routing reads memory and never waits on the registry service.
+    """
+
+    def __init__(self):
+        self.nodes: Dict[str, Dict] = {}
+        self.last_heartbeat: Dict[str, float] = {}
+        self.synced_at: Optional[float] = None
+        self.redis = None
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self):
+        self.redis = aioredis.Redis(
+            host=REDIS_HOST,
+            port=REDIS_PORT,
+            password=REDIS_PASSWORD if REDIS_PASSWORD else None,
+            decode_responses=True
+        )
+        try:
+            await self.resync()
+        except Exception as e:
+            logger.error(f"Registry cache initial sync failed: {e}")
+        self._tasks = [
+            asyncio.create_task(self._listen()),
+            asyncio.create_task(self._resync_loop())
+        ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        if self.redis:
+            await self.redis.close()
+
+    async def resync(self):
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.hgetall(REGISTRY_NODES_KEY)
+        pipe.zrange(REGISTRY_HEARTBEATS_KEY, 0, -1, withscores=True)
+        node_data, heartbeats = await pipe.execute()
+
+        self.nodes = {name: json.loads(info) for name, info in node_data.items()}
+        self.last_heartbeat = dict(heartbeats)
+        self.synced_at = time.time()
+
+    async def _resync_loop(self):
+        while True:
+            await asyncio.sleep(REGISTRY_RESYNC_SECONDS)
+            try:
+                await self.resync()
+            except Exception as e:
+                logger.error(f"Registry cache resync failed: {e}")
+
+    async def _listen(self):
+        while True:
+            try:
+                pubsub = self.redis.pubsub()
+                await pubsub.subscribe(EVENTS_CHANNEL)
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self.apply_event(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Registry cache listener error: {e}")
+                await asyncio.sleep(5)
+
+    def apply_event(self, raw: str):
+        try:
+            event = json.loads(raw)
+        except (TypeError, ValueError):
+            return
+
+        event_type = event.get("type")
+        data = event.get("data") or {}
+        node = data.get("node")
+        if not node:
+            return
+
+        if event_type == "node_heartbeat":
+            self.last_heartbeat[node] = time.time()
+        elif event_type == "node_registered":
+            if data.get("info"):
+                self.nodes[node] = data["info"]
+            else:
+                self.nodes.setdefault(node, {"name": node}).update(
+                    {k: data[k] for k in ("role", "vpn_ip") if k in data}
+                )
+            self.last_heartbeat[node] = time.time()
+
+    def status(self, node: str, now: float) -> str:
+        last = self.last_heartbeat.get(node)
+        if last is None:
+            return "offline"
+        age = now - last
+        if age < NODE_ACTIVE_WINDOW:
+            return "active"
+        if age < NODE_WARNING_WINDOW:
+            return "warning"
+        return "offline"
+
+    def live_nodes(self) -> List[Dict]:
+        """Registered nodes heard from within the warning window"""
+        now = time.time()
+        live = []
+        for name, info in self.nodes.items():
+            status = self.status(name, now)
+            if status != "offline":
+                live.append({**info, "name": info.get("name", name), "status": status})
+        return live
+
+
+registry_cache = RegistryCache()
+latency_model = LatencyModel()
+routing_stats = {"routes": 0, "hedges_fired": 0, "hedges_won": 0}
+_background_tasks: List[asyncio.Task] = []
+
+
+@app.on_event("startup")
+async def startup():
+    await registry_cache.start()
+    
+    # Pick up where this router left off
+    try:
+        snapshot = redis_client.get(LATENCY_MODEL_KEY)
+        if snapshot:
+            latency_model.load(json.loads(snapshot))
+            logger.info(f"📈 Loaded latency model ({len(latency_model.stats)} node/model pairs)")
+    except Exception as e:
+        logger.error(f"Failed to load latency model: {e}")
+    
+    _background_tasks.append(asyncio.create_task(save_latency_model_loop()))
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    for task in _background_tasks:
+        task.cancel()
+    await asyncio.to_thread(save_latency_model)
+    await registry_cache.stop()
+
+
+def save_latency_model():
+    try:
+        redis_client.set(LATENCY_MODEL_KEY, json.dumps(latency_model.snapshot()))
+    except Exception as e:
+        logger.error(f"Failed to save latency model: {e}")
+
+
+async def save_latency_model_loop():
+    while True:
+        await asyncio.sleep(MODEL_SAVE_SECONDS)
+        await asyncio.to_thread(save_latency_model)
+
+
 class GenerationRequest(BaseModel):
     prompt: str
     model: str = "llama3.1:8b"
@@ -106,20 +296,24 @@ async def route_generation(request: GenerationRequest):
         if not nodes:
             raise HTTPException(status_code=503, detail="No nodes available")
         
-        # 2. Calculate best node
-        best_node = await calculate_best_node(nodes, request)
+        # 2. Rank nodes by predicted completion time
+        ranking = await rank_nodes(nodes, request)
+        best_node = ranking[0]
         
         logger.info(f"✅ Selected node: {best_node['node_name']} "
                    f"(estimated: {best_node['estimated_time_ms']}ms)")
         
-        # 3. Execute on best node
-        result = await execute_on_node(best_node['node_name'], request)
+        # 3. Execute on best node, hedged to the runner-up if it runs long
+        backup_node = ranking[1] if HEDGE_ENABLED and len(ranking) > 1 else None
+        result, executed = await execute_with_hedge(best_node, backup_node, request)
+        routing_stats["routes"] += 1
         
         return {
             "response": result["response"],
-            "executed_on": best_node['node_name'],
-            "estimated_time_ms": best_node['estimated_time_ms'],
+            "executed_on": executed['node_name'],
+            "estimated_time_ms": executed['estimated_time_ms'],
             "actual_time_ms": result.get("execution_time_ms", 0),
+            "hedged": result.get("hedged", False),
             "user_node": request.user_node or NODE_NAME
         }
         
@@ -129,7 +323,11 @@ async def route_generation(request: GenerationRequest):
 
 
 async def get_available_nodes() -> List[Dict]:
-    """Get all available nodes from registry"""
+    """Get live nodes from the local registry cache"""
+    if registry_cache.synced_at is not None:
+        return registry_cache.live_nodes()
+
+    # Cache never synced (Redis down at startup): ask the registry directly
     try:
         async with httpx.AsyncClient(timeout=5.0) as client:
             response = await client.get(f"{NODE_REGISTRY_URL}/nodes")
@@ -146,87 +344,75 @@ async def get_available_nodes() -> List[Dict]:
 
 
 async def calculate_best_node(nodes: List[Dict], request: GenerationRequest) -> Dict:
+    """Node with the lowest predicted completion time"""
+    return (await rank_nodes(nodes, request))[0]
+
+
+async def rank_nodes(nodes: List[Dict], request: GenerationRequest) -> List[Dict]:
     """
-    Calculate which node will complete the generation fastest
+    Rank nodes by predicted completion time, fastest first
     
-    Factors:
-    - GPU availability (10x faster than CPU)
-    - Current load (queue wait time)
-    - Network latency to user's node
-    - Model availability (cached vs download)
+    Factors (all learned per node and model, see latency_model.py):
+    - Tokens/sec and time-to-first-token from completed requests
+    - Expected output length for the model
+    - Requests this router already has in flight on the node
+    - Network overhead to the node, plus latency to the user's node
     """
+    nodes = list(nodes)
+    by_name = {node["name"]: node for node in nodes}
+    ranking = latency_model.rank(nodes, request.model, request.max_tokens)
     
-    scored_nodes = []
-    
-    for node in nodes:
-        # Base generation time estimate
-        if node.get("capabilities", {}).get("gpu", False):
-            # GPU nodes: ~100ms per 100 tokens
-            base_time_ms = (request.max_tokens / 100) * 100
-        else:
-            # CPU nodes: ~1000ms per 100 tokens (10x slower)
-            base_time_ms = (request.max_tokens / 100) * 1000
-        
-        # Adjust for current load
-        current_load = node.get("status", {}).get("cpu_usage", 0) / 100
-        load_multiplier = 1 + current_load  # 50% load = 1.5x time
+    for prediction in ranking:
+        node = by_name[prediction["node_name"]]
+        prediction["node_ip"] = node.get("vpn_ip")
+        prediction["endpoint"] = node_endpoint(node)
         
-        # Adjust for active jobs (queue time)
-        active_jobs = node.get("active_jobs", 0)
-        queue_time_ms = active_jobs * 500  # 500ms per job in queue
+        # Slow-tail estimate: how long to wait before hedging
+        prediction["hedge_after_ms"] = latency_model.predict(
+            prediction["node_name"], request.model, request.max_tokens,
+            prediction["has_gpu"], pessimistic=True
+        )["estimated_time_ms"]
         
         # Network latency to user's node
-        if request.user_node and request.user_node != node["name"]:
-            network_latency_ms = await estimate_network_latency(
-                node["name"], 
-                request.user_node
-            )
-        else:
-            network_latency_ms = 0  # Same node, no network
-        
-        # Total estimated time
-        total_time_ms = (base_time_ms * load_multiplier) + queue_time_ms + network_latency_ms
-        
-        scored_nodes.append({
-            "node_name": node["name"],
-            "node_ip": node["vpn_ip"],
-            "estimated_time_ms": int(total_time_ms),
-            "has_gpu": node.get("capabilities", {}).get("gpu", False),
-            "current_load": current_load,
-            "breakdown": {
-                "base_time": int(base_time_ms),
-                "load_multiplier": load_multiplier,
-                "queue_time": queue_time_ms,
-                "network_latency": network_latency_ms
-            }
-        })
+        if request.user_node and request.user_node != prediction["node_name"]:
+            user_latency_ms = await estimate_network_latency(prediction["node_name"], request.user_node)
+            prediction["breakdown"]["user_network_latency"] = user_latency_ms
+            prediction["estimated_time_ms"] += user_latency_ms
     
-    # Sort by estimated time (fastest first)
-    scored_nodes.sort(key=lambda x: x["estimated_time_ms"])
-    
-    return scored_nodes[0]  # Return fastest
+    ranking.sort(key=lambda p: (p["cooling_down"], p["estimated_time_ms"]))
+    return ranking
+
+
+def node_endpoint(node: Dict) -> str:
+    """Ollama URL for a node: registry-advertised URL, then its VPN IP, then the fallback map"""
+    for source in (node.get("capabilities") or {}, node.get("metadata") or {}):
+        if source.get("ollama_url"):
+            return source["ollama_url"]
+    if node.get("vpn_ip"):
+        return f"http://{node['vpn_ip']}:{OLLAMA_PORT}"
+    return FALLBACK_NODE_ENDPOINTS.get(node.get("name"), "http://localhost:11434")
 
 
 async def estimate_network_latency(from_node: str, to_node: str) -> int:
     """Estimate network latency between nodes (ms)"""
     try:
-        # Check Redis cache first
+        # Explicit measurements/overrides in Redis win
         cache_key = f"aurora:latency:{from_node}:{to_node}"
         cached = redis_client.get(cache_key)
         
         if cached:
             return int(cached)
         
-        # Estimate based on node location
-        # VPN mesh is typically < 50ms within same region
         if from_node == to_node:
             return 0
-        elif "aurora" in from_node or "aurora" in to_node:
-            return 20  # Elestio typically fast
-        elif "runpod" in from_node or "runpod" in to_node:
-            return 30  # Texas datacenter
-        else:
-            return 10  # Local network (Vengeance, RobbieBook1)
+        
+        # Otherwise bound it by the slower of the two measured router-to-node paths
+        measured = [
+            latency_model.network_ms[node].ewma
+            for node in (from_node, to_node)
+            if node in latency_model.network_ms
+        ]
+        return int(max(measured)) if measured else int(PRIOR_NETWORK_MS)
         
     except:
         return 50  # Default assumption
@@ -241,25 +427,35 @@ async def mark_node_failed(node_name: str):
         logger.error(f"Failed to mark node {node_name} as failed: {e}")
 
 
+def record_trace(trace: Dict):
+    """Append a completed request to the replay trace log (bounded)"""
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.lpush(TRACES_KEY, json.dumps(trace))
+        pipe.ltrim(TRACES_KEY, 0, TRACE_RETENTION - 1)
+        pipe.execute()
+    except Exception as e:
+        logger.debug(f"Failed to record trace: {e}")
+
+
 @circuit(failure_threshold=3, recovery_timeout=60, expected_exception=Exception)
-async def execute_on_node(node_name: str, request: GenerationRequest) -> Dict:
+async def execute_on_node(node_name: str, request: GenerationRequest, endpoint: Optional[str] = None) -> Dict:
     """Execute generation on specific node with circuit breaker protection"""
+    node_info = registry_cache.nodes.get(node_name) or {"name": node_name}
+    has_gpu = bool((node_info.get("capabilities") or {}).get("gpu", False))
+    predicted = latency_model.predict(node_name, request.model, request.max_tokens, has_gpu)
+    queue_depth = predicted["breakdown"]["queue_depth"]
+    ticket = latency_model.begin(node_name, predicted["breakdown"]["service_time"])
     try:
         # Map node to Ollama endpoint
-        node_endpoints = {
-            "aurora": "http://10.0.0.1:11434",
-            "runpod-tx": "http://10.0.0.3:11434",
-            "vengeance": "http://10.0.0.4:11434",
-            "robbiebook1": "http://10.0.0.5:11434"
-        }
-        
-        ollama_url = node_endpoints.get(node_name, "http://localhost:11434")
+        if endpoint is None:
+            endpoint = node_endpoint(node_info)
         
-        start_time = datetime.now()
+        start_time = time.perf_counter()
         
         async with httpx.AsyncClient(timeout=120.0) as client:
             response = await client.post(
-                f"{ollama_url}/api/generate",
+                f"{endpoint}/api/generate",
                 json={
                     "model": request.model,
                     "prompt": request.prompt,
@@ -275,19 +471,103 @@ async def execute_on_node(node_name: str, request: GenerationRequest) -> Dict:
                 raise Exception(f"Ollama error: {response.status_code}")
             
             result = response.json()
-            execution_time_ms = int((datetime.now() - start_time).total_seconds() * 1000)
-            
-            return {
-                "response": result.get("response", ""),
-                "execution_time_ms": execution_time_ms,
-                "node": node_name
-            }
+            execution_time_ms = int((time.perf_counter() - start_time) * 1000)
+        
+        # Ollama reports its own timings in nanoseconds
+        eval_count = result.get("eval_count", 0)
+        eval_ms = result.get("eval_duration", 0) / 1e6
+        ttft_ms = (result.get("load_duration", 0) + result.get("prompt_eval_duration", 0)) / 1e6
+        server_ms = result.get("total_duration", 0) / 1e6
+        network_ms = max(0.0, execution_time_ms - server_ms) if server_ms else None
+        
+        latency_model.record(
+            node_name, request.model, request.max_tokens,
+            eval_count, eval_ms, ttft_ms, network_ms
+        )
+        record_trace({
+            "ts": time.time(),
+            "node": node_name,
+            "model": request.model,
+            "max_tokens": request.max_tokens,
+            "has_gpu": has_gpu,
+            "eval_count": eval_count,
+            "eval_ms": round(eval_ms, 2),
+            "ttft_ms": round(ttft_ms, 2),
+            "network_ms": round(network_ms, 2) if network_ms is not None else None,
+            "total_ms": execution_time_ms,
+            "queue_depth": queue_depth
+        })
+        
+        return {
+            "response": result.get("response", ""),
+            "execution_time_ms": execution_time_ms,
+            "node": node_name
+        }
             
     except Exception as e:
         logger.error(f"Execution failed on {node_name}: {e}")
+        latency_model.record_failure(node_name, request.model)
         # Mark node as failed in Redis for routing decisions
         await mark_node_failed(node_name)
         raise
+    finally:
+        latency_model.end(node_name, ticket)
+
+
+async def execute_with_hedge(primary: Dict, backup: Optional[Dict], request: GenerationRequest):
+    """
+    Run on the primary node; if it outlives its slow-tail estimate (or fails),
+    race the backup node and keep whichever answers first
+    """
+    first = asyncio.create_task(execute_on_node(primary["node_name"], request, primary["endpoint"]))
+    if backup is None:
+        return await first, primary
+    
+    delay_ms = max(HEDGE_MIN_DELAY_MS, primary["hedge_after_ms"])
+    done, _ = await asyncio.wait({first}, timeout=delay_ms / 1000)
+    if done and first.exception() is None:
+        return first.result(), primary
+    
+    logger.info(f"🪂 Hedging {primary['node_name']} with {backup['node_name']} after {delay_ms}ms")
+    routing_stats["hedges_fired"] += 1
+    second = asyncio.create_task(execute_on_node(backup["node_name"], request, backup["endpoint"]))
+    contenders = {first: primary, second: backup}
+    
+    pending = set(contenders)
+    error = None
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if task.exception() is None:
+                for loser in pending:
+                    loser.cancel()
+                if contenders[task] is backup:
+                    routing_stats["hedges_won"] += 1
+                result = task.result()
+                result["hedged"] = True
+                return result, contenders[task]
+            error = task.exception()
+    raise error
+
+
+@app.get("/api/route/model")
+async def get_latency_model():
+    """Learned per-node/per-model latency stats and hedging counters"""
+    return {
+        "model": latency_model.summary(),
+        "routing": routing_stats,
+        "hedge_enabled": HEDGE_ENABLED
+    }
+
+
+@app.get("/api/route/traces")
+async def get_traces(limit: int = 1000):
+    """Recent completed requests, oldest first (input for trace replays)"""
+    try:
+        raw = redis_client.lrange(TRACES_KEY, 0, limit - 1)
+        return {"traces": [json.loads(t) for t in reversed(raw)]}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/api/route/benchmark")
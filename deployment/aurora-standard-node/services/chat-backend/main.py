@@ -199,7 +199,10 @@ async def chat_endpoint(request: ChatMessage):
                 "type": "chat_message",
                 "conversation_id": conversation_id,
                 "client_id": request.client_id,
-                "node": NODE_NAME
+                "node": NODE_NAME,
+                "role": "user",
+                "content": request.message,
+                "timestamp": datetime.utcnow().isoformat()
             })
         )
         
@@ -223,6 +226,18 @@ async def chat_endpoint(request: ChatMessage):
                 "personality": request.personality
             })
         )
+        await redis_client.publish(
+            'aurora:chat:message',
+            json.dumps({
+                "type": "chat_message",
+                "conversation_id": conversation_id,
+                "client_id": request.client_id,
+                "node": NODE_NAME,
+                "role": "assistant",
+                "content": response,
+                "timestamp": datetime.utcnow().isoformat()
+            })
+        )
         
         return {
             "response": response,
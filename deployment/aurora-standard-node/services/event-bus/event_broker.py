@@ -1,16 +1,29 @@
 #!/usr/bin/env python3
 """
-Aurora Event Bus - Distributed event broker using Redis Pub/Sub
-Connects all nodes for real-time event propagation
+Aurora Event Bus - Distributed event broker using Redis Streams
+Connects all nodes for durable, replayable event propagation
+
+Every channel is backed by a stream (<channel>:stream). Each node reads
+through its own consumer group, so a node that was down or restarting
+picks up where its group left off instead of losing events. Entries are
+acknowledged once their handlers succeed; entries left pending (crashed
+or failing handlers) are reclaimed and retried, and dead-lettered after
+MAX_DELIVERIES attempts.
+
+Publishes are also sent over pub/sub on the same channel names, so
+pub/sub listeners (node registry, agent router) keep working, and
+pub/sub-only producers (chat backend sessions) are still heard.
 """
 
 import asyncio
 import json
 import os
 import time
+from collections import defaultdict, deque
 from datetime import datetime
-from typing import Dict, Callable, List
+from typing import Dict, Callable, List, Optional, Tuple
 import redis.asyncio as redis
+from aiohttp import web
 
 # Configuration
 NODE_NAME = os.getenv('NODE_NAME', 'unknown')
@@ -18,6 +31,36 @@ NODE_ROLE = os.getenv('NODE_ROLE', 'compute')
 REDIS_HOST = os.getenv('REDIS_HOST', 'redis')
 REDIS_PORT = int(os.getenv('REDIS_PORT', '6379'))
 REDIS_PASSWORD = os.getenv('REDIS_PASSWORD', '')
+EVENT_BUS_PORT = int(os.getenv('EVENT_BUS_PORT', '8004'))
+
+# Streams: one consumer group per node service, bounded length
+EVENT_BUS_GROUP = os.getenv('EVENT_BUS_GROUP', f'event-bus:{NODE_NAME}')
+EVENT_BUS_CONSUMER = os.getenv('EVENT_BUS_CONSUMER', NODE_NAME)
+STREAM_MAXLEN = int(os.getenv('EVENT_STREAM_MAXLEN', '100000'))  # approximate trim per stream
+DEAD_LETTER_STREAM = 'aurora:events:dead-letter'
+
+READ_COUNT = 100            # entries per XREADGROUP
+READ_BLOCK_MS = 1000        # XREADGROUP blocks instead of polling
+PUBLISH_BATCH_SIZE = 100    # events per pipelined publish
+PUBLISH_LINGER = 0.002      # seconds a publish waits for others to batch with
+MAX_IN_FLIGHT = 1000        # entries read but not yet handled before reading pauses
+HANDLER_CONCURRENCY = int(os.getenv('EVENT_HANDLER_CONCURRENCY', '32'))
+
+RECLAIM_INTERVAL = 15       # seconds between pending-entry sweeps
+RECLAIM_IDLE_MS = 30000     # pending this long means its consumer died or its handler failed
+MAX_DELIVERIES = 5
+
+LATENCY_WINDOW = 1000       # recent publish-to-handle samples kept per event type
+
+
+def stream_key(channel: str) -> str:
+    return f'{channel}:stream'
+
+
+def stream_id_ms(entry_id: str) -> int:
+    """Stream ids are <ms since epoch>-<seq>, stamped by Redis at XADD"""
+    return int(entry_id.split('-', 1)[0])
+
 
 class AuroraEventBus:
     """Distributed event bus for Aurora mesh"""
@@ -25,11 +68,30 @@ class AuroraEventBus:
     def __init__(self):
         self.node_name = NODE_NAME
         self.node_role = NODE_ROLE
+        self.group = EVENT_BUS_GROUP
+        self.consumer = EVENT_BUS_CONSUMER
         self.redis_client = None
         self.pubsub = None
+        self.channels: List[str] = []
         self.event_handlers = {}
         self.running = False
         
+        # Publishing: callers queue events, one task pipelines them in batches
+        self.publish_queue: asyncio.Queue = asyncio.Queue()
+        
+        # Dispatch: one ordered lane per event type, lanes run concurrently
+        self.lanes: Dict[str, asyncio.Queue] = {}
+        self.lane_tasks: Dict[str, asyncio.Task] = {}
+        self.handler_slots = asyncio.Semaphore(HANDLER_CONCURRENCY)
+        self.in_flight = set()  # (stream, entry id) read but not yet handled
+        self.capacity = asyncio.Event()
+        self.capacity.set()
+        self.pending_acks: Dict[str, List[str]] = defaultdict(list)
+        
+        # Metrics
+        self.counters = defaultdict(int)
+        self.latencies: Dict[str, deque] = defaultdict(lambda: deque(maxlen=LATENCY_WINDOW))
+        
     async def connect(self):
         """Connect to Redis"""
         self.redis_client = redis.Redis(
@@ -50,8 +112,8 @@ class AuroraEventBus:
         await self.subscribe_to_channels()
         
     async def subscribe_to_channels(self):
-        """Subscribe to relevant event channels"""
-        channels = [
+        """Join (or create) this node's consumer group on every relevant stream"""
+        self.channels = [
             'aurora:events:global',              # All nodes
             f'aurora:events:role:{self.node_role}',  # Role-specific
             f'aurora:events:node:{self.node_name}',  # Node-specific
@@ -61,44 +123,105 @@ class AuroraEventBus:
             'aurora:system:alert',               # System alerts
         ]
         
-        for channel in channels:
-            await self.pubsub.subscribe(channel)
-            print(f"📡 Subscribed to: {channel}")
+        for channel in self.channels:
+            try:
+                # A new group starts at the stream's end; an existing one resumes where it left off
+                await self.redis_client.xgroup_create(stream_key(channel), self.group, id='$', mkstream=True)
+                print(f"📡 Created group {self.group} on: {stream_key(channel)}")
+            except redis.ResponseError as e:
+                if 'BUSYGROUP' not in str(e):
+                    raise
+                print(f"📡 Rejoined group {self.group} on: {stream_key(channel)}")
+                
+        # Pub/sub stays subscribed for producers that only publish there
+        await self.pubsub.subscribe(*self.channels)
         
         self.running = True
+        
+    # ============================================
+    # PUBLISHING
+    # ============================================
     
-    async def publish_event(self, event_type: str, data: Dict, channel: str = 'aurora:events:global'):
-        """Publish an event to the mesh"""
-        event = {
+    def _build_event(self, event_type: str, data: Dict) -> Dict:
+        return {
             'type': event_type,
             'source_node': self.node_name,
             'source_role': self.node_role,
             'timestamp': datetime.utcnow().isoformat(),
-            'data': data
+            'data': data,
+            'stream': True  # pub/sub copy of a stream entry; stream readers get the durable one
         }
         
-        await self.redis_client.publish(channel, json.dumps(event))
+    async def publish_event(self, event_type: str, data: Dict, channel: str = 'aurora:events:global'):
+        """Publish an event to the mesh (returns once it's in the stream)"""
+        done = asyncio.get_running_loop().create_future()
+        await self.publish_queue.put((channel, self._build_event(event_type, data), done))
+        await done
         print(f"📤 [{datetime.now().isoformat()}] Published: {event_type} to {channel}")
-    
+        
+    async def publish_events(self, events: List[Tuple[str, Dict, str]]):
+        """Publish many (event_type, data, channel) events in one pipeline"""
+        await self._write_batch([(channel, self._build_event(event_type, data)) for event_type, data, channel in events])
+        
+    async def _write_batch(self, batch: List[Tuple[str, Dict]]):
+        """XADD (trimmed) + PUBLISH every event in one round trip"""
+        pipe = self.redis_client.pipeline(transaction=False)
+        for channel, event in batch:
+            payload = json.dumps(event)
+            pipe.xadd(stream_key(channel), {'event': payload}, maxlen=STREAM_MAXLEN, approximate=True)
+            pipe.publish(channel, payload)
+        await pipe.execute()
+        self.counters['published'] += len(batch)
+        
+    async def publisher(self):
+        """Drain the publish queue, batching whatever arrives within PUBLISH_LINGER"""
+        while self.running:
+            batch = [await self.publish_queue.get()]
+            deadline = time.monotonic() + PUBLISH_LINGER
+            while len(batch) < PUBLISH_BATCH_SIZE:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.publish_queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+                    
+            try:
+                await self._write_batch([(channel, event) for channel, event, _ in batch])
+                for _, _, done in batch:
+                    if not done.done():
+                        done.set_result(True)
+            except Exception as e:
+                print(f"❌ Error publishing {len(batch)} events: {e}")
+                for _, _, done in batch:
+                    if not done.done():
+                        done.set_exception(e)
+                        
     def register_handler(self, event_type: str, handler: Callable):
         """Register a handler for an event type"""
         if event_type not in self.event_handlers:
             self.event_handlers[event_type] = []
         self.event_handlers[event_type].append(handler)
         print(f"🔧 Registered handler for: {event_type}")
+        
+    # ============================================
+    # CONSUMING
+    # ============================================
     
-    async def handle_event(self, event: Dict):
-        """Handle incoming event"""
+    async def handle_event(self, event: Dict) -> bool:
+        """Handle incoming event; False if any handler failed (the entry stays pending for retry)"""
         event_type = event.get('type')
         source_node = event.get('source_node')
         
         # Don't process our own events (unless explicitly needed)
         if source_node == self.node_name:
-            return
-        
+            return True
+            
         print(f"📥 [{datetime.now().isoformat()}] Received: {event_type} from {source_node}")
         
         # Call registered handlers
+        ok = True
         if event_type in self.event_handlers:
             for handler in self.event_handlers[event_type]:
                 try:
@@ -108,28 +231,207 @@ class AuroraEventBus:
                         handler(event)
                 except Exception as e:
                     print(f"❌ Error in handler for {event_type}: {e}")
-    
+                    ok = False
+        return ok
+        
+    def _dispatch(self, event: Dict, stream: Optional[str] = None, entry_id: Optional[str] = None):
+        """Queue an event on its type's lane: same-type events run in order, types run in parallel"""
+        event_type = event.get('type') or 'unknown'
+        if event_type not in self.lanes:
+            self.lanes[event_type] = asyncio.Queue()
+            self.lane_tasks[event_type] = asyncio.create_task(self._lane(event_type, self.lanes[event_type]))
+            
+        if stream:
+            self.in_flight.add((stream, entry_id))
+            if len(self.in_flight) >= MAX_IN_FLIGHT:
+                self.capacity.clear()
+        self.lanes[event_type].put_nowait((event, stream, entry_id))
+        
+    async def _lane(self, event_type: str, queue: asyncio.Queue):
+        while True:
+            event, stream, entry_id = await queue.get()
+            try:
+                async with self.handler_slots:
+                    ok = await self.handle_event(event)
+                    
+                self.counters['handled' if ok else 'failed'] += 1
+                if stream and ok:
+                    self.pending_acks[stream].append(entry_id)
+                    self.latencies[event_type].append(time.time() * 1000 - stream_id_ms(entry_id))
+            finally:
+                if stream:
+                    self.in_flight.discard((stream, entry_id))
+                    if len(self.in_flight) < MAX_IN_FLIGHT:
+                        self.capacity.set()
+                        
+    async def _flush_acks(self):
+        """XACK everything handled since the last flush, one pipeline for all streams"""
+        if not self.pending_acks:
+            return
+        acks, self.pending_acks = self.pending_acks, defaultdict(list)
+        pipe = self.redis_client.pipeline(transaction=False)
+        for stream, ids in acks.items():
+            pipe.xack(stream, self.group, *ids)
+        await pipe.execute()
+        
+    def _decode(self, fields: Dict) -> Optional[Dict]:
+        try:
+            return json.loads(fields['event'])
+        except (KeyError, json.JSONDecodeError) as e:
+            print(f"❌ Invalid event entry: {e}")
+            return None
+            
     async def listen(self):
-        """Listen for events"""
+        """Read new entries for this node's group from every stream"""
         print(f"👂 [{datetime.now().isoformat()}] Listening for events...")
         
+        streams = {stream_key(channel): '>' for channel in self.channels}
         while self.running:
             try:
-                message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                await self._flush_acks()
+                await self.capacity.wait()
+                
+                response = await self.redis_client.xreadgroup(
+                    self.group, self.consumer, streams, count=READ_COUNT, block=READ_BLOCK_MS
+                )
+                for stream, entries in response or []:
+                    for entry_id, fields in entries:
+                        event = self._decode(fields)
+                        if event is None:
+                            self.pending_acks[stream].append(entry_id)  # unparseable: retrying won't help
+                            continue
+                        self._dispatch(event, stream, entry_id)
+                        
+            except Exception as e:
+                print(f"❌ Error listening for events: {e}")
+                await asyncio.sleep(1)
                 
-                if message and message['type'] == 'message':
+    async def listen_pubsub(self):
+        """Events from pub/sub-only producers (best effort, as before)"""
+        while self.running:
+            try:
+                async for message in self.pubsub.listen():
+                    if message['type'] != 'message':
+                        continue
                     try:
                         event = json.loads(message['data'])
-                        await self.handle_event(event)
                     except json.JSONDecodeError as e:
                         print(f"❌ Invalid JSON in event: {e}")
-                
-                await asyncio.sleep(0.01)  # Small sleep to prevent CPU spinning
-                
+                        continue
+                    if not event.get('stream'):  # stream-backed events arrive through listen()
+                        self._dispatch(event)
             except Exception as e:
-                print(f"❌ Error listening for events: {e}")
+                print(f"❌ Error listening on pub/sub: {e}")
                 await asyncio.sleep(1)
+                
+    async def reclaim(self):
+        """
+        Retry entries that have sat unacknowledged for RECLAIM_IDLE_MS
+        
+        They belong to a consumer that died mid-handling, or their handler
+        failed. Claimed entries go back through dispatch; entries already
+        delivered MAX_DELIVERIES times move to the dead-letter stream.
+        """
+        while self.running:
+            await asyncio.sleep(RECLAIM_INTERVAL)
+            for channel in self.channels:
+                stream = stream_key(channel)
+                try:
+                    pending = await self.redis_client.xpending_range(
+                        stream, self.group, min='-', max='+', count=READ_COUNT, idle=RECLAIM_IDLE_MS
+                    )
+                    ids = [p['message_id'] for p in pending if (stream, p['message_id']) not in self.in_flight]
+                    if not ids:
+                        continue
+                    deliveries = {p['message_id']: p['times_delivered'] for p in pending}
+                    
+                    claimed = await self.redis_client.xclaim(stream, self.group, self.consumer, RECLAIM_IDLE_MS, ids)
+                    for entry_id, fields in claimed:
+                        if fields is None:  # trimmed away while pending
+                            self.pending_acks[stream].append(entry_id)
+                            continue
+                        if deliveries.get(entry_id, 0) >= MAX_DELIVERIES:
+                            await self.redis_client.xadd(
+                                DEAD_LETTER_STREAM,
+                                {**fields, 'stream': stream, 'id': entry_id, 'group': self.group},
+                                maxlen=STREAM_MAXLEN, approximate=True
+                            )
+                            self.pending_acks[stream].append(entry_id)
+                            self.counters['dead_lettered'] += 1
+                            print(f"☠️  Dead-lettered {entry_id} from {stream} after {deliveries[entry_id]} deliveries")
+                            continue
+                        event = self._decode(fields)
+                        if event is None:
+                            self.pending_acks[stream].append(entry_id)
+                            continue
+                        self.counters['reclaimed'] += 1
+                        self._dispatch(event, stream, entry_id)
+                        
+                except Exception as e:
+                    print(f"❌ Error reclaiming pending events on {stream}: {e}")
+                    
+    # ============================================
+    # METRICS
+    # ============================================
     
+    async def get_metrics(self) -> Dict:
+        """Counters, publish-to-handle latency per event type, lag per stream and group"""
+        latency = {}
+        for event_type, samples in self.latencies.items():
+            ordered = sorted(samples)
+            if ordered:
+                latency[event_type] = {
+                    'samples': len(ordered),
+                    'p50_ms': round(ordered[len(ordered) // 2], 1),
+                    'p95_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 1),
+                    'max_ms': round(ordered[-1], 1)
+                }
+                
+        lag = {}
+        for channel in self.channels:
+            stream = stream_key(channel)
+            try:
+                lag[stream] = {
+                    group['name']: {
+                        'lag': group.get('lag'),
+                        'pending': group['pending'],
+                        'consumers': group['consumers']
+                    }
+                    for group in await self.redis_client.xinfo_groups(stream)
+                }
+            except Exception as e:
+                lag[stream] = {'error': str(e)}
+                
+        return {
+            'node': self.node_name,
+            'group': self.group,
+            'counters': dict(self.counters),
+            'in_flight': len(self.in_flight),
+            'publish_queue': self.publish_queue.qsize(),
+            'latency': latency,
+            'streams': lag
+        }
+        
+    async def serve_http(self):
+        """/health and /metrics"""
+        async def health(request):
+            try:
+                await self.redis_client.ping()
+                return web.json_response({'status': 'healthy', 'node': self.node_name})
+            except Exception as e:
+                return web.json_response({'status': 'unhealthy', 'error': str(e)}, status=503)
+                
+        async def metrics(request):
+            return web.json_response(await self.get_metrics())
+            
+        app = web.Application()
+        app.router.add_get('/health', health)
+        app.router.add_get('/metrics', metrics)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, '0.0.0.0', EVENT_BUS_PORT).start()
+        print(f"📈 Metrics on :{EVENT_BUS_PORT}/metrics")
+        
     async def heartbeat(self):
         """Send periodic heartbeat"""
         while self.running:
@@ -143,7 +445,7 @@ class AuroraEventBus:
                 channel='aurora:events:global'
             )
             await asyncio.sleep(60)  # Every minute
-    
+            
     async def run(self):
         """Main run loop"""
         print(f"🚀 Starting Aurora Event Bus on node: {self.node_name} ({self.node_role})")
@@ -154,12 +456,17 @@ class AuroraEventBus:
         # Register default handlers
         self.register_default_handlers()
         
-        # Start listening and heartbeat
+        await self.serve_http()
+        
+        # Start listening, publishing, reclaiming and heartbeat
         await asyncio.gather(
+            self.publisher(),
             self.listen(),
+            self.listen_pubsub(),
+            self.reclaim(),
             self.heartbeat()
         )
-    
+        
     def register_default_handlers(self):
         """Register default event handlers"""
         
@@ -168,7 +475,7 @@ class AuroraEventBus:
             cache_key = event['data'].get('key')
             print(f"🗑️  Cache invalidation: {cache_key}")
             # Implement actual cache invalidation logic here
-        
+            
         self.register_handler('cache_invalidate', handle_cache_invalidate)
         
         # User session handler
@@ -177,7 +484,7 @@ class AuroraEventBus:
             user_id = event['data'].get('user_id')
             print(f"👤 User session event: {action} for user {user_id}")
             # Implement session sync logic here
-        
+            
         self.register_handler('user_session', handle_user_session)
         
         # AI task completion handler
@@ -186,7 +493,7 @@ class AuroraEventBus:
             result = event['data'].get('result')
             print(f"🤖 AI task completed: {task_id}")
             # Notify other services about task completion
-        
+            
         self.register_handler('ai_task_complete', handle_ai_task_complete)
         
         # System alert handler
@@ -195,7 +502,7 @@ class AuroraEventBus:
             severity = event['data'].get('severity', 'info')
             print(f"⚠️  System alert ({severity}): {alert}")
             # Log alerts, send notifications, etc.
-        
+            
         self.register_handler('system_alert', handle_system_alert)
         
         # Node heartbeat handler
@@ -207,7 +514,7 @@ class AuroraEventBus:
                 120,  # 2 minute TTL
                 datetime.utcnow().isoformat()
             )
-        
+            
         self.register_handler('node_heartbeat', handle_node_heartbeat)
 
 async def main():
@@ -8,78 +8,172 @@ import asyncio
 import json
 import time
 import os
+from collections import deque
 from typing import Dict, List, Optional
 from datetime import datetime
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
 from pydantic import BaseModel
 
+from scheduler import (
+    COMPLETED_RETENTION,
+    LEASE_SECONDS,
+    MAX_TASK_ATTEMPTS,
+    NodeIndex,
+    TaskQueue,
+    create_task_store,
+    requirement_shape,
+    serialize_tasks,
+)
+
 app = FastAPI(title="Aurora GPU Mesh Coordinator", version="1.0.0")
 
 # Node configuration
 NODE_NAME = os.getenv('NODE_NAME', 'coordinator')
 NODE_ROLE = os.getenv('NODE_ROLE', 'lead')
 
+# Scheduler tuning
+LEASE_CHECK_INTERVAL = float(os.getenv('LEASE_CHECK_INTERVAL', '5'))
+STORE_FLUSH_INTERVAL = float(os.getenv('STORE_FLUSH_INTERVAL', '0.25'))
+DISPATCH_SCAN_LIMIT = int(os.getenv('DISPATCH_SCAN_LIMIT', '256'))
+LOG_TASK_EVENTS = os.getenv('LOG_TASK_EVENTS', 'true').lower() == 'true'
+
 class TaskSubmission(BaseModel):
     task_type: str
     requirements: Dict
     priority: int = 5
 
+def log_task_event(message: str):
+    """Per-task log line (disable with LOG_TASK_EVENTS=false under heavy load)"""
+    if LOG_TASK_EVENTS:
+        print(message)
+
 class GPUMeshCoordinator:
-    def __init__(self):
+    def __init__(self, store=None):
         self.nodes = {}
-        self.task_queue = []
+        self.task_queue = TaskQueue()
+        self.node_index = NodeIndex()
         self.active_tasks = {}
-        self.completed_tasks = []
+        self.completed_tasks = deque(maxlen=COMPLETED_RETENTION)
         self.task_counter = 0
-        
+
+        # Write-behind persistence: changed tasks are flushed in batches
+        self.store = store
+        self._dirty: Dict[str, Dict] = {}
+        self._flush_lock = asyncio.Lock()
+        self._background: List[asyncio.Task] = []
+
+        # Re-entrant dispatch requests collapse into one more pass
+        self._dispatching = False
+        self._dispatch_again = False
+
+        # Stats
+        self.leases_expired = 0
+        self.dispatch_passes = 0
+
+    # ============================================
+    # LIFECYCLE
+    # ============================================
+
+    async def start(self):
+        """Restore persisted tasks and start the lease reaper and flusher"""
+        if self.store is None:
+            self.store = create_task_store()
+        self.restore()
+        self._background = [
+            asyncio.create_task(self._lease_loop()),
+            asyncio.create_task(self._flush_loop()),
+        ]
+
+    async def stop(self):
+        for task in self._background:
+            task.cancel()
+        self._background = []
+        await self.flush()
+
+    def restore(self):
+        """Reload queued and in-flight tasks after a restart"""
+        now = time.time()
+        for task in self.store.load_open():
+            if task["status"] == "assigned":
+                # The node may reconnect and finish it; otherwise the lease expires
+                task["lease_expires_at"] = max(task.get("lease_expires_at") or 0, now + LEASE_SECONDS)
+                self.active_tasks[task["task_id"]] = task
+            else:
+                task["status"] = "queued"
+                self.task_queue.push(task)
+        self.completed_tasks.extend(self.store.load_finished(COMPLETED_RETENTION))
+
+        # Keep new task ids unique across restarts
+        self.task_counter = len(self.active_tasks) + len(self.task_queue) + len(self.completed_tasks)
+
+        if self.active_tasks or self.task_queue:
+            print(f"♻️  [{datetime.now().isoformat()}] Restored {len(self.task_queue)} queued and "
+                  f"{len(self.active_tasks)} in-flight tasks")
+
+    # ============================================
+    # NODES
+    # ============================================
+
     async def register_node(self, node_id: str, node_info: Dict, websocket: WebSocket):
         """Register a new GPU node in the mesh"""
+        gpu_count = node_info.get("gpu_count", 0)
         self.nodes[node_id] = {
             "websocket": websocket,
-            "gpu_count": node_info.get("gpu_count", 0),
+            "gpu_count": gpu_count,
             "gpu_memory": node_info.get("gpu_memory", 0),
             "gpu_type": node_info.get("gpu_type", "unknown"),
+            "max_tasks": node_info.get("max_concurrent_tasks", max(1, gpu_count)),
             "status": "active",
             "last_ping": time.time(),
-            "active_tasks": 0,
+            # Tasks restored from before a restart still count against this node
+            "active_tasks": sum(1 for t in self.active_tasks.values() if t.get("assigned_node") == node_id),
             "completed_tasks": 0,
             "node_info": node_info
         }
+        self.node_index.update(node_id, self.nodes[node_id])
         print(f"✅ [{datetime.now().isoformat()}] Node {node_id} registered: "
               f"{node_info.get('gpu_count', 0)} x {node_info.get('gpu_type', 'unknown')} "
               f"({node_info.get('gpu_memory', 0)}GB VRAM)")
-        
+
         # Broadcast node registry update
         await self.broadcast_node_update()
-        
+
+        # New capacity: place anything that was waiting
+        await self.dispatch()
+
     async def unregister_node(self, node_id: str):
         """Remove a node from the mesh"""
-        if node_id in self.nodes:
+        if node_id in self.nodes and self.nodes[node_id]["status"] != "disconnected":
             self.nodes[node_id]["status"] = "disconnected"
+            self.node_index.discard(node_id)
             print(f"❌ [{datetime.now().isoformat()}] Node {node_id} disconnected")
-            
+
             # Reassign any active tasks from this node
             await self.reassign_tasks_from_node(node_id)
             await self.broadcast_node_update()
-    
+
     async def reassign_tasks_from_node(self, node_id: str):
         """Reassign tasks from a failed node"""
         tasks_to_reassign = [
             task_id for task_id, task in self.active_tasks.items()
             if task.get("assigned_node") == node_id
         ]
-        
+
         for task_id in tasks_to_reassign:
-            task = self.active_tasks[task_id]
             print(f"⚠️  Reassigning task {task_id} from failed node {node_id}")
-            
-            # Mark task as pending reassignment
-            task["status"] = "pending"
-            task["assigned_node"] = None
-            
-            # Try to redistribute
-            await self.distribute_task_internal(task)
-    
+            self.requeue(self.active_tasks[task_id])
+
+        await self.dispatch()
+
+    def renew_leases(self, node_id: str):
+        """A node heartbeat renews the lease on every task it holds"""
+        now = time.time()
+        if node_id in self.nodes:
+            self.nodes[node_id]["last_ping"] = now
+        for task in self.active_tasks.values():
+            if task.get("assigned_node") == node_id:
+                task["lease_expires_at"] = now + LEASE_SECONDS
+
     async def broadcast_node_update(self):
         """Broadcast node registry update to all connected nodes"""
         message = {
@@ -95,111 +189,153 @@ class GPUMeshCoordinator:
                 for node_id, node in self.nodes.items()
             }
         }
-        
+
         for node_id, node in self.nodes.items():
             if node["status"] == "active":
                 try:
                     await node["websocket"].send_text(json.dumps(message))
                 except:
                     pass
-    
+
+    # ============================================
+    # SCHEDULING
+    # ============================================
+
     async def submit_task(self, task_type: str, requirements: Dict, priority: int = 5):
         """Submit a new task for distribution"""
         self.task_counter += 1
         task_id = f"task_{NODE_NAME}_{self.task_counter}_{int(time.time())}"
-        
+
         task = {
             "task_id": task_id,
             "task_type": task_type,
             "requirements": requirements,
             "priority": priority,
-            "status": "pending",
+            "status": "queued",
             "assigned_node": None,
+            "attempts": 0,
             "submitted_at": time.time(),
             "started_at": None,
-            "completed_at": None
+            "completed_at": None,
+            "lease_expires_at": None
         }
-        
-        self.active_tasks[task_id] = task
-        result = await self.distribute_task_internal(task)
-        
-        return {"task_id": task_id, **result}
-    
-    async def distribute_task_internal(self, task: Dict):
-        """Distribute a task to the best available node"""
-        best_node = self.find_best_node(task["requirements"], task["priority"])
-        
-        if best_node:
-            task["assigned_node"] = best_node
-            task["status"] = "assigned"
-            task["started_at"] = time.time()
-            
-            # Update node stats
-            self.nodes[best_node]["active_tasks"] += 1
-            
-            # Send task to node
-            await self.send_task_to_node(best_node, task)
-            
-            print(f"📤 [{datetime.now().isoformat()}] Task {task['task_id']} assigned to {best_node}")
-            
-            return {"status": "assigned", "node": best_node}
-        else:
-            # Queue for later
-            self.task_queue.append(task)
-            task["status"] = "queued"
-            
-            print(f"⏸️  [{datetime.now().isoformat()}] Task {task['task_id']} queued (no available nodes)")
-            
-            return {"status": "queued", "message": "No available nodes, task queued"}
-    
+
+        self.task_queue.push(task)
+        self.mark_dirty(task)
+        await self.dispatch()
+
+        if task["status"] == "assigned":
+            return {"task_id": task_id, "status": "assigned", "node": task["assigned_node"]}
+
+        log_task_event(f"⏸️  [{datetime.now().isoformat()}] Task {task_id} queued (no available nodes)")
+        return {"task_id": task_id, "status": "queued", "message": "No available nodes, task queued"}
+
+    async def dispatch(self):
+        """
+        Assign queued tasks, highest effective priority first, while any node
+        has a free slot. Tasks that fit nowhere right now are set aside (with
+        every later task of the same shape) and go back on the heap.
+        """
+        if self._dispatching:
+            self._dispatch_again = True
+            return
+
+        self._dispatching = True
+        try:
+            while True:
+                self._dispatch_again = False
+                self.dispatch_passes += 1
+
+                deferred = []
+                unplaceable = set()
+                scanned = 0
+                while (self.task_queue and self.node_index.has_capacity()
+                       and scanned < DISPATCH_SCAN_LIMIT):
+                    task = self.task_queue.pop()
+                    scanned += 1
+
+                    shape = requirement_shape(task["requirements"])
+                    best_node = None
+                    if shape not in unplaceable:
+                        best_node = self.node_index.find(task["requirements"], task["priority"], self.nodes)
+
+                    if best_node is None:
+                        unplaceable.add(shape)
+                        deferred.append(task)
+                        continue
+
+                    await self.assign_task(task, best_node)
+
+                for task in deferred:
+                    self.task_queue.push(task)
+
+                if not self._dispatch_again:
+                    break
+        finally:
+            self._dispatching = False
+
+    async def assign_task(self, task: Dict, node_id: str):
+        """Lease a task to a node and send it over"""
+        now = time.time()
+        task["assigned_node"] = node_id
+        task["status"] = "assigned"
+        task["started_at"] = now
+        task["lease_expires_at"] = now + LEASE_SECONDS
+        task["attempts"] = task.get("attempts", 0) + 1
+        self.active_tasks[task["task_id"]] = task
+        self.mark_dirty(task)
+
+        # Update node stats
+        node = self.nodes[node_id]
+        node["active_tasks"] += 1
+        self.node_index.update(node_id, node)
+
+        # Send task to node
+        await self.send_task_to_node(node_id, task)
+
+        log_task_event(f"📤 [{datetime.now().isoformat()}] Task {task['task_id']} assigned to {node_id}")
+
+    def release_task(self, task: Dict):
+        """Free the slot a task held on its node"""
+        node_id = task.get("assigned_node")
+        if node_id in self.nodes:
+            node = self.nodes[node_id]
+            node["active_tasks"] = max(0, node["active_tasks"] - 1)
+            self.node_index.update(node_id, node)
+        task["assigned_node"] = None
+        task["lease_expires_at"] = None
+
+    def requeue(self, task: Dict, error: Optional[str] = None):
+        """Put a task back on the heap, or fail it once it's out of attempts"""
+        task["previous_node"] = task.get("assigned_node")
+        self.release_task(task)
+        self.active_tasks.pop(task["task_id"], None)
+        if error:
+            task["error"] = error
+
+        if task.get("attempts", 0) >= MAX_TASK_ATTEMPTS:
+            task["status"] = "failed"
+            self.finish_task(task)
+            print(f"❌ [{datetime.now().isoformat()}] Task {task['task_id']} failed after "
+                  f"{task['attempts']} attempts")
+            return
+
+        # Keeps its original submitted_at, so it has aged ahead of newer work
+        task["status"] = "queued"
+        self.task_queue.push(task)
+        self.mark_dirty(task)
+
+    def finish_task(self, task: Dict):
+        task["completed_at"] = task.get("completed_at") or time.time()
+        self.active_tasks.pop(task["task_id"], None)
+        self.task_queue.remove(task["task_id"])
+        self.completed_tasks.append(task)
+        self.mark_dirty(task)
+
     def find_best_node(self, requirements: Dict, priority: int) -> Optional[str]:
         """Find the best node for a task based on requirements and current load"""
-        required_memory = requirements.get("memory_gb", 0)
-        required_gpus = requirements.get("gpu_count", 1)
-        preferred_gpu_type = requirements.get("gpu_type", None)
-        
-        best_node = None
-        best_score = -1
-        
-        for node_id, node in self.nodes.items():
-            if node["status"] != "active":
-                continue
-                
-            # Check if node meets requirements
-            if (node["gpu_memory"] < required_memory or 
-                node["gpu_count"] < required_gpus):
-                continue
-            
-            # Check GPU type preference
-            if preferred_gpu_type and node["gpu_type"] != preferred_gpu_type:
-                continue
-            
-            # Calculate score based on:
-            # 1. Available resources (higher is better)
-            # 2. Current load (lower is better)
-            # 3. GPU type match (bonus)
-            
-            resource_score = (node["gpu_memory"] - required_memory) * 10
-            resource_score += (node["gpu_count"] - required_gpus) * 50
-            
-            load_penalty = node["active_tasks"] * 20
-            
-            score = resource_score - load_penalty
-            
-            # Bonus for GPU type match
-            if preferred_gpu_type and node["gpu_type"] == preferred_gpu_type:
-                score += 100
-            
-            # Bonus for high priority tasks (prefer more powerful nodes)
-            if priority >= 8 and "4090" in node["gpu_type"]:
-                score += 200
-            
-            if score > best_score:
-                best_score = score
-                best_node = node_id
-        
-        return best_node
-    
+        return self.node_index.find(requirements, priority, self.nodes)
+
     async def send_task_to_node(self, node_id: str, task: Dict):
         """Send task assignment to a specific node"""
         if node_id in self.nodes:
@@ -212,61 +348,110 @@ class GPUMeshCoordinator:
             except Exception as e:
                 print(f"❌ Failed to send task to {node_id}: {e}")
                 await self.unregister_node(node_id)
-    
+
     async def handle_task_completion(self, node_id: str, task_id: str, result: Dict):
         """Handle task completion from a node"""
-        if task_id in self.active_tasks:
-            task = self.active_tasks[task_id]
-            task["status"] = "completed"
-            task["completed_at"] = time.time()
-            task["result"] = result
-            
-            # Update node stats
-            if node_id in self.nodes:
-                self.nodes[node_id]["active_tasks"] -= 1
-                self.nodes[node_id]["completed_tasks"] += 1
-            
-            # Move to completed tasks
-            self.completed_tasks.append(task)
-            del self.active_tasks[task_id]
-            
-            duration = task["completed_at"] - task["started_at"]
-            print(f"✅ [{datetime.now().isoformat()}] Task {task_id} completed by {node_id} in {duration:.2f}s")
-            
-            # Process any queued tasks
-            await self.process_task_queue()
-    
+        task = self.active_tasks.get(task_id)
+        if task is not None:
+            if task.get("assigned_node") != node_id:
+                # Late result from a node the task was moved away from
+                return
+        else:
+            queued = self.task_queue.get(task_id)
+            if queued is not None and queued.get("previous_node") == node_id:
+                # Lease expired and it was requeued, but the result still counts
+                task = self.task_queue.remove(task_id)
+        if task is None:
+            return
+
+        self.release_task(task)
+        task["status"] = "completed"
+        task["completed_at"] = time.time()
+        task["completed_by"] = node_id
+        task["result"] = result
+
+        if node_id in self.nodes:
+            self.nodes[node_id]["completed_tasks"] += 1
+
+        self.finish_task(task)
+
+        duration = task["completed_at"] - (task["started_at"] or task["submitted_at"])
+        log_task_event(f"✅ [{datetime.now().isoformat()}] Task {task_id} completed by {node_id} in {duration:.2f}s")
+
+        # Process any queued tasks
+        await self.dispatch()
+
     async def handle_task_failure(self, node_id: str, task_id: str, error: str):
         """Handle task failure from a node"""
-        if task_id in self.active_tasks:
-            task = self.active_tasks[task_id]
-            task["status"] = "failed"
-            task["error"] = error
-            
-            # Update node stats
-            if node_id in self.nodes:
-                self.nodes[node_id]["active_tasks"] -= 1
-            
-            print(f"❌ [{datetime.now().isoformat()}] Task {task_id} failed on {node_id}: {error}")
-            
-            # Retry task on different node
-            task["assigned_node"] = None
-            task["status"] = "pending"
-            await self.distribute_task_internal(task)
-    
+        task = self.active_tasks.get(task_id)
+        if task is None or task.get("assigned_node") != node_id:
+            return
+
+        print(f"❌ [{datetime.now().isoformat()}] Task {task_id} failed on {node_id}: {error}")
+
+        # Retry task (until MAX_TASK_ATTEMPTS)
+        self.requeue(task, error=error)
+        await self.dispatch()
+
     async def process_task_queue(self):
         """Process any queued tasks"""
-        if not self.task_queue:
+        await self.dispatch()
+
+    async def expire_leases(self) -> int:
+        """Requeue tasks whose node stopped renewing their lease"""
+        now = time.time()
+        expired = [
+            task for task in self.active_tasks.values()
+            if task.get("lease_expires_at") and task["lease_expires_at"] < now
+        ]
+        for task in expired:
+            print(f"⏰ [{datetime.now().isoformat()}] Lease expired for task {task['task_id']} "
+                  f"on {task.get('assigned_node')}, requeueing")
+            self.requeue(task, error="lease expired")
+
+        if expired:
+            self.leases_expired += len(expired)
+            await self.dispatch()
+        return len(expired)
+
+    async def _lease_loop(self):
+        while True:
+            await asyncio.sleep(LEASE_CHECK_INTERVAL)
+            try:
+                await self.expire_leases()
+            except Exception as e:
+                print(f"❌ Lease check failed: {e}")
+
+    # ============================================
+    # PERSISTENCE
+    # ============================================
+
+    def mark_dirty(self, task: Dict):
+        self._dirty[task["task_id"]] = task
+
+    async def flush(self):
+        """Write changed tasks to the store in one batch"""
+        if not self._dirty or self.store is None:
             return
-        
-        tasks_to_process = list(self.task_queue)
-        self.task_queue.clear()
-        
-        for task in tasks_to_process:
-            await self.distribute_task_internal(task)
-    
+        async with self._flush_lock:
+            dirty, self._dirty = self._dirty, {}
+            rows = serialize_tasks(dirty.values())
+            try:
+                await asyncio.to_thread(self.store.write, rows)
+            except Exception as e:
+                print(f"❌ Failed to persist {len(rows)} tasks: {e}")
+                # Retry next flush unless the task changed again since
+                for task_id, task in dirty.items():
+                    self._dirty.setdefault(task_id, task)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(STORE_FLUSH_INTERVAL)
+            await self.flush()
+
     def get_mesh_status(self) -> Dict:
         """Get current mesh status"""
+        oldest = min((t["submitted_at"] for t in self.task_queue.tasks()), default=None)
         return {
             "coordinator": NODE_NAME,
             "total_nodes": len([n for n in self.nodes.values() if n["status"] == "active"]),
@@ -275,6 +460,14 @@ class GPUMeshCoordinator:
             "active_tasks": len(self.active_tasks),
             "queued_tasks": len(self.task_queue),
             "completed_tasks": len(self.completed_tasks),
+            "scheduler": {
+                "oldest_queued_age_s": round(time.time() - oldest, 1) if oldest else 0,
+                "leases_expired": self.leases_expired,
+                "dispatch_passes": self.dispatch_passes,
+                "nodes_with_free_slots": len(self.node_index.available),
+                "pending_writes": len(self._dirty),
+                "store": type(self.store).__name__ if self.store else None
+            },
             "nodes": {
                 node_id: {
                     "gpu_count": node["gpu_count"],
@@ -282,6 +475,7 @@ class GPUMeshCoordinator:
                     "gpu_memory": node["gpu_memory"],
                     "status": node["status"],
                     "active_tasks": node["active_tasks"],
+                    "max_tasks": node["max_tasks"],
                     "completed_tasks": node["completed_tasks"]
                 }
                 for node_id, node in self.nodes.items()
@@ -291,6 +485,14 @@ class GPUMeshCoordinator:
 # Global coordinator instance
 coordinator = GPUMeshCoordinator()
 
+@app.on_event("startup")
+async def startup():
+    await coordinator.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await coordinator.stop()
+
 # API Endpoints
 @app.get("/")
 async def root():
@@ -322,6 +524,7 @@ async def mesh_nodes():
                 "gpu_memory": node["gpu_memory"],
                 "status": node["status"],
                 "active_tasks": node["active_tasks"],
+                "max_tasks": node["max_tasks"],
                 "completed_tasks": node["completed_tasks"],
                 "last_ping": node["last_ping"]
             }
@@ -334,10 +537,27 @@ async def active_tasks():
     """Get active tasks"""
     return {"tasks": coordinator.active_tasks}
 
+@app.get("/tasks/queued")
+async def queued_tasks(limit: int = 100):
+    """Get queued tasks, highest effective priority first"""
+    now = time.time()
+    ranked = sorted(
+        coordinator.task_queue.tasks(),
+        key=lambda t: coordinator.task_queue.effective_priority(t, now),
+        reverse=True
+    )[:limit]
+    return {
+        "tasks": [
+            {**t, "effective_priority": round(coordinator.task_queue.effective_priority(t, now), 2)}
+            for t in ranked
+        ],
+        "total": len(coordinator.task_queue)
+    }
+
 @app.get("/tasks/completed")
 async def completed_tasks():
     """Get completed tasks"""
-    return {"tasks": coordinator.completed_tasks[-100:]}  # Last 100
+    return {"tasks": list(coordinator.completed_tasks)[-100:]}  # Last 100
 
 @app.post("/tasks/submit")
 async def submit_task(submission: TaskSubmission):
@@ -354,50 +574,50 @@ async def websocket_endpoint(websocket: WebSocket, node_id: str):
     """WebSocket endpoint for GPU nodes"""
     await websocket.accept()
     print(f"🔌 [{datetime.now().isoformat()}] Node {node_id} connecting...")
-    
+
     try:
         # Wait for node registration message
         data = await websocket.receive_text()
         message = json.loads(data)
-        
+
         if message["type"] == "register":
             await coordinator.register_node(node_id, message["node_info"], websocket)
-            
+
             # Send acknowledgment
             await websocket.send_text(json.dumps({
                 "type": "registered",
                 "coordinator": NODE_NAME,
                 "message": "Successfully registered with GPU mesh"
             }))
-            
+
             # Main message loop
             while True:
                 data = await websocket.receive_text()
                 message = json.loads(data)
-                
+
                 if message["type"] == "ping":
-                    coordinator.nodes[node_id]["last_ping"] = time.time()
+                    coordinator.renew_leases(node_id)
                     await websocket.send_text(json.dumps({"type": "pong"}))
-                
+
                 elif message["type"] == "task_complete":
                     await coordinator.handle_task_completion(
                         node_id,
                         message["task_id"],
                         message.get("result", {})
                     )
-                
+
                 elif message["type"] == "task_failed":
                     await coordinator.handle_task_failure(
                         node_id,
                         message["task_id"],
                         message.get("error", "Unknown error")
                     )
-                
+
                 elif message["type"] == "status_update":
                     # Update node status
                     if node_id in coordinator.nodes:
                         coordinator.nodes[node_id]["node_info"] = message.get("node_info", {})
-                
+
     except WebSocketDisconnect:
         await coordinator.unregister_node(node_id)
     except Exception as e:
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Aurora GPU Mesh Scheduler
+Scheduling core for the mesh coordinator: a priority heap with aging,
+a capacity index over GPU nodes, and a Redis/SQLite task store so queued
+and in-flight tasks survive a coordinator restart
+"""
+
+import bisect
+import heapq
+import itertools
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import redis
+except ImportError:  # SQLite store is used when redis isn't installed
+    redis = None
+
+# Waiting AGING_SECONDS raises a task's effective priority by one level
+AGING_SECONDS = float(os.getenv('SCHEDULER_AGING_SECONDS', '30'))
+
+# Assigned tasks must be renewed (node ping) within the lease or get requeued
+LEASE_SECONDS = float(os.getenv('TASK_LEASE_SECONDS', '120'))
+MAX_TASK_ATTEMPTS = int(os.getenv('MAX_TASK_ATTEMPTS', '3'))
+
+# Finished tasks kept in memory and in the store
+COMPLETED_RETENTION = int(os.getenv('COMPLETED_TASK_RETENTION', '1000'))
+
+SCHEDULER_DB_PATH = os.getenv('SCHEDULER_DB_PATH', '/app/data/gpu_scheduler.db')
+REDIS_URL = os.getenv('REDIS_URL')
+REDIS_PREFIX = os.getenv('SCHEDULER_REDIS_PREFIX', 'gpu_mesh')
+
+TERMINAL_STATUSES = ("completed", "failed")
+
+
+def requirement_shape(requirements: Dict) -> Tuple[float, int, Optional[str]]:
+    """Feasibility key: tasks with the same shape fit the same nodes"""
+    return (
+        requirements.get("memory_gb", 0),
+        requirements.get("gpu_count", 1),
+        requirements.get("gpu_type", None)
+    )
+
+
+class TaskQueue:
+    """
+    Max-priority heap with linear aging
+
+    Effective priority is priority + waited / aging_seconds. Every queued
+    task ages at the same rate, so ordering by
+    submitted_at / aging_seconds - priority gives the same order without
+    ever rebuilding keys.
+    """
+
+    def __init__(self, aging_seconds: float = AGING_SECONDS):
+        self.aging_seconds = aging_seconds
+        self.heap: List[list] = []
+        self.entries: Dict[str, list] = {}
+        self._seq = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, task_id: str) -> bool:
+        return task_id in self.entries
+
+    def get(self, task_id: str) -> Optional[Dict]:
+        entry = self.entries.get(task_id)
+        return entry[2] if entry else None
+
+    def push(self, task: Dict):
+        self.remove(task["task_id"])
+        key = task["submitted_at"] / self.aging_seconds - task["priority"]
+        entry = [key, next(self._seq), task]
+        self.entries[task["task_id"]] = entry
+        heapq.heappush(self.heap, entry)
+
+    def pop(self) -> Optional[Dict]:
+        """Highest effective priority task, or None"""
+        while self.heap:
+            _, _, task = heapq.heappop(self.heap)
+            if task is not None:
+                del self.entries[task["task_id"]]
+                return task
+        return None
+
+    def remove(self, task_id: str) -> Optional[Dict]:
+        """Lazy delete: the heap entry is skipped when it surfaces"""
+        entry = self.entries.pop(task_id, None)
+        if entry is None:
+            return None
+        task, entry[2] = entry[2], None
+        return task
+
+    def effective_priority(self, task: Dict, now: Optional[float] = None) -> float:
+        waited = (now or time.time()) - task["submitted_at"]
+        return task["priority"] + waited / self.aging_seconds
+
+    def tasks(self) -> List[Dict]:
+        return [entry[2] for entry in self.entries.values()]
+
+
+class NodeIndex:
+    """
+    Active nodes with a free task slot, sorted by gpu_memory
+
+    Lookups bisect past every node with too little VRAM instead of
+    scanning the whole mesh, and full or disconnected nodes are never
+    visited at all.
+    """
+
+    def __init__(self):
+        self.available: List[Tuple[float, str]] = []
+        self.members: Dict[str, float] = {}
+
+    def has_capacity(self) -> bool:
+        return bool(self.available)
+
+    def update(self, node_id: str, node: Dict):
+        """Re-index a node after its status or active_tasks changed"""
+        self.discard(node_id)
+        if node["status"] == "active" and node["active_tasks"] < node["max_tasks"]:
+            bisect.insort(self.available, (node["gpu_memory"], node_id))
+            self.members[node_id] = node["gpu_memory"]
+
+    def discard(self, node_id: str):
+        memory = self.members.pop(node_id, None)
+        if memory is not None:
+            i = bisect.bisect_left(self.available, (memory, node_id))
+            del self.available[i]
+
+    def find(self, requirements: Dict, priority: int, nodes: Dict[str, Dict]) -> Optional[str]:
+        """Best free node for a task based on requirements and current load"""
+        required_memory, required_gpus, preferred_gpu_type = requirement_shape(requirements)
+
+        best_node = None
+        best_score = -1
+
+        start = bisect.bisect_left(self.available, (required_memory, ""))
+        for gpu_memory, node_id in self.available[start:]:
+            node = nodes[node_id]
+            if node["gpu_count"] < required_gpus:
+                continue
+            if preferred_gpu_type and node["gpu_type"] != preferred_gpu_type:
+                continue
+
+            # Spare resources (higher is better) minus current load
+            score = (gpu_memory - required_memory) * 10
+            score += (node["gpu_count"] - required_gpus) * 50
+            score -= node["active_tasks"] * 20
+
+            # Bonus for GPU type match
+            if preferred_gpu_type:
+                score += 100
+
+            # High priority tasks prefer more powerful nodes
+            if priority >= 8 and "4090" in node["gpu_type"]:
+                score += 200
+
+            if score > best_score:
+                best_score = score
+                best_node = node_id
+
+        return best_node
+
+
+# ============================================
+# TASK STORES
+# ============================================
+
+class SQLiteTaskStore:
+    """Tasks as JSON rows in a local SQLite file (WAL)"""
+
+    def __init__(self, path: str = SCHEDULER_DB_PATH, retention: int = COMPLETED_RETENTION):
+        self.path = path
+        self.retention = retention
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # Writes run in worker threads; the lock keeps one transaction at a time
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS tasks (
+                task_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                finished_at REAL,
+                data TEXT NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_finished ON tasks(finished_at)")
+
+    def load_open(self) -> List[Dict]:
+        rows = self.conn.execute(
+            "SELECT data FROM tasks WHERE finished_at IS NULL"
+        ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def load_finished(self, limit: int) -> List[Dict]:
+        rows = self.conn.execute(
+            "SELECT data FROM tasks WHERE finished_at IS NOT NULL ORDER BY finished_at DESC LIMIT ?",
+            (limit,)
+        ).fetchall()
+        return [json.loads(row[0]) for row in reversed(rows)]
+
+    def write(self, rows: List[Tuple[str, str, Optional[float], str]]):
+        """Upsert (task_id, status, finished_at, json) rows and trim finished tasks"""
+        if not rows:
+            return
+        with self._lock:
+            self._write(rows)
+
+    def _write(self, rows: List[Tuple[str, str, Optional[float], str]]):
+        self.conn.execute("BEGIN")
+        try:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO tasks (task_id, status, finished_at, data) VALUES (?, ?, ?, ?)",
+                rows
+            )
+            if any(row[2] is not None for row in rows):
+                self.conn.execute("""
+                    DELETE FROM tasks WHERE finished_at IS NOT NULL AND finished_at < (
+                        SELECT MIN(finished_at) FROM (
+                            SELECT finished_at FROM tasks WHERE finished_at IS NOT NULL
+                            ORDER BY finished_at DESC LIMIT ?
+                        )
+                    )
+                """, (self.retention,))
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def close(self):
+        self.conn.close()
+
+
+class RedisTaskStore:
+    """Open tasks in one hash; finished tasks in a hash + ZSET trimmed to retention"""
+
+    def __init__(self, url: str = REDIS_URL, retention: int = COMPLETED_RETENTION,
+                 prefix: str = REDIS_PREFIX):
+        self.retention = retention
+        self.open_key = f"{prefix}:tasks:open"
+        self.done_key = f"{prefix}:tasks:done"
+        self.done_index = f"{prefix}:tasks:done:index"
+        self.redis = redis.Redis.from_url(url, decode_responses=True)
+        self.redis.ping()
+
+    def load_open(self) -> List[Dict]:
+        return [json.loads(data) for data in self.redis.hvals(self.open_key)]
+
+    def load_finished(self, limit: int) -> List[Dict]:
+        task_ids = self.redis.zrange(self.done_index, -limit, -1)
+        if not task_ids:
+            return []
+        return [json.loads(data) for data in self.redis.hmget(self.done_key, task_ids) if data]
+
+    def write(self, rows: List[Tuple[str, str, Optional[float], str]]):
+        if not rows:
+            return
+        pipe = self.redis.pipeline(transaction=False)
+        finished = False
+        for task_id, _, finished_at, data in rows:
+            if finished_at is None:
+                pipe.hset(self.open_key, task_id, data)
+            else:
+                finished = True
+                pipe.hdel(self.open_key, task_id)
+                pipe.hset(self.done_key, task_id, data)
+                pipe.zadd(self.done_index, {task_id: finished_at})
+        pipe.execute()
+
+        if finished:
+            expired = self.redis.zrange(self.done_index, 0, -(self.retention + 1))
+            if expired:
+                pipe = self.redis.pipeline(transaction=False)
+                pipe.hdel(self.done_key, *expired)
+                pipe.zrem(self.done_index, *expired)
+                pipe.execute()
+
+    def close(self):
+        self.redis.close()
+
+
+def create_task_store():
+    """Redis when REDIS_URL is set and reachable, otherwise SQLite"""
+    if REDIS_URL and redis is not None:
+        try:
+            store = RedisTaskStore(REDIS_URL)
+            print(f"🗄️  Scheduler state in Redis ({REDIS_PREFIX}:*)")
+            return store
+        except Exception as e:
+            print(f"⚠️  Redis unavailable for scheduler state ({e}), falling back to SQLite")
+    print(f"🗄️  Scheduler state in SQLite ({SCHEDULER_DB_PATH})")
+    return SQLiteTaskStore(SCHEDULER_DB_PATH)
+
+
+def serialize_tasks(tasks: Iterable[Dict]) -> List[Tuple[str, str, Optional[float], str]]:
+    """Snapshot tasks as store rows (done on the event loop, before handing off)"""
+    return [
+        (
+            task["task_id"],
+            task["status"],
+            (task.get("completed_at") or time.time()) if task["status"] in TERMINAL_STATUSES else None,
+            json.dumps(task, default=str)
+        )
+        for task in tasks
+    ]
@@ -6,6 +6,7 @@ Syncs data between Aurora nodes and external systems (HubSpot, Google Workspace,
 Features:
 - Bidirectional sync (Aurora <-> External)
 - Change detection via last_modified timestamps
+- Watermarked, paginated pulls and bulk upserts/batch pushes for HubSpot
 - Conflict resolution (last-write-wins with version tracking)
 - Event bus notifications on changes
 - Webhook support for real-time updates
@@ -15,7 +16,8 @@ import os
 import asyncio
 import json
 import logging
-from datetime import datetime, timedelta
+import random
+from datetime import datetime, timedelta, timezone
 from typing import Dict, List, Optional, Any
 import asyncpg
 import aiohttp
@@ -43,6 +45,16 @@ REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
 REDIS_PASSWORD = os.getenv("REDIS_PASSWORD", "")
 
 HUBSPOT_API_KEY = os.getenv("HUBSPOT_API_KEY", "")
+HUBSPOT_BASE_URL = os.getenv("HUBSPOT_BASE_URL", "https://api.hubapi.com").rstrip("/")
+HUBSPOT_PAGE_SIZE = int(os.getenv("HUBSPOT_PAGE_SIZE", "100"))
+HUBSPOT_BATCH_SIZE = int(os.getenv("HUBSPOT_BATCH_SIZE", "100"))  # HubSpot's batch endpoint limit
+HUBSPOT_PUSH_LIMIT = int(os.getenv("HUBSPOT_PUSH_LIMIT", "2000"))  # contacts pushed per cycle
+HUBSPOT_MAX_CONCURRENCY = int(os.getenv("HUBSPOT_MAX_CONCURRENCY", "4"))
+HUBSPOT_MAX_RETRIES = int(os.getenv("HUBSPOT_MAX_RETRIES", "5"))
+HUBSPOT_BACKOFF_BASE = float(os.getenv("HUBSPOT_BACKOFF_BASE", "1.0"))
+HUBSPOT_BACKOFF_CAP = float(os.getenv("HUBSPOT_BACKOFF_CAP", "30.0"))
+HUBSPOT_SEARCH_RESULT_CAP = 10000  # search API won't page past this many results
+HUBSPOT_CONTACT_PROPERTIES = ["firstname", "lastname", "email", "phone", "hs_lastmodifieddate"]
 GOOGLE_CREDENTIALS = os.getenv("GOOGLE_CREDENTIALS_PATH", "")
 
 # SMTP Configuration
@@ -56,6 +68,22 @@ SMTP_FROM_NAME = os.getenv("SMTP_FROM_NAME", "Robbie AI")
 SYNC_INTERVAL = int(os.getenv("SYNC_INTERVAL", "300"))  # 5 minutes default
 
 
+def _chunks(items: List, size: int) -> List[List]:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def _parse_hubspot_timestamp(value: Optional[str]) -> Optional[datetime]:
+    """HubSpot dates are ISO 8601 ('2024-05-01T12:00:00.000Z') or epoch millis"""
+    if not value:
+        return None
+    try:
+        if value.isdigit():
+            return datetime.fromtimestamp(int(value) / 1000, tz=timezone.utc)
+        return datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+
 class SyncRecord(BaseModel):
     """Represents a synchronized record"""
     local_id: str
@@ -75,6 +103,7 @@ class IntegrationSyncEngine:
         self.db_pool: Optional[asyncpg.Pool] = None
         self.redis: Optional[redis.Redis] = None
         self.session: Optional[aiohttp.ClientSession] = None
+        self.hubspot_slots = asyncio.Semaphore(HUBSPOT_MAX_CONCURRENCY)
         self.running = False
         
     async def start(self):
@@ -136,6 +165,16 @@ class IntegrationSyncEngine:
                 CREATE INDEX IF NOT EXISTS idx_sync_registry_lookup 
                 ON sync_registry(external_system, entity_type, sync_status)
             """)
+
+            await conn.execute("""
+                CREATE TABLE IF NOT EXISTS sync_watermarks (
+                    external_system TEXT NOT NULL,
+                    entity_type TEXT NOT NULL,
+                    watermark TIMESTAMPTZ NOT NULL,
+                    updated_at TIMESTAMP DEFAULT NOW(),
+                    PRIMARY KEY (external_system, entity_type)
+                )
+            """)
             
         logger.info("✅ Sync registry tables initialized")
         
@@ -177,78 +216,216 @@ class IntegrationSyncEngine:
         
         logger.info("✅ HubSpot sync complete")
         
-    async def _pull_hubspot_contacts(self):
-        """Pull contacts FROM HubSpot → Aurora"""
-        headers = {
+    # ============================================
+    # HUBSPOT API
+    # ============================================
+
+    def _hubspot_headers(self) -> Dict[str, str]:
+        return {
             "Authorization": f"Bearer {HUBSPOT_API_KEY}",
             "Content-Type": "application/json"
         }
-        
-        url = "https://api.hubapi.com/crm/v3/objects/contacts"
-        params = {
-            "limit": 100,
-            "properties": ["firstname", "lastname", "email", "phone", "hs_lastmodifieddate"]
-        }
-        
-        try:
-            async with self.session.get(url, headers=headers, params=params) as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    contacts = data.get("results", [])
-                    
-                    for contact in contacts:
-                        await self._upsert_contact_from_hubspot(contact)
-                        
-                    logger.info(f"✅ Pulled {len(contacts)} contacts from HubSpot")
-                else:
-                    logger.error(f"❌ HubSpot API error: {resp.status}")
-                    
-        except Exception as e:
-            logger.error(f"❌ Error pulling HubSpot contacts: {e}")
-            
-    async def _upsert_contact_from_hubspot(self, contact: Dict):
-        """Insert/update contact from HubSpot data"""
-        hubspot_id = contact["id"]
-        props = contact.get("properties", {})
-        
+
+    async def _hubspot_request(self, method: str, path: str, payload: Optional[Dict] = None,
+                               ok_statuses: tuple = (200, 201, 207)) -> Optional[Dict]:
+        """
+        Call the HubSpot API with bounded concurrency and rate-limit-aware retries
+
+        429s wait for Retry-After (or exponential backoff with jitter), and so
+        do 5xx and connection errors. Returns the JSON body, or None once the
+        request has failed for good.
+        """
+        url = f"{HUBSPOT_BASE_URL}{path}"
+        for attempt in range(HUBSPOT_MAX_RETRIES + 1):
+            delay = None
+            try:
+                async with self.hubspot_slots:
+                    async with self.session.request(method, url, headers=self._hubspot_headers(),
+                                                    json=payload) as resp:
+                        if resp.status in ok_statuses:
+                            return await resp.json()
+                        if resp.status == 429 or resp.status >= 500:
+                            retry_after = resp.headers.get("Retry-After")
+                            delay = float(retry_after) if retry_after else None
+                            logger.warning(f"⚠️ HubSpot {resp.status} on {method} {path} (attempt {attempt + 1})")
+                        else:
+                            logger.error(f"❌ HubSpot API error {resp.status} on {method} {path}: {await resp.text()}")
+                            return None
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.warning(f"⚠️ HubSpot request failed on {method} {path}: {e}")
+
+            if attempt < HUBSPOT_MAX_RETRIES:
+                if delay is None:
+                    delay = min(HUBSPOT_BACKOFF_CAP, HUBSPOT_BACKOFF_BASE * 2 ** attempt)
+                    delay *= random.uniform(0.5, 1.0)
+                await asyncio.sleep(delay)
+
+        logger.error(f"❌ HubSpot {method} {path} failed after {HUBSPOT_MAX_RETRIES + 1} attempts")
+        return None
+
+    async def _get_watermark(self, system: str, entity_type: str) -> Optional[datetime]:
         async with self.db_pool.acquire() as conn:
-            # Upsert contact
-            await conn.execute("""
-                INSERT INTO contacts (
-                    hubspot_id, first_name, last_name, email, phone, 
-                    updated_at, last_sync
-                ) VALUES ($1, $2, $3, $4, $5, NOW(), NOW())
-                ON CONFLICT (hubspot_id) DO UPDATE SET
-                    first_name = EXCLUDED.first_name,
-                    last_name = EXCLUDED.last_name,
-                    email = EXCLUDED.email,
-                    phone = EXCLUDED.phone,
-                    updated_at = NOW(),
-                    last_sync = NOW()
-            """, hubspot_id, props.get("firstname"), props.get("lastname"),
-                props.get("email"), props.get("phone"))
-            
-            # Update sync registry
-            await conn.execute("""
-                INSERT INTO sync_registry (
-                    local_id, external_id, external_system, entity_type, last_synced
-                ) VALUES ($1, $2, 'hubspot', 'contact', NOW())
-                ON CONFLICT (local_id, external_system, entity_type) DO UPDATE SET
-                    last_synced = NOW(),
-                    sync_status = 'synced'
-            """, hubspot_id, hubspot_id)
-            
-        # Publish event
-        await self.redis.publish("aurora:sync:contact", json.dumps({
-            "action": "updated",
-            "source": "hubspot",
-            "contact_id": hubspot_id
-        }))
-        
+            return await conn.fetchval("""
+                SELECT watermark FROM sync_watermarks
+                WHERE external_system = $1 AND entity_type = $2
+            """, system, entity_type)
+
+    async def _publish_sync_events(self, channel: str, events: List[Dict]):
+        """Publish a batch of events in one Redis round trip"""
+        if not events:
+            return
+        pipe = self.redis.pipeline(transaction=False)
+        for event in events:
+            pipe.publish(channel, json.dumps(event))
+        await pipe.execute()
+
+    # ============================================
+    # HUBSPOT CONTACTS
+    # ============================================
+
+    async def _pull_hubspot_contacts(self):
+        """
+        Pull contacts modified since the stored watermark FROM HubSpot → Aurora
+
+        Pages through the search API in hs_lastmodifieddate order and upserts
+        each page in bulk; the watermark advances with every page, so an
+        interrupted pull resumes where it stopped. Search stops returning
+        results after HUBSPOT_SEARCH_RESULT_CAP, so a larger backlog restarts
+        the search from the new watermark.
+        """
+        watermark = await self._get_watermark("hubspot", "contact")
+        query_start, after = watermark, None
+        total = 0
+
+        while True:
+            body = {
+                "limit": HUBSPOT_PAGE_SIZE,
+                "properties": HUBSPOT_CONTACT_PROPERTIES,
+                "sorts": [{"propertyName": "hs_lastmodifieddate", "direction": "ASCENDING"}]
+            }
+            if query_start:
+                # GTE, not GT: contacts sharing the watermark's millisecond aren't skipped
+                body["filterGroups"] = [{"filters": [{
+                    "propertyName": "hs_lastmodifieddate",
+                    "operator": "GTE",
+                    "value": str(int(query_start.timestamp() * 1000))
+                }]}]
+            if after:
+                body["after"] = after
+
+            data = await self._hubspot_request("POST", "/crm/v3/objects/contacts/search", body)
+            if data is None:
+                break
+
+            contacts = data.get("results", [])
+            if contacts:
+                watermark = await self._upsert_contacts_from_hubspot(contacts, watermark)
+                await self._publish_sync_events("aurora:sync:contact", [
+                    {"action": "updated", "source": "hubspot", "contact_id": contact["id"]}
+                    for contact in contacts
+                ])
+                total += len(contacts)
+
+            after = data.get("paging", {}).get("next", {}).get("after")
+            if not after:
+                break
+            if int(after) + HUBSPOT_PAGE_SIZE > HUBSPOT_SEARCH_RESULT_CAP:
+                if watermark == query_start:
+                    logger.warning("⚠️ HubSpot search cap hit without the watermark moving; resuming next cycle")
+                    break
+                query_start, after = watermark, None
+
+        logger.info(f"✅ Pulled {total} contacts from HubSpot")
+
+    async def _upsert_contacts_from_hubspot(self, contacts: List[Dict],
+                                            watermark: Optional[datetime]) -> Optional[datetime]:
+        """
+        Insert/update a page of contacts from HubSpot data
+
+        The page is COPYed into a temp staging table and merged into contacts
+        and sync_registry with one statement each, in the same transaction that
+        advances the watermark. Returns the new watermark.
+        """
+        records = []
+        for contact in contacts:
+            props = contact.get("properties", {})
+            modified = _parse_hubspot_timestamp(props.get("hs_lastmodifieddate") or contact.get("updatedAt"))
+            if modified and (watermark is None or modified > watermark):
+                watermark = modified
+            records.append((
+                contact["id"], props.get("firstname"), props.get("lastname"),
+                props.get("email"), props.get("phone"), modified
+            ))
+
+        async with self.db_pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute("""
+                    CREATE TEMP TABLE IF NOT EXISTS hubspot_contact_staging (
+                        hubspot_id TEXT,
+                        first_name TEXT,
+                        last_name TEXT,
+                        email TEXT,
+                        phone TEXT,
+                        modified_at TIMESTAMPTZ
+                    ) ON COMMIT DELETE ROWS
+                """)
+                await conn.copy_records_to_table(
+                    "hubspot_contact_staging", records=records,
+                    columns=["hubspot_id", "first_name", "last_name", "email", "phone", "modified_at"]
+                )
+
+                # DISTINCT ON: a contact modified mid-pull can show up twice in a page
+                await conn.execute("""
+                    INSERT INTO contacts (
+                        hubspot_id, first_name, last_name, email, phone,
+                        updated_at, last_sync
+                    )
+                    SELECT DISTINCT ON (hubspot_id)
+                        hubspot_id, first_name, last_name, email, phone, NOW(), NOW()
+                    FROM hubspot_contact_staging
+                    ORDER BY hubspot_id, modified_at DESC NULLS LAST
+                    ON CONFLICT (hubspot_id) DO UPDATE SET
+                        first_name = EXCLUDED.first_name,
+                        last_name = EXCLUDED.last_name,
+                        email = EXCLUDED.email,
+                        phone = EXCLUDED.phone,
+                        updated_at = NOW(),
+                        last_sync = NOW()
+                """)
+
+                await conn.execute("""
+                    INSERT INTO sync_registry (
+                        local_id, external_id, external_system, entity_type, last_synced
+                    )
+                    SELECT DISTINCT hubspot_id, hubspot_id, 'hubspot', 'contact', NOW()
+                    FROM hubspot_contact_staging
+                    ON CONFLICT (local_id, external_system, entity_type) DO UPDATE SET
+                        last_synced = NOW(),
+                        sync_status = 'synced'
+                """)
+
+                if watermark:
+                    await conn.execute("""
+                        INSERT INTO sync_watermarks (external_system, entity_type, watermark, updated_at)
+                        VALUES ('hubspot', 'contact', $1, NOW())
+                        ON CONFLICT (external_system, entity_type) DO UPDATE SET
+                            watermark = GREATEST(sync_watermarks.watermark, EXCLUDED.watermark),
+                            updated_at = NOW()
+                    """, watermark)
+
+        return watermark
+
     async def _push_hubspot_contacts(self):
-        """Push contacts TO HubSpot from Aurora"""
+        """
+        Push contacts TO HubSpot from Aurora
+
+        Changed contacts go out through the batch create/update endpoints,
+        up to HUBSPOT_BATCH_SIZE per request and HUBSPOT_MAX_CONCURRENCY
+        requests at once; sync_registry is updated in one executemany.
+        """
         async with self.db_pool.acquire() as conn:
-            # Find contacts modified since last sync
+            # Changes made while the push is in flight stay newer than this
+            cycle_started = await conn.fetchval("SELECT LOCALTIMESTAMP")
             rows = await conn.fetch("""
                 SELECT c.*, sr.external_id, sr.last_synced
                 FROM contacts c
@@ -257,62 +434,83 @@ class IntegrationSyncEngine:
                     sr.external_system = 'hubspot' AND 
                     sr.entity_type = 'contact'
                 WHERE c.updated_at > COALESCE(sr.last_synced, '1970-01-01')
-                LIMIT 100
-            """)
-            
-            for row in rows:
-                await self._push_contact_to_hubspot(dict(row))
-                
-            if rows:
-                logger.info(f"✅ Pushed {len(rows)} contacts to HubSpot")
-                
-    async def _push_contact_to_hubspot(self, contact: Dict):
-        """Push single contact to HubSpot"""
-        headers = {
-            "Authorization": f"Bearer {HUBSPOT_API_KEY}",
-            "Content-Type": "application/json"
-        }
-        
-        payload = {
-            "properties": {
-                "firstname": contact.get("first_name"),
-                "lastname": contact.get("last_name"),
-                "email": contact.get("email"),
-                "phone": contact.get("phone")
+                LIMIT $1
+            """, HUBSPOT_PUSH_LIMIT)
+
+        if not rows:
+            return
+
+        creates = [dict(row) for row in rows if not row["external_id"]]
+        updates = [dict(row) for row in rows if row["external_id"]]
+
+        # Batch create results aren't returned in input order; they're matched
+        # back by email, so contacts without one are created one per request
+        with_email = [c for c in creates if c.get("email")]
+        batches = [("create", batch) for batch in _chunks(with_email, HUBSPOT_BATCH_SIZE)]
+        batches += [("create", [c]) for c in creates if not c.get("email")]
+        batches += [("update", batch) for batch in _chunks(updates, HUBSPOT_BATCH_SIZE)]
+
+        results = await asyncio.gather(*(
+            self._push_contact_batch(action, batch) for action, batch in batches
+        ))
+        synced = [pair for batch in results for pair in batch]
+
+        if synced:
+            async with self.db_pool.acquire() as conn:
+                await conn.executemany("""
+                    INSERT INTO sync_registry (
+                        local_id, external_id, external_system,
+                        entity_type, last_synced
+                    ) VALUES ($1, $2, 'hubspot', 'contact', $3)
+                    ON CONFLICT (local_id, external_system, entity_type) DO UPDATE SET
+                        external_id = EXCLUDED.external_id,
+                        last_synced = EXCLUDED.last_synced,
+                        sync_status = 'synced'
+                """, [(local_id, external_id, cycle_started) for local_id, external_id in synced])
+
+        logger.info(f"✅ Pushed {len(synced)}/{len(rows)} contacts to HubSpot "
+                    f"({len(creates)} new, {len(updates)} updated, {len(batches)} requests)")
+
+    async def _push_contact_batch(self, action: str, contacts: List[Dict]) -> List[tuple]:
+        """Send one batch create/update; returns (local_id, external_id) for each success"""
+        inputs = []
+        for contact in contacts:
+            item = {
+                "properties": {
+                    "firstname": contact.get("first_name"),
+                    "lastname": contact.get("last_name"),
+                    "email": contact.get("email"),
+                    "phone": contact.get("phone")
+                }
             }
-        }
-        
-        try:
-            if contact.get("external_id"):
-                # Update existing
-                url = f"https://api.hubapi.com/crm/v3/objects/contacts/{contact['external_id']}"
-                async with self.session.patch(url, headers=headers, json=payload) as resp:
-                    if resp.status == 200:
-                        logger.info(f"✅ Updated HubSpot contact {contact['external_id']}")
-                    else:
-                        logger.error(f"❌ Failed to update contact: {resp.status}")
-            else:
-                # Create new
-                url = "https://api.hubapi.com/crm/v3/objects/contacts"
-                async with self.session.post(url, headers=headers, json=payload) as resp:
-                    if resp.status == 201:
-                        data = await resp.json()
-                        new_id = data["id"]
-                        
-                        # Update sync registry
-                        async with self.db_pool.acquire() as conn:
-                            await conn.execute("""
-                                INSERT INTO sync_registry (
-                                    local_id, external_id, external_system, 
-                                    entity_type, last_synced
-                                ) VALUES ($1, $2, 'hubspot', 'contact', NOW())
-                            """, contact["hubspot_id"], new_id)
-                            
-                        logger.info(f"✅ Created HubSpot contact {new_id}")
-                        
-        except Exception as e:
-            logger.error(f"❌ Error pushing contact to HubSpot: {e}")
-            
+            if action == "update":
+                item["id"] = contact["external_id"]
+            inputs.append(item)
+
+        data = await self._hubspot_request(
+            "POST", f"/crm/v3/objects/contacts/batch/{action}", {"inputs": inputs}
+        )
+        if data is None:
+            return []
+
+        for error in data.get("errors", []):
+            logger.error(f"❌ HubSpot batch {action} error: {error.get('message')}")
+
+        results = data.get("results", [])
+        if action == "update":
+            local_ids = {contact["external_id"]: contact["hubspot_id"] for contact in contacts}
+            return [(local_ids[r["id"]], r["id"]) for r in results if r.get("id") in local_ids]
+
+        if len(contacts) == 1 and len(results) == 1:
+            return [(contacts[0]["hubspot_id"], results[0]["id"])]
+        by_email = {contact["email"].lower(): contact["hubspot_id"] for contact in contacts}
+        synced = []
+        for result in results:
+            email = (result.get("properties", {}).get("email") or "").lower()
+            if email in by_email:
+                synced.append((by_email[email], result["id"]))
+        return synced
+
     async def _pull_hubspot_companies(self):
         """Pull companies FROM HubSpot → Aurora"""
         # Similar to _pull_hubspot_contacts
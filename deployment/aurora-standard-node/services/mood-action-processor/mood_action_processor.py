@@ -1,18 +1,22 @@
 #!/usr/bin/env python3
 """
 Mood & Action Processor - Core Robbie Intelligence
-Runs every 20 seconds for mood evaluation and every 1 minute for action processing
+Tracks mood from chat messages as they arrive and handles action triggers as they are inserted
 """
 
 import os
 import json
 import logging
 import asyncio
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Deque, Dict, List, Optional, Any, Tuple
 import psycopg2
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
 from psycopg2.extras import RealDictCursor
-import redis
+import redis.asyncio as redis
 import httpx
 import numpy as np
 from fastapi import FastAPI, HTTPException, BackgroundTasks
@@ -41,6 +45,27 @@ REDIS_PASSWORD = os.getenv("REDIS_PASSWORD", "")
 PRIORITY_ENGINE_URL = os.getenv("PRIORITY_ENGINE_URL", "http://priority-surface:8002")
 CHAT_BACKEND_URL = os.getenv("CHAT_BACKEND_URL", "http://chat-backend:8000")
 
+MOOD_USER_ID = os.getenv("MOOD_USER_ID", "allan")
+MOOD_CHANNEL = "aurora:chat:message"  # chat-backend publishes every message here
+MOOD_WINDOW_SECONDS = int(os.getenv("MOOD_WINDOW_SECONDS", "3600"))
+MOOD_BUCKET_SECONDS = int(os.getenv("MOOD_BUCKET_SECONDS", "60"))
+
+POSITIVE_WORDS = ["great", "excellent", "awesome", "good", "perfect", "love", "excited", "happy"]
+NEGATIVE_WORDS = ["terrible", "awful", "bad", "horrible", "hate", "frustrated", "angry", "sad"]
+URGENT_WORDS = ["urgent", "asap", "emergency", "crisis", "deadline", "now", "immediately"]
+
+# Action triggers: claimed in batches (SKIP LOCKED, so replicas share the table), woken by NOTIFY
+TRIGGER_CHANNEL = "action_triggers"
+TRIGGER_WORKER_ID = f"{NODE_NAME}:{os.getpid()}"
+TRIGGER_BATCH_SIZE = int(os.getenv("TRIGGER_BATCH_SIZE", "50"))
+TRIGGER_BATCHES = int(os.getenv("TRIGGER_BATCHES", "4"))  # claimed batches in flight per replica
+TRIGGER_CLAIM_LEASE = int(os.getenv("TRIGGER_CLAIM_LEASE", "300"))  # seconds before a crashed replica's claim is retried
+TRIGGER_LEASE_RENEWAL = TRIGGER_CLAIM_LEASE / 3  # running batches renew their claim this often
+TRIGGER_POLL_SECONDS = 30  # fallback when no notification arrives
+TRIGGER_CONCURRENCY = {"email": 4, "calendar": 4, "meeting": 8, "deadline": 8, "opportunity": 8}
+# Metadata fields identifying what a trigger is about, most specific first
+TRIGGER_ENTITY_FIELDS = ["entity_id", "external_id", "message_id", "event_id", "deal_id", "task_id", "id"]
+
 # Redis client
 redis_client = redis.Redis(
     host=REDIS_HOST,
@@ -71,6 +96,70 @@ class MoodState(BaseModel):
     reasoning: str
 
 
+class MoodWindow:
+    """
+    Sliding window of message signal counts, in MOOD_BUCKET_SECONDS buckets
+
+    Messages are scanned once on arrival; expiry drops whole buckets from the
+    old end and subtracts them from the running totals.
+    """
+
+    def __init__(self, window: int = MOOD_WINDOW_SECONDS, bucket: int = MOOD_BUCKET_SECONDS):
+        self.window = window
+        self.bucket = bucket
+        # [bucket index, messages, positive, negative, urgent], oldest first
+        self.buckets: Deque[List[int]] = deque()
+        self.totals = [0, 0, 0, 0]
+        self.seeded = False
+        self.seeded_until = 0.0  # Messages at or before this were loaded by the seed
+        self.mood: Optional[str] = None  # Last classification written to mood_states
+
+    def add(self, content: str, timestamp: float):
+        index = int(timestamp // self.bucket)
+        if index < self._horizon(time.time()):
+            return
+
+        bucket = None
+        for existing in reversed(self.buckets):
+            if existing[0] <= index:
+                bucket = existing if existing[0] == index else None
+                break
+        if bucket is None:
+            bucket = [index, 0, 0, 0, 0]
+            # Late messages are rare and only ever a few buckets back
+            position = len(self.buckets)
+            while position and self.buckets[position - 1][0] > index:
+                position -= 1
+            self.buckets.insert(position, bucket)
+
+        for i, count in enumerate((1,) + count_signals(content)):
+            bucket[i + 1] += count
+            self.totals[i] += count
+
+    def expire(self, now: float):
+        horizon = self._horizon(now)
+        while self.buckets and self.buckets[0][0] < horizon:
+            bucket = self.buckets.popleft()
+            for i in range(4):
+                self.totals[i] -= bucket[i + 1]
+
+    def classify(self, now: Optional[float] = None) -> Dict:
+        self.expire(now or time.time())
+        messages, positive, negative, urgent = self.totals
+        return classify_mood(positive, negative, urgent, messages)
+
+    def reset(self):
+        self.buckets.clear()
+        self.totals = [0, 0, 0, 0]
+
+    def _horizon(self, now: float) -> int:
+        """Buckets older than this index are entirely outside the window"""
+        return int((now - self.window) // self.bucket)
+
+
+mood_window = MoodWindow()
+
+
 class ActionTrigger(BaseModel):
     id: str
     type: str  # 'email', 'calendar', 'meeting', 'deadline', 'opportunity'
@@ -113,6 +202,34 @@ async def startup_event():
                 )
             """)
 
+            cur.execute("""
+                ALTER TABLE action_triggers
+                    ADD COLUMN IF NOT EXISTS claimed_by TEXT,
+                    ADD COLUMN IF NOT EXISTS claimed_at TIMESTAMPTZ,
+                    ADD COLUMN IF NOT EXISTS processed_at TIMESTAMPTZ;
+
+                CREATE INDEX IF NOT EXISTS idx_action_triggers_pending
+                    ON action_triggers (priority DESC, created_at)
+                    WHERE processed = FALSE;
+
+                CREATE OR REPLACE FUNCTION notify_action_trigger() RETURNS trigger AS $$
+                BEGIN
+                    PERFORM pg_notify('action_triggers', NEW.type);
+                    RETURN NEW;
+                END;
+                $$ LANGUAGE plpgsql;
+
+                DO $$
+                BEGIN
+                    IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'action_triggers_notify') THEN
+                        CREATE TRIGGER action_triggers_notify
+                            AFTER INSERT ON action_triggers
+                            FOR EACH ROW EXECUTE FUNCTION notify_action_trigger();
+                    END IF;
+                END
+                $$;
+            """)
+
             conn.commit()
 
         logger.info("✅ Mood & Action Processor ready")
@@ -120,18 +237,25 @@ async def startup_event():
     finally:
         conn.close()
 
+    # Chat messages stream into the mood window (seeded from the database first)
+    asyncio.create_task(run_mood_listener())
+
+    # Action triggers are handled as soon as they are inserted
+    asyncio.create_task(run_trigger_listener())
+    asyncio.create_task(run_trigger_engine())
+
     # Start schedulers
     scheduler = AsyncIOScheduler()
 
-    # Every 20 seconds: Mood evaluation
+    # Every 20 seconds: Mood re-check, so messages ageing out of the window count too
     scheduler.add_job(evaluate_mood, 'interval', seconds=20)
 
-    # Every 1 minute: Action processing
+    # Every 1 minute: Action sweep, for claims whose lease ran out
     scheduler.add_job(process_actions, 'interval', seconds=60)
 
     scheduler.start()
 
-    logger.info("⏰ Cron jobs started: Mood (20s) + Actions (1m)")
+    logger.info("⏰ Cron jobs started: Mood (20s) + Action sweep (1m)")
 
 
 @fastapi_app.get("/health")
@@ -148,10 +272,10 @@ async def get_current_mood():
             with conn.cursor() as cur:
                 cur.execute("""
                     SELECT * FROM mood_states
-                    WHERE user_id = 'allan'
+                    WHERE user_id = %s
                     ORDER BY created_at DESC
                     LIMIT 1
-                """)
+                """, (MOOD_USER_ID,))
 
                 mood_state = cur.fetchone()
                 if mood_state:
@@ -167,6 +291,37 @@ async def get_current_mood():
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@fastapi_app.get("/api/mood/window")
+async def get_mood_window():
+    """Live mood classification and signal counts from the in-memory window"""
+    return {
+        "classification": mood_window.classify(),
+        "stored_mood": mood_window.mood,
+        "seeded": mood_window.seeded,
+        "window_seconds": mood_window.window,
+        "bucket_seconds": mood_window.bucket,
+        "buckets": len(mood_window.buckets)
+    }
+
+
+@fastapi_app.get("/api/actions/stats")
+async def get_action_stats():
+    """Trigger engine counters for this replica"""
+    latencies = sorted(trigger_stats["latencies_ms"])
+    return {
+        "worker": TRIGGER_WORKER_ID,
+        "batches": trigger_stats["batches"],
+        "claimed": trigger_stats["claimed"],
+        "handled": trigger_stats["handled"],
+        "collapsed": trigger_stats["collapsed"],
+        "in_flight": dict(trigger_stats["in_flight"]),
+        "trigger_to_action_ms": {
+            "p50": latencies[len(latencies) // 2] if latencies else None,
+            "p95": latencies[int(len(latencies) * 0.95)] if latencies else None
+        }
+    }
+
+
 @fastapi_app.get("/api/actions/triggers")
 async def get_action_triggers(limit: int = 50):
     """Get recent action triggers"""
@@ -192,61 +347,329 @@ async def get_action_triggers(limit: int = 50):
 
 
 async def evaluate_mood():
-    """Evaluate current mood state (runs every 20 seconds)"""
+    """Classify the mood window; store it only when the classification changes"""
     try:
-        # Get recent conversation data
-        recent_messages = await get_recent_conversation_data()
+        if not mood_window.seeded:
+            await seed_mood_window()
 
-        # Analyze conversation patterns
-        mood_analysis = await analyze_conversation_mood(recent_messages)
+        mood_analysis = mood_window.classify()
+        previous = mood_window.mood
+        if mood_analysis["mood"] == previous:
+            return
 
-        # Store mood state
-        await store_mood_state(mood_analysis)
+        # Only remembered once written, so a failed write is retried next evaluation
+        if not await store_mood_state(mood_analysis):
+            return
+        mood_window.mood = mood_analysis["mood"]
 
         # Update personality state if needed
         await update_personality_from_mood(mood_analysis)
 
-        logger.debug(f"🎭 Mood evaluated: {mood_analysis['mood']} (confidence: {mood_analysis['confidence']})")
+        logger.info(f"🎭 Mood changed: {previous} → {mood_analysis['mood']} (confidence: {mood_analysis['confidence']})")
 
     except Exception as e:
         logger.error(f"❌ Error in mood evaluation: {e}")
 
 
+async def seed_mood_window():
+    """Cold start: fill the window from stored messages and pick up the last stored mood"""
+    started = datetime.now(timezone.utc)
+    messages = await get_recent_conversation_data(until=started)
+
+    mood_window.reset()
+    for msg in messages:
+        mood_window.add(msg["content"] or "", _epoch(msg["created_at"]))
+    mood_window.mood = await get_stored_mood()
+    mood_window.seeded_until = started.timestamp()
+    mood_window.seeded = True
+
+    logger.info(f"🎭 Mood window seeded with {len(messages)} messages (stored mood: {mood_window.mood})")
+
+
+async def run_mood_listener():
+    """Feed chat message events into the mood window"""
+    while True:
+        pubsub = redis_client.pubsub()
+        try:
+            # Subscribe before seeding so nothing falls between the two
+            await pubsub.subscribe(MOOD_CHANNEL)
+            if not mood_window.seeded:
+                await seed_mood_window()
+
+            async for message in pubsub.listen():
+                if message["type"] != "message":
+                    continue
+                try:
+                    event = json.loads(message["data"])
+                    if event.get("user_id", event.get("client_id")) != MOOD_USER_ID or not event.get("content"):
+                        continue
+                    timestamp = _epoch(event.get("timestamp"))
+                    if timestamp <= mood_window.seeded_until:
+                        continue  # Already counted by the seed
+                    mood_window.add(event["content"], timestamp)
+                except (ValueError, TypeError) as e:
+                    logger.warning(f"⚠️ Ignoring malformed chat message event: {e}")
+                    continue
+
+                await evaluate_mood()
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"⚠️ Chat message listener disconnected: {e}")
+            await asyncio.sleep(5)
+        finally:
+            await pubsub.reset()
+
+
 async def process_actions():
-    """Process pending actions (runs every 1 minute)"""
+    """Claim and dispatch every pending action trigger (the engine does this on each NOTIFY)"""
     try:
-        # Get unprocessed action triggers
-        triggers = await get_unprocessed_triggers()
+        claimed = await drain_triggers()
+        logger.debug(f"⚡ Claimed {claimed} action triggers")
 
-        for trigger in triggers:
-            # Process the trigger based on its type
-            await process_trigger(trigger)
+    except Exception as e:
+        logger.error(f"❌ Error in action processing: {e}")
 
-            # Mark as processed
-            await mark_trigger_processed(trigger["id"])
 
-        logger.debug(f"⚡ Processed {len(triggers)} action triggers")
+trigger_wakeup = asyncio.Event()
+trigger_batches = asyncio.Semaphore(TRIGGER_BATCHES)
+trigger_slots = {trigger_type: asyncio.Semaphore(limit) for trigger_type, limit in TRIGGER_CONCURRENCY.items()}
+trigger_stats = {
+    "batches": 0,
+    "claimed": 0,
+    "handled": 0,
+    "collapsed": 0,
+    "in_flight": {trigger_type: 0 for trigger_type in TRIGGER_CONCURRENCY},
+    "latencies_ms": deque(maxlen=1000)
+}
+
+
+async def run_trigger_engine():
+    """Drain pending triggers whenever woken, or every TRIGGER_POLL_SECONDS at the latest"""
+    while True:
+        try:
+            trigger_wakeup.clear()
+            if not await drain_triggers():
+                try:
+                    await asyncio.wait_for(trigger_wakeup.wait(), TRIGGER_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"❌ Trigger engine error: {e}")
+            await asyncio.sleep(5)
+
+
+async def run_trigger_listener():
+    """LISTEN for new triggers on a dedicated connection and wake the engine"""
+    loop = asyncio.get_running_loop()
+    while True:
+        conn = None
+        lost = loop.create_future()
+        try:
+            conn = get_db_connection()
+            conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+            with conn.cursor() as cur:
+                cur.execute(f"LISTEN {TRIGGER_CHANNEL}")
+
+            def on_notify():
+                try:
+                    conn.poll()
+                except Exception as e:
+                    if not lost.done():
+                        lost.set_exception(e)
+                    return
+                if conn.notifies:
+                    conn.notifies.clear()
+                    trigger_wakeup.set()
+
+            loop.add_reader(conn.fileno(), on_notify)
+            trigger_wakeup.set()  # Catch up on anything inserted while not listening
+            logger.info(f"👂 Listening for action triggers on {TRIGGER_CHANNEL}")
+            await lost
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"⚠️ Action trigger listener disconnected: {e}")
+            await asyncio.sleep(5)
+        finally:
+            if conn is not None:
+                try:
+                    loop.remove_reader(conn.fileno())
+                except Exception:
+                    pass
+                conn.close()
+
+
+async def drain_triggers() -> int:
+    """Claim batches until none are left; each batch is handled in the background"""
+    claimed = 0
+    while True:
+        await trigger_batches.acquire()
+        try:
+            triggers = await claim_triggers()
+        except Exception:
+            trigger_batches.release()
+            raise
+        if not triggers:
+            trigger_batches.release()
+            return claimed
+
+        claimed += len(triggers)
+        asyncio.create_task(handle_trigger_batch(triggers))
+
+
+async def claim_triggers() -> List[Dict]:
+    """
+    Claim the next batch of pending triggers; rows another replica holds are
+    skipped. Each claim gets its own token in claimed_by, which fences the
+    renewals and the final mark against a later claim of the same rows.
+    """
+    claim = f"{TRIGGER_WORKER_ID}:{uuid.uuid4().hex}"
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                UPDATE action_triggers t
+                SET claimed_by = %s, claimed_at = NOW()
+                FROM (
+                    SELECT id FROM action_triggers
+                    WHERE processed = FALSE
+                    AND (claimed_at IS NULL OR claimed_at < NOW() - make_interval(secs => %s))
+                    ORDER BY priority DESC, created_at ASC
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                ) pending
+                WHERE t.id = pending.id
+                RETURNING t.id, t.type, t.priority, t.description, t.metadata, t.created_at, t.claimed_by
+            """, (claim, TRIGGER_CLAIM_LEASE, TRIGGER_BATCH_SIZE))
+
+            triggers = [dict(t) for t in cur.fetchall()]
+            conn.commit()
+
+    finally:
+        conn.close()
+
+    triggers.sort(key=lambda t: (-t["priority"], t["created_at"]))
+    return triggers
+
+
+def trigger_entity(trigger: Dict) -> Optional[Tuple[str, str]]:
+    """(type, entity) a trigger is about, or None if it can't be told apart from others"""
+    metadata = trigger["metadata"] or {}
+    for field in TRIGGER_ENTITY_FIELDS:
+        if metadata.get(field):
+            return trigger["type"], f"{field}:{metadata[field]}"
+    title = metadata.get("title") or metadata.get("subject") or metadata.get("event_title")
+    if title:
+        return trigger["type"], f"title:{title}"
+    return None
+
+
+def collapse_triggers(triggers: List[Dict]) -> List[Tuple[Dict, List[Dict]]]:
+    """
+    Group triggers for the same entity; the newest one in a group (the most
+    current metadata) is handled on behalf of all of them
+    """
+    groups: Dict[Any, List[Dict]] = {}
+    for trigger in triggers:
+        key = trigger_entity(trigger) or trigger["id"]
+        groups.setdefault(key, []).append(trigger)
+    return [(max(group, key=lambda t: t["created_at"]), group) for group in groups.values()]
+
+
+async def handle_trigger_batch(triggers: List[Dict]):
+    """
+    Run a claimed batch's handlers concurrently, then mark the whole batch
+    processed at once. The claim is renewed while handlers run, so a slow
+    batch isn't claimed again by the sweep.
+    """
+    claim = triggers[0]["claimed_by"]
+    trigger_ids = [t["id"] for t in triggers]
+    renewal = asyncio.create_task(renew_trigger_claims(trigger_ids, claim))
+    try:
+        groups = collapse_triggers(triggers)
+        await asyncio.gather(*(dispatch_trigger(trigger) for trigger, _ in groups))
+        renewal.cancel()
+        marked = await mark_triggers_processed(trigger_ids, claim)
+        if marked < len(trigger_ids):
+            logger.warning(f"⚠️ Lost the claim on {len(trigger_ids) - marked} action triggers before marking them processed")
+
+        trigger_stats["batches"] += 1
+        trigger_stats["claimed"] += len(triggers)
+        trigger_stats["handled"] += len(groups)
+        trigger_stats["collapsed"] += len(triggers) - len(groups)
+
+        logger.debug(f"⚡ Processed {len(triggers)} action triggers ({len(triggers) - len(groups)} duplicates collapsed)")
 
     except Exception as e:
-        logger.error(f"❌ Error in action processing: {e}")
+        # Claims lapse after TRIGGER_CLAIM_LEASE, so the batch is retried by the sweep
+        logger.error(f"❌ Error handling trigger batch: {e}")
+    finally:
+        renewal.cancel()
+        trigger_batches.release()
 
 
-async def get_recent_conversation_data() -> List[Dict]:
-    """Get recent conversation data for mood analysis"""
+async def renew_trigger_claims(trigger_ids: List[str], claim: str):
+    """Push claimed_at forward every TRIGGER_LEASE_RENEWAL while this claim still holds the rows"""
+    while True:
+        await asyncio.sleep(TRIGGER_LEASE_RENEWAL)
+        try:
+            conn = get_db_connection()
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("""
+                        UPDATE action_triggers SET claimed_at = NOW()
+                        WHERE id = ANY(%s::uuid[]) AND claimed_by = %s AND processed = FALSE
+                    """, ([str(trigger_id) for trigger_id in trigger_ids], claim))
+                    renewed = cur.rowcount
+                    conn.commit()
+            finally:
+                conn.close()
+            if renewed < len(trigger_ids):
+                logger.warning(f"⚠️ Lost the claim on {len(trigger_ids) - renewed} action triggers")
+        except Exception as e:
+            logger.warning(f"⚠️ Could not renew action trigger claim: {e}")
+
+
+async def dispatch_trigger(trigger: Dict):
+    """Run one trigger's handler within its type's concurrency limit"""
+    slots = trigger_slots.get(trigger["type"])
+    if slots is None:
+        return await process_trigger(trigger)
+    async with slots:
+        latency = datetime.now(timezone.utc) - trigger["created_at"]
+        trigger_stats["latencies_ms"].append(latency.total_seconds() * 1000)
+        trigger_stats["in_flight"][trigger["type"]] += 1
+        try:
+            await process_trigger(trigger)
+        finally:
+            trigger_stats["in_flight"][trigger["type"]] -= 1
+
+
+async def get_recent_conversation_data(until: Optional[datetime] = None) -> List[Dict]:
+    """Get the messages currently inside the mood window (cold-start seed)"""
     try:
         conn = get_db_connection()
         try:
             with conn.cursor() as cur:
                 cur.execute("""
-                    SELECT content, role, created_at, metadata
-                    FROM messages
-                    WHERE created_at > NOW() - INTERVAL '1 hour'
-                    AND conversation_id IN (
-                        SELECT id FROM conversations WHERE user_id = 'allan'
-                    )
-                    ORDER BY created_at DESC
-                    LIMIT 100
-                """)
+                    SELECT m.content, m.role, m.created_at, m.metadata
+                    FROM messages m
+                    JOIN conversations c ON c.id = m.conversation_id
+                    WHERE c.user_id = %s
+                    AND m.created_at > %s
+                    AND m.created_at <= %s
+                    ORDER BY m.created_at DESC
+                """, (
+                    MOOD_USER_ID,
+                    (until or datetime.now(timezone.utc)) - timedelta(seconds=MOOD_WINDOW_SECONDS),
+                    until or datetime.now(timezone.utc)
+                ))
 
                 messages = cur.fetchall()
                 return [dict(msg) for msg in messages]
@@ -259,9 +682,54 @@ async def get_recent_conversation_data() -> List[Dict]:
         return []
 
 
-async def analyze_conversation_mood(messages: List[Dict]) -> Dict:
-    """Analyze mood from recent conversations"""
-    if not messages:
+async def get_stored_mood() -> Optional[str]:
+    """Most recently stored mood, if any"""
+    try:
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT mood FROM mood_states
+                    WHERE user_id = %s
+                    ORDER BY created_at DESC
+                    LIMIT 1
+                """, (MOOD_USER_ID,))
+
+                row = cur.fetchone()
+                return row["mood"] if row else None
+
+        finally:
+            conn.close()
+
+    except Exception as e:
+        logger.error(f"❌ Error getting stored mood: {e}")
+        return None
+
+
+def _epoch(value) -> float:
+    """Seconds since the epoch for a datetime or ISO string (naive means UTC); now if missing"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+    return time.time()
+
+
+def count_signals(content: str) -> Tuple[int, int, int]:
+    """Positive, negative and urgent word hits in one message"""
+    content = content.lower()
+    return (
+        sum(1 for word in POSITIVE_WORDS if word in content),
+        sum(1 for word in NEGATIVE_WORDS if word in content),
+        sum(1 for word in URGENT_WORDS if word in content)
+    )
+
+
+def classify_mood(positive_count: int, negative_count: int, urgent_count: int, total_words: int) -> Dict:
+    """Mood from signal counts over a number of messages"""
+    if not total_words:
         return {
             "mood": "neutral",
             "confidence": 0.5,
@@ -269,23 +737,6 @@ async def analyze_conversation_mood(messages: List[Dict]) -> Dict:
             "reasoning": "No recent conversation data"
         }
 
-    # Simple mood analysis based on message patterns
-    positive_words = ["great", "excellent", "awesome", "good", "perfect", "love", "excited", "happy"]
-    negative_words = ["terrible", "awful", "bad", "horrible", "hate", "frustrated", "angry", "sad"]
-    urgent_words = ["urgent", "asap", "emergency", "crisis", "deadline", "now", "immediately"]
-
-    positive_count = 0
-    negative_count = 0
-    urgent_count = 0
-
-    for msg in messages:
-        content = msg["content"].lower()
-        positive_count += sum(1 for word in positive_words if word in content)
-        negative_count += sum(1 for word in negative_words if word in content)
-        urgent_count += sum(1 for word in urgent_words if word in content)
-
-    total_words = len(messages)
-
     # Determine mood based on patterns
     if urgent_count > total_words * 0.1:
         mood = "urgent"
@@ -313,8 +764,8 @@ async def analyze_conversation_mood(messages: List[Dict]) -> Dict:
     }
 
 
-async def store_mood_state(analysis: Dict):
-    """Store current mood state"""
+async def store_mood_state(analysis: Dict) -> bool:
+    """Store current mood state; False if the write failed"""
     try:
         conn = get_db_connection()
         try:
@@ -335,8 +786,11 @@ async def store_mood_state(analysis: Dict):
         finally:
             conn.close()
 
+        return True
+
     except Exception as e:
         logger.error(f"❌ Error storing mood state: {e}")
+        return False
 
 
 async def update_personality_from_mood(analysis: Dict):
@@ -362,30 +816,6 @@ async def update_personality_from_mood(analysis: Dict):
         logger.error(f"❌ Error updating personality from mood: {e}")
 
 
-async def get_unprocessed_triggers() -> List[Dict]:
-    """Get unprocessed action triggers"""
-    try:
-        conn = get_db_connection()
-        try:
-            with conn.cursor() as cur:
-                cur.execute("""
-                    SELECT * FROM action_triggers
-                    WHERE processed = FALSE
-                    ORDER BY priority DESC, created_at ASC
-                    LIMIT 20
-                """)
-
-                triggers = cur.fetchall()
-                return [dict(t) for t in triggers]
-
-        finally:
-            conn.close()
-
-    except Exception as e:
-        logger.error(f"❌ Error getting unprocessed triggers: {e}")
-        return []
-
-
 async def process_trigger(trigger: Dict):
     """Process a single action trigger"""
     try:
@@ -525,24 +955,23 @@ async def process_opportunity_trigger(metadata: Dict):
         logger.error(f"❌ Error processing opportunity trigger: {e}")
 
 
-async def mark_trigger_processed(trigger_id: str):
-    """Mark trigger as processed"""
+async def mark_triggers_processed(trigger_ids: List[str], claim: str) -> int:
+    """Mark a batch of triggers processed in one statement; only rows still held by this claim count"""
+    conn = get_db_connection()
     try:
-        conn = get_db_connection()
-        try:
-            with conn.cursor() as cur:
-                cur.execute("""
-                    UPDATE action_triggers SET processed = TRUE
-                    WHERE id = %s
-                """, (trigger_id,))
+        with conn.cursor() as cur:
+            cur.execute("""
+                UPDATE action_triggers SET processed = TRUE, processed_at = NOW()
+                WHERE id = ANY(%s::uuid[]) AND claimed_by = %s AND processed = FALSE
+            """, ([str(trigger_id) for trigger_id in trigger_ids], claim))
+            marked = cur.rowcount
 
-                conn.commit()
+            conn.commit()
 
-        finally:
-            conn.close()
+    finally:
+        conn.close()
 
-    except Exception as e:
-        logger.error(f"❌ Error marking trigger processed: {e}")
+    return marked
 
 
 async def get_personality_state() -> Dict:
@@ -7,7 +7,7 @@ Maintains real-time map of all nodes in the mesh
 import os
 import asyncio
 import time
-from datetime import datetime, timedelta
+from datetime import datetime, timezone
 from typing import Dict, List, Optional
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
@@ -33,6 +33,20 @@ NODE_ROLE = os.getenv('NODE_ROLE', 'lead')
 REDIS_HOST = os.getenv('REDIS_HOST', 'redis')
 REDIS_PASSWORD = os.getenv('REDIS_PASSWORD', '')
 
+# Registry layout: one hash of node info plus a ZSET of last-heartbeat
+# times, so listing every node is a single pipelined round trip
+NODES_KEY = 'aurora:registry:nodes'
+HEARTBEATS_KEY = 'aurora:registry:heartbeats'
+EVENTS_CHANNEL = 'aurora:events:global'
+
+# Liveness thresholds (seconds since last heartbeat)
+ACTIVE_WINDOW = int(os.getenv('REGISTRY_ACTIVE_WINDOW', '120'))
+WARNING_WINDOW = int(os.getenv('REGISTRY_WARNING_WINDOW', '180'))
+
+# Nodes silent this long are dropped from the registry altogether
+NODE_EXPIRY = int(os.getenv('REGISTRY_NODE_EXPIRY', '86400'))
+PRUNE_INTERVAL = int(os.getenv('REGISTRY_PRUNE_INTERVAL', '300'))
+
 app = FastAPI(
     title="Aurora Node Registry",
     version="1.0.0",
@@ -76,8 +90,11 @@ async def startup():
     )
     logger.info("node_registry_started", registry_node=NODE_NAME)
     
+    await migrate_legacy_keys()
+    
     # Subscribe to heartbeat events
     asyncio.create_task(listen_for_heartbeats())
+    asyncio.create_task(prune_loop())
 
 @app.on_event("shutdown")
 async def shutdown():
@@ -85,11 +102,83 @@ async def shutdown():
     if redis_client:
         await redis_client.close()
 
+def node_status(last_heartbeat: Optional[float], now: Optional[float] = None) -> str:
+    """active / warning / offline from the heartbeat score"""
+    if last_heartbeat is None:
+        return "offline"
+    age = (now or time.time()) - last_heartbeat
+    if age < ACTIVE_WINDOW:
+        return "active"
+    if age < WARNING_WINDOW:
+        return "warning"
+    return "offline"
+
+def with_liveness(info: Dict, last_heartbeat: Optional[float], now: Optional[float] = None) -> Dict:
+    info['status'] = node_status(last_heartbeat, now)
+    info['last_seen'] = (
+        datetime.utcfromtimestamp(last_heartbeat).isoformat() if last_heartbeat is not None else None
+    )
+    return info
+
+async def record_heartbeat(node_name: str):
+    await redis_client.zadd(HEARTBEATS_KEY, {node_name: time.time()})
+
+async def prune_expired_nodes() -> int:
+    """Drop nodes whose last heartbeat is older than NODE_EXPIRY"""
+    cutoff = time.time() - NODE_EXPIRY
+    expired = await redis_client.zrangebyscore(HEARTBEATS_KEY, "-inf", cutoff)
+    pipe = redis_client.pipeline(transaction=True)
+    if expired:
+        pipe.hdel(NODES_KEY, *expired)
+    pipe.zremrangebyscore(HEARTBEATS_KEY, "-inf", cutoff)
+    await pipe.execute()
+    return len(expired)
+
+async def prune_loop():
+    while True:
+        try:
+            pruned = await prune_expired_nodes()
+            if pruned:
+                logger.info("expired_nodes_pruned", nodes=pruned)
+        except Exception as e:
+            logger.error("prune_expired_nodes_error", error=str(e))
+        await asyncio.sleep(PRUNE_INTERVAL)
+
+async def migrate_legacy_keys():
+    """One-time move of per-node :info / :lastseen keys into the hash + ZSET"""
+    try:
+        legacy = [key async for key in redis_client.scan_iter("aurora:registry:node:*:info")]
+        if not legacy:
+            return
+        
+        names = [key.split(':')[3] for key in legacy]
+        pipe = redis_client.pipeline(transaction=False)
+        for key in legacy:
+            pipe.get(key)
+        for name in names:
+            pipe.get(f'aurora:registry:node:{name}:lastseen')
+        values = await pipe.execute()
+        infos, last_seens = values[:len(names)], values[len(names):]
+        
+        pipe = redis_client.pipeline(transaction=True)
+        for name, info, last_seen in zip(names, infos, last_seens):
+            if info:
+                pipe.hsetnx(NODES_KEY, name, info)
+            if last_seen:
+                seen = datetime.fromisoformat(last_seen).replace(tzinfo=timezone.utc).timestamp()
+                pipe.zadd(HEARTBEATS_KEY, {name: seen}, nx=True)
+            pipe.delete(f'aurora:registry:node:{name}:info', f'aurora:registry:node:{name}:lastseen')
+        await pipe.execute()
+        
+        logger.info("legacy_registry_keys_migrated", nodes=len(names))
+    except Exception as e:
+        logger.error("legacy_registry_migration_error", error=str(e))
+
 async def listen_for_heartbeats():
     """Listen for node heartbeat events from event bus"""
     try:
         pubsub = redis_client.pubsub()
-        await pubsub.subscribe('aurora:events:global')
+        await pubsub.subscribe(EVENTS_CHANNEL)
         
         logger.info("listening_for_heartbeats")
         
@@ -98,16 +187,13 @@ async def listen_for_heartbeats():
                 try:
                     event = json.loads(message['data'])
                     
-                    if event.get('type') == 'node_heartbeat':
+                    # Heartbeats posted to this registry were ZADDed already
+                    if event.get('type') == 'node_heartbeat' and not event['data'].get('recorded'):
                         node = event['data']['node']
-                        role = event['data']['role']
+                        role = event['data'].get('role')
                         
                         # Update last seen timestamp
-                        await redis_client.setex(
-                            f'aurora:registry:node:{node}:lastseen',
-                            180,  # 3 minute TTL
-                            datetime.utcnow().isoformat()
-                        )
+                        await record_heartbeat(node)
                         
                         logger.debug("heartbeat_received", node=node, role=role)
                         
@@ -126,6 +212,7 @@ async def root():
         "role": NODE_ROLE,
         "endpoints": {
             "nodes": "/nodes",
+            "live_nodes": "/nodes/live",
             "register": "/nodes/register",
             "node_info": "/nodes/{node_name}",
             "topology": "/topology",
@@ -146,38 +233,18 @@ async def health():
 async def list_nodes():
     """List all registered nodes with their status"""
     try:
-        nodes = {}
-        
-        # Get all node keys from Redis
-        keys = []
-        async for key in redis_client.scan_iter("aurora:registry:node:*:info"):
-            keys.append(key)
+        # Node info and heartbeat scores in one round trip
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.hgetall(NODES_KEY)
+        pipe.zrange(HEARTBEATS_KEY, 0, -1, withscores=True)
+        node_data, heartbeats = await pipe.execute()
         
-        for key in keys:
-            node_name = key.split(':')[3]
-            
-            # Get node info
-            node_data = await redis_client.get(key)
-            if node_data:
-                info = json.loads(node_data)
-                
-                # Get last seen
-                last_seen_key = f'aurora:registry:node:{node_name}:lastseen'
-                last_seen = await redis_client.get(last_seen_key)
-                
-                # Determine status
-                status = "offline"
-                if last_seen:
-                    last_seen_dt = datetime.fromisoformat(last_seen)
-                    if datetime.utcnow() - last_seen_dt < timedelta(minutes=2):
-                        status = "active"
-                    elif datetime.utcnow() - last_seen_dt < timedelta(minutes=5):
-                        status = "warning"
-                
-                info['status'] = status
-                info['last_seen'] = last_seen
-                
-                nodes[node_name] = info
+        last_heartbeats = dict(heartbeats)
+        now = time.time()
+        nodes = {
+            node_name: with_liveness(json.loads(info), last_heartbeats.get(node_name), now)
+            for node_name, info in node_data.items()
+        }
         
         return {
             "nodes": nodes,
@@ -190,36 +257,53 @@ async def list_nodes():
         logger.error("list_nodes_error", error=str(e))
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/nodes/live")
+async def list_live_nodes():
+    """Nodes heard from within the warning window (ZSET range, then HMGET)"""
+    try:
+        since = time.time() - WARNING_WINDOW
+        heartbeats = await redis_client.zrangebyscore(HEARTBEATS_KEY, since, "+inf", withscores=True)
+        names = [name for name, _ in heartbeats]
+        infos = await redis_client.hmget(NODES_KEY, names) if names else []
+        
+        now = time.time()
+        nodes = {
+            name: with_liveness(json.loads(info), score, now)
+            for (name, score), info in zip(heartbeats, infos)
+            if info
+        }
+        
+        return {
+            "nodes": nodes,
+            "total": len(nodes),
+            "timestamp": datetime.utcnow().isoformat()
+        }
+        
+    except Exception as e:
+        logger.error("list_live_nodes_error", error=str(e))
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/nodes/register")
 async def register_node(node: NodeInfo):
     """Register or update a node in the registry"""
     try:
-        # Store node info
-        node_key = f'aurora:registry:node:{node.name}:info'
-        await redis_client.set(
-            node_key,
-            json.dumps({
-                "name": node.name,
-                "role": node.role,
-                "vpn_ip": node.vpn_ip,
-                "public_ip": node.public_ip,
-                "capabilities": node.capabilities,
-                "metadata": node.metadata,
-                "registered_at": datetime.utcnow().isoformat()
-            })
-        )
-        
-        # Set last seen
-        last_seen_key = f'aurora:registry:node:{node.name}:lastseen'
-        await redis_client.setex(
-            last_seen_key,
-            180,
-            datetime.utcnow().isoformat()
-        )
+        info = {
+            "name": node.name,
+            "role": node.role,
+            "vpn_ip": node.vpn_ip,
+            "public_ip": node.public_ip,
+            "capabilities": node.capabilities,
+            "metadata": node.metadata,
+            "registered_at": datetime.utcnow().isoformat()
+        }
         
-        # Publish registration event
-        await redis_client.publish(
-            'aurora:events:global',
+        # Store node info, set last seen and publish the registration
+        # (with full info, so router caches never need to call back)
+        pipe = redis_client.pipeline(transaction=True)
+        pipe.hset(NODES_KEY, node.name, json.dumps(info))
+        pipe.zadd(HEARTBEATS_KEY, {node.name: time.time()})
+        pipe.publish(
+            EVENTS_CHANNEL,
             json.dumps({
                 "type": "node_registered",
                 "source_node": NODE_NAME,
@@ -227,10 +311,12 @@ async def register_node(node: NodeInfo):
                 "data": {
                     "node": node.name,
                     "role": node.role,
-                    "vpn_ip": node.vpn_ip
+                    "vpn_ip": node.vpn_ip,
+                    "info": info
                 }
             })
         )
+        await pipe.execute()
         
         logger.info("node_registered", node=node.name, role=node.role)
         
@@ -248,13 +334,23 @@ async def register_node(node: NodeInfo):
 async def node_heartbeat(node_name: str, heartbeat: NodeHeartbeat):
     """Record a node heartbeat"""
     try:
-        # Update last seen
-        last_seen_key = f'aurora:registry:node:{node_name}:lastseen'
-        await redis_client.setex(
-            last_seen_key,
-            180,
-            datetime.utcnow().isoformat()
+        # Update last seen and let router caches know
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.zadd(HEARTBEATS_KEY, {node_name: time.time()})
+        pipe.publish(
+            EVENTS_CHANNEL,
+            json.dumps({
+                "type": "node_heartbeat",
+                "source_node": NODE_NAME,
+                "timestamp": datetime.utcnow().isoformat(),
+                "data": {
+                    "node": node_name,
+                    "status": heartbeat.status,
+                    "recorded": True
+                }
+            })
         )
+        await pipe.execute()
         
         return {
             "status": "ok",
@@ -269,32 +365,16 @@ async def node_heartbeat(node_name: str, heartbeat: NodeHeartbeat):
 async def get_node_info(node_name: str):
     """Get detailed information about a specific node"""
     try:
-        # Get node info
-        node_key = f'aurora:registry:node:{node_name}:info'
-        node_data = await redis_client.get(node_key)
+        # Get node info and last heartbeat
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.hget(NODES_KEY, node_name)
+        pipe.zscore(HEARTBEATS_KEY, node_name)
+        node_data, last_heartbeat = await pipe.execute()
         
         if not node_data:
             raise HTTPException(status_code=404, detail=f"Node {node_name} not found")
         
-        info = json.loads(node_data)
-        
-        # Get last seen
-        last_seen_key = f'aurora:registry:node:{node_name}:lastseen'
-        last_seen = await redis_client.get(last_seen_key)
-        
-        # Determine status
-        status = "offline"
-        if last_seen:
-            last_seen_dt = datetime.fromisoformat(last_seen)
-            if datetime.utcnow() - last_seen_dt < timedelta(minutes=2):
-                status = "active"
-            elif datetime.utcnow() - last_seen_dt < timedelta(minutes=5):
-                status = "warning"
-        
-        info['status'] = status
-        info['last_seen'] = last_seen
-        
-        return info
+        return with_liveness(json.loads(node_data), last_heartbeat)
         
     except HTTPException:
         raise
@@ -6,18 +6,19 @@ Queues requests when nodes are offline and syncs them when connectivity is resto
 
 import os
 import json
+import time
+import random
 import logging
 import asyncio
 import sqlite3
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 import psycopg2
 from psycopg2.extras import RealDictCursor
 import redis
 import httpx
 from fastapi import FastAPI, HTTPException, BackgroundTasks
 from pydantic import BaseModel
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -62,37 +63,63 @@ def get_postgres_connection():
     )
 
 
-def get_local_connection():
-    """Get SQLite connection for offline queue"""
-    conn = sqlite3.connect(LOCAL_QUEUE_DB)
+# Drain tuning
+DRAIN_INTERVAL_SECONDS = float(os.getenv("DRAIN_INTERVAL_SECONDS", "30"))
+DRAIN_BATCH_SIZE = int(os.getenv("DRAIN_BATCH_SIZE", "200"))
+MIN_CONCURRENCY = int(os.getenv("DRAIN_MIN_CONCURRENCY", "1"))
+MAX_CONCURRENCY = int(os.getenv("DRAIN_MAX_CONCURRENCY", "32"))
+AVAILABILITY_TTL_SECONDS = float(os.getenv("AVAILABILITY_TTL_SECONDS", "10"))
+BACKOFF_BASE_SECONDS = float(os.getenv("BACKOFF_BASE_SECONDS", "1"))
+BACKOFF_MAX_SECONDS = float(os.getenv("BACKOFF_MAX_SECONDS", "300"))
+
+SERVICE_HEALTH_URLS = {
+    "chat-backend": "http://chat-backend:8000/health",
+    "priority-surface": "http://priority-surface:8002/health",
+    "secrets-manager": "http://secrets-manager:8003/health",
+    "auth-service": "http://auth-service:8008/health",
+    "robbieblocks-api": "http://robbieblocks-api:8009/health",
+    "training-scheduler": "http://training-scheduler:8010/health",
+    "integration-sync": "http://integration-sync:8000/health",
+    "slack-integration": "http://slack-integration:3003/health",
+    "github-integration": "http://github-integration:3004/health",
+    "fireflies-integration": "http://fireflies-integration:3005/health"
+}
+
+
+def get_local_connection(path: str = LOCAL_QUEUE_DB):
+    """Get SQLite connection for offline queue (WAL mode, autocommit)"""
+    conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
     conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=5000")
     return conn
 
 
-class QueuedRequest(BaseModel):
-    id: str
-    node_name: str
-    service: str
-    method: str
-    url: str
-    headers: Dict
-    data: Any
-    priority: int = 5
-    max_retries: int = 3
-    created_at: datetime
-    retries: int = 0
-    last_error: Optional[str] = None
+def backoff_delay(attempt: int) -> float:
+    """Exponential backoff with full jitter"""
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** attempt)))
 
 
-@fastapi_app.on_event("startup")
-async def startup_event():
-    """Initialize offline queue service"""
-    logger.info(f"📡 Starting Offline Queue Service on {NODE_NAME}...")
+def is_service_fault(error: Optional[str]) -> bool:
+    """4xx means the request itself was rejected; anything else blames the service"""
+    return not (error or "").startswith("HTTP 4")
 
-    # Ensure local SQLite database exists
-    conn = get_local_connection()
-    try:
-        conn.execute("""
+
+class OfflineQueueStore:
+    """Durable request queue on one long-lived SQLite connection in WAL mode"""
+
+    def __init__(self, path: str = LOCAL_QUEUE_DB):
+        self.path = path
+        self.conn: Optional[sqlite3.Connection] = None
+
+    def open(self):
+        if self.conn is not None:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.conn = get_local_connection(self.path)
+
+        self.conn.execute("""
             CREATE TABLE IF NOT EXISTS offline_requests (
                 id TEXT PRIMARY KEY,
                 node_name TEXT NOT NULL,
@@ -109,25 +136,309 @@ async def startup_event():
             )
         """)
 
+        # Queues created before backoff support lack next_attempt_at
+        columns = {row["name"] for row in self.conn.execute("PRAGMA table_info(offline_requests)")}
+        if "next_attempt_at" not in columns:
+            self.conn.execute("ALTER TABLE offline_requests ADD COLUMN next_attempt_at REAL DEFAULT 0")
+
         # Create index for priority-based processing
-        conn.execute("""
+        self.conn.execute("""
             CREATE INDEX IF NOT EXISTS idx_priority_created
             ON offline_requests(priority DESC, created_at ASC)
         """)
 
-        conn.commit()
+        # Per-service drain scans
+        self.conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_service_ready
+            ON offline_requests(service, next_attempt_at, priority DESC, created_at ASC)
+        """)
 
-    finally:
-        conn.close()
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def enqueue(self, request: "QueuedRequest", not_before: float = 0.0):
+        """Durably store a request; not_before holds it back from the drain loop"""
+        self.conn.execute("""
+            INSERT OR REPLACE INTO offline_requests (
+                id, node_name, service, method, url, headers, data,
+                priority, max_retries, retries, created_at, next_attempt_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            request.id,
+            request.node_name,
+            request.service,
+            request.method,
+            request.url,
+            json.dumps(request.headers) if request.headers else "{}",
+            json.dumps(request.data) if request.data else None,
+            request.priority,
+            request.max_retries,
+            request.retries,
+            request.created_at.isoformat(),
+            not_before
+        ))
+
+    def release(self, request_id: str):
+        """Make a held request ready for the drain loop"""
+        self.conn.execute("UPDATE offline_requests SET next_attempt_at = 0 WHERE id = ?", (request_id,))
+
+    def services_with_ready_requests(self, now: float) -> List[str]:
+        rows = self.conn.execute("""
+            SELECT DISTINCT service FROM offline_requests
+            WHERE next_attempt_at <= ?
+        """, (now,))
+        return [row["service"] for row in rows]
+
+    def fetch_ready(self, service: str, now: float, limit: int) -> List[Dict[str, Any]]:
+        rows = self.conn.execute("""
+            SELECT * FROM offline_requests
+            WHERE service = ? AND next_attempt_at <= ?
+            ORDER BY priority DESC, created_at ASC
+            LIMIT ?
+        """, (service, now, limit))
+        return [dict(row) for row in rows]
+
+    def delete_many(self, request_ids: List[str]):
+        if not request_ids:
+            return
+        self.conn.executemany("DELETE FROM offline_requests WHERE id = ?", [(rid,) for rid in request_ids])
+
+    def record_failures(self, failures: List[Dict[str, Any]], now: float) -> List[str]:
+        """Bump retries and schedule the next attempt; returns ids dropped after max retries"""
+        exhausted = [r["id"] for r in failures if r["retries"] + 1 > r["max_retries"]]
+        retry = [r for r in failures if r["retries"] + 1 <= r["max_retries"]]
+
+        self.conn.execute("BEGIN")
+        try:
+            self.conn.executemany("""
+                UPDATE offline_requests
+                SET retries = retries + 1, last_error = ?, next_attempt_at = ?
+                WHERE id = ?
+            """, [
+                (r.get("error") or f"Retry {r['retries'] + 1}", now + backoff_delay(r["retries"] + 1), r["id"])
+                for r in retry
+            ])
+            self.delete_many(exhausted)
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return exhausted
+
+    def complete(self, request_ids: List[str]):
+        self.conn.execute("BEGIN")
+        try:
+            self.delete_many(request_ids)
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+
+class ServiceState:
+    """Cached availability, backoff and adaptive concurrency for one target service"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.available = False
+        self.checked_at = 0.0
+        self.failures = 0
+        self.backoff_until = 0.0
+        self.concurrency = MIN_CONCURRENCY
+        self.probe_lock = asyncio.Lock()
+        self.drain_lock = asyncio.Lock()
+        self.executed = 0
+        self.failed = 0
+
+    def in_backoff(self, now: float) -> bool:
+        return now < self.backoff_until
+
+    def on_batch(self, succeeded: int, failed: int, service_faults: int, now: float):
+        """
+        AIMD on service health: widen while the service copes, halve and
+        back off when it doesn't. Request-level rejections (4xx) only
+        count against the request, not the service.
+        """
+        self.executed += succeeded
+        self.failed += failed
+        attempted = succeeded + service_faults
+        if service_faults <= attempted * 0.1:
+            self.failures = 0
+            self.concurrency = min(MAX_CONCURRENCY, self.concurrency + 1)
+        else:
+            self.failures += 1
+            self.concurrency = max(MIN_CONCURRENCY, self.concurrency // 2)
+            if service_faults > succeeded:
+                self.available = False
+                self.backoff_until = now + backoff_delay(self.failures)
+
+    def to_dict(self, now: float) -> Dict[str, Any]:
+        return {
+            "service": self.name,
+            "available": self.available,
+            "concurrency": self.concurrency,
+            "consecutive_failures": self.failures,
+            "backoff_seconds": round(max(0.0, self.backoff_until - now), 1),
+            "executed": self.executed,
+            "failed": self.failed
+        }
+
+
+class QueueEngine:
+    """Drains the offline queue concurrently per target service"""
+
+    def __init__(self, store: OfflineQueueStore):
+        self.store = store
+        self.services: Dict[str, ServiceState] = {}
+        self.http: Optional[httpx.AsyncClient] = None
+        self.wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def state(self, service: str) -> ServiceState:
+        if service not in self.services:
+            self.services[service] = ServiceState(service)
+        return self.services[service]
+
+    async def start(self):
+        self.store.open()
+        self.http = httpx.AsyncClient(timeout=30.0, limits=httpx.Limits(max_connections=MAX_CONCURRENCY * 4))
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+        if self.http:
+            await self.http.aclose()
+        self.store.close()
+
+    def trigger(self):
+        """Wake the drain loop immediately (new work or a service came back)"""
+        self.wakeup.set()
+
+    async def _run(self):
+        while True:
+            try:
+                self.wakeup.clear()
+                await self.drain()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Offline monitoring error: {e}")
+
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=DRAIN_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    async def is_available(self, service: str) -> bool:
+        """One shared probe per service per AVAILABILITY_TTL_SECONDS"""
+        state = self.state(service)
+        async with state.probe_lock:
+            now = time.monotonic()
+            if now - state.checked_at < AVAILABILITY_TTL_SECONDS:
+                return state.available
+
+            was_available = state.available
+            state.available = await self._probe(service)
+            state.checked_at = time.monotonic()
+
+            if state.available and not was_available:
+                logger.info(f"🔌 {service} is reachable again, draining its queue")
+                state.backoff_until = 0.0
+                self.trigger()
+            return state.available
+
+    async def _probe(self, service: str) -> bool:
+        url = SERVICE_HEALTH_URLS.get(service)
+        if not url:
+            return False
+        try:
+            response = await self.http.get(url, timeout=5.0)
+            return response.status_code == 200
+        except Exception:
+            return False
+
+    async def drain(self):
+        """Drain every service with ready requests, each at its own concurrency"""
+        services = self.store.services_with_ready_requests(time.time())
+        if services:
+            await asyncio.gather(*(self.drain_service(service) for service in services))
+
+    async def drain_service(self, service: str):
+        state = self.state(service)
+        if state.drain_lock.locked():
+            return
+
+        async with state.drain_lock:
+            while True:
+                if state.in_backoff(time.monotonic()) or not await self.is_available(service):
+                    return
+
+                batch = self.store.fetch_ready(service, time.time(), DRAIN_BATCH_SIZE)
+                if not batch:
+                    return
+
+                semaphore = asyncio.Semaphore(state.concurrency)
+
+                async def run(row: Dict[str, Any]):
+                    async with semaphore:
+                        return row, await execute_request(row, self.http)
+
+                results = await asyncio.gather(*(run(row) for row in batch))
+                done = [row["id"] for row, (ok, _) in results if ok]
+                failed = [{**row, "error": error} for row, (ok, error) in results if not ok]
+
+                self.store.complete(done)
+                exhausted = self.store.record_failures(failed, time.time())
+                for request_id in exhausted:
+                    logger.warning(f"❌ Removed request {request_id} after max retries")
+
+                service_faults = sum(1 for row in failed if is_service_fault(row["error"]))
+                state.on_batch(len(done), len(failed), service_faults, time.monotonic())
+                logger.info(f"✅ {service}: executed {len(done)}, failed {len(failed)} "
+                            f"(concurrency {state.concurrency})")
+
+                if state.in_backoff(time.monotonic()) or len(batch) < DRAIN_BATCH_SIZE:
+                    return
+
+
+# Queue engine (single long-lived connection, shared HTTP client)
+queue_engine = QueueEngine(OfflineQueueStore())
+
+
+class QueuedRequest(BaseModel):
+    id: str
+    node_name: str
+    service: str
+    method: str
+    url: str
+    headers: Dict
+    data: Any
+    priority: int = 5
+    max_retries: int = 3
+    created_at: datetime
+    retries: int = 0
+    last_error: Optional[str] = None
 
-    # Start background sync scheduler
-    scheduler = AsyncIOScheduler()
-    scheduler.add_job(sync_offline_requests, 'interval', seconds=30)
-    scheduler.start()
+
+@fastapi_app.on_event("startup")
+async def startup_event():
+    """Initialize offline queue service"""
+    logger.info(f"📡 Starting Offline Queue Service on {NODE_NAME}...")
+
+    # Open the WAL-mode queue and start the drain loop
+    await queue_engine.start()
 
     logger.info("✅ Offline queue service ready")
 
 
+@fastapi_app.on_event("shutdown")
+async def shutdown_event():
+    await queue_engine.stop()
+
+
 @fastapi_app.get("/health")
 async def health_check():
     return {"status": "healthy", "service": "offline-queue", "node": NODE_NAME}
@@ -135,65 +446,77 @@ async def health_check():
 
 @fastapi_app.post("/api/queue/request")
 async def queue_request(request: QueuedRequest):
-    """Queue a request for offline processing"""
+    """Queue a request for offline processing (written ahead, executed if possible)"""
+    state = queue_engine.state(request.service)
     try:
-        # Check if we can reach the service directly
-        if await is_service_available(request.service):
-            # Service is available, execute immediately
-            success = await execute_request(request)
-            if success:
-                return {"status": "executed", "request_id": request.id}
-
-        # Service unavailable or execution failed, queue for later
-        await store_offline_request(request)
+        execute_now = not state.in_backoff(time.monotonic()) and await is_service_available(request.service)
+    except Exception:
+        execute_now = False
+
+    # Durable first: a crash mid-request can't lose it. While we try it
+    # inline, the drain loop is held off so it isn't sent twice.
+    await store_offline_request(request, hold_seconds=60.0 if execute_now else 0.0)
+    if not execute_now:
         return {"status": "queued", "request_id": request.id}
 
+    try:
+        # Service is available, execute immediately
+        success, _ = await execute_request(request.model_dump(mode="json"), queue_engine.http)
+        if success:
+            queue_engine.store.complete([request.id])
+            return {"status": "executed", "request_id": request.id}
+
     except Exception as e:
         logger.error(f"❌ Error queuing request: {e}")
-        # Always store offline as fallback
-        await store_offline_request(request)
-        return {"status": "queued", "request_id": request.id}
+
+    queue_engine.store.release(request.id)
+    return {"status": "queued", "request_id": request.id}
+
+
+@fastapi_app.post("/api/queue/drain")
+async def trigger_drain():
+    """Start a drain pass now instead of waiting for the next interval"""
+    queue_engine.trigger()
+    return {"status": "draining"}
 
 
 @fastapi_app.get("/api/queue/status")
 async def get_queue_status():
     """Get queue status and statistics"""
     try:
-        conn = get_local_connection()
-        try:
-            cursor = conn.cursor()
-
-            # Get total queued requests
-            cursor.execute("SELECT COUNT(*) as total FROM offline_requests")
-            total = cursor.fetchone()["total"]
-
-            # Get requests by service
-            cursor.execute("""
-                SELECT service, COUNT(*) as count
-                FROM offline_requests
-                GROUP BY service
-                ORDER BY count DESC
-            """)
-            by_service = [{"service": row["service"], "count": row["count"]} for row in cursor.fetchall()]
-
-            # Get requests by priority
-            cursor.execute("""
-                SELECT priority, COUNT(*) as count
-                FROM offline_requests
-                GROUP BY priority
-                ORDER BY priority DESC
-            """)
-            by_priority = [{"priority": row["priority"], "count": row["count"]} for row in cursor.fetchall()]
-
-            return {
-                "total_queued": total,
-                "by_service": by_service,
-                "by_priority": by_priority,
-                "node": NODE_NAME
-            }
-
-        finally:
-            conn.close()
+        conn = queue_engine.store.conn
+        cursor = conn.cursor()
+
+        # Get total queued requests
+        cursor.execute("SELECT COUNT(*) as total FROM offline_requests")
+        total = cursor.fetchone()["total"]
+
+        # Get requests by service
+        cursor.execute("""
+            SELECT service, COUNT(*) as count
+            FROM offline_requests
+            GROUP BY service
+            ORDER BY count DESC
+        """)
+        by_service = [{"service": row["service"], "count": row["count"]} for row in cursor.fetchall()]
+
+        # Get requests by priority
+        cursor.execute("""
+            SELECT priority, COUNT(*) as count
+            FROM offline_requests
+            GROUP BY priority
+            ORDER BY priority DESC
+        """)
+        by_priority = [{"priority": row["priority"], "count": row["count"]} for row in cursor.fetchall()]
+
+        now = time.monotonic()
+        return {
+            "total_queued": total,
+            "by_service": by_service,
+            "by_priority": by_priority,
+            "services": [state.to_dict(now) for state in queue_engine.services.values()],
+            "node": NODE_NAME
+        }
 
     except Exception as e:
         logger.error(f"❌ Error getting queue status: {e}")
@@ -204,27 +527,23 @@ async def get_queue_status():
 async def get_queued_requests(service: Optional[str] = None, limit: int = 100):
     """Get queued requests"""
     try:
-        conn = get_local_connection()
-        try:
-            cursor = conn.cursor()
+        conn = queue_engine.store.conn
+        cursor = conn.cursor()
 
-            query = "SELECT * FROM offline_requests WHERE 1=1"
-            params = []
+        query = "SELECT * FROM offline_requests WHERE 1=1"
+        params = []
 
-            if service:
-                query += " AND service = ?"
-                params.append(service)
+        if service:
+            query += " AND service = ?"
+            params.append(service)
 
-            query += " ORDER BY priority DESC, created_at ASC LIMIT ?"
-            params.append(limit)
+        query += " ORDER BY priority DESC, created_at ASC LIMIT ?"
+        params.append(limit)
 
-            cursor.execute(query, params)
-            requests = [dict(row) for row in cursor.fetchall()]
+        cursor.execute(query, params)
+        requests = [dict(row) for row in cursor.fetchall()]
 
-            return {"requests": requests}
-
-        finally:
-            conn.close()
+        return {"requests": requests}
 
     except Exception as e:
         logger.error(f"❌ Error getting queued requests: {e}")
@@ -235,16 +554,8 @@ async def get_queued_requests(service: Optional[str] = None, limit: int = 100):
 async def remove_queued_request(request_id: str):
     """Remove a queued request"""
     try:
-        conn = get_local_connection()
-        try:
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM offline_requests WHERE id = ?", (request_id,))
-            conn.commit()
-
-            return {"status": "removed", "request_id": request_id}
-
-        finally:
-            conn.close()
+        queue_engine.store.complete([request_id])
+        return {"status": "removed", "request_id": request_id}
 
     except Exception as e:
         logger.error(f"❌ Error removing queued request: {e}")
@@ -252,92 +563,43 @@ async def remove_queued_request(request_id: str):
 
 
 async def is_service_available(service: str) -> bool:
-    """Check if a service is available"""
-    service_urls = {
-        "chat-backend": "http://chat-backend:8000/health",
-        "priority-surface": "http://priority-surface:8002/health",
-        "secrets-manager": "http://secrets-manager:8003/health",
-        "auth-service": "http://auth-service:8008/health",
-        "robbieblocks-api": "http://robbieblocks-api:8009/health",
-        "training-scheduler": "http://training-scheduler:8010/health",
-        "integration-sync": "http://integration-sync:8000/health",
-        "slack-integration": "http://slack-integration:3003/health",
-        "github-integration": "http://github-integration:3004/health",
-        "fireflies-integration": "http://fireflies-integration:3005/health"
-    }
-
-    url = service_urls.get(service)
-    if not url:
-        return False
+    """Check if a service is available (cached single probe per service)"""
+    return await queue_engine.is_available(service)
 
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, timeout=5.0)
-            return response.status_code == 200
-    except:
-        return False
 
-
-async def execute_request(request: QueuedRequest) -> bool:
-    """Execute a queued request"""
+async def execute_request(request: Dict[str, Any], client: httpx.AsyncClient) -> Tuple[bool, Optional[str]]:
+    """Execute a queued request on the shared client; returns (success, error)"""
     try:
-        headers = json.loads(request.headers) if request.headers else {}
-
-        async with httpx.AsyncClient() as client:
-            if request.method == "POST":
-                response = await client.post(
-                    request.url,
-                    headers=headers,
-                    json=json.loads(request.data) if request.data else None,
-                    timeout=30.0
-                )
-            elif request.method == "GET":
-                response = await client.get(
-                    request.url,
-                    headers=headers,
-                    timeout=30.0
-                )
-            else:
-                logger.error(f"❌ Unsupported method: {request.method}")
-                return False
-
-            return response.status_code < 400
+        headers = request.get("headers") or {}
+        if isinstance(headers, str):
+            headers = json.loads(headers)
+
+        data = request.get("data")
+        if isinstance(data, str):
+            data = json.loads(data)
+
+        if request["method"] == "POST":
+            response = await client.post(request["url"], headers=headers, json=data, timeout=30.0)
+        elif request["method"] == "GET":
+            response = await client.get(request["url"], headers=headers, timeout=30.0)
+        else:
+            logger.error(f"❌ Unsupported method: {request['method']}")
+            return False, f"Unsupported method: {request['method']}"
+
+        if response.status_code < 400:
+            return True, None
+        return False, f"HTTP {response.status_code}"
 
     except Exception as e:
         logger.error(f"❌ Error executing request: {e}")
-        return False
+        return False, str(e)
 
 
-async def store_offline_request(request: QueuedRequest):
+async def store_offline_request(request: QueuedRequest, hold_seconds: float = 0.0):
     """Store request in offline queue"""
     try:
-        conn = get_local_connection()
-        try:
-            conn.execute("""
-                INSERT OR REPLACE INTO offline_requests (
-                    id, node_name, service, method, url, headers, data,
-                    priority, max_retries, retries, created_at
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                request.id,
-                request.node_name,
-                request.service,
-                request.method,
-                request.url,
-                json.dumps(request.headers) if request.headers else "{}",
-                json.dumps(request.data) if request.data else None,
-                request.priority,
-                request.max_retries,
-                request.retries,
-                request.created_at.isoformat()
-            ))
-
-            conn.commit()
-
-            logger.info(f"📦 Queued request {request.id} for service {request.service}")
-
-        finally:
-            conn.close()
+        queue_engine.store.enqueue(request, time.time() + hold_seconds if hold_seconds else 0.0)
+        logger.info(f"📦 Queued request {request.id} for service {request.service}")
 
     except Exception as e:
         logger.error(f"❌ Error storing offline request: {e}")
@@ -345,68 +607,12 @@ async def store_offline_request(request: QueuedRequest):
 
 async def sync_offline_requests():
     """Sync offline requests when services become available"""
-    try:
-        conn = get_local_connection()
-        try:
-            cursor = conn.cursor()
-
-            # Get requests ordered by priority
-            cursor.execute("""
-                SELECT * FROM offline_requests
-                ORDER BY priority DESC, created_at ASC
-                LIMIT 10
-            """)
-
-            requests = [QueuedRequest(**dict(row)) for row in cursor.fetchall()]
-
-            for request in requests:
-                # Check if service is now available
-                if await is_service_available(request.service):
-                    # Try to execute
-                    if await execute_request(request):
-                        # Success, remove from queue
-                        cursor.execute("DELETE FROM offline_requests WHERE id = ?", (request.id,))
-                        logger.info(f"✅ Executed queued request {request.id}")
-                    else:
-                        # Failed, increment retry count
-                        cursor.execute("""
-                            UPDATE offline_requests
-                            SET retries = retries + 1, last_error = ?
-                            WHERE id = ?
-                        """, (f"Retry {request.retries + 1}", request.id))
-
-                        # Remove if max retries exceeded
-                        if request.retries >= request.max_retries:
-                            cursor.execute("DELETE FROM offline_requests WHERE id = ?", (request.id,))
-                            logger.warning(f"❌ Removed request {request.id} after max retries")
-
-                conn.commit()
-
-        finally:
-            conn.close()
-
-    except Exception as e:
-        logger.error(f"❌ Error syncing offline requests: {e}")
-
-
-async def run_offline_monitoring():
-    """Background task to monitor connectivity and sync requests"""
-    while True:
-        try:
-            await sync_offline_requests()
-            await asyncio.sleep(30)  # Check every 30 seconds
-
-        except Exception as e:
-            logger.error(f"❌ Offline monitoring error: {e}")
-            await asyncio.sleep(60)  # Wait 1 minute before retry
+    await queue_engine.drain()
 
 
 async def main():
     """Main entry point"""
-    # Start offline monitoring in background
-    monitoring_task = asyncio.create_task(run_offline_monitoring())
-
-    # Start FastAPI server
+    # Start FastAPI server (startup event opens the queue and starts draining)
     import uvicorn
     config = uvicorn.Config(fastapi_app, host="0.0.0.0", port=3006)
     server = uvicorn.Server(config)
@@ -416,7 +622,6 @@ async def main():
     except KeyboardInterrupt:
         logger.info("🛑 Shutting down offline queue service...")
     finally:
-        monitoring_task.cancel()
         await server.shutdown()
 
 
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Secrets Manager Client
+Resolves secrets through the Secrets Manager and keeps a short-lived
+in-process cache of the decrypted values, dropped on push when a secret changes
+
+ResolutionCache and listen_for_changes are shared with the Secrets Manager,
+which caches its own resolved rows the same way.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Dict, Optional, Tuple
+
+import httpx
+import redis.asyncio as redis
+
+logger = logging.getLogger(__name__)
+
+SECRETS_MANAGER_URL = os.getenv("SECRETS_MANAGER_URL", "http://secrets-manager:8003")
+SECRETS_CACHE_TTL = float(os.getenv("SECRETS_CACHE_TTL", "60"))  # Seconds; bounds staleness if a push is missed
+SECRETS_CHANNEL = "aurora:secrets:updated"
+
+# (service, key_name, scope, scope_id, node_name): everything resolution depends on
+CacheKey = Tuple[str, str, str, Optional[str], Optional[str]]
+
+
+class ResolutionCache:
+    """
+    Resolved secrets keyed by everything resolution depends on
+    (service, key_name, scope, scope_id, node name), so an override is
+    never served to another node or company
+
+    Invalidation bumps a version (epoch: everything, generations: one
+    secret); a lookup that was in flight during an invalidation passes
+    the version it started with to put() and doesn't cache its answer.
+    """
+
+    def __init__(self, ttl: float = SECRETS_CACHE_TTL):
+        self.ttl = ttl
+        self.entries: Dict[CacheKey, Tuple[float, Dict]] = {}
+        self.epoch = 0
+        self.generations: Dict[Tuple[str, str], int] = {}
+
+    def get(self, key: CacheKey) -> Optional[Dict]:
+        cached = self.entries.get(key)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+        return None
+
+    def version(self, service: str, key_name: str) -> Tuple[int, int]:
+        return self.epoch, self.generations.get((service, key_name), 0)
+
+    def put(self, key: CacheKey, value: Dict, version: Tuple[int, int]):
+        if self.version(key[0], key[1]) == version:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+
+    def invalidate(self, service: str, key_name: str):
+        """Drop every cached resolution of a secret (any scope can change what a lookup resolves to)"""
+        self.generations[(service, key_name)] = self.generations.get((service, key_name), 0) + 1
+        for key in [k for k in self.entries if k[0] == service and k[1] == key_name]:
+            del self.entries[key]
+
+    def invalidate_all(self):
+        self.epoch += 1
+        self.entries.clear()
+
+
+async def listen_for_changes(cache: ResolutionCache, host: str, port: int, password: Optional[str] = None):
+    """Subscribe to secret changes; reconnects, flushing the cache since pushes may have been missed"""
+    while True:
+        client = redis.Redis(host=host, port=port, password=password or None, decode_responses=True)
+        try:
+            pubsub = client.pubsub()
+            await pubsub.subscribe(SECRETS_CHANNEL)
+            cache.invalidate_all()
+            async for message in pubsub.listen():
+                if message["type"] != "message":
+                    continue
+                try:
+                    change = json.loads(message["data"])
+                    cache.invalidate(change["service"], change["key_name"])
+                except (ValueError, KeyError) as e:
+                    logger.warning(f"⚠️ Ignoring malformed secret change: {e}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"⚠️ Secret change listener disconnected: {e}")
+            cache.invalidate_all()
+            await asyncio.sleep(5)
+        finally:
+            await client.aclose()
+
+
+class SecretsClient:
+    """
+    Secrets Manager client with a per-process cache
+
+    Entries are keyed by the full resolution tuple, so a node or company
+    override is never served for another node or company. Plaintext stays
+    in this process's memory; nothing decrypted is written to Redis.
+    """
+
+    def __init__(self,
+                 base_url: str = SECRETS_MANAGER_URL,
+                 node_name: Optional[str] = None,
+                 ttl: float = SECRETS_CACHE_TTL,
+                 redis_host: Optional[str] = None,
+                 redis_port: Optional[int] = None,
+                 redis_password: Optional[str] = None):
+        self.base_url = base_url.rstrip("/")
+        self.node_name = node_name or os.getenv("NODE_NAME")
+        self.ttl = ttl
+        self.redis_host = redis_host or os.getenv("REDIS_HOST", "redis")
+        self.redis_port = redis_port or int(os.getenv("REDIS_PORT", "6379"))
+        self.redis_password = redis_password or os.getenv("REDIS_PASSWORD") or None
+
+        self.cache = ResolutionCache(ttl)
+        self.http: Optional[httpx.AsyncClient] = None
+        self.listener: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Open the HTTP client and start listening for secret changes"""
+        headers = {"X-Node-Name": self.node_name} if self.node_name else {}
+        self.http = httpx.AsyncClient(base_url=self.base_url, headers=headers, timeout=5.0)
+        self.listener = asyncio.create_task(
+            listen_for_changes(self.cache, self.redis_host, self.redis_port, self.redis_password)
+        )
+
+    async def close(self):
+        if self.listener:
+            self.listener.cancel()
+        if self.http:
+            await self.http.aclose()
+        self.cache.invalidate_all()
+
+    # ============================================
+    # LOOKUPS
+    # ============================================
+
+    async def get_secret(self, service: str, key_name: str,
+                         scope: str = "global", scope_id: Optional[str] = None) -> Optional[Dict]:
+        """Resolved secret (as returned by the manager), or None if there isn't one"""
+        key = (service, key_name, scope, scope_id, self.node_name)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        version = self.cache.version(service, key_name)
+        params = {"scope": scope}
+        if scope_id:
+            params["scope_id"] = scope_id
+        response = await self.http.get(f"/api/secrets/{service}/{key_name}", params=params)
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+
+        secret = response.json()
+        self.cache.put(key, secret, version)
+        return secret
+
+    async def get(self, service: str, key_name: str, default: Optional[str] = None,
+                  scope: str = "global", scope_id: Optional[str] = None) -> Optional[str]:
+        """Just the value"""
+        secret = await self.get_secret(service, key_name, scope, scope_id)
+        return secret["key_value"] if secret else default
+
+    async def load_service(self, service: str,
+                           scope: str = "global", scope_id: Optional[str] = None) -> Dict[str, str]:
+        """
+        Fetch every secret of a service in one call and cache them all
+        (call at startup); returns {key_name: value}
+        """
+        epoch, generations = self.cache.epoch, dict(self.cache.generations)
+        params = {"scope": scope}
+        if scope_id:
+            params["scope_id"] = scope_id
+        response = await self.http.get(f"/api/services/{service}/secrets", params=params)
+        response.raise_for_status()
+
+        secrets = response.json()["secrets"]
+        for key_name, secret in secrets.items():
+            self.cache.put((service, key_name, scope, scope_id, self.node_name), secret,
+                           (epoch, generations.get((service, key_name), 0)))
+
+        logger.info(f"✅ Loaded {len(secrets)} secrets for {service}")
+        return {key_name: secret["key_value"] for key_name, secret in secrets.items()}
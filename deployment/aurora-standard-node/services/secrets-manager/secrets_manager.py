@@ -6,18 +6,21 @@ Centrally manages API credentials with node-level overrides and connectivity sta
 
 import os
 import json
+import asyncio
 import logging
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any
 from cryptography.fernet import Fernet
-import psycopg2
 from psycopg2.extras import RealDictCursor
+from psycopg2.pool import ThreadedConnectionPool
 import redis
 from fastapi import FastAPI, HTTPException, Header
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import httpx
 
+from secrets_client import SECRETS_CHANNEL, ResolutionCache, listen_for_changes
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -40,6 +43,8 @@ POSTGRES_PORT = int(os.getenv("POSTGRES_PORT", "5432"))
 POSTGRES_DB = os.getenv("POSTGRES_DB", "aurora_unified")
 POSTGRES_USER = os.getenv("POSTGRES_USER", "aurora_app")
 POSTGRES_PASSWORD = os.getenv("POSTGRES_PASSWORD", "")
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
 
 REDIS_HOST = os.getenv("REDIS_HOST", "redis")
 REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
@@ -58,16 +63,73 @@ redis_client = redis.Redis(
 )
 
 
+# Candidate scopes for a lookup, ranked most specific first:
+# node override (X-Node-Name), company override (scope=company), global
+SCOPE_CANDIDATES = """
+    ((scope = 'node' AND scope_id = %(node_name)s)
+     OR (scope = 'company' AND %(scope)s = 'company' AND scope_id = %(scope_id)s)
+     OR scope = 'global')
+"""
+SCOPE_RANK = "CASE scope WHEN 'node' THEN 0 WHEN 'company' THEN 1 ELSE 2 END"
+
+# Resolved rows are cached this long for callers that hit the HTTP API directly
+RESOLVE_CACHE_TTL = float(os.getenv("SECRETS_RESOLVE_CACHE_TTL", "30"))
+
+db_pool: Optional[ThreadedConnectionPool] = None
+
+
+# Resolved rows keep the encrypted value and each hit decrypts it: no
+# plaintext outlives a request. Writes on this replica and pushes from
+# other replicas (SECRETS_CHANNEL) drop every cached resolution of the
+# changed secret.
+resolution_cache = ResolutionCache(RESOLVE_CACHE_TTL)
+
+
 def get_db_connection():
-    """Get PostgreSQL connection"""
-    return psycopg2.connect(
-        host=POSTGRES_HOST,
-        port=POSTGRES_PORT,
-        database=POSTGRES_DB,
-        user=POSTGRES_USER,
-        password=POSTGRES_PASSWORD,
-        cursor_factory=RealDictCursor
-    )
+    """Get a pooled PostgreSQL connection (hand it back with release_db_connection)"""
+    global db_pool
+    if db_pool is None:
+        db_pool = ThreadedConnectionPool(
+            DB_POOL_MIN,
+            DB_POOL_MAX,
+            host=POSTGRES_HOST,
+            port=POSTGRES_PORT,
+            database=POSTGRES_DB,
+            user=POSTGRES_USER,
+            password=POSTGRES_PASSWORD,
+            cursor_factory=RealDictCursor
+        )
+    return db_pool.getconn()
+
+
+def release_db_connection(conn):
+    """Return a connection to the pool (an open transaction is rolled back)"""
+    db_pool.putconn(conn)
+
+
+def secret_response(service: str, key_name: str, row: Dict) -> Dict:
+    """Decrypted secret as returned by the API"""
+    return {
+        "service": service,
+        "key_name": key_name,
+        "key_value": cipher.decrypt(row['key_value_encrypted'].encode()).decode(),
+        "scope": row['scope'],
+        "scope_id": row['scope_id'],
+        "metadata": row['metadata'],
+        "override_applied": row['scope'] if row['scope'] in ("node", "company") else None
+    }
+
+
+def publish_secret_change(service: str, key_name: str, scope: str, scope_id: Optional[str]):
+    """Tell clients and other replicas a secret changed; they drop every cached resolution of it"""
+    resolution_cache.invalidate(service, key_name)
+    redis_client.publish(SECRETS_CHANNEL, json.dumps({
+        "service": service,
+        "key_name": key_name,
+        "scope": scope,
+        "scope_id": scope_id,
+        "timestamp": datetime.utcnow().isoformat()
+    }))
 
 
 # Pydantic models
@@ -149,7 +211,9 @@ async def startup_event():
         logger.info("✅ Database tables initialized")
         
     finally:
-        conn.close()
+        release_db_connection(conn)
+    
+    asyncio.create_task(listen_for_changes(resolution_cache, REDIS_HOST, REDIS_PORT, REDIS_PASSWORD))
 
 
 @app.get("/health")
@@ -193,17 +257,8 @@ async def create_secret(secret: SecretCreate, x_node_name: Optional[str] = Heade
                 result = cur.fetchone()
                 conn.commit()
                 
-                # Invalidate cache
-                cache_key = f"secret:{secret.service}:{secret.key_name}:{secret.scope}:{secret.scope_id or 'none'}"
-                redis_client.delete(cache_key)
-                
-                # Publish event
-                redis_client.publish("aurora:secrets:updated", json.dumps({
-                    "service": secret.service,
-                    "key_name": secret.key_name,
-                    "scope": secret.scope,
-                    "timestamp": datetime.utcnow().isoformat()
-                }))
+                # Publish event (clients invalidate their caches)
+                publish_secret_change(secret.service, secret.key_name, secret.scope, secret.scope_id)
                 
                 return {
                     "success": True,
@@ -212,13 +267,67 @@ async def create_secret(secret: SecretCreate, x_node_name: Optional[str] = Heade
                 }
                 
         finally:
-            conn.close()
+            release_db_connection(conn)
             
     except Exception as e:
         logger.error(f"Error creating secret: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.put("/api/secrets/{service}/{key_name}")
+async def update_secret(
+    service: str,
+    key_name: str,
+    update: SecretUpdate
+):
+    """Update the value and/or metadata of the secret at scope/scope_id (default global)"""
+    try:
+        scope = update.scope or "global"
+        assignments = ["updated_at = NOW()"]
+        params = []
+        
+        if update.key_value is not None:
+            assignments.append("key_value_encrypted = %s")
+            params.append(cipher.encrypt(update.key_value.encode()).decode())
+        
+        if update.metadata is not None:
+            assignments.append("metadata = %s")
+            params.append(json.dumps(update.metadata))
+        
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(f"""
+                    UPDATE secrets SET {", ".join(assignments)}
+                    WHERE service = %s AND key_name = %s
+                      AND scope = %s AND scope_id IS NOT DISTINCT FROM %s
+                    RETURNING id
+                """, params + [service, key_name, scope, update.scope_id])
+                
+                result = cur.fetchone()
+                if not result:
+                    raise HTTPException(status_code=404, detail="Secret not found")
+                conn.commit()
+                
+                # Publish event (clients invalidate their caches)
+                publish_secret_change(service, key_name, scope, update.scope_id)
+                
+                return {
+                    "success": True,
+                    "secret_id": result['id'],
+                    "message": "Secret updated successfully"
+                }
+                
+        finally:
+            release_db_connection(conn)
+            
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error updating secret: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.get("/api/secrets/{service}/{key_name}")
 async def get_secret(
     service: str,
@@ -228,105 +337,48 @@ async def get_secret(
     x_node_name: Optional[str] = Header(None)
 ):
     """
-    Get a secret with override logic:
-    1. Check for node-specific override (scope=node, scope_id=node_name)
-    2. Check for company-specific override (scope=company, scope_id=company_id)
+    Get a secret with override logic, resolved in one query:
+    1. Node-specific override (scope=node, scope_id=node_name)
+    2. Company-specific override (scope=company, scope_id=company_id)
     3. Fall back to global secret
+    
+    Resolved rows are cached (still encrypted) for RESOLVE_CACHE_TTL;
+    services using secrets_client.SecretsClient also cache on their side.
     """
+    cache_key = (service, key_name, scope, scope_id, x_node_name)
+    cached = resolution_cache.get(cache_key)
+    if cached is not None:
+        return secret_response(service, key_name, cached)
+    
+    version = resolution_cache.version(service, key_name)
     try:
-        # Check cache first
-        cache_key = f"secret:{service}:{key_name}:{scope}:{scope_id or 'none'}"
-        cached = redis_client.get(cache_key)
-        if cached:
-            return json.loads(cached)
-        
         conn = get_db_connection()
         try:
             with conn.cursor() as cur:
-                # Try node-specific first
-                if x_node_name:
-                    cur.execute("""
-                        SELECT key_value_encrypted, metadata, scope, scope_id
-                        FROM secrets
-                        WHERE service = %s AND key_name = %s 
-                          AND scope = 'node' AND scope_id = %s
-                        ORDER BY updated_at DESC
-                        LIMIT 1
-                    """, (service, key_name, x_node_name))
-                    
-                    result = cur.fetchone()
-                    if result:
-                        decrypted = cipher.decrypt(result['key_value_encrypted'].encode()).decode()
-                        response = {
-                            "service": service,
-                            "key_name": key_name,
-                            "key_value": decrypted,
-                            "scope": result['scope'],
-                            "scope_id": result['scope_id'],
-                            "metadata": result['metadata'],
-                            "override_applied": "node"
-                        }
-                        
-                        # Cache for 5 minutes
-                        redis_client.setex(cache_key, 300, json.dumps(response))
-                        return response
-                
-                # Try company-specific if scope_id provided
-                if scope == "company" and scope_id:
-                    cur.execute("""
-                        SELECT key_value_encrypted, metadata, scope, scope_id
-                        FROM secrets
-                        WHERE service = %s AND key_name = %s 
-                          AND scope = 'company' AND scope_id = %s
-                        ORDER BY updated_at DESC
-                        LIMIT 1
-                    """, (service, key_name, scope_id))
-                    
-                    result = cur.fetchone()
-                    if result:
-                        decrypted = cipher.decrypt(result['key_value_encrypted'].encode()).decode()
-                        response = {
-                            "service": service,
-                            "key_name": key_name,
-                            "key_value": decrypted,
-                            "scope": result['scope'],
-                            "scope_id": result['scope_id'],
-                            "metadata": result['metadata'],
-                            "override_applied": "company"
-                        }
-                        
-                        redis_client.setex(cache_key, 300, json.dumps(response))
-                        return response
-                
-                # Fall back to global
-                cur.execute("""
+                cur.execute(f"""
                     SELECT key_value_encrypted, metadata, scope, scope_id
                     FROM secrets
-                    WHERE service = %s AND key_name = %s AND scope = 'global'
-                    ORDER BY updated_at DESC
+                    WHERE service = %(service)s AND key_name = %(key_name)s
+                      AND {SCOPE_CANDIDATES}
+                    ORDER BY {SCOPE_RANK}, updated_at DESC
                     LIMIT 1
-                """, (service, key_name))
+                """, {
+                    "service": service,
+                    "key_name": key_name,
+                    "node_name": x_node_name,
+                    "scope": scope,
+                    "scope_id": scope_id
+                })
                 
                 result = cur.fetchone()
-                if result:
-                    decrypted = cipher.decrypt(result['key_value_encrypted'].encode()).decode()
-                    response = {
-                        "service": service,
-                        "key_name": key_name,
-                        "key_value": decrypted,
-                        "scope": result['scope'],
-                        "scope_id": result['scope_id'],
-                        "metadata": result['metadata'],
-                        "override_applied": None
-                    }
-                    
-                    redis_client.setex(cache_key, 300, json.dumps(response))
-                    return response
+                if not result:
+                    raise HTTPException(status_code=404, detail="Secret not found")
                 
-                raise HTTPException(status_code=404, detail="Secret not found")
+                resolution_cache.put(cache_key, dict(result), version)
+                return secret_response(service, key_name, result)
                 
         finally:
-            conn.close()
+            release_db_connection(conn)
             
     except HTTPException:
         raise
@@ -335,6 +387,54 @@ async def get_secret(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/services/{service}/secrets")
+async def get_service_secrets(
+    service: str,
+    scope: str = "global",
+    scope_id: Optional[str] = None,
+    x_node_name: Optional[str] = Header(None)
+):
+    """
+    Every secret of a service, each resolved with the same override logic
+    as get_secret, in one query (for loading a service's config at startup)
+    """
+    try:
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(f"""
+                    SELECT DISTINCT ON (key_name)
+                           key_name, key_value_encrypted, metadata, scope, scope_id
+                    FROM secrets
+                    WHERE service = %(service)s
+                      AND {SCOPE_CANDIDATES}
+                    ORDER BY key_name, {SCOPE_RANK}, updated_at DESC
+                """, {
+                    "service": service,
+                    "node_name": x_node_name,
+                    "scope": scope,
+                    "scope_id": scope_id
+                })
+                
+                rows = cur.fetchall()
+                
+                return {
+                    "service": service,
+                    "secrets": {
+                        row['key_name']: secret_response(service, row['key_name'], row)
+                        for row in rows
+                    },
+                    "total": len(rows)
+                }
+                
+        finally:
+            release_db_connection(conn)
+            
+    except Exception as e:
+        logger.error(f"Error getting secrets for {service}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.get("/api/secrets")
 async def list_secrets(
     service: Optional[str] = None,
@@ -383,7 +483,7 @@ async def list_secrets(
                 }
                 
         finally:
-            conn.close()
+            release_db_connection(conn)
             
     except Exception as e:
         logger.error(f"Error listing secrets: {e}")
@@ -436,7 +536,7 @@ async def update_connectivity_status(
                 return {"success": True, "message": "Status updated"}
                 
         finally:
-            conn.close()
+            release_db_connection(conn)
             
     except Exception as e:
         logger.error(f"Error updating connectivity status: {e}")
@@ -501,7 +601,7 @@ async def get_connectivity_status(service: Optional[str] = None):
                 }
                 
         finally:
-            conn.close()
+            release_db_connection(conn)
             
     except Exception as e:
         logger.error(f"Error getting connectivity status: {e}")
@@ -542,7 +642,7 @@ async def get_overall_health():
                 }
                 
         finally:
-            conn.close()
+            release_db_connection(conn)
             
     except Exception as e:
         logger.error(f"Error getting overall health: {e}")
@@ -6,7 +6,9 @@ Provides templates and automation for adding new capabilities
 """
 
 import os
+import hmac
 import json
+import keyword
 import logging
 import asyncio
 from datetime import datetime
@@ -14,11 +16,13 @@ from typing import Dict, List, Optional, Any
 from pathlib import Path
 import httpx
 import redis
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Depends, Header
 from pydantic import BaseModel, Field
 from jinja2 import Template
 import uuid
 
+from skill_runtime import SkillRuntime, SkillError
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -29,6 +33,11 @@ app = FastAPI(title="Skill Manager", version="1.0.0")
 # Configuration
 REDIS_URL = os.getenv("REDIS_URL", "redis://:aurora_password@redis-sentinel-aurora:26379")
 ROBBIE_AGENT_URL = os.getenv("ROBBIE_AGENT_URL", "http://robbie-agent:8018")
+SKILL_MANAGER_URL = os.getenv("SKILL_MANAGER_URL", "http://skill-manager:8019")
+API_KEY = os.getenv("API_KEY", "")  # required on endpoints that change or run skill code
+
+# Skill hash fields stored as JSON (Redis hashes only hold strings)
+SKILL_JSON_FIELDS = ("capabilities", "parameters")
 
 # Redis client
 redis_client = redis.from_url(REDIS_URL, decode_responses=True)
@@ -71,7 +80,9 @@ class SkillManager:
     
     def __init__(self):
         self.skill_templates = {}
+        self.compiled_templates: Dict[str, Template] = {}
         self.deployments = {}
+        self.runtime = SkillRuntime()
         self._load_skill_templates()
     
     def _load_skill_templates(self):
@@ -424,6 +435,10 @@ async def handle_webhook(parameters: Dict[str, Any]) -> Dict[str, Any]:
             else:
                 skill_code = self._generate_custom_skill_code(request)
             
+            # Compile, validate and swap into the runtime (the previous version keeps
+            # serving if this raises)
+            loaded = self.runtime.load(request.skill_id, skill_code)
+            
             # Create skill definition
             skill_definition = {
                 "skill_id": request.skill_id,
@@ -434,6 +449,7 @@ async def handle_webhook(parameters: Dict[str, Any]) -> Dict[str, Any]:
                 "capabilities": request.capabilities,
                 "parameters": request.parameters,
                 "code": skill_code,
+                "version": loaded.version,
                 "created_at": datetime.now().isoformat(),
                 "status": "created"
             }
@@ -441,12 +457,12 @@ async def handle_webhook(parameters: Dict[str, Any]) -> Dict[str, Any]:
             # Store in Redis
             redis_client.hset(
                 f"skill:{request.skill_id}",
-                mapping=skill_definition
+                mapping=self._encode_skill(skill_definition)
             )
             
             # Deploy to Robbie Agent if requested
             if request.auto_deploy:
-                deployment_result = await self._deploy_skill_to_robbie(request)
+                deployment_result = await self._deploy_skill_to_robbie(skill_definition)
                 skill_definition["deployment"] = deployment_result
             
             logger.info(f"✅ Created skill: {request.name} ({request.skill_id})")
@@ -456,14 +472,20 @@ async def handle_webhook(parameters: Dict[str, Any]) -> Dict[str, Any]:
                 "skill_definition": skill_definition
             }
             
+        except SkillError as e:
+            logger.error(f"❌ Invalid skill code for {request.skill_id}: {e}")
+            return {"success": False, "error": str(e)}
         except Exception as e:
             logger.error(f"❌ Error creating skill: {e}")
             return {"success": False, "error": str(e)}
     
     def _generate_skill_code(self, template: SkillTemplate, request: NewSkillRequest) -> str:
         """Generate skill code from template"""
-        # Use Jinja2 to render template with parameters
-        template_obj = Template(template.template_code)
+        # Use Jinja2 to render template with parameters (each template is parsed once)
+        template_obj = self.compiled_templates.get(template.template_id)
+        if template_obj is None:
+            template_obj = Template(template.template_code)
+            self.compiled_templates[template.template_id] = template_obj
         
         # Prepare template variables
         template_vars = {
@@ -477,18 +499,26 @@ async def handle_webhook(parameters: Dict[str, Any]) -> Dict[str, Any]:
         return template_obj.render(**template_vars)
     
     def _generate_custom_skill_code(self, request: NewSkillRequest) -> str:
-        """Generate custom skill code without template"""
+        """
+        Generate custom skill code without template. Request fields only
+        ever land in the code as literals (repr) or JSON inside comments,
+        so they can't add statements of their own.
+        """
+        name = request.skill_id.replace('-', '_')
+        if not name.isidentifier() or keyword.iskeyword(name):
+            raise SkillError(f"Skill id {request.skill_id!r} can't be used as a function name")
+        
         return f"""
-async def {request.skill_id.replace('-', '_')}(parameters: Dict[str, Any]) -> Dict[str, Any]:
-    \"\"\"{request.description}\"\"\"
+async def {name}(parameters: Dict[str, Any]) -> Dict[str, Any]:
+    {request.description!r}
     try:
-        # Custom implementation for {request.name}
-        # Parameters: {request.parameters}
+        # Custom implementation for {json.dumps(request.name)}
+        # Parameters: {json.dumps(request.parameters)}
         
         # Call service endpoint
         async with httpx.AsyncClient() as client:
             response = await client.post(
-                "{request.service_endpoint}",
+                {request.service_endpoint!r},
                 json=parameters,
                 timeout=30.0
             )
@@ -502,28 +532,30 @@ async def {request.skill_id.replace('-', '_')}(parameters: Dict[str, Any]) -> Di
         return {{"success": False, "error": str(e)}}
 """
     
-    async def _deploy_skill_to_robbie(self, request: NewSkillRequest) -> Dict[str, Any]:
-        """Deploy skill to Robbie Agent"""
+    async def _deploy_skill_to_robbie(self, skill: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Register a skill with Robbie Agent. Robbie invokes it through this
+        service's runtime, so later versions swap in without touching Robbie.
+        """
         try:
-            # Create ServiceSkill object
-            from robbie_agent import ServiceSkill
-            
-            skill = ServiceSkill(
-                skill_id=request.skill_id,
-                name=request.name,
-                description=request.description,
-                service_endpoint=request.service_endpoint,
-                capabilities=request.capabilities,
-                confidence_threshold=0.7,
-                cost_estimate=0.0,
-                time_estimate_seconds=30
-            )
+            # ServiceSkill fields
+            payload = {
+                "skill_id": skill["skill_id"],
+                "name": skill["name"],
+                "description": skill["description"],
+                "service_endpoint": f"{SKILL_MANAGER_URL}/api/skills/{skill['skill_id']}/invoke",
+                "capabilities": skill["capabilities"],
+                "confidence_threshold": 0.7,
+                "cost_estimate": 0.0,
+                "time_estimate_seconds": 30
+            }
             
             # Send to Robbie Agent
             async with httpx.AsyncClient() as client:
                 response = await client.post(
                     f"{ROBBIE_AGENT_URL}/api/skills/add",
-                    json=skill.dict(),
+                    json=payload,
+                    headers={"X-API-Key": API_KEY},
                     timeout=10.0
                 )
                 
@@ -535,6 +567,14 @@ async def {request.skill_id.replace('-', '_')}(parameters: Dict[str, Any]) -> Di
         except Exception as e:
             return {"deployed": False, "error": str(e)}
     
+    @staticmethod
+    def _encode_skill(skill: Dict[str, Any]) -> Dict[str, Any]:
+        return {k: json.dumps(v) if k in SKILL_JSON_FIELDS else v for k, v in skill.items()}
+    
+    @staticmethod
+    def _decode_skill(skill: Dict[str, Any]) -> Dict[str, Any]:
+        return {k: json.loads(v) if k in SKILL_JSON_FIELDS else v for k, v in skill.items()}
+    
     async def get_skill_templates(self) -> List[SkillTemplate]:
         """Get available skill templates"""
         return list(self.skill_templates.values())
@@ -542,7 +582,7 @@ async def {request.skill_id.replace('-', '_')}(parameters: Dict[str, Any]) -> Di
     async def get_skill(self, skill_id: str) -> Optional[Dict[str, Any]]:
         """Get a specific skill"""
         skill_data = redis_client.hgetall(f"skill:{skill_id}")
-        return skill_data if skill_data else None
+        return self._decode_skill(skill_data) if skill_data else None
     
     async def list_skills(self) -> List[Dict[str, Any]]:
         """List all created skills"""
@@ -550,13 +590,34 @@ async def {request.skill_id.replace('-', '_')}(parameters: Dict[str, Any]) -> Di
         for key in redis_client.scan_iter("skill:*"):
             skill_data = redis_client.hgetall(key)
             if skill_data:
-                skills.append(skill_data)
+                skills.append(self._decode_skill(skill_data))
         return skills
     
+    async def preload_skills(self):
+        """Compile (or load cached bytecode for) every stored skill so first calls are warm"""
+        loaded = 0
+        for skill in await self.list_skills():
+            if not skill.get("code"):
+                continue
+            try:
+                self.runtime.load(skill["skill_id"], skill["code"])
+                loaded += 1
+            except SkillError as e:
+                logger.error(f"❌ Could not preload skill {skill['skill_id']}: {e}")
+        logger.info(f"✅ Preloaded {loaded} skills")
+    
+    async def reload_skill(self, skill_id: str) -> Optional[Dict[str, Any]]:
+        """Swap in the stored version of a skill (e.g. after another replica updated it)"""
+        skill = await self.get_skill(skill_id)
+        if not skill:
+            return None
+        return self.runtime.load(skill_id, skill["code"]).stats()
+    
     async def delete_skill(self, skill_id: str) -> bool:
         """Delete a skill"""
         try:
             redis_client.delete(f"skill:{skill_id}")
+            self.runtime.unload(skill_id)
             logger.info(f"✅ Deleted skill: {skill_id}")
             return True
         except Exception as e:
@@ -566,9 +627,20 @@ async def {request.skill_id.replace('-', '_')}(parameters: Dict[str, Any]) -> Di
 # Initialize skill manager
 skill_manager = SkillManager()
 
+async def verify_api_key(x_api_key: str = Header(...)):
+    """Verify the shared service API key; nothing gets in while API_KEY is unset"""
+    if not API_KEY or not hmac.compare_digest(x_api_key, API_KEY):
+        logger.warning("⚠️ Rejected skill request with an invalid API key")
+        raise HTTPException(status_code=401, detail="Invalid API key")
+    return x_api_key
+
 @app.on_event("startup")
 async def startup():
     """Initialize skill manager"""
+    try:
+        await skill_manager.preload_skills()
+    except Exception as e:
+        logger.error(f"❌ Skill preload failed: {e}")
     logger.info("🔧 Skill Manager initialized")
 
 @app.get("/health")
@@ -577,7 +649,8 @@ async def health_check():
     return {
         "status": "healthy",
         "service": "skill-manager",
-        "templates_available": len(skill_manager.skill_templates)
+        "templates_available": len(skill_manager.skill_templates),
+        "skills_loaded": len(skill_manager.runtime.skills)
     }
 
 @app.get("/api/templates")
@@ -586,7 +659,7 @@ async def get_templates():
     templates = await skill_manager.get_skill_templates()
     return {"templates": [template.dict() for template in templates]}
 
-@app.post("/api/skills/create")
+@app.post("/api/skills/create", dependencies=[Depends(verify_api_key)])
 async def create_skill(request: NewSkillRequest):
     """Create a new skill"""
     result = await skill_manager.create_skill(request)
@@ -610,7 +683,7 @@ async def get_skill(skill_id: str):
     else:
         raise HTTPException(status_code=404, detail="Skill not found")
 
-@app.delete("/api/skills/{skill_id}")
+@app.delete("/api/skills/{skill_id}", dependencies=[Depends(verify_api_key)])
 async def delete_skill(skill_id: str):
     """Delete a skill"""
     success = await skill_manager.delete_skill(skill_id)
@@ -619,30 +692,48 @@ async def delete_skill(skill_id: str):
     else:
         raise HTTPException(status_code=500, detail="Failed to delete skill")
 
-@app.post("/api/skills/{skill_id}/deploy")
+@app.post("/api/skills/{skill_id}/deploy", dependencies=[Depends(verify_api_key)])
 async def deploy_skill(skill_id: str):
     """Deploy a skill to Robbie Agent"""
     skill = await skill_manager.get_skill(skill_id)
     if not skill:
         raise HTTPException(status_code=404, detail="Skill not found")
     
-    # Create deployment request
-    from robbie_agent import ServiceSkill
-    
-    skill_obj = ServiceSkill(
-        skill_id=skill["skill_id"],
-        name=skill["name"],
-        description=skill["description"],
-        service_endpoint=skill["service_endpoint"],
-        capabilities=skill["capabilities"],
-        confidence_threshold=0.7,
-        cost_estimate=0.0,
-        time_estimate_seconds=30
-    )
-    
-    result = await skill_manager._deploy_skill_to_robbie(skill_obj)
+    result = await skill_manager._deploy_skill_to_robbie(skill)
     return result
 
+@app.post("/api/skills/{skill_id}/invoke", dependencies=[Depends(verify_api_key)])
+async def invoke_skill(skill_id: str, parameters: Dict[str, Any]):
+    """Run a loaded skill (the endpoint Robbie Agent calls for deployed skills)"""
+    try:
+        return await skill_manager.runtime.invoke(skill_id, parameters)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Skill not loaded")
+
+@app.post("/api/skills/{skill_id}/reload", dependencies=[Depends(verify_api_key)])
+async def reload_skill(skill_id: str):
+    """Swap in the stored version of a skill"""
+    try:
+        stats = await skill_manager.reload_skill(skill_id)
+    except SkillError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if stats is None:
+        raise HTTPException(status_code=404, detail="Skill not found")
+    return stats
+
+@app.get("/api/skills/{skill_id}/stats")
+async def get_skill_stats(skill_id: str):
+    """Invocation latency and error counts for a loaded skill"""
+    skill = skill_manager.runtime.skills.get(skill_id)
+    if not skill:
+        raise HTTPException(status_code=404, detail="Skill not loaded")
+    return skill.stats()
+
+@app.get("/api/runtime/stats")
+async def get_runtime_stats():
+    """Loaded skills, bytecode cache hits and per-skill invocation stats"""
+    return skill_manager.runtime.stats()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8019)
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Skill Runtime
+Compiles generated skill code once, caches the bytecode by content hash
+and keeps every skill loaded, ready to invoke and swappable in place
+"""
+
+import __future__
+import ast
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import marshal
+import os
+import secrets
+import stat
+import sys
+import time
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from types import CodeType
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Private to the service user (0700); bytecode in it is HMAC-signed with a key kept alongside
+SKILL_CACHE_DIR = Path(os.getenv("SKILL_CACHE_DIR", Path.home() / ".cache" / "skill-bytecode"))
+SKILL_WORKERS = int(os.getenv("SKILL_WORKERS", "32"))  # concurrent invocations across all skills
+LATENCY_WINDOW = 1000  # recent invocation latencies kept per skill
+
+# Names generated skill code uses without importing them
+SKILL_GLOBALS = {
+    "asyncio": asyncio,
+    "datetime": datetime,
+    "httpx": httpx,
+    "json": json,
+    "Any": Any,
+    "Dict": Dict,
+}
+
+
+class SkillError(Exception):
+    """Skill code that can't be compiled or loaded"""
+
+
+class LoadedSkill:
+    """A compiled skill's entrypoint plus its invocation counters"""
+
+    def __init__(self, skill_id: str, version: str, entrypoint: Callable):
+        self.skill_id = skill_id
+        self.version = version
+        self.entrypoint = entrypoint
+        self.loaded_at = datetime.now().isoformat()
+
+        self.invocations = 0
+        self.errors = 0
+        self.last_error: Optional[str] = None
+        self.latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+
+    def stats(self) -> Dict[str, Any]:
+        latencies = sorted(self.latencies)
+        return {
+            "skill_id": self.skill_id,
+            "version": self.version,
+            "entrypoint": self.entrypoint.__name__,
+            "loaded_at": self.loaded_at,
+            "invocations": self.invocations,
+            "errors": self.errors,
+            "last_error": self.last_error,
+            "latency_ms": {
+                "p50": latencies[len(latencies) // 2] if latencies else None,
+                "p95": latencies[int(len(latencies) * 0.95)] if latencies else None,
+                "max": latencies[-1] if latencies else None
+            }
+        }
+
+
+class SkillRuntime:
+    """
+    Loaded skills by id
+
+    A skill is compiled and validated before it replaces the loaded version
+    (a single dict assignment), so callers only ever see a complete skill and
+    invocations already running finish on the version they started with.
+    """
+
+    def __init__(self, cache_dir: Path = SKILL_CACHE_DIR, workers: int = SKILL_WORKERS):
+        self.cache_dir: Optional[Path] = cache_dir
+        self.cache_key = b""
+        self.skills: Dict[str, LoadedSkill] = {}
+        self.code_cache: Dict[str, Tuple[str, CodeType]] = {}  # content hash -> (entrypoint, bytecode)
+        self.slots = asyncio.Semaphore(workers)
+        self.cache_stats = {"memory_hits": 0, "disk_hits": 0, "compiles": 0, "rejected": 0}
+
+        try:
+            self.cache_key = self._open_cache_dir(cache_dir)
+        except (OSError, SkillError) as e:
+            self.cache_dir = None
+            logger.warning(f"⚠️ Skill bytecode cache directory unavailable, caching in memory only: {e}")
+
+    @staticmethod
+    def _open_cache_dir(cache_dir: Path) -> bytes:
+        """
+        Create the cache directory 0700 and return its signing key. A directory
+        someone else owns or can write to is refused: whoever can plant files
+        there could otherwise get code run by this service.
+        """
+        cache_dir.mkdir(mode=0o700, parents=True, exist_ok=True)
+        info = cache_dir.lstat()
+        if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+            raise SkillError(f"{cache_dir} must be a directory owned by this user with mode 0700")
+
+        key_path = cache_dir / "signing.key"
+        try:
+            fd = os.open(key_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            key = key_path.read_bytes()
+            if len(key) != 32:
+                raise SkillError(f"{key_path} is not a signing key")
+            return key
+        key = secrets.token_bytes(32)
+        with os.fdopen(fd, "wb") as f:
+            f.write(key)
+        return key
+
+    # ============================================
+    # LOADING
+    # ============================================
+
+    def load(self, skill_id: str, source: str) -> LoadedSkill:
+        """Compile (or reuse) a skill's code and swap it in; raises SkillError if it isn't valid"""
+        version = hashlib.sha256(source.encode()).hexdigest()
+        current = self.skills.get(skill_id)
+        if current and current.version == version:
+            return current
+
+        name, code = self._bytecode(version, source)
+        namespace = dict(SKILL_GLOBALS)
+        try:
+            exec(code, namespace)
+        except Exception as e:
+            raise SkillError(f"Skill {skill_id} failed to load: {e}") from e
+
+        skill = LoadedSkill(skill_id, version, namespace[name])
+        self.skills[skill_id] = skill
+
+        logger.info(f"✅ Loaded skill {skill_id} ({version[:12]})")
+        return skill
+
+    def unload(self, skill_id: str):
+        self.skills.pop(skill_id, None)
+
+    def _bytecode(self, version: str, source: str) -> Tuple[str, CodeType]:
+        """Validated bytecode for a source hash: memory, then disk, then compile"""
+        compiled = self.code_cache.get(version)
+        if compiled is not None:
+            self.cache_stats["memory_hits"] += 1
+            return compiled
+
+        compiled = self._read_cached(version)
+        if compiled is None:
+            compiled = self._compile(version, source)
+            self._write_cached(version, compiled)
+
+        self.code_cache[version] = compiled
+        return compiled
+
+    def _cache_path(self, version: str) -> Path:
+        return self.cache_dir / f"{version}.{sys.implementation.cache_tag}.bin"
+
+    def _signature(self, version: str, payload: bytes) -> bytes:
+        # The source hash is signed too, so a valid file can't be renamed to another skill
+        return hmac.new(self.cache_key, version.encode() + b"\0" + payload, hashlib.sha256).digest()
+
+    def _read_cached(self, version: str) -> Optional[Tuple[str, CodeType]]:
+        """Signed bytecode from disk; anything missing, unsigned or malformed is a miss"""
+        if self.cache_dir is None:
+            return None
+        try:
+            data = self._cache_path(version).read_bytes()
+        except OSError:
+            return None
+
+        signature, payload = data[:32], data[32:]
+        if not hmac.compare_digest(signature, self._signature(version, payload)):
+            self.cache_stats["rejected"] += 1
+            logger.warning(f"⚠️ Ignoring skill bytecode with a bad signature ({version[:12]})")
+            return None
+        try:
+            compiled = marshal.loads(payload)
+        except (ValueError, EOFError, TypeError):
+            self.cache_stats["rejected"] += 1
+            return None
+        if not (isinstance(compiled, tuple) and len(compiled) == 2
+                and isinstance(compiled[0], str) and isinstance(compiled[1], CodeType)):
+            self.cache_stats["rejected"] += 1
+            return None
+
+        self.cache_stats["disk_hits"] += 1
+        return compiled
+
+    def _write_cached(self, version: str, compiled: Tuple[str, CodeType]):
+        """Only validated code is ever written, and the name is the hash of the source"""
+        if self.cache_dir is None:
+            return
+        path = self._cache_path(version)
+        try:
+            payload = marshal.dumps(compiled)
+            # Write-then-rename so a concurrent reader never sees half a file
+            tmp = path.with_suffix(f".{os.getpid()}.tmp")
+            tmp.write_bytes(self._signature(version, payload) + payload)
+            tmp.replace(path)
+        except OSError as e:
+            logger.warning(f"⚠️ Could not cache skill bytecode: {e}")
+
+    def _compile(self, version: str, source: str) -> Tuple[str, CodeType]:
+        name = self._entrypoint_name(source)
+        self.cache_stats["compiles"] += 1
+        # Annotations stay strings, so defining the functions evaluates nothing
+        return name, compile(source, f"<skill {version[:12]}>", "exec",
+                             flags=__future__.annotations.compiler_flag, dont_inherit=True)
+
+    @staticmethod
+    def _entrypoint_name(source: str) -> str:
+        """
+        The skill's entrypoint: its one top-level async function, taking the
+        parameters dict. Only imports and plain function definitions may sit
+        at top level. Decorators and default values run when a function is
+        defined, so they're rejected, and annotations are compiled unevaluated.
+        Loading a skill therefore runs its imports and none of its own logic.
+        """
+        try:
+            tree = ast.parse(source)
+        except SyntaxError as e:
+            raise SkillError(f"Skill code does not parse: {e}") from e
+
+        entrypoints = []
+        for node in tree.body:
+            if isinstance(node, ast.AsyncFunctionDef):
+                entrypoints.append(node)
+            elif isinstance(node, ast.Expr) and isinstance(node.value, ast.Constant) and isinstance(node.value.value, str):
+                continue  # docstring
+            elif not isinstance(node, (ast.Import, ast.ImportFrom, ast.FunctionDef)):
+                raise SkillError(f"Skill code may only define functions, found {type(node).__name__} on line {node.lineno}")
+
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                if node.decorator_list:
+                    raise SkillError(f"Skill function {node.name} may not have decorators (line {node.lineno})")
+                if node.args.defaults or any(default is not None for default in node.args.kw_defaults):
+                    raise SkillError(f"Skill function {node.name} may not have default values (line {node.lineno})")
+
+        if len(entrypoints) != 1:
+            raise SkillError(f"Skill code must define exactly one async function, found {len(entrypoints)}")
+        if len(entrypoints[0].args.args) != 1:
+            raise SkillError(f"Skill entrypoint {entrypoints[0].name} must take a single parameters argument")
+        return entrypoints[0].name
+
+    # ============================================
+    # INVOCATION
+    # ============================================
+
+    async def invoke(self, skill_id: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        """Run a loaded skill; KeyError if there is no such skill"""
+        skill = self.skills[skill_id]
+
+        async with self.slots:
+            started = time.monotonic()
+            try:
+                result = await skill.entrypoint(parameters)
+            except Exception as e:
+                skill.errors += 1
+                skill.last_error = str(e)
+                result = {"success": False, "error": str(e)}
+            else:
+                if isinstance(result, dict) and result.get("success") is False:
+                    skill.errors += 1
+                    skill.last_error = str(result.get("error"))
+            finally:
+                skill.invocations += 1
+                skill.latencies.append(round((time.monotonic() - started) * 1000, 2))
+
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "skills_loaded": len(self.skills),
+            "bytecode_cache": {**self.cache_stats, "entries": len(self.code_cache)},
+            "skills": {skill_id: skill.stats() for skill_id, skill in self.skills.items()}
+        }
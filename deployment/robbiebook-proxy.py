@@ -8,15 +8,186 @@ import aiohttp
 import aiofiles
 import hashlib
 import json
+import sqlite3
 import time
 import os
-import re
-from datetime import datetime, timedelta
-from urllib.parse import urlparse, urljoin
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+from http import HTTPStatus
 from pathlib import Path
-import mimetypes
-import gzip
-import base64
+
+# Hop-by-hop and body-framing headers we never store or replay
+# (aiohttp has already decoded the body, so Content-Encoding no longer applies)
+STRIP_HEADERS = {'transfer-encoding', 'connection', 'keep-alive', 'content-length',
+                 'content-encoding', 'proxy-connection'}
+
+
+def parse_cache_control(value):
+    """'public, max-age=600' -> {'public': True, 'max-age': '600'}"""
+    directives = {}
+    for part in (value or '').split(','):
+        name, _, arg = part.strip().partition('=')
+        if name:
+            directives[name.lower()] = arg.strip('"') if arg else True
+    return directives
+
+
+class CacheIndex:
+    """
+    In-memory index of cached bodies, persisted to SQLite
+    
+    Entries are kept in an OrderedDict in least-recently-used order, so hits
+    and LRU eviction never touch the disk. Access times and hit counts are
+    written back in batches by flush(). Inserts and evictions are written
+    immediately.
+    """
+    
+    def __init__(self, db_path, max_bytes, policy='lru'):
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.counters = {'hits': 0, 'misses': 0, 'revalidated': 0, 'bytes_saved': 0, 'evictions': 0}
+        self._dirty = set()
+        
+        self.db = sqlite3.connect(db_path, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                status_code INTEGER NOT NULL,
+                headers TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                stored_at REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        self.db.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        
+        for row in self.db.execute("SELECT * FROM entries ORDER BY last_access"):
+            entry = self._from_row(row)
+            self.entries[entry['key']] = entry
+            self.total_bytes += entry['size']
+        for name, value in self.db.execute("SELECT name, value FROM counters"):
+            self.counters[name] = value
+    
+    @staticmethod
+    def _from_row(row):
+        key, url, size, status_code, headers, etag, last_modified, stored_at, expires_at, last_access, hits = row
+        return {
+            'key': key, 'url': url, 'size': size, 'status_code': status_code,
+            'headers': json.loads(headers), 'etag': etag, 'last_modified': last_modified,
+            'stored_at': stored_at, 'expires_at': expires_at, 'last_access': last_access, 'hits': hits
+        }
+    
+    def get(self, key):
+        return self.entries.get(key)
+    
+    def record_hit(self, key, revalidated=False):
+        entry = self.entries[key]
+        entry['hits'] += 1
+        entry['last_access'] = time.time()
+        self.entries.move_to_end(key)
+        self._dirty.add(key)
+        self.counters['hits'] += 1
+        self.counters['bytes_saved'] += entry['size']
+        if revalidated:
+            self.counters['revalidated'] += 1
+    
+    def record_miss(self):
+        self.counters['misses'] += 1
+    
+    def refresh(self, key, expires_at, headers):
+        """A 304 revalidation extended a stale entry"""
+        entry = self.entries[key]
+        entry['expires_at'] = expires_at
+        entry['headers'].update(headers)
+        self._dirty.add(key)
+    
+    def put(self, entry):
+        """Index a stored body; returns keys evicted to stay within the byte budget"""
+        old = self.entries.pop(entry['key'], None)
+        if old:
+            self.total_bytes -= old['size']
+        self.entries[entry['key']] = entry
+        self.total_bytes += entry['size']
+        self._save(entry)
+        return self.evict()
+    
+    def remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry:
+            self.total_bytes -= entry['size']
+            self._dirty.discard(key)
+            self.db.execute("DELETE FROM entries WHERE key = ?", (key,))
+    
+    def evict(self):
+        """Drop entries until under budget: least recently used, or least often used (then oldest)"""
+        if self.total_bytes <= self.max_bytes:
+            return []
+        
+        if self.policy == 'lfu':
+            victims = iter(sorted(self.entries.values(), key=lambda e: (e['hits'], e['last_access'])))
+        else:
+            victims = iter(list(self.entries.values()))
+        
+        # Evict down to 90% so a full cache doesn't evict on every store
+        target = self.max_bytes * 0.9
+        evicted = []
+        while self.total_bytes > target:
+            entry = next(victims)
+            self.entries.pop(entry['key'])
+            self.total_bytes -= entry['size']
+            self._dirty.discard(entry['key'])
+            evicted.append(entry['key'])
+        
+        self.db.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key in evicted])
+        self.counters['evictions'] += len(evicted)
+        return evicted
+    
+    def _save(self, entry):
+        self.db.execute("""
+            INSERT OR REPLACE INTO entries
+            (key, url, size, status_code, headers, etag, last_modified, stored_at, expires_at, last_access, hits)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (entry['key'], entry['url'], entry['size'], entry['status_code'], json.dumps(entry['headers']),
+              entry['etag'], entry['last_modified'], entry['stored_at'], entry['expires_at'],
+              entry['last_access'], entry['hits']))
+    
+    def flush(self):
+        """Write back batched access times, hit counts and counters"""
+        rows = [
+            (e['last_access'], e['hits'], e['expires_at'], json.dumps(e['headers']), key)
+            for key in self._dirty if (e := self.entries.get(key))
+        ]
+        self._dirty.clear()
+        self.db.execute("BEGIN")
+        self.db.executemany(
+            "UPDATE entries SET last_access = ?, hits = ?, expires_at = ?, headers = ? WHERE key = ?", rows
+        )
+        self.db.executemany("INSERT OR REPLACE INTO counters (name, value) VALUES (?, ?)",
+                            list(self.counters.items()))
+        self.db.execute("COMMIT")
+    
+    def stats(self):
+        lookups = self.counters['hits'] + self.counters['misses']
+        return {
+            **self.counters,
+            'hit_rate': self.counters['hits'] / lookups if lookups else 0.0,
+            'entries': len(self.entries),
+            'bytes': self.total_bytes,
+            'max_bytes': self.max_bytes
+        }
+    
+    def close(self):
+        self.flush()
+        self.db.close()
+
 
 class RobbieBookProxy:
     """Transparent proxy for RobbieBook1 with aggressive caching"""
@@ -27,116 +198,117 @@ class RobbieBookProxy:
         self.cache_dir = Path(cache_dir)
         self.cache_dir.mkdir(exist_ok=True)
         
-        # Cache statistics
+        # Request statistics (cache hit/miss/bytes saved live in the index)
         self.stats = {
             'requests': 0,
-            'cache_hits': 0,
-            'cache_misses': 0,
-            'bytes_saved': 0,
             'start_time': time.time()
         }
         
         # Cache configuration
         self.cache_config = {
-            'max_age': 86400 * 7,  # 7 days
+            'max_age': 86400 * 7,  # 7 days, when the origin doesn't say
             'max_size': 1024 * 1024 * 1024,  # 1GB
-            'compress': True,
+            'eviction': 'lru',  # or 'lfu'
+            'flush_interval': 30,  # seconds between index write-backs
             'aggressive_cache': True
         }
         
+        self.index = CacheIndex(
+            str(self.cache_dir / 'index.db'),
+            self.cache_config['max_size'],
+            self.cache_config['eviction']
+        )
+        self._remove_orphans()
+        self.session = None
+        
         print(f"🚀 RobbieBook1.testpilot.ai Proxy Starting...")
         print(f"   Host: {self.host}:{self.port}")
         print(f"   Cache: {self.cache_dir}")
         print(f"   Max Age: {self.cache_config['max_age']} seconds")
         print(f"   Max Size: {self.cache_config['max_size'] / (1024*1024):.1f} MB")
+        print(f"   Indexed: {len(self.index.entries)} entries, {self.index.total_bytes / (1024*1024):.1f} MB")
     
-    def get_cache_path(self, url):
-        """Generate cache file path for URL"""
-        url_hash = hashlib.md5(url.encode()).hexdigest()
-        return self.cache_dir / f"{url_hash}.cache"
+    def cache_key(self, url):
+        """Cache key (and body file name) for URL"""
+        return hashlib.md5(url.encode()).hexdigest()
     
-    def get_meta_path(self, url):
-        """Generate metadata file path for URL"""
-        url_hash = hashlib.md5(url.encode()).hexdigest()
-        return self.cache_dir / f"{url_hash}.meta"
+    def get_cache_path(self, key):
+        """Body file path for a cache key"""
+        return self.cache_dir / f"{key}.cache"
     
-    async def is_cached(self, url):
-        """Check if URL is cached and still valid"""
-        cache_path = self.get_cache_path(url)
-        meta_path = self.get_meta_path(url)
-        
-        if not cache_path.exists() or not meta_path.exists():
-            return False
-        
-        try:
-            async with aiofiles.open(meta_path, 'r') as f:
-                metadata = json.loads(await f.read())
-            
-            # Check if cache is expired
-            if time.time() - metadata['timestamp'] > self.cache_config['max_age']:
-                return False
-            
-            # Check if cache file exists and has content
-            if not cache_path.exists() or cache_path.stat().st_size == 0:
-                return False
-            
-            return True
-        except:
-            return False
+    def _remove_orphans(self):
+        """Delete bodies the index doesn't know (and old-format .meta files)"""
+        removed = 0
+        for path in self.cache_dir.iterdir():
+            if path.suffix == '.meta' or (path.suffix == '.cache' and path.stem not in self.index.entries):
+                path.unlink(missing_ok=True)
+                removed += 1
+        if removed:
+            print(f"🧹 Removed {removed} unindexed cache files")
+    
+    def _evict_files(self, keys):
+        for key in keys:
+            self.get_cache_path(key).unlink(missing_ok=True)
+        if keys:
+            print(f"🗑️ Evicted {len(keys)} entries ({self.index.total_bytes / (1024*1024):.1f} MB cached)")
     
-    async def get_cached_content(self, url):
-        """Retrieve cached content"""
-        cache_path = self.get_cache_path(url)
-        meta_path = self.get_meta_path(url)
+    def freshness(self, headers):
+        """Expiry time from Cache-Control / Expires, or None if the response must not be stored"""
+        lower = {k.lower(): v for k, v in headers.items()}
+        directives = parse_cache_control(lower.get('cache-control'))
+        if 'no-store' in directives or 'private' in directives:
+            return None
         
-        try:
-            async with aiofiles.open(meta_path, 'r') as f:
-                metadata = json.loads(await f.read())
-            
-            async with aiofiles.open(cache_path, 'rb') as f:
-                content = await f.read()
-            
-            # Decompress if needed
-            if metadata.get('compressed', False):
-                content = gzip.decompress(content)
-            
-            return content, metadata
-        except Exception as e:
-            print(f"❌ Cache read error: {e}")
-            return None, None
+        now = time.time()
+        if 'no-cache' in directives:
+            return now  # stored, but revalidated on every use
+        for name in ('s-maxage', 'max-age'):
+            if name in directives:
+                try:
+                    return now + int(directives[name])
+                except ValueError:
+                    pass
+        if 'expires' in lower:
+            try:
+                return parsedate_to_datetime(lower['expires']).timestamp()
+            except (TypeError, ValueError):
+                return now
+        return now + self.cache_config['max_age']
     
-    async def cache_content(self, url, content, headers, status_code):
-        """Cache content with metadata"""
-        cache_path = self.get_cache_path(url)
-        meta_path = self.get_meta_path(url)
+    async def cache_content(self, key, url, content, headers, status_code):
+        """Write body to disk (atomically) and index it"""
+        expires_at = self.freshness(headers)
+        if expires_at is None:
+            return
         
+        cache_path = self.get_cache_path(key)
+        tmp_path = cache_path.with_suffix('.tmp')
         try:
-            # Prepare metadata
-            metadata = {
-                'url': url,
-                'timestamp': time.time(),
-                'status_code': status_code,
-                'headers': dict(headers),
-                'size': len(content),
-                'compressed': False
-            }
-            
-            # Compress content if enabled
-            if self.cache_config['compress'] and len(content) > 1024:
-                content = gzip.compress(content)
-                metadata['compressed'] = True
-            
-            # Write cache file
-            async with aiofiles.open(cache_path, 'wb') as f:
+            async with aiofiles.open(tmp_path, 'wb') as f:
                 await f.write(content)
+            os.replace(tmp_path, cache_path)
             
-            # Write metadata
-            async with aiofiles.open(meta_path, 'w') as f:
-                await f.write(json.dumps(metadata, indent=2))
+            lower = {k.lower(): v for k, v in headers.items()}
+            now = time.time()
+            evicted = self.index.put({
+                'key': key,
+                'url': url,
+                'size': len(content),
+                'status_code': status_code,
+                'headers': {k: v for k, v in headers.items() if k.lower() not in STRIP_HEADERS},
+                'etag': lower.get('etag'),
+                'last_modified': lower.get('last-modified'),
+                'stored_at': now,
+                'expires_at': expires_at,
+                'last_access': now,
+                'hits': 0
+            })
+            self._evict_files(evicted)
             
             print(f"💾 Cached: {url[:60]}... ({len(content)} bytes)")
-            
+        
         except Exception as e:
+            tmp_path.unlink(missing_ok=True)
             print(f"❌ Cache write error: {e}")
     
     async def should_cache(self, url, headers, status_code):
@@ -167,41 +339,77 @@ class RobbieBookProxy:
         return True
     
     async def fetch_url(self, url, method='GET', headers=None, data=None):
-        """Fetch URL with caching"""
+        """
+        Fetch URL with caching
+        
+        Returns (status_code, headers, body, cache_path, cache_status). Cache
+        hits come back with body None and the path of the cached file, so
+        the caller can stream it straight to the socket.
+        """
         self.stats['requests'] += 1
+        headers = {k: v for k, v in (headers or {}).items() if k not in STRIP_HEADERS}
+        
+        cacheable = method == 'GET'
+        key = self.cache_key(url) if cacheable else None
+        entry = self.index.get(key) if cacheable else None
+        if entry and not self.get_cache_path(key).exists():
+            self.index.remove(key)
+            entry = None
         
-        # Check cache first
-        if await self.is_cached(url):
+        # Fresh hit
+        if entry and entry['expires_at'] > time.time():
             print(f"🎯 Cache HIT: {url[:60]}...")
-            self.stats['cache_hits'] += 1
-            content, metadata = await self.get_cached_content(url)
-            if content:
-                return content, metadata['headers'], metadata['status_code']
+            self.index.record_hit(key)
+            return entry['status_code'], entry['headers'], None, self.get_cache_path(key), 'HIT'
+        
+        # Stale entry with a validator: ask the origin whether it changed
+        if entry and (entry['etag'] or entry['last_modified']):
+            if entry['etag']:
+                headers['if-none-match'] = entry['etag']
+            if entry['last_modified']:
+                headers['if-modified-since'] = entry['last_modified']
         
         print(f"🌐 Fetching: {url[:60]}...")
-        self.stats['cache_misses'] += 1
         
         # Fetch from internet
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.request(
-                    method, url, 
-                    headers=headers, 
-                    data=data,
-                    timeout=aiohttp.ClientTimeout(total=30)
-                ) as response:
-                    content = await response.read()
-                    response_headers = dict(response.headers)
-                    
-                    # Cache if appropriate
-                    if await self.should_cache(url, response_headers, response.status):
-                        await self.cache_content(url, content, response_headers, response.status)
-                    
-                    return content, response_headers, response.status
-                    
+            async with self.session.request(
+                method, url,
+                headers=headers,
+                data=data,
+                timeout=aiohttp.ClientTimeout(total=30)
+            ) as response:
+                response_headers = dict(response.headers)
+                
+                if entry and response.status == 304:
+                    expires_at = self.freshness(response_headers) or time.time()
+                    self.index.refresh(key, expires_at, {
+                        k: v for k, v in response_headers.items()
+                        if k.lower() in ('cache-control', 'expires', 'etag', 'last-modified', 'date')
+                    })
+                    print(f"♻️ Revalidated: {url[:60]}...")
+                    self.index.record_hit(key, revalidated=True)
+                    return entry['status_code'], entry['headers'], None, self.get_cache_path(key), 'REVALIDATED'
+                
+                content = await response.read()
+                if cacheable:
+                    self.index.record_miss()
+                
+                # Cache if appropriate
+                if cacheable and await self.should_cache(url, response_headers, response.status):
+                    await self.cache_content(key, url, content, response_headers, response.status)
+                
+                return response.status, response_headers, content, None, 'MISS'
+        
         except Exception as e:
             print(f"❌ Fetch error: {e}")
-            return None, {}, 500
+            return 500, {}, None, None, 'MISS'
+    
+    async def send_file(self, writer, path):
+        """Stream a cached body to the client (os.sendfile where the transport allows)"""
+        loop = asyncio.get_running_loop()
+        with open(path, 'rb') as f:
+            await loop.sendfile(writer.transport, f)
     
     async def handle_request(self, reader, writer):
         """Handle incoming HTTP request"""
@@ -211,18 +419,16 @@ class RobbieBookProxy:
             if not request_line:
                 return
             
-            request_str = request_line.decode().strip()
             method, url, version = request_line.decode().strip().split()
             
             # Read headers
             headers = {}
             while True:
                 line = await reader.readline()
-                if line == b'\r\n':
+                if line in (b'\r\n', b'\n', b''):
                     break
-                if line:
-                    key, value = line.decode().strip().split(': ', 1)
-                    headers[key.lower()] = value
+                key, value = line.decode().strip().split(': ', 1)
+                headers[key.lower()] = value
             
             # Parse URL
             if url.startswith('http://') or url.startswith('https://'):
@@ -234,42 +440,58 @@ class RobbieBookProxy:
             print(f"📥 {method} {full_url}")
             
             # Fetch content
-            content, response_headers, status_code = await self.fetch_url(
+            status_code, response_headers, content, cache_path, cache_status = await self.fetch_url(
                 full_url, method, headers
             )
             
-            if content is None:
+            if content is None and cache_path is None:
                 # Send error response
                 error_response = b"HTTP/1.1 500 Internal Server Error\r\n\r\nProxy Error"
                 writer.write(error_response)
                 await writer.drain()
                 return
             
+            size = cache_path.stat().st_size if cache_path else len(content)
+            
             # Prepare response
-            response_line = f"HTTP/1.1 {status_code} OK\r\n"
+            try:
+                reason = HTTPStatus(status_code).phrase
+            except ValueError:
+                reason = 'OK'
+            response_line = f"HTTP/1.1 {status_code} {reason}\r\n"
             
             # Add headers
             response_headers_str = ""
             for key, value in response_headers.items():
-                if key.lower() not in ['transfer-encoding', 'connection']:
+                if key.lower() not in STRIP_HEADERS:
                     response_headers_str += f"{key}: {value}\r\n"
             
             # Add proxy headers
+            response_headers_str += f"Content-Length: {size}\r\n"
             response_headers_str += "X-RobbieBook-Proxy: 1.0\r\n"
-            response_headers_str += f"X-Cache-Status: {'HIT' if self.stats['cache_hits'] > 0 else 'MISS'}\r\n"
+            response_headers_str += f"X-Cache-Status: {cache_status}\r\n"
             response_headers_str += "Connection: close\r\n"
             
             # Send response
-            response = response_line.encode() + response_headers_str.encode() + b"\r\n" + content
-            writer.write(response)
-            await writer.drain()
-            
+            writer.write(response_line.encode() + response_headers_str.encode() + b"\r\n")
+            if cache_path:
+                await writer.drain()
+                await self.send_file(writer, cache_path)
+            else:
+                writer.write(content)
+                await writer.drain()
+        
         except Exception as e:
             print(f"❌ Request error: {e}")
         finally:
             writer.close()
             await writer.wait_closed()
     
+    async def _flush_index_loop(self):
+        while True:
+            await asyncio.sleep(self.cache_config['flush_interval'])
+            self.index.flush()
+    
     async def start_server(self):
         """Start the proxy server"""
         print(f"🚀 Starting RobbieBook1 Proxy Server...")
@@ -278,9 +500,13 @@ class RobbieBookProxy:
         print(f"   Press Ctrl+C to stop")
         print()
         
+        # One pooled client session instead of a new connection per request
+        self.session = aiohttp.ClientSession(auto_decompress=True)
+        flusher = asyncio.create_task(self._flush_index_loop())
+        
         server = await asyncio.start_server(
-            self.handle_request, 
-            self.host, 
+            self.handle_request,
+            self.host,
             self.port
         )
         
@@ -291,27 +517,31 @@ class RobbieBookProxy:
         
         try:
             await server.serve_forever()
-        except KeyboardInterrupt:
+        except (KeyboardInterrupt, asyncio.CancelledError):
             print("\n🛑 Stopping RobbieBook1 Proxy...")
             server.close()
             await server.wait_closed()
+        finally:
+            flusher.cancel()
+            await self.session.close()
+            self.index.close()
             self.print_stats()
     
     def print_stats(self):
         """Print cache statistics"""
         uptime = time.time() - self.stats['start_time']
-        hit_rate = (self.stats['cache_hits'] / self.stats['requests'] * 100) if self.stats['requests'] > 0 else 0
+        cache = self.index.stats()
         
         print(f"\n📊 RobbieBook1 Proxy Statistics")
         print(f"   Uptime: {uptime:.1f} seconds")
         print(f"   Total Requests: {self.stats['requests']}")
-        print(f"   Cache Hits: {self.stats['cache_hits']} ({hit_rate:.1f}%)")
-        print(f"   Cache Misses: {self.stats['cache_misses']}")
+        print(f"   Cache Hits: {cache['hits']} ({cache['hit_rate'] * 100:.1f}%, {cache['revalidated']} revalidated)")
+        print(f"   Cache Misses: {cache['misses']}")
+        print(f"   Bytes Saved: {cache['bytes_saved'] / (1024*1024):.1f} MB")
+        print(f"   Evictions: {cache['evictions']}")
         print(f"   Cache Directory: {self.cache_dir}")
-        
-        # Calculate cache size
-        cache_size = sum(f.stat().st_size for f in self.cache_dir.glob('*.cache'))
-        print(f"   Cache Size: {cache_size / (1024*1024):.1f} MB")
+        print(f"   Cache Size: {cache['bytes'] / (1024*1024):.1f} MB in {cache['entries']} entries "
+              f"(limit {cache['max_bytes'] / (1024*1024):.0f} MB)")
 
 async def main():
     """Main function"""
@@ -332,12 +562,3 @@ if __name__ == "__main__":
         asyncio.run(main())
     except KeyboardInterrupt:
         print("\n👋 RobbieBook1 Proxy stopped!")
-
-
-
-
-
-
-
-
-
@@ -0,0 +1,526 @@
+#!/usr/bin/env python3
+"""
+HYBRID MEMORY ENGINE
+Local keyword + vector memory search shared by the Robbie MCP server and
+the Python Cursor memory
+
+- SQLite FTS5 index (BM25) kept in sync with the memory table by triggers
+- On-disk vector index: float32 memmap plus an IVF coarse quantizer, so a
+  query only scans the few clusters nearest to it
+- Reciprocal-rank fusion of the keyword and vector result lists
+- Batched access-count updates
+
+Vectors are optional: without numpy, or with no embeddings stored, search
+falls back to BM25 alone.
+"""
+
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # keyword-only search without numpy
+    np = None
+
+RRF_K = 60  # standard reciprocal-rank-fusion constant
+
+# Query terms in more than this share of memories are dropped (they barely
+# move BM25 and make every query score most of the table)
+COMMON_TERM_RATIO = 0.05
+MAX_QUERY_TERMS = 12
+# BM25 costs a few microseconds per matching document; past this many
+# matches a query falls back to the newest hits for its rarest term.
+# Tables no bigger than the budget are always ranked with every term.
+RANKED_DOC_BUDGET = 2000
+DOC_COUNT_REFRESH = 1.1  # recount a term's documents once the table grows 10%
+DOC_COUNT_CACHE_MIN = 1000  # rarer terms are cheap to count, so they're never cached
+DOC_COUNT_CACHE_SIZE = 50000
+
+# IVF layout: brute force until IVF_TRAIN_AT vectors, then ~2*sqrt(n) clusters.
+# Reaching IVF_TRAIN_AT, or growing IVF_RETRAIN_FACTOR-fold past the last
+# training, flags needs_training; callers run train() off their hot path
+# (it re-assigns every vector), and search stays brute force until then.
+IVF_TRAIN_AT = 10000
+IVF_RETRAIN_FACTOR = 8
+IVF_NPROBE = 12
+IVF_TRAIN_SAMPLE = 50000
+IVF_TRAIN_ITERATIONS = 6
+
+
+def rrf_fuse(*rankings: Sequence[int], k: int = RRF_K) -> List[Tuple[int, float]]:
+    """Reciprocal-rank fusion of ranked id lists -> [(id, score)] best first"""
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda pair: pair[1], reverse=True)
+
+
+class VectorIndex:
+    """
+    On-disk vector index with IVF search
+
+    Every vector is appended (L2-normalised, float32) to a raw memmap that
+    is the source of truth for training. Once IVF_TRAIN_AT vectors exist,
+    k-means centroids partition them and each vector is also copied into
+    its cluster's bucket in a second memmap. Buckets are contiguous runs
+    with spare room, so a query reads a handful of contiguous slices
+    instead of gathering rows from all over the file. A full bucket is
+    moved to the end of the file with double the room.
+    """
+
+    def __init__(self, path: Path, nprobe: int = IVF_NPROBE):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.nprobe = nprobe
+        self.meta_path = self.path.with_suffix(".json")
+        meta = json.loads(self.meta_path.read_text()) if self.meta_path.exists() else {}
+        self.dim: Optional[int] = meta.get("dim")
+        self.capacity: int = meta.get("capacity", 0)
+        self.count: int = meta.get("count", 0)
+        self.trained_at: int = meta.get("trained_at", 0)
+
+        self.vectors = self.row_ids = None
+        self.centroids = None
+        self.buckets = self.bucket_ids = None
+        self.bucket_start = self.bucket_size = self.bucket_cap = None
+        self.bucket_end = 0
+        self.bucketed = 0  # raw slots [0, bucketed) are in buckets
+        self._unsaved = 0
+        self._lock = threading.Lock()
+
+        if self.dim:
+            self.vectors, self.row_ids = self._open_pair(".f32", ".ids", self.capacity)
+            # Recover vectors written after the last metadata save
+            while self.count < self.capacity and self.row_ids[self.count] != -1:
+                self.count += 1
+            if self.path.with_suffix(".centroids.npy").exists():
+                self._load_buckets()
+
+    def __len__(self) -> int:
+        return self.count
+
+    @property
+    def needs_training(self) -> bool:
+        if self.centroids is None:
+            return self.count >= IVF_TRAIN_AT
+        return self.count >= IVF_RETRAIN_FACTOR * self.trained_at
+
+    # ============================================
+    # STORAGE
+    # ============================================
+
+    def _open_pair(self, vec_suffix: str, id_suffix: str, capacity: int):
+        vectors = np.memmap(self.path.with_suffix(vec_suffix), dtype=np.float32, mode="r+",
+                            shape=(capacity, self.dim))
+        ids = np.memmap(self.path.with_suffix(id_suffix), dtype=np.int64, mode="r+", shape=(capacity,))
+        return vectors, ids
+
+    def _resize_pair(self, vec_suffix: str, id_suffix: str, old: int, new: int):
+        for suffix, width in ((vec_suffix, self.dim * 4), (id_suffix, 8)):
+            file = self.path.with_suffix(suffix)
+            file.touch()
+            with open(file, "r+b") as f:
+                f.truncate(new * width)
+        vectors, ids = self._open_pair(vec_suffix, id_suffix, new)
+        ids[old:] = -1
+        return vectors, ids
+
+    def _save_meta(self):
+        self.meta_path.write_text(json.dumps({
+            "dim": self.dim, "capacity": self.capacity,
+            "count": self.count, "trained_at": self.trained_at
+        }))
+
+    def _save_buckets(self):
+        tmp = self.path.with_suffix(".buckets.tmp.npz")
+        np.savez(tmp, start=self.bucket_start, size=self.bucket_size, cap=self.bucket_cap,
+                 end=self.bucket_end, bucketed=self.bucketed)
+        tmp.replace(self.path.with_suffix(".buckets.npz"))
+        self._unsaved = 0
+
+    def _load_buckets(self):
+        self.centroids = np.load(self.path.with_suffix(".centroids.npy"))
+        table = np.load(self.path.with_suffix(".buckets.npz"))
+        self.bucket_start, self.bucket_size, self.bucket_cap = table["start"], table["size"], table["cap"]
+        self.bucket_end, self.bucketed = int(table["end"]), int(table["bucketed"])
+        total = self.path.with_suffix(".bucket.f32").stat().st_size // (self.dim * 4)
+        self.buckets, self.bucket_ids = self._open_pair(".bucket.f32", ".bucket.ids", total)
+        # Anything appended after the table was last saved goes in again
+        self._bucket_range(self.bucketed, self.count)
+
+    # ============================================
+    # BUCKETS
+    # ============================================
+
+    def _nearest(self, vectors, centroids=None) -> "np.ndarray":
+        centroids = self.centroids if centroids is None else centroids
+        out = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), 65536):
+            chunk = np.asarray(vectors[start:start + 65536])
+            out[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+        return out
+
+    def _reserve(self, rows: int) -> int:
+        """Room for `rows` more bucket rows at the end of the bucket file"""
+        start = self.bucket_end
+        total = len(self.bucket_ids)
+        if start + rows > total:
+            new_total = max(total * 2, start + rows)
+            self.buckets, self.bucket_ids = self._resize_pair(".bucket.f32", ".bucket.ids", total, new_total)
+        self.bucket_end += rows
+        return start
+
+    def _bucket_range(self, first: int, last: int):
+        """Copy raw slots [first, last) into their clusters' buckets"""
+        if last <= first:
+            return
+        clusters = self._nearest(self.vectors[first:last])
+        for offset, cluster in enumerate(clusters):
+            size, cap = self.bucket_size[cluster], self.bucket_cap[cluster]
+            if size == cap:
+                # Full: move the bucket to the end with double the room
+                new_cap = max(16, cap * 2)
+                new_start = self._reserve(new_cap)
+                old_start = self.bucket_start[cluster]
+                self.buckets[new_start:new_start + size] = self.buckets[old_start:old_start + size]
+                self.bucket_ids[new_start:new_start + size] = self.bucket_ids[old_start:old_start + size]
+                self.bucket_start[cluster], self.bucket_cap[cluster] = new_start, new_cap
+            at = self.bucket_start[cluster] + size
+            self.buckets[at] = self.vectors[first + offset]
+            self.bucket_ids[at] = self.row_ids[first + offset]
+            self.bucket_size[cluster] = size + 1
+        self.bucketed = last
+        self._unsaved += last - first
+        if self._unsaved >= 1000:
+            self._save_buckets()
+
+    def add(self, row_ids: Sequence[int], vectors: Sequence[Sequence[float]]) -> List[int]:
+        """Append vectors for row ids; returns their raw slots (check needs_training after)"""
+        with self._lock:
+            return self._add(row_ids, vectors)
+
+    def _add(self, row_ids: Sequence[int], vectors: Sequence[Sequence[float]]) -> List[int]:
+        batch = np.asarray(vectors, dtype=np.float32).reshape(len(row_ids), -1)
+        if self.dim is None:
+            self.dim = batch.shape[1]
+        if batch.shape[1] != self.dim:
+            raise ValueError(f"expected {self.dim}-dim vectors, got {batch.shape[1]}")
+        batch /= np.maximum(np.linalg.norm(batch, axis=1, keepdims=True), 1e-12)
+
+        start = self.count
+        if start + len(batch) > self.capacity:
+            capacity = max(1024, self.capacity)
+            while capacity < start + len(batch):
+                capacity *= 2
+            self.vectors, self.row_ids = self._resize_pair(".f32", ".ids", self.capacity, capacity)
+            self.capacity = capacity
+        self.vectors[start:start + len(batch)] = batch
+        self.row_ids[start:start + len(batch)] = row_ids
+        self.count += len(batch)
+        self._save_meta()
+
+        if self.centroids is not None:
+            self._bucket_range(self.bucketed, self.count)
+        return list(range(start, start + len(batch)))
+
+    def train(self):
+        """
+        k-means over a sample, then rebuild every bucket
+
+        Slow at scale (it re-assigns every vector), so callers run retrains
+        in a worker thread. Adds and searches keep using the old buckets
+        until the rebuilt files are swapped in.
+        """
+        with self._lock:
+            n, vectors, row_ids = self.count, self.vectors, self.row_ids
+        rng = np.random.default_rng(0)
+        nlist = max(16, int(2 * n ** 0.5))
+        sample = np.asarray(vectors[np.sort(rng.choice(n, min(n, IVF_TRAIN_SAMPLE), replace=False))])
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+        for _ in range(IVF_TRAIN_ITERATIONS):
+            nearest = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, nearest, sample)
+            counts = np.bincount(nearest, minlength=nlist)[:, None]
+            centroids = np.where(counts > 0, sums / np.maximum(counts, 1), centroids)
+            centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+        centroids = centroids.astype(np.float32)
+
+        # Lay buckets out in cluster order with 25% spare room each
+        assign = self._nearest(vectors[:n], centroids)
+        order = np.argsort(assign, kind="stable")
+        size = np.bincount(assign, minlength=nlist)
+        cap = np.maximum(16, (size * 5) // 4)
+        start = np.concatenate(([0], np.cumsum(cap)[:-1]))
+        end = int(cap.sum())
+
+        tmp_vec, tmp_ids = ".bucket.tmp.f32", ".bucket.tmp.ids"
+        buckets, bucket_ids = self._resize_pair(tmp_vec, tmp_ids, 0, end)
+        rank = np.arange(n) - np.repeat(np.concatenate(([0], np.cumsum(size)[:-1])), size)
+        dest = start[assign[order]] + rank
+        for i in range(0, n, 65536):
+            chunk = order[i:i + 65536]
+            buckets[dest[i:i + 65536]] = vectors[chunk]
+            bucket_ids[dest[i:i + 65536]] = row_ids[chunk]
+        buckets.flush()
+        bucket_ids.flush()
+
+        # Swap in, then catch up on vectors added while training
+        with self._lock:
+            for tmp, final in ((tmp_vec, ".bucket.f32"), (tmp_ids, ".bucket.ids")):
+                self.path.with_suffix(tmp).replace(self.path.with_suffix(final))
+            self.buckets, self.bucket_ids = self._open_pair(".bucket.f32", ".bucket.ids", end)
+            self.bucket_start, self.bucket_size, self.bucket_cap = start, size, cap
+            self.bucket_end, self.bucketed = end, n
+            self.centroids = centroids
+            np.save(self.path.with_suffix(".centroids.npy"), centroids)
+            self.trained_at = n
+            self._save_meta()
+            self._bucket_range(n, self.count)
+            self._save_buckets()
+
+    # ============================================
+    # SEARCH
+    # ============================================
+
+    def search(self, query: Sequence[float], limit: int = 10) -> List[Tuple[int, float]]:
+        """[(row_id, cosine similarity)] best first"""
+        if not self.count:
+            return []
+        q = np.asarray(query, dtype=np.float32)
+        q = q / max(float(np.linalg.norm(q)), 1e-12)
+        with self._lock:
+            scores, ids = self._scan(q)
+
+        want = min(len(scores), limit * 2)
+        if not want:
+            return []
+        top = np.argpartition(-scores, want - 1)[:want]
+        top = top[np.argsort(-scores[top])]
+
+        results, seen = [], set()
+        for i in top:
+            row_id = int(ids[i])
+            if row_id not in seen:  # a re-embedded row keeps its best-scoring copy
+                seen.add(row_id)
+                results.append((row_id, float(scores[i])))
+            if len(results) == limit:
+                break
+        return results
+
+    def _scan(self, q):
+        """Scores and row ids of every candidate: all vectors, or the nprobe nearest buckets"""
+        if self.centroids is None:
+            return self.vectors[:self.count] @ q, np.asarray(self.row_ids[:self.count])
+        nprobe = min(self.nprobe, len(self.centroids))
+        probe = np.argpartition(-(self.centroids @ q), nprobe - 1)[:nprobe]
+        spans = [(self.bucket_start[c], self.bucket_start[c] + self.bucket_size[c]) for c in probe]
+        scores = np.concatenate([self.buckets[a:b] @ q for a, b in spans])
+        ids = np.concatenate([self.bucket_ids[a:b] for a, b in spans])
+        return scores, ids
+
+    def flush(self):
+        if self.vectors is None:
+            return
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        self.vectors.flush()
+        self.row_ids.flush()
+        self._save_meta()
+        if self.centroids is not None:
+            self.buckets.flush()
+            self.bucket_ids.flush()
+            self._save_buckets()
+
+
+class AccessCounter:
+    """Buffers access-count bumps and writes them in one executemany"""
+
+    def __init__(self, conn: sqlite3.Connection, table: str, id_column: str,
+                 count_column: str = "access_count", touched_column: Optional[str] = None,
+                 flush_every: int = 100, flush_seconds: float = 5.0):
+        self.conn = conn
+        self.pending: Counter = Counter()
+        self.flush_every = flush_every
+        self.flush_seconds = flush_seconds
+        self.last_flush = time.monotonic()
+        touched = f", {touched_column} = CURRENT_TIMESTAMP" if touched_column else ""
+        self.sql = f"UPDATE {table} SET {count_column} = {count_column} + ?{touched} WHERE {id_column} = ?"
+
+    def record(self, ids: Iterable):
+        self.pending.update(ids)
+        if len(self.pending) >= self.flush_every or time.monotonic() - self.last_flush >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        self.last_flush = time.monotonic()
+        if not self.pending:
+            return
+        rows = [(count, item) for item, count in self.pending.items()]
+        self.pending.clear()
+        with self.conn:
+            self.conn.executemany(self.sql, rows)
+
+
+class HybridMemory:
+    """
+    Keyword + vector search over one SQLite table
+
+    The FTS5 index is an external-content table over `table`: triggers keep
+    it in step with inserts, deletes and edits of the indexed columns, so
+    callers keep writing to their own table as before.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, table: str, columns: Sequence[str],
+                 rowid_column: str = "rowid", vector_path: Optional[Path] = None):
+        self.conn = conn
+        self.table = table
+        self.columns = list(columns)
+        self.rowid_column = rowid_column
+        self.fts = f"{table}_fts"
+        self._doc_counts: Dict[str, Tuple[int, int]] = {}  # term -> (docs, newest rowid when counted)
+        self._ensure_fts()
+        self.vectors = VectorIndex(vector_path) if vector_path and np is not None else None
+
+    def _ensure_fts(self):
+        exists = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (self.fts,)
+        ).fetchone()
+        if exists:
+            return
+
+        cols = ", ".join(self.columns)
+        new_cols = ", ".join(f"new.{c}" for c in self.columns)
+        old_cols = ", ".join(f"old.{c}" for c in self.columns)
+        content_rowid = "" if self.rowid_column == "rowid" else f", content_rowid='{self.rowid_column}'"
+        with self.conn:
+            self.conn.execute(f"""
+                CREATE VIRTUAL TABLE {self.fts} USING fts5(
+                    {cols}, content='{self.table}'{content_rowid},
+                    tokenize='unicode61 remove_diacritics 2'
+                )
+            """)
+            self.conn.execute(f"CREATE VIRTUAL TABLE {self.fts}_vocab USING fts5vocab({self.fts}, 'row')")
+            self.conn.execute(f"""
+                CREATE TRIGGER {self.fts}_ai AFTER INSERT ON {self.table} BEGIN
+                    INSERT INTO {self.fts}(rowid, {cols}) VALUES (new.{self.rowid_column}, {new_cols});
+                END
+            """)
+            self.conn.execute(f"""
+                CREATE TRIGGER {self.fts}_ad AFTER DELETE ON {self.table} BEGIN
+                    INSERT INTO {self.fts}({self.fts}, rowid, {cols}) VALUES ('delete', old.{self.rowid_column}, {old_cols});
+                END
+            """)
+            self.conn.execute(f"""
+                CREATE TRIGGER {self.fts}_au AFTER UPDATE OF {cols} ON {self.table} BEGIN
+                    INSERT INTO {self.fts}({self.fts}, rowid, {cols}) VALUES ('delete', old.{self.rowid_column}, {old_cols});
+                    INSERT INTO {self.fts}(rowid, {cols}) VALUES (new.{self.rowid_column}, {new_cols});
+                END
+            """)
+            # Index whatever the table already holds
+            self.conn.execute(f"INSERT INTO {self.fts}({self.fts}) VALUES ('rebuild')")
+
+    def _doc_count(self, term: str, newest: int) -> int:
+        """
+        Number of memories containing `term`
+
+        fts5vocab counts by walking the term's whole doclist (milliseconds
+        for a common word), so counts of common terms are cached until the
+        table grows by DOC_COUNT_REFRESH. Counts under DOC_COUNT_CACHE_MIN
+        are always read fresh: a new or rare term must show up as soon as
+        a row containing it is inserted.
+        """
+        cached = self._doc_counts.get(term)
+        if cached and newest <= cached[1] * DOC_COUNT_REFRESH:
+            return cached[0]
+        row = self.conn.execute(f"SELECT doc FROM {self.fts}_vocab WHERE term = ?", (term,)).fetchone()
+        count = row[0] if row else 0
+        if count >= DOC_COUNT_CACHE_MIN:
+            if len(self._doc_counts) >= DOC_COUNT_CACHE_SIZE:
+                self._doc_counts.clear()
+            self._doc_counts[term] = (count, newest)
+        return count
+
+    def _match_expression(self, query: str) -> Tuple[Optional[str], bool]:
+        """
+        Free text -> (FTS5 query, whether to order by recency)
+
+        Selective terms are OR-ed together and ranked by BM25. When even the
+        rarest term matches too many memories to rank cheaply, the newest
+        memories containing it come back instead: reading the head of one
+        doclist costs the same however long it is, where ranking or
+        intersecting common terms walks all of them. A table within
+        RANKED_DOC_BUDGET rows is small enough to rank on every term.
+        """
+        terms = list(dict.fromkeys(t for t in re.findall(r"\w+", query.lower()) if len(t) > 1))
+        if not terms:
+            return None, False
+
+        # MAX over the base table's key is an index lookup; over the FTS table it's a scan
+        newest = self.conn.execute(f"SELECT MAX({self.rowid_column}) FROM {self.table}").fetchone()[0] or 1
+        doc_counts = {}
+        for term in terms[:MAX_QUERY_TERMS * 2]:
+            count = self._doc_count(term, newest)
+            if count:
+                doc_counts[term] = count
+        if not doc_counts:
+            return None, False
+
+        if newest <= RANKED_DOC_BUDGET:
+            chosen = sorted(doc_counts, key=doc_counts.get)
+            return " OR ".join(f'"{t}"' for t in chosen[:MAX_QUERY_TERMS]), False
+
+        # Rarest selective terms first, while the documents BM25 has to score stay in budget
+        chosen, budget = [], RANKED_DOC_BUDGET
+        for term in sorted(doc_counts, key=doc_counts.get):
+            if doc_counts[term] > newest * COMMON_TERM_RATIO or doc_counts[term] > budget:
+                break
+            chosen.append(term)
+            budget -= doc_counts[term]
+        if chosen:
+            return " OR ".join(f'"{t}"' for t in chosen[:MAX_QUERY_TERMS]), False
+        return f'"{min(doc_counts, key=doc_counts.get)}"', True
+
+    def keyword_search(self, query: str, limit: int = 10) -> List[Tuple[int, float]]:
+        """[(rowid, bm25)] best first (lower bm25 is better; 0.0 for recency-ordered results)"""
+        expression, by_recency = self._match_expression(query)
+        if not expression:
+            return []
+        if by_recency:
+            # No bm25 here: its corpus statistics walk every common term's doclist
+            return self.conn.execute(
+                f"SELECT rowid, 0.0 FROM {self.fts} WHERE {self.fts} MATCH ? ORDER BY rowid DESC LIMIT ?",
+                (expression, limit)
+            ).fetchall()
+        return self.conn.execute(
+            f"SELECT rowid, rank FROM {self.fts} WHERE {self.fts} MATCH ? ORDER BY rank LIMIT ?",
+            (expression, limit)
+        ).fetchall()
+
+    def add_vector(self, rowid: int, vector: Sequence[float]) -> Optional[int]:
+        """Store an embedding for a row; returns its vector slot"""
+        if self.vectors is None or vector is None:
+            return None
+        return self.vectors.add([rowid], [vector])[0]
+
+    def search(self, query: str, query_vector: Optional[Sequence[float]] = None,
+               limit: int = 10, candidates: int = 50) -> List[Tuple[int, float]]:
+        """Fused keyword + vector ranking -> [(rowid, rrf score)]"""
+        keyword_ids = [rowid for rowid, _ in self.keyword_search(query, candidates)]
+        rankings = [keyword_ids]
+        if query_vector is not None and self.vectors is not None and len(self.vectors):
+            rankings.append([rowid for rowid, _ in self.vectors.search(query_vector, candidates)])
+        return rrf_fuse(*rankings)[:limit]
+
+    def flush(self):
+        if self.vectors is not None:
+            self.vectors.flush()
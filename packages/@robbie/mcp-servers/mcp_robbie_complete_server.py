@@ -26,6 +26,8 @@ import aiohttp
 import sqlite3
 from pathlib import Path
 
+from hybrid_memory import HybridMemory
+
 # Check if we should use universal input
 USE_UNIVERSAL_INPUT = os.getenv('USE_UNIVERSAL_INPUT', 'false').lower() == 'true'
 
@@ -43,6 +45,7 @@ LOG_DIR = Path("/tmp/robbie-cursor")
 LOG_DIR.mkdir(exist_ok=True)
 CONVERSATION_LOG = LOG_DIR / "conversations.jsonl"
 STATE_DB = LOG_DIR / "robbie_state.db"
+MEMORY_VECTORS = LOG_DIR / "memory_vectors"
 
 class RobbieState:
     """Persistent Robbie state management"""
@@ -50,6 +53,8 @@ class RobbieState:
     def __init__(self):
         self.conn = sqlite3.connect(str(STATE_DB))
         self._init_db()
+        self.memory = HybridMemory(self.conn, "memory_context", ["content"],
+                                   rowid_column="id", vector_path=MEMORY_VECTORS)
         
     def _init_db(self):
         """Initialize state database"""
@@ -197,27 +202,36 @@ class RobbieState:
             }
             f.write(json.dumps(log_entry) + "\n")
     
-    def add_memory(self, content: str, importance: float = 1.0, tags: List[str] = None):
-        """Add to memory context"""
-        self.conn.execute("""
+    def add_memory(self, content: str, importance: float = 1.0, tags: List[str] = None,
+                   embedding: Optional[List[float]] = None):
+        """Add to memory context (the FTS index follows via triggers)"""
+        cursor = self.conn.execute("""
             INSERT INTO memory_context (timestamp, content, importance, tags)
             VALUES (?, ?, ?, ?)
         """, (datetime.now().isoformat(), content, importance, 
               json.dumps(tags or [])))
+        slot = self.memory.add_vector(cursor.lastrowid, embedding)
+        if slot is not None:
+            self.conn.execute("UPDATE memory_context SET embedding_id = ? WHERE id = ?",
+                              (str(slot), cursor.lastrowid))
         self.conn.commit()
     
-    def search_memory(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
-        """Simple keyword-based memory search (can be enhanced with vector search)"""
-        cursor = self.conn.execute("""
-            SELECT content, importance, tags, timestamp
+    def search_memory(self, query: str, limit: int = 5,
+                      query_vector: Optional[List[float]] = None) -> List[Dict[str, Any]]:
+        """Hybrid memory search: BM25 keyword hits fused with vector hits"""
+        ranked = [rowid for rowid, _ in self.memory.search(query, query_vector, limit)]
+        if not ranked:
+            return []
+        
+        placeholders = ", ".join("?" for _ in ranked)
+        rows = {row[0]: row[1:] for row in self.conn.execute(f"""
+            SELECT id, content, importance, tags, timestamp
             FROM memory_context
-            WHERE content LIKE ?
-            ORDER BY importance DESC, id DESC
-            LIMIT ?
-        """, (f"%{query}%", limit))
+            WHERE id IN ({placeholders})
+        """, ranked)}
         
         results = []
-        for row in cursor.fetchall():
+        for row in (rows[rowid] for rowid in ranked if rowid in rows):
             results.append({
                 "content": row[0],
                 "importance": row[1],
@@ -346,7 +360,9 @@ class RobbieCompleteServer:
         self.state = RobbieState()
         self.ollama_endpoint = os.getenv("OLLAMA_ENDPOINT", "http://localhost:11434")
         self.model = os.getenv("MODEL", "qwen2.5:7b")
+        self.embed_model = os.getenv("EMBED_MODEL", "nomic-embed-text")
         self.session: Optional[aiohttp.ClientSession] = None
+        self._retraining = False
         
     async def initialize(self):
         """Initialize async resources"""
@@ -357,6 +373,32 @@ class RobbieCompleteServer:
         """Cleanup async resources"""
         if self.session:
             await self.session.close()
+        self.state.memory.flush()
+    
+    async def _embed(self, text: str) -> Optional[List[float]]:
+        """Embedding from local Ollama; None (keyword-only search) if unavailable"""
+        try:
+            async with self.session.post(
+                f"{self.ollama_endpoint}/api/embeddings",
+                json={"model": self.embed_model, "prompt": text},
+                timeout=aiohttp.ClientTimeout(total=5)
+            ) as resp:
+                if resp.status == 200:
+                    return (await resp.json()).get("embedding") or None
+        except Exception:
+            pass
+        return None
+    
+    async def _retrain_vectors(self):
+        """Rebuild the vector clusters in a worker thread once the index has outgrown them"""
+        vectors = self.state.memory.vectors
+        if self._retraining or vectors is None or not vectors.needs_training:
+            return
+        self._retraining = True
+        try:
+            await asyncio.to_thread(vectors.train)
+        finally:
+            self._retraining = False
     
     async def chat_with_context(self, user_message: str, 
                                 include_memory: bool = True) -> Dict[str, Any]:
@@ -376,8 +418,10 @@ class RobbieCompleteServer:
         
         # 2. Search memory for relevant context
         memory_context = ""
+        query_vector = None
         if include_memory:
-            memories = self.state.search_memory(user_message)
+            query_vector = await self._embed(user_message)
+            memories = self.state.search_memory(user_message, query_vector=query_vector)
             if memories:
                 memory_context = "\nRELEVANT MEMORIES:\n"
                 for mem in memories:
@@ -430,8 +474,10 @@ class RobbieCompleteServer:
                         self.state.add_memory(
                             f"User asked: {user_message[:200]}",
                             importance=1.0,
-                            tags=["cursor", "conversation"]
+                            tags=["cursor", "conversation"],
+                            embedding=query_vector or await self._embed(user_message)
                         )
+                        asyncio.create_task(self._retrain_vectors())
                     
                     return {
                         "response": response,
@@ -41,7 +41,9 @@ from src.services import (
 )
 
 from src.ai import personality_manager
+from src.services.system_metrics import system_metrics_sampler
 from src.websockets import manager as ws_manager
+from src.websockets.broadcaster import broadcaster as ws_broadcaster
 
 # Configure logging
 logging.basicConfig(
@@ -72,6 +74,12 @@ async def lifespan(app: FastAPI):
         logger.info("🧠 Initializing Priorities Engine...")
         # Will be initialized when first needed (connects to DB)
         
+        # Start background system metrics sampler
+        system_metrics_sampler.start()
+        
+        # Cross-node WebSocket relay (no-op without REDIS_URL)
+        await ws_broadcaster.start()
+        
         logger.info("✅ All services initialized!")
         
     except Exception as e:
@@ -82,7 +90,8 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     logger.info("🛑 Shutting down Robbieverse API...")
-    # Cleanup if needed
+    system_metrics_sampler.stop()
+    await ws_broadcaster.stop()
 
 # Create FastAPI app
 app = FastAPI(
@@ -22,6 +22,8 @@ logger = logging.getLogger(__name__)
 from src.db.database import database
 from src.routes import universal_input, killswitch, monitoring
 from src.routes.robbieblocks_new import router as robbieblocks_router
+from src.services.system_metrics import system_metrics_sampler
+from src.ai.gatekeeper_fast import gatekeeper
 
 # Import context switcher
 try:
@@ -49,8 +51,11 @@ async def lifespan(app: FastAPI):
     # Startup
     await database.connect()
     logger.info("💋 Database connected for RobbieBlocks CMS")
+    system_metrics_sampler.start()
     yield
     # Shutdown
+    system_metrics_sampler.stop()
+    await gatekeeper.close()
     await database.disconnect()
     logger.info("👋 Database disconnected")
 
@@ -8,6 +8,7 @@ Perfect for quick deployment on Vengeance, RobbieBook1, and Aurora Town
 
 import os
 import logging
+from contextlib import asynccontextmanager
 from datetime import datetime
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
@@ -15,6 +16,7 @@ from fastapi.staticfiles import StaticFiles
 
 # Import only robbiebar routes
 from src.routes import robbiebar
+from src.services.system_metrics import system_metrics_sampler
 
 # Configure logging
 logging.basicConfig(
@@ -23,11 +25,19 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start the system metrics sampler before serving stats"""
+    system_metrics_sampler.start()
+    yield
+    system_metrics_sampler.stop()
+
 # Create FastAPI app
 app = FastAPI(
     title="RobbieBar API",
     description="Code Command Center - System stats, git quick commands, personality state",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS configuration
@@ -7,6 +7,7 @@ Minimal API server with just RobbieBar routes for testing the extension.
 
 import os
 import logging
+from contextlib import asynccontextmanager
 from datetime import datetime
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
@@ -14,6 +15,7 @@ from fastapi.staticfiles import StaticFiles
 
 # Import just the RobbieBar routes
 from src.routes import robbiebar
+from src.services.system_metrics import system_metrics_sampler
 
 # Configure logging
 logging.basicConfig(
@@ -22,11 +24,19 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start the system metrics sampler before serving stats"""
+    system_metrics_sampler.start()
+    yield
+    system_metrics_sampler.stop()
+
 # Create FastAPI app
 app = FastAPI(
     title="RobbieBar API",
     description="Simple API for RobbieBar extension testing",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS configuration
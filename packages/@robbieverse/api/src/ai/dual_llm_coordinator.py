@@ -1,5 +1,8 @@
 import asyncio
-from typing import Dict, List, Optional, Any
+import json
+import re
+import time
+from typing import AsyncGenerator, Dict, List, Optional, Any
 from datetime import datetime
 import structlog
 
@@ -8,6 +11,20 @@ from .gatekeeper_ai import GatekeeperAI
 
 logger = structlog.get_logger()
 
+# How much work may start before the Gatekeeper has approved the input, per safety mode.
+#   speculate: generate while the input is still being checked (cancelled if it's blocked)
+#   max_ahead_chunks: tokens buffered ahead of the input verdict before generation waits
+#   segment_chars: stream output in filtered segments of at least this many characters;
+#                  None holds the whole response until it has been filtered
+SPECULATION_POLICIES = {
+    "strict": {"speculate": False, "max_ahead_chunks": 0, "segment_chars": None},
+    "moderate": {"speculate": True, "max_ahead_chunks": 64, "segment_chars": 200},
+    "permissive": {"speculate": True, "max_ahead_chunks": 256, "segment_chars": 40}
+}
+
+# Output is filtered in whole sentences/lines so a pattern isn't split across two checks
+SEGMENT_BOUNDARY = re.compile(r"[.!?]\s|\n")
+
 class DualLLMCoordinator:
     def __init__(self):
         self.robbie = RobbieAI()
@@ -19,9 +36,23 @@ class DualLLMCoordinator:
         logger.info("Dual LLM processing", user_id=user_id, message_length=len(message))
         start_time = datetime.now()
         
-        safety_check = await self.gatekeeper.safety_check(message, user_id)
+        policy = SPECULATION_POLICIES[self.safety_mode]
+        
+        if policy["speculate"]:
+            # Generate while the input is checked; a blocked input cancels the generation
+            generation = asyncio.create_task(self.robbie.process_message(message, user_id, context))
+            try:
+                safety_check = await self.gatekeeper.safety_check(message, user_id)
+            except BaseException:
+                generation.cancel()
+                raise
+        else:
+            generation = None
+            safety_check = await self.gatekeeper.safety_check(message, user_id)
         
         if not safety_check["safe"]:
+            if generation:
+                generation.cancel()
             logger.warning("Message blocked by Gatekeeper", user_id=user_id, issues=safety_check["issues"])
             return {
                 "response": await self.gatekeeper.generate_safety_response("blocked_content"),
@@ -32,7 +63,10 @@ class DualLLMCoordinator:
                 "processing_time_ms": (datetime.now() - start_time).total_seconds() * 1000
             }
         
-        robbie_response = await self.robbie.process_message(message, user_id, context)
+        if generation:
+            robbie_response = await generation
+        else:
+            robbie_response = await self.robbie.process_message(message, user_id, context)
         response_filter = await self.gatekeeper.response_filter(robbie_response["content"], context)
         
         if not response_filter["approved"]:
@@ -48,10 +82,108 @@ class DualLLMCoordinator:
             "safety_status": "approved" if response_filter["approved"] else "filtered",
             "robbie_confidence": robbie_response.get("confidence", 0.5),
             "gatekeeper_confidence": response_filter.get("confidence", 1.0),
+            "speculative": policy["speculate"],
             "processing_time_ms": (datetime.now() - start_time).total_seconds() * 1000,
             "timestamp": datetime.now().isoformat()
         }
     
+    async def stream_user_message(self, message: str, user_id: str = "default", context: Dict = None) -> AsyncGenerator[str, None]:
+        """
+        Stream Robbie's reply as JSON lines, released as the Gatekeeper approves it
+        
+        Nothing reaches the client before the input is approved. Output is
+        filtered a segment at a time (or whole, in strict mode); a rejected
+        segment stops generation and ends the stream with a blocked event.
+        """
+        policy = SPECULATION_POLICIES[self.safety_mode]
+        start = time.monotonic()
+        chunks: asyncio.Queue = asyncio.Queue(maxsize=max(policy["max_ahead_chunks"], 1))
+        
+        async def generate():
+            try:
+                async for token in self.robbie.stream_tokens(message, user_id, context):
+                    await chunks.put(token)
+            except Exception as e:
+                await chunks.put(e)
+            else:
+                await chunks.put(None)
+        
+        generation = asyncio.create_task(generate()) if policy["speculate"] else None
+        try:
+            safety_check = await self.gatekeeper.safety_check(message, user_id)
+            if not safety_check["safe"]:
+                logger.warning("Message blocked by Gatekeeper", user_id=user_id, issues=safety_check["issues"])
+                yield await self._blocked_event("blocked", safety_check["issues"], start)
+                return
+            
+            if generation is None:
+                generation = asyncio.create_task(generate())
+            first_chunk_ms = None
+            pending = ""
+            confidence = 1.0
+            
+            while True:
+                chunk = await chunks.get()
+                if isinstance(chunk, Exception):
+                    logger.error("Robbie streaming error", error=str(chunk))
+                    yield json.dumps({"type": "error", "content": f"Error: {str(chunk)}"}) + "\n"
+                    return
+                if chunk is not None:
+                    pending += chunk
+                    segment, pending = self._split_segment(pending, policy["segment_chars"])
+                else:
+                    segment, pending = pending, ""
+                
+                if segment:
+                    response_filter = await self.gatekeeper.response_filter(segment, context)
+                    confidence = min(confidence, response_filter.get("confidence", 1.0))
+                    if not response_filter["approved"]:
+                        logger.warning("Response filtered mid-stream", user_id=user_id)
+                        yield await self._blocked_event("filtered", response_filter.get("modifications", []), start)
+                        return
+                    if first_chunk_ms is None:
+                        first_chunk_ms = (time.monotonic() - start) * 1000
+                    yield json.dumps({"type": "content", "content": response_filter["filtered_response"]}) + "\n"
+                
+                if chunk is None:
+                    break
+            
+            yield json.dumps({
+                "type": "done",
+                "source": "robbie_approved",
+                "safety_status": "approved",
+                "gatekeeper_confidence": confidence,
+                "speculative": policy["speculate"],
+                "first_chunk_ms": first_chunk_ms,
+                "processing_time_ms": (time.monotonic() - start) * 1000,
+                "timestamp": datetime.now().isoformat()
+            }) + "\n"
+        finally:
+            if generation and not generation.done():
+                generation.cancel()
+    
+    @staticmethod
+    def _split_segment(text: str, segment_chars: Optional[int]):
+        """(filterable segment, remainder): up to the last boundary once there's enough text"""
+        if segment_chars is None or len(text) < segment_chars:
+            return "", text
+        boundaries = list(SEGMENT_BOUNDARY.finditer(text))
+        if not boundaries:
+            return "", text
+        cut = boundaries[-1].end()
+        return text[:cut], text[cut:]
+    
+    async def _blocked_event(self, status: str, issues: List, start: float) -> str:
+        return json.dumps({
+            "type": "blocked",
+            "content": await self.gatekeeper.generate_safety_response("blocked_content"),
+            "source": "gatekeeper" if status == "blocked" else "gatekeeper_filtered",
+            "safety_status": status,
+            "issues": issues,
+            "processing_time_ms": (time.monotonic() - start) * 1000,
+            "timestamp": datetime.now().isoformat()
+        }) + "\n"
+    
     async def get_system_status(self):
         robbie_status = self.robbie.get_status()
         gatekeeper_status = self.gatekeeper.get_security_status()
@@ -60,6 +192,7 @@ class DualLLMCoordinator:
             "system": "Aurora Dual LLM",
             "status": "operational",
             "safety_mode": self.safety_mode,
+            "speculation": SPECULATION_POLICIES[self.safety_mode],
             "components": {
                 "robbie": robbie_status,
                 "gatekeeper": gatekeeper_status
@@ -77,6 +210,6 @@ class DualLLMCoordinator:
         return {"user_id": user_id, "status": "no_issues"}
     
     def set_safety_mode(self, mode: str):
-        if mode in ["strict", "moderate", "permissive"]:
+        if mode in SPECULATION_POLICIES:
             self.safety_mode = mode
             logger.info("Safety mode changed", new_mode=mode)
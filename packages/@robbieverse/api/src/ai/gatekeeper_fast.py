@@ -11,7 +11,8 @@ import json
 from typing import Dict, Any, List, Optional
 from datetime import datetime, timedelta
 import logging
-import psycopg2
+
+from ..services.rate_limiter import RateLimiter
 
 logger = logging.getLogger(__name__)
 
@@ -38,6 +39,7 @@ class GatekeeperFast:
             'api_call': {'limit': 100, 'window_minutes': 1},
             'image_gen': {'limit': 20, 'window_minutes': 10}
         }
+        self.rate_limiter = RateLimiter(self.rate_limits, self.db_conn_string)
         
         # Suspicious keywords
         self.suspicious_keywords = [
@@ -54,10 +56,6 @@ class GatekeeperFast:
             'admin access'
         ]
     
-    def _get_db_connection(self):
-        """Get database connection"""
-        return psycopg2.connect(self.db_conn_string)
-    
     async def pre_flight_check(
         self,
         request_id: str,
@@ -208,46 +206,12 @@ class GatekeeperFast:
         source: str,
         ai_service: str
     ) -> Dict[str, Any]:
-        """Check if user has exceeded rate limits"""
+        """Check if user has exceeded rate limits (in memory or Redis; Postgres only gets an async audit copy)"""
         try:
-            conn = self._get_db_connection()
-            cursor = conn.cursor()
-            
             # Determine action type for rate limiting
             action_type = ai_service  # Could be more sophisticated
             
-            if action_type not in self.rate_limits:
-                return {'allowed': True, 'excessive': False}
-            
-            limits = self.rate_limits[action_type]
-            
-            # Use database function to check rate limit
-            cursor.execute("""
-                SELECT check_rate_limit(%s, %s, %s, %s, %s)
-            """, (
-                user_id,
-                source,
-                action_type,
-                limits['limit'],
-                limits['window_minutes']
-            ))
-            
-            limit_exceeded = cursor.fetchone()[0]
-            
-            cursor.close()
-            conn.close()
-            
-            if limit_exceeded:
-                # Check if it's excessive (2x the limit)
-                is_excessive = False  # Could add more sophisticated check
-                
-                return {
-                    'allowed': False,
-                    'excessive': is_excessive,
-                    'message': f"Rate limit exceeded: {limits['limit']} {action_type} per {limits['window_minutes']} minutes"
-                }
-            
-            return {'allowed': True, 'excessive': False}
+            return await self.rate_limiter.check(user_id, source, action_type)
             
         except Exception as e:
             logger.error(f"Rate limit check failed: {e}")
@@ -417,6 +381,10 @@ Answer ONLY with JSON:
                 }
         
         return {'allowed': True, 'reason': 'Action approved'}
+    
+    async def close(self):
+        """Flush rate limit counts not yet mirrored to Postgres (app shutdown)"""
+        await self.rate_limiter.close()
 
 
 # Global instance
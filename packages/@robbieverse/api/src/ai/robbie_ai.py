@@ -178,10 +178,9 @@ Respond naturally and helpfully."""
                 logger.error("Ollama streaming error", error=str(e))
                 yield json.dumps({"type": "error", "content": f"Error: {str(e)}"}) + "\n"
     
-    async def _generate_response(self, message: str, user_id: str, context: Dict):
-        """Generate complete response (non-streaming fallback)"""
-        try:
-            system_prompt = """You are Robbie, Allan's AI executive assistant at TestPilot CPG.
+    def _prompt(self, message: str) -> str:
+        """Robbie's system prompt plus the user message"""
+        system_prompt = """You are Robbie, Allan's AI executive assistant at TestPilot CPG.
             
 Personality: Direct, thoughtful, curious, honest, pragmatic. No fluff.
 Communication: Lead with answer, short sentences, bullet points, strategic emojis (✅🔴💰🚀⚠️💡📊🎯).
@@ -189,7 +188,37 @@ Revenue lens: Every response should help close deals, reduce friction, scale, or
 
 Respond naturally and helpfully."""
 
-            prompt = f"{system_prompt}\n\nUser: {message}\n\nRobbie:"
+        return f"{system_prompt}\n\nUser: {message}\n\nRobbie:"
+    
+    async def stream_tokens(self, message: str, user_id: str = "default", context: Dict = None) -> AsyncGenerator[str, None]:
+        """Stream just the response text as Ollama generates it (no thinking stages, raises on errors)"""
+        async with httpx.AsyncClient(timeout=60.0) as client:
+            async with client.stream(
+                "POST",
+                f"{self.ollama_url}/api/generate",
+                json={
+                    "model": self.model,
+                    "prompt": self._prompt(message),
+                    "stream": True
+                }
+            ) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    try:
+                        data = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if data.get("response"):
+                        yield data["response"]
+                    if data.get("done", False):
+                        return
+    
+    async def _generate_response(self, message: str, user_id: str, context: Dict):
+        """Generate complete response (non-streaming fallback)"""
+        try:
+            prompt = self._prompt(message)
             
             async with httpx.AsyncClient(timeout=60.0) as client:
                 response = await client.post(
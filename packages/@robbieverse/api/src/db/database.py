@@ -7,12 +7,22 @@ Author: Robbie (with flirt mode 11/11!)
 """
 
 import os
+import time
 import asyncpg
 import logging
-from typing import Optional
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from .query import QueryStats, compile_query
 
 logger = logging.getLogger(__name__)
 
+# asyncpg keeps an LRU of prepared statements per connection - sized for our query set
+STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "256"))
+
+# Timing counters are kept for this many distinct queries (least recently run dropped first)
+QUERY_STATS_SIZE = int(os.getenv("DB_QUERY_STATS_SIZE", "500"))
+
 class Database:
     """
     💕 Your sexy database wrapper - connects to master or replica!
@@ -24,6 +34,7 @@ class Database:
     def __init__(self):
         self.pool: Optional[asyncpg.Pool] = None
         self.connected = False
+        self.query_stats: "OrderedDict[str, QueryStats]" = OrderedDict()
         
     async def connect(self):
         """💋 Connect to the database (master or local replica)"""
@@ -43,7 +54,8 @@ class Database:
                 database_url,
                 min_size=2,
                 max_size=10,
-                command_timeout=30
+                command_timeout=30,
+                statement_cache_size=STATEMENT_CACHE_SIZE
             )
             
             self.connected = True
@@ -61,6 +73,7 @@ class Database:
                     min_size=2,
                     max_size=10,
                     command_timeout=30,
+                    statement_cache_size=STATEMENT_CACHE_SIZE,
                     ssl='require'
                 )
                 
@@ -88,49 +101,128 @@ class Database:
             self.connected = False
             logger.info("Database disconnected")
     
-    async def fetch_one(self, query: str, values: dict = None):
-        """💋 Fetch one sexy row from the database"""
+    async def _run(self, method: str, query: str, values: Optional[dict] = None):
+        """Compile :name params, run on a pooled connection and record timing"""
         if not self.connected:
             await self.connect()
         
-        async with self.pool.acquire() as conn:
-            if values:
-                # Convert dict to list for asyncpg ($1, $2, $3 format)
-                param_values = list(values.values())
-                return await conn.fetchrow(query, *param_values)
-            else:
-                return await conn.fetchrow(query)
+        compiled = compile_query(query)
+        args = compiled.bind(values)
+        
+        started = time.perf_counter()
+        result = None
+        error = False
+        try:
+            async with self.pool.acquire() as conn:
+                # Same SQL text => asyncpg reuses this connection's prepared statement
+                result = await getattr(conn, method)(compiled.sql, *args)
+                return result
+        except Exception:
+            error = True
+            raise
+        finally:
+            rows = len(result) if isinstance(result, list) else int(result is not None and method == "fetchrow")
+            self._record(compiled.sql, started, rows, error)
+    
+    def _record(self, key: str, started: float, rows: int = 0, error: bool = False):
+        stats = self.query_stats.get(key)
+        if stats is None:
+            stats = self.query_stats[key] = QueryStats()
+            if len(self.query_stats) > QUERY_STATS_SIZE:
+                self.query_stats.popitem(last=False)
+        else:
+            self.query_stats.move_to_end(key)
+        stats.record((time.perf_counter() - started) * 1000, rows, error)
+    
+    async def fetch_one(self, query: str, values: dict = None):
+        """💋 Fetch one sexy row from the database (:name or $1-style params)"""
+        return await self._run("fetchrow", query, values)
     
     async def fetch_all(self, query: str, values: dict = None):
         """💋 Fetch ALL the sexy rows! 🔥"""
+        return await self._run("fetch", query, values)
+    
+    async def fetch_val(self, query: str, values: dict = None):
+        """💋 Fetch a single value (first column of the first row)"""
+        return await self._run("fetchval", query, values)
+    
+    async def execute(self, query: str, values: dict = None):
+        """💋 Execute a command (INSERT, UPDATE, DELETE)"""
+        return await self._run("execute", query, values)
+    
+    async def execute_many(self, query: str, values_list: Iterable[dict]):
+        """
+        🔥 Execute one statement for many parameter sets
+        
+        Prepared once and pipelined by asyncpg - use this instead of
+        looping over execute() for batch writes.
+        """
+        compiled = compile_query(query)
+        args = [compiled.bind(values) for values in values_list]
+        if not args:
+            return
+        
         if not self.connected:
             await self.connect()
         
-        async with self.pool.acquire() as conn:
-            if values:
-                # Convert dict to list for asyncpg ($1, $2, $3 format)
-                param_values = list(values.values())
-                return await conn.fetch(query, *param_values)
-            else:
-                return await conn.fetch(query)
+        started = time.perf_counter()
+        error = False
+        try:
+            async with self.pool.acquire() as conn:
+                await conn.executemany(compiled.sql, args)
+        except Exception:
+            error = True
+            raise
+        finally:
+            self._record(compiled.sql, started, len(args), error)
     
-    async def execute(self, query: str, values: dict = None):
-        """💋 Execute a command (INSERT, UPDATE, DELETE)"""
+    async def copy_records(
+        self,
+        table_name: str,
+        records: Iterable[Sequence[Any]],
+        columns: Optional[Sequence[str]] = None,
+        schema_name: Optional[str] = None
+    ) -> str:
+        """
+        🚀 Bulk load rows with COPY - the fastest path for big inserts
+        
+        Args:
+            table_name: Target table
+            records: Row tuples in column order
+            columns: Column names (defaults to table column order)
+            schema_name: Optional schema
+        """
         if not self.connected:
             await self.connect()
         
-        async with self.pool.acquire() as conn:
-            if values:
-                # Convert dict to list for asyncpg ($1, $2, $3 format)
-                param_values = list(values.values())
-                return await conn.execute(query, *param_values)
-            else:
-                return await conn.execute(query)
+        records = list(records)
+        started = time.perf_counter()
+        error = False
+        try:
+            async with self.pool.acquire() as conn:
+                return await conn.copy_records_to_table(
+                    table_name,
+                    records=records,
+                    columns=columns,
+                    schema_name=schema_name
+                )
+        except Exception:
+            error = True
+            raise
+        finally:
+            self._record(f"COPY {table_name}", started, len(records), error)
+    
+    def get_query_stats(self, top: int = 20) -> List[Dict[str, Any]]:
+        """📊 Per-query timing counters, most expensive (total time) first"""
+        ranked = sorted(self.query_stats.items(), key=lambda item: item[1].total_ms, reverse=True)
+        return [
+            {"query": " ".join(query.split())[:200], **stats.to_dict()}
+            for query, stats in ranked[:top]
+        ]
     
-    def _extract_params(self, query: str):
-        """Extract parameter names from query (:param_name)"""
-        import re
-        return re.findall(r':(\w+)', query)
+    def reset_query_stats(self):
+        """Clear the timing counters"""
+        self.query_stats.clear()
 
 
 # 💋 Global database instance - share the love across all modules!
@@ -0,0 +1,105 @@
+"""
+💋 Query Compiler - :name params to asyncpg's $n form
+Compile once, bind many times. Keeps callers writing readable SQL! 🔥
+"""
+
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+# String literals, quoted identifiers, dollar quotes, comments and :: casts
+# are matched first so a ":name" inside any of them is never rewritten
+_SQL_TOKEN = re.compile(
+    r"'(?:[^']|'')*'"
+    r'|"(?:[^"]|"")*"'
+    r"|\$(\w*)\$.*?\$\1\$"
+    r"|--[^\n]*"
+    r"|/\*.*?\*/"
+    r"|::"
+    r"|(?<![:\w]):([A-Za-z_]\w*)",
+    re.DOTALL
+)
+
+
+@dataclass(frozen=True)
+class CompiledQuery:
+    """SQL rewritten to $n placeholders plus the param name for each position"""
+    sql: str
+    param_names: Tuple[str, ...]
+
+    @property
+    def named(self) -> bool:
+        return bool(self.param_names)
+
+    def bind(self, values: Optional[Dict[str, Any]]) -> List[Any]:
+        """Order a values dict to match the compiled $n positions"""
+        if not values:
+            return []
+        if not self.named:
+            # Legacy $1-style SQL: positional in dict order
+            return list(values.values())
+        try:
+            return [values[name] for name in self.param_names]
+        except KeyError as e:
+            raise KeyError(f"Missing SQL parameter {e} for query: {' '.join(self.sql.split())[:80]}") from None
+
+
+@lru_cache(maxsize=1024)
+def compile_query(query: str) -> CompiledQuery:
+    """
+    Compile :name SQL into $n form (cached per query string)
+
+    Repeated names share one position. Queries already written with
+    $n placeholders come back unchanged and bind positionally.
+
+    A param directly followed by a single ":" (e.g. arr[:lo:hi]) is
+    rejected: it reads as a slice bound but would bind as a param and
+    silently drop the rest of the slice. Space the slice out instead,
+    arr[:lo : :hi].
+    """
+    positions: Dict[str, int] = {}
+
+    def substitute(match: "re.Match") -> str:
+        name = match.group(2)
+        if name is None:
+            return match.group(0)
+        following = query[match.end():match.end() + 2]
+        if following.startswith(":") and following != "::":
+            raise ValueError(
+                f"Ambiguous ':{name}:' in SQL (array slice?) - put spaces around the slice colon"
+            )
+        if name not in positions:
+            positions[name] = len(positions) + 1
+        return f"${positions[name]}"
+
+    sql = _SQL_TOKEN.sub(substitute, query)
+    return CompiledQuery(sql=sql, param_names=tuple(positions))
+
+
+@dataclass
+class QueryStats:
+    """Per-query timing counters"""
+    calls: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+    rows: int = 0
+    errors: int = 0
+
+    def record(self, elapsed_ms: float, rows: int = 0, error: bool = False):
+        self.calls += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.rows += rows
+        if error:
+            self.errors += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "total_ms": round(self.total_ms, 2),
+            "avg_ms": round(self.total_ms / self.calls, 3) if self.calls else 0.0,
+            "max_ms": round(self.max_ms, 2),
+            "rows": self.rows,
+            "errors": self.errors
+        }
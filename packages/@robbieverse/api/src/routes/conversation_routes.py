@@ -3,14 +3,16 @@ Aurora RobbieVerse - Enhanced Conversation API Routes
 Handles conversation context, rollback, and branching
 """
 from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi.responses import StreamingResponse
 from typing import List, Dict, Any, Optional
 from pydantic import BaseModel
+import json
 import uuid
 
-from app.db.database import database
-from app.services.conversation_context import ConversationContextManager
-from app.services.ai.dual_llm_coordinator import DualLLMCoordinator
-from app.websockets.conversation_ws import conversation_ws_manager
+from ..db.database import database
+from ..services.conversation_context import ConversationContextManager
+from ..ai.dual_llm_coordinator import DualLLMCoordinator
+from ..websockets.conversation_ws import conversation_ws_manager
 
 router = APIRouter(prefix="/conversations", tags=["conversations"])
 
@@ -105,6 +107,58 @@ async def add_message(
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+async def _chat_context(conversation_id: str, use_context: bool, context_window: Optional[int]) -> Dict:
+    """Conversation history for the dual LLM, if requested"""
+    if not use_context:
+        return {}
+    context = await context_manager.get_conversation_context(
+        conversation_id, 
+        context_window or 10
+    )
+    return {
+        "conversation_history": context["messages"],
+        "conversation_metadata": context["conversation"]
+    }
+
+async def _record_exchange(conversation_id: str, message: str, client_id: str, result: Dict):
+    """Store the user message and the reply, and broadcast both; returns their ids"""
+    # Add user message to conversation
+    user_message_id = await context_manager.add_message(
+        conversation_id=conversation_id,
+        role="user",
+        content=message,
+        metadata={"client_id": client_id}
+    )
+    
+    # Add AI response to conversation
+    ai_message_id = await context_manager.add_message(
+        conversation_id=conversation_id,
+        role="assistant",
+        content=result["response"],
+        metadata={
+            "source": result["source"],
+            "safety_status": result["safety_status"],
+            "confidence": result.get("robbie_confidence", 0.8),
+            "processing_time_ms": result["processing_time_ms"]
+        },
+        model_used=result.get("model_used", "dual_llm")
+    )
+    
+    # Broadcast WebSocket events
+    await conversation_ws_manager.handle_message_added(conversation_id, {
+        "id": user_message_id,
+        "role": "user",
+        "content": message,
+        "created_at": "now()"
+    })
+    await conversation_ws_manager.handle_message_added(conversation_id, {
+        "id": ai_message_id,
+        "role": "assistant",
+        "content": result["response"],
+        "created_at": "now()"
+    })
+    return user_message_id, ai_message_id
+
 @router.post("/{conversation_id}/chat")
 async def chat_with_context(
     conversation_id: str,
@@ -115,17 +169,7 @@ async def chat_with_context(
 ):
     """Chat with conversation context"""
     try:
-        # Get conversation context if requested
-        context_data = {}
-        if use_context:
-            context = await context_manager.get_conversation_context(
-                conversation_id, 
-                context_window or 10
-            )
-            context_data = {
-                "conversation_history": context["messages"],
-                "conversation_metadata": context["conversation"]
-            }
+        context_data = await _chat_context(conversation_id, use_context, context_window)
         
         # Process through dual LLM system
         result = await dual_llm.process_user_message(
@@ -134,41 +178,7 @@ async def chat_with_context(
             context_data
         )
         
-        # Add user message to conversation
-        user_message_id = await context_manager.add_message(
-            conversation_id=conversation_id,
-            role="user",
-            content=message,
-            metadata={"client_id": client_id}
-        )
-        
-        # Add AI response to conversation
-        ai_message_id = await context_manager.add_message(
-            conversation_id=conversation_id,
-            role="assistant",
-            content=result["response"],
-            metadata={
-                "source": result["source"],
-                "safety_status": result["safety_status"],
-                "confidence": result.get("robbie_confidence", 0.8),
-                "processing_time_ms": result["processing_time_ms"]
-            },
-            model_used=result.get("model_used", "dual_llm")
-        )
-        
-        # Broadcast WebSocket events
-        await conversation_ws_manager.handle_message_added(conversation_id, {
-            "id": user_message_id,
-            "role": "user",
-            "content": message,
-            "created_at": "now()"
-        })
-        await conversation_ws_manager.handle_message_added(conversation_id, {
-            "id": ai_message_id,
-            "role": "assistant",
-            "content": result["response"],
-            "created_at": "now()"
-        })
+        user_message_id, ai_message_id = await _record_exchange(conversation_id, message, client_id, result)
         
         return {
             "response": result["response"],
@@ -186,6 +196,45 @@ async def chat_with_context(
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@router.post("/{conversation_id}/chat/stream")
+async def stream_chat_with_context(
+    conversation_id: str,
+    message: str,
+    client_id: str = "anonymous",
+    use_context: bool = True,
+    context_window: Optional[int] = None
+):
+    """
+    Chat with conversation context, streaming the reply as JSON lines
+    (content events, then done, blocked or error) as the Gatekeeper
+    approves it. The exchange is stored once the stream has finished.
+    """
+    try:
+        context_data = await _chat_context(conversation_id, use_context, context_window)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    async def events():
+        reply = []
+        final = None
+        async for line in dual_llm.stream_user_message(message, client_id, context_data):
+            event = json.loads(line)
+            if event["type"] == "content":
+                reply.append(event["content"])
+            elif event["type"] in ("done", "blocked"):
+                final = event
+            yield line
+        
+        if final is not None:
+            await _record_exchange(conversation_id, message, client_id, {
+                "response": "".join(reply) if final["type"] == "done" else final["content"],
+                "source": final["source"],
+                "safety_status": final["safety_status"],
+                "processing_time_ms": final["processing_time_ms"]
+            })
+    
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
 @router.post("/{conversation_id}/rollback")
 async def rollback_message(conversation_id: str, request: RollbackRequest):
     """Rollback (soft delete) a message"""
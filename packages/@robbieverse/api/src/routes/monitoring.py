@@ -14,9 +14,9 @@ from typing import Dict, Any, List, Optional
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 import logging
-import subprocess
 
-from ..services.universal_logger import universal_logger
+from ..db.database import database
+from ..services.system_metrics import system_metrics_sampler
 
 logger = logging.getLogger(__name__)
 
@@ -42,91 +42,56 @@ def get_db_connection():
 
 @router.get("/system/current")
 async def get_current_system_metrics():
-    """Get current system resource usage"""
+    """Get current system resource usage (latest background sample)"""
     try:
-        # CPU
-        cpu_percent = psutil.cpu_percent(interval=1)
-        cpu_count = psutil.cpu_count()
-        
-        # Memory
-        memory = psutil.virtual_memory()
-        memory_percent = memory.percent
-        memory_used_gb = memory.used / (1024 ** 3)
-        memory_total_gb = memory.total / (1024 ** 3)
-        
-        # Disk
-        disk = psutil.disk_usage('/')
-        disk_percent = disk.percent
-        disk_used_gb = disk.used / (1024 ** 3)
-        disk_total_gb = disk.total / (1024 ** 3)
-        
-        # GPU (try nvidia-smi)
-        gpu_percent = 0
-        gpu_memory_used = 0
-        gpu_memory_total = 0
-        
-        try:
-            result = subprocess.run(
-                ["nvidia-smi", "--query-gpu=utilization.gpu,memory.used,memory.total", 
-                 "--format=csv,noheader,nounits"],
-                capture_output=True,
-                text=True,
-                timeout=5
-            )
-            if result.returncode == 0:
-                gpu_data = result.stdout.strip().split(',')
-                gpu_percent = float(gpu_data[0])
-                gpu_memory_used = float(gpu_data[1])
-                gpu_memory_total = float(gpu_data[2])
-        except:
-            pass
-        
-        # Network
-        net_io = psutil.net_io_counters()
+        sample = system_metrics_sampler.latest()
+        if sample is None:
+            raise HTTPException(status_code=503, detail="System metrics not sampled yet")
+        
+        cpu_percent = sample["cpu_percent"]
+        memory_percent = sample["memory_percent"]
+        disk_percent = sample["disk_percent"]
+        gpu_percent = sample["gpu_percent"] or 0
+        gpu_memory_total = sample["gpu_memory_total_mb"]
         
         metrics = {
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": sample["timestamp"].isoformat(),
             "cpu": {
                 "percent": round(cpu_percent, 1),
-                "count": cpu_count,
+                "count": sample["cpu_count"],
                 "status": _get_status_color(cpu_percent)
             },
             "memory": {
                 "percent": round(memory_percent, 1),
-                "used_gb": round(memory_used_gb, 2),
-                "total_gb": round(memory_total_gb, 2),
+                "used_gb": round(sample["memory_used_gb"], 2),
+                "total_gb": round(sample["memory_total_gb"], 2),
                 "status": _get_status_color(memory_percent)
             },
             "disk": {
                 "percent": round(disk_percent, 1),
-                "used_gb": round(disk_used_gb, 2),
-                "total_gb": round(disk_total_gb, 2),
+                "used_gb": round(sample["disk_used_gb"], 2),
+                "total_gb": round(sample["disk_total_gb"], 2),
                 "status": _get_status_color(disk_percent)
             },
             "gpu": {
                 "percent": round(gpu_percent, 1),
-                "memory_used_mb": round(gpu_memory_used, 0),
+                "memory_used_mb": round(sample["gpu_memory_used_mb"], 0),
                 "memory_total_mb": round(gpu_memory_total, 0),
                 "available": gpu_memory_total > 0,
                 "status": _get_status_color(gpu_percent) if gpu_memory_total > 0 else "unknown"
             },
             "network": {
-                "bytes_sent": net_io.bytes_sent,
-                "bytes_recv": net_io.bytes_recv,
-                "packets_sent": net_io.packets_sent,
-                "packets_recv": net_io.packets_recv
+                "bytes_sent": sample["bytes_sent"],
+                "bytes_recv": sample["bytes_recv"],
+                "packets_sent": sample["packets_sent"],
+                "packets_recv": sample["packets_recv"]
             }
         }
         
-        # Log metrics to database
-        universal_logger.log_monitoring_metric("system", "cpu_percent", cpu_percent, "percent")
-        universal_logger.log_monitoring_metric("system", "memory_percent", memory_percent, "percent")
-        universal_logger.log_monitoring_metric("system", "disk_percent", disk_percent, "percent")
-        if gpu_memory_total > 0:
-            universal_logger.log_monitoring_metric("system", "gpu_percent", gpu_percent, "percent")
-        
         return metrics
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to get system metrics: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -145,6 +110,17 @@ async def get_system_metrics_history(
         metric_name: Optional filter for specific metric
     """
     try:
+        # Recent windows are answered from the sampler's ring buffer
+        buffered = system_metrics_sampler.history(hours, metric_name)
+        if buffered is not None:
+            return {
+                "history": buffered,
+                "count": len(buffered),
+                "hours": hours,
+                "metric_name": metric_name,
+                "source": "memory"
+            }
+        
         conn = get_db_connection()
         cursor = conn.cursor(cursor_factory=RealDictCursor)
         
@@ -184,7 +160,8 @@ async def get_system_metrics_history(
             "history": history,
             "count": len(history),
             "hours": hours,
-            "metric_name": metric_name
+            "metric_name": metric_name,
+            "source": "database"
         }
         
     except Exception as e:
@@ -456,6 +433,20 @@ async def get_ai_stats(hours: int = 1):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# ============================================
+# DATABASE QUERY TIMING
+# ============================================
+
+@router.get("/db/queries")
+async def get_db_query_stats(top: int = 20):
+    """Get per-query timing counters from the asyncpg Database wrapper"""
+    return {
+        "queries": database.get_query_stats(top),
+        "tracked_queries": len(database.query_stats),
+        "timestamp": datetime.now().isoformat()
+    }
+
+
 # ============================================
 # HELPER FUNCTIONS
 # ============================================
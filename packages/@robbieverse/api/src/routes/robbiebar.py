@@ -7,7 +7,6 @@ Provides personality, system stats, git commands, and more
 
 import os
 import subprocess
-import psutil
 import sqlite3
 import requests
 import json
@@ -17,6 +16,8 @@ from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 import logging
 
+from ..services.system_metrics import system_metrics_sampler
+
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/code/api", tags=["robbiebar"])
@@ -74,7 +75,6 @@ def get_db_cursor():
 def get_personality() -> Dict[str, Any]:
     """Get current Robbie personality state with mood data and image URLs"""
     try:
-        import json
         conn = get_db_cursor()
         try:
             cursor = conn.cursor()
@@ -156,33 +156,24 @@ def get_personality() -> Dict[str, Any]:
 def get_system_stats() -> Dict[str, Any]:
     """Get system resource usage"""
     try:
-        # CPU usage
-        cpu_percent = psutil.cpu_percent(interval=1)
-        
-        # Memory usage
-        memory = psutil.virtual_memory()
-        memory_percent = memory.percent
+        # Latest sample from the background sampler (no blocking psutil/nvidia-smi)
+        sample = system_metrics_sampler.latest()
+        if sample is None:
+            raise HTTPException(status_code=503, detail="System metrics not sampled yet")
         
-        # GPU usage (try to get GPU info)
-        gpu_percent = 0
-        try:
-            # Try nvidia-smi if available
-            result = subprocess.run(
-                ["nvidia-smi", "--query-gpu=utilization.gpu", "--format=csv,noheader,nounits"],
-                capture_output=True, text=True, timeout=5
-            )
-            if result.returncode == 0:
-                gpu_percent = float(result.stdout.strip())
-        except:
-            gpu_percent = 0
+        cpu_percent = sample["cpu_percent"]
+        memory_percent = sample["memory_percent"]
+        gpu_percent = sample["gpu_percent"] or 0
         
         return {
             "cpu": cpu_percent,
             "memory": memory_percent,
             "gpu": gpu_percent,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": sample["timestamp"].isoformat()
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting system stats: {e}")
         raise HTTPException(status_code=500, detail=f"System stats error: {e}")
@@ -626,7 +617,6 @@ def search_notes(q: str) -> Dict[str, Any]:
 def get_moods() -> Dict[str, Any]:
     """Get all mood definitions with image URLs from database"""
     try:
-        import json
         conn = get_db_cursor()
         try:
             cursor = conn.cursor()
@@ -4,13 +4,23 @@ Serves pages stored in SQL with automatic town-wide replication
 """
 
 from fastapi import APIRouter, HTTPException, Request
-from fastapi.responses import HTMLResponse
-from typing import Optional, Dict, Any
+from fastapi.responses import HTMLResponse, Response
+from typing import Optional, Tuple
+from contextlib import contextmanager
 import psycopg2
+import psycopg2.pool
 import os
+import re
 import logging
 from urllib.parse import parse_qs
 
+from ..services.robbieblocks_page_cache import (
+    CompiledPageCache,
+    PageTemplate,
+    etag_matches,
+    make_etag
+)
+
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
@@ -35,99 +45,140 @@ def get_db_connection():
         logger.error(f"Database connection failed: {e}")
         raise HTTPException(status_code=500, detail="Database connection error")
 
-def personalize_content(content: str, params: Dict[str, str]) -> str:
-    """Replace {{name}}, {{company}} etc with actual values from URL params"""
-    for key, value in params.items():
-        placeholder = f"{{{{{key}}}}}"
-        content = content.replace(placeholder, value)
-    return content
+# Reused connections for the page render hot path
+_connection_pool: Optional[psycopg2.pool.ThreadedConnectionPool] = None
 
-@router.get("/robbieblocks/page/{page_route:path}")
-async def render_robbieblocks_page(page_route: str, request: Request):
+@contextmanager
+def pooled_cursor():
+    """Borrow a pooled connection instead of connecting per request"""
+    global _connection_pool
+    try:
+        if _connection_pool is None:
+            _connection_pool = psycopg2.pool.ThreadedConnectionPool(
+                1, 5,
+                host=DB_HOST,
+                port=DB_PORT,
+                database=DB_NAME,
+                user=DB_USER,
+                password=DB_PASSWORD
+            )
+        conn = _connection_pool.getconn()
+    except Exception as e:
+        logger.error(f"Database connection failed: {e}")
+        raise HTTPException(status_code=500, detail="Database connection error")
+    
+    try:
+        with conn.cursor() as cursor:
+            yield cursor
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        _connection_pool.putconn(conn)
+
+# Compiled pages keyed by (page_route, node_name, content version)
+page_cache = CompiledPageCache()
+
+ZONES = ('header', 'main', 'sidebar', 'footer', 'overlay')
+SLOT_MARKER = re.compile(r"\x00slot:(\w+)\x00")
+
+
+def _slot_marker(name: str) -> str:
+    return f"\x00slot:{name}\x00"
+
+
+def get_page_version(cursor, page_route: str, node_name: str) -> Optional[Tuple]:
     """
-    Render a RobbieBlocks page from PostgreSQL
+    Cheap content version lookup that drives compiled-page invalidation
     
-    Example: /robbieblocks/page/landing/groceryshop/?name=Allan&company=TestPilot
+    Covers everything compile_page reads: the page row, its blocks and their
+    components (edits bump updated_at; adds/removes change the count) and
+    the node's branding.
     """
-    try:
-        # Parse query parameters for personalization
-        query_params = dict(request.query_params)
-        
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Get page definition
-        cursor.execute("""
-            SELECT 
-                p.id, p.page_key, p.page_name, p.meta_title, p.meta_description,
-                p.layout_template, p.metadata
-            FROM robbieblocks_pages p
-            WHERE p.page_route = %s AND p.status = 'published'
-        """, (f'/{page_route}/',))
-        
-        page = cursor.fetchone()
-        if not page:
-            raise HTTPException(status_code=404, detail=f"Page not found: {page_route}")
-        
-        page_id, page_key, page_name, meta_title, meta_description, layout_template, metadata = page
-        
-        # Get all components for this page in order
-        cursor.execute("""
-            SELECT 
-                pb.zone, pb.block_order, pb.props,
-                c.component_key, c.component_name, c.react_code, c.css_styles, c.metadata
-            FROM robbieblocks_page_blocks pb
-            JOIN robbieblocks_components c ON pb.component_id = c.id
-            WHERE pb.page_id = %s
-            ORDER BY pb.block_order
-        """, (page_id,))
-        
-        blocks = cursor.fetchall()
-        
-        # Get node-specific branding (if exists)
-        cursor.execute("""
-            SELECT brand_colors, custom_css
-            FROM robbieblocks_node_branding
-            WHERE page_id = %s AND (node_name = %s OR node_name = 'all_towns')
-            LIMIT 1
-        """, (page_id, os.getenv('NODE_NAME', 'robbiebook1')))
-        
-        branding = cursor.fetchone()
-        custom_css = branding[1] if branding else ""
-        
-        cursor.close()
-        conn.close()
-        
-        # Build HTML
-        html_parts = {
-            'header': [],
-            'main': [],
-            'sidebar': [],
-            'footer': [],
-            'overlay': []
-        }
-        
-        css_parts = []
-        
-        for zone, block_order, props, comp_key, comp_name, react_code, css_styles, comp_metadata in blocks:
-            # Personalize content
-            personalized_html = personalize_content(react_code, query_params)
-            personalized_props = personalize_content(str(props or '{}'), query_params)
-            
-            html_parts[zone].append(personalized_html)
-            if css_styles:
-                css_parts.append(css_styles)
-        
-        # Personalize meta title
-        personalized_title = personalize_content(meta_title or page_name, query_params)
-        
-        # Generate complete HTML
-        html = f"""<!DOCTYPE html>
+    cursor.execute("""
+        SELECT
+            p.version,
+            p.updated_at,
+            (SELECT COUNT(*) FROM robbieblocks_page_blocks pb WHERE pb.page_id = p.id),
+            (SELECT MAX(GREATEST(pb.updated_at, c.updated_at))
+             FROM robbieblocks_page_blocks pb
+             JOIN robbieblocks_components c ON pb.component_id = c.id
+             WHERE pb.page_id = p.id),
+            (SELECT MAX(b.updated_at)
+             FROM robbieblocks_node_branding b
+             WHERE b.page_id = p.id AND (b.node_name = %s OR b.node_name = 'all_towns'))
+        FROM robbieblocks_pages p
+        WHERE p.page_route = %s AND p.status = 'published'
+    """, (node_name, f'/{page_route}/'))
+    
+    row = cursor.fetchone()
+    return tuple(row) if row else None
+
+
+def compile_page(cursor, page_route: str, node_name: str) -> Tuple[int, PageTemplate]:
+    """
+    Build a page once: run the page/blocks/branding queries and
+    pre-tokenize the HTML so requests only fill {{slots}}
+    """
+    # Get page definition
+    cursor.execute("""
+        SELECT 
+            p.id, p.page_key, p.page_name, p.meta_title, p.meta_description,
+            p.layout_template, p.metadata, p.version
+        FROM robbieblocks_pages p
+        WHERE p.page_route = %s AND p.status = 'published'
+    """, (f'/{page_route}/',))
+    
+    page = cursor.fetchone()
+    if not page:
+        raise HTTPException(status_code=404, detail=f"Page not found: {page_route}")
+    
+    page_id, page_key, page_name, meta_title, meta_description, layout_template, metadata, version = page
+    
+    # Get all components for this page in order
+    cursor.execute("""
+        SELECT 
+            pb.zone, pb.block_order, pb.props,
+            c.component_key, c.component_name, c.react_code, c.css_styles, c.metadata
+        FROM robbieblocks_page_blocks pb
+        JOIN robbieblocks_components c ON pb.component_id = c.id
+        WHERE pb.page_id = %s
+        ORDER BY pb.block_order
+    """, (page_id,))
+    
+    blocks = cursor.fetchall()
+    
+    # Get node-specific branding (if exists)
+    cursor.execute("""
+        SELECT brand_colors, custom_css
+        FROM robbieblocks_node_branding
+        WHERE page_id = %s AND (node_name = %s OR node_name = 'all_towns')
+        LIMIT 1
+    """, (page_id, node_name))
+    
+    branding = cursor.fetchone()
+    custom_css = branding[1] if branding else ""
+    
+    # Group component code by zone
+    html_parts = {zone: [] for zone in ZONES}
+    css_parts = []
+    
+    for zone, block_order, props, comp_key, comp_name, react_code, css_styles, comp_metadata in blocks:
+        html_parts[zone].append(react_code or '')
+        if css_styles:
+            css_parts.append(css_styles)
+    
+    slot_content = {zone: ''.join(parts) for zone, parts in html_parts.items()}
+    slot_content['title'] = meta_title or page_name
+    
+    # Page skeleton with markers where personalizable content goes
+    html = f"""<!DOCTYPE html>
 <html lang="en">
 <head>
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>{personalized_title}</title>
+    <title>{_slot_marker("title")}</title>
     <meta name="description" content="{meta_description or ''}">
     <link href="https://fonts.googleapis.com/css2?family=Inter:wght@400;500;600;700;800&display=swap" rel="stylesheet">
     {custom_css}
@@ -161,22 +212,22 @@ async def render_robbieblocks_page(page_route: str, request: Request):
 </head>
 <body>
     <!-- Header -->
-    {''.join(html_parts['header'])}
+    {_slot_marker("header")}
     
     <!-- Main Container -->
     <div class="container">
         <!-- Main Content -->
-        {''.join(html_parts['main'])}
+        {_slot_marker("main")}
         
         <!-- Sidebar -->
-        {''.join(html_parts['sidebar'])}
+        {_slot_marker("sidebar")}
     </div>
     
     <!-- Footer -->
-    {''.join(html_parts['footer'])}
+    {_slot_marker("footer")}
     
     <!-- Overlay (Popups, etc) -->
-    {''.join(html_parts['overlay'])}
+    {_slot_marker("overlay")}
     
     <!-- Enhanced Tracking Script with HubSpot Integration 🔥 -->
     <script>
@@ -347,7 +398,49 @@ async def render_robbieblocks_page(page_route: str, request: Request):
 </body>
 </html>"""
         
-        return HTMLResponse(content=html)
+    # Split the skeleton into literals and personalizable content
+    pieces = SLOT_MARKER.split(html)
+    parts = [
+        (slot_content[piece], True) if index % 2 else piece
+        for index, piece in enumerate(pieces)
+    ]
+    
+    return version, PageTemplate(parts)
+
+
+@router.get("/robbieblocks/page/{page_route:path}")
+async def render_robbieblocks_page(page_route: str, request: Request):
+    """
+    Render a RobbieBlocks page from PostgreSQL
+    
+    Pages are compiled once per (route, node, version); a hit costs one
+    version lookup plus filling the {{slots}} from the query string.
+    Responses carry an ETag and honour If-None-Match with a 304.
+    
+    Example: /robbieblocks/page/landing/groceryshop/?name=Allan&company=TestPilot
+    """
+    try:
+        # Parse query parameters for personalization
+        query_params = dict(request.query_params)
+        node_name = os.getenv('NODE_NAME', 'robbiebook1')
+        
+        with pooled_cursor() as cursor:
+            version = get_page_version(cursor, page_route, node_name)
+            if version is None:
+                raise HTTPException(status_code=404, detail=f"Page not found: {page_route}")
+            
+            template = page_cache.get(page_route, node_name, version)
+            if template is None:
+                # Keyed by the version read first: an edit landing mid-build
+                # only costs one extra compile on the next request
+                _, template = compile_page(cursor, page_route, node_name)
+                page_cache.put(page_route, node_name, version, template)
+        
+        etag = make_etag(page_route, node_name, version, template.slot_values(query_params))
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        
+        return HTMLResponse(content=template.render(query_params), headers={"ETag": etag})
         
     except HTTPException:
         raise
@@ -4,21 +4,27 @@ New routes that use the RobbieBlocksCMS service for dynamic rendering
 """
 
 from fastapi import APIRouter, HTTPException, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from typing import Optional
 import logging
 from src.services.robbieblocks_cms import robbieblocks_cms
+from src.services.robbieblocks_page_cache import make_etag, etag_matches
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
 @router.get("/robbieblocks/page/{page_key}")
-async def get_page_definition(page_key: str, node_id: Optional[str] = "robbiebook1"):
+async def get_page_definition(
+    page_key: str,
+    request: Request,
+    node_id: Optional[str] = "robbiebook1"
+):
     """
     💋 Get complete page definition from RobbieBlocks CMS
     
     Returns the full page definition with all components, props, and styling
-    needed to render a dynamic RobbieBlocks page.
+    needed to render a dynamic RobbieBlocks page. Responses carry an ETag
+    derived from (page_key, node_id, content version) and honour If-None-Match.
     
     Args:
         page_key: Page identifier (e.g., 'cursor-sidebar-main')
@@ -27,8 +33,8 @@ async def get_page_definition(page_key: str, node_id: Optional[str] = "robbieboo
     try:
         logger.info(f"💋 Fetching page definition: {page_key} for node: {node_id}")
         
-        # Get the full page definition from CMS service
-        page_definition = await robbieblocks_cms.get_page_definition(page_key, node_id)
+        # Get the full page definition from CMS service (compiled cache on hit)
+        version, page_definition = await robbieblocks_cms.get_versioned_page_definition(page_key, node_id)
         
         if not page_definition or not page_definition.get('success'):
             raise HTTPException(
@@ -36,8 +42,18 @@ async def get_page_definition(page_key: str, node_id: Optional[str] = "robbieboo
                 detail=f"Page not found: {page_key}"
             )
         
-        return JSONResponse(content=page_definition)
+        if version is None:
+            # Version lookup failed: serve it, but don't let clients cache a tag for it
+            return JSONResponse(content=page_definition)
         
+        etag = make_etag(page_key, node_id, version)
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        
+        return JSONResponse(content=page_definition, headers={"ETag": etag})
+        
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching page definition: {e}")
         raise HTTPException(
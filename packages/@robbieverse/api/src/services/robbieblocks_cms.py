@@ -7,10 +7,12 @@ Date: October 10, 2025
 Author: Robbie (with flirt mode 11/11 activated!)
 """
 
+import copy
 import logging
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime
 from src.db.database import database
+from src.services.robbieblocks_page_cache import CompiledPageCache
 
 logger = logging.getLogger(__name__)
 
@@ -24,8 +26,8 @@ class RobbieBlocksCMS:
     """
     
     def __init__(self):
-        self.cache = {}  # Simple cache for hot pages
-        self.cache_ttl = 30  # 30 seconds - fresh but not too eager
+        # Compiled pages keyed by (page_key, node_id, content version) - built once per version
+        self.cache = CompiledPageCache()
         
     async def get_page_definition(
         self,
@@ -38,6 +40,9 @@ class RobbieBlocksCMS:
         This is the money shot, baby! Returns everything you need to render
         a complete RobbieBlocks page with local branding.
         
+        Only the cheap version check hits the database on a cache hit; the
+        four-query build runs once per (page_key, node_id, content version).
+        
         Args:
             page_key: Page identifier (e.g., 'cursor-sidebar-main')
             node_id: Node ID for branding (e.g., 'vengeance-local', 'aurora-town-local')
@@ -45,6 +50,68 @@ class RobbieBlocksCMS:
         Returns:
             Complete page definition with components, props, and styles
         """
+        _, definition = await self.get_versioned_page_definition(page_key, node_id)
+        return definition
+    
+    async def get_versioned_page_definition(
+        self,
+        page_key: str,
+        node_id: str = 'vengeance-local'
+    ) -> Tuple[Optional[Tuple], Dict[str, Any]]:
+        """
+        (content version, page definition) - the version is what ETags are made from
+        
+        The definition is a copy, so callers can change it without touching the cache.
+        """
+        version = await self._content_version(page_key, node_id)
+        if version is None:
+            return None, await self._build_page_definition(page_key, node_id)
+        
+        cached = self.cache.get(page_key, node_id, version)
+        if cached is None:
+            cached = await self._build_page_definition(page_key, node_id)
+            if not cached.get('success'):
+                return version, cached
+            # Keyed by the version read first: an edit landing mid-build
+            # only costs one extra build on the next request
+            self.cache.put(page_key, node_id, version, cached)
+        return version, copy.deepcopy(cached)
+    
+    async def _content_version(self, page_key: str, node_id: str) -> Optional[Tuple]:
+        """
+        Everything a page definition is built from, in one cheap query
+        
+        The page row, its blocks and their components (edits bump updated_at;
+        adds/removes change the count), the node's branding and the style tokens.
+        """
+        try:
+            row = await database.fetch_one("""
+                SELECT
+                    p.version,
+                    p.updated_at,
+                    (SELECT COUNT(*) FROM robbieblocks_page_blocks pb WHERE pb.page_id = p.id) AS block_count,
+                    (SELECT MAX(GREATEST(pb.updated_at, c.updated_at))
+                     FROM robbieblocks_page_blocks pb
+                     JOIN robbieblocks_components c ON pb.component_id = c.id
+                     WHERE pb.page_id = p.id) AS blocks_updated_at,
+                    (SELECT MAX(updated_at) FROM robbieblocks_node_branding WHERE node_id = $2) AS branding_updated_at,
+                    (SELECT COUNT(*) FROM robbieblocks_style_tokens) AS token_count,
+                    (SELECT MAX(updated_at) FROM robbieblocks_style_tokens) AS tokens_updated_at
+                FROM robbieblocks_pages p
+                WHERE p.page_key = $1 AND p.status = 'published'
+            """, {"page_key": page_key, "node_id": node_id})
+        except Exception as e:
+            logger.error(f"Error getting page content version: {e}")
+            return None
+        
+        return tuple(row.values()) if row else None
+    
+    async def _build_page_definition(
+        self,
+        page_key: str,
+        node_id: str
+    ) -> Dict[str, Any]:
+        """🔥 Assemble a page definition from the database (cache miss path)"""
         try:
             logger.info(f"💋 Fetching sexy page definition: {page_key} for node: {node_id}")
             
@@ -0,0 +1,281 @@
+"""
+System Metrics Sampler - Background resource sampling
+======================================================
+One sampler thread per process collects CPU, memory, disk, network and
+GPU usage on a fixed cadence into an in-memory ring buffer.
+Routes read the latest sample (or a window of samples) straight from
+memory instead of blocking on psutil/nvidia-smi per request.
+Downsampled averages are persisted to monitoring_metrics in batches.
+"""
+
+import os
+import logging
+import subprocess
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Tuple
+
+import psutil
+
+from .universal_logger import universal_logger
+
+logger = logging.getLogger(__name__)
+
+# Sampling cadence and buffer size (default: 2s x 2000 = just over an hour in memory,
+# so a full hour of history is served without the database)
+SAMPLE_INTERVAL_SECONDS = float(os.getenv("METRICS_SAMPLE_INTERVAL", "2"))
+BUFFER_SIZE = int(os.getenv("METRICS_BUFFER_SIZE", "2000"))
+
+# Persist one averaged point per DOWNSAMPLE_FACTOR samples,
+# flushing PERSIST_BATCH_SIZE points per database round trip
+DOWNSAMPLE_FACTOR = int(os.getenv("METRICS_DOWNSAMPLE_FACTOR", "15"))
+PERSIST_BATCH_SIZE = int(os.getenv("METRICS_PERSIST_BATCH_SIZE", "4"))
+
+# Metrics that are averaged and persisted
+PERSISTED_METRICS = {
+    "cpu_percent": "percent",
+    "memory_percent": "percent",
+    "disk_percent": "percent",
+    "gpu_percent": "percent",
+}
+
+
+class SystemMetricsSampler:
+    """Fixed-cadence sampler backed by a ring buffer"""
+
+    def __init__(
+        self,
+        interval: float = SAMPLE_INTERVAL_SECONDS,
+        buffer_size: int = BUFFER_SIZE,
+        downsample_factor: int = DOWNSAMPLE_FACTOR,
+        persist_batch_size: int = PERSIST_BATCH_SIZE
+    ):
+        self.interval = interval
+        self.downsample_factor = max(1, downsample_factor)
+        self.persist_batch_size = max(1, persist_batch_size)
+
+        # Ring buffer of samples, oldest first
+        self.buffer: deque = deque(maxlen=buffer_size)
+
+        # Guards the thread handle and the pending downsample/persist state
+        # (touched by the sampler thread, start() and stop())
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.started_at: Optional[datetime] = None
+
+        # nvidia-smi is disabled after the first "not installed" failure
+        self._gpu_enabled = True
+
+        # Downsampling / persistence state
+        self._pending_samples: List[Dict[str, Any]] = []
+        self._pending_points: List[Tuple[datetime, str, str, float, str]] = []
+
+    # ============================================
+    # LIFECYCLE
+    # ============================================
+
+    def start(self) -> None:
+        """Start the sampler thread (idempotent)"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+
+            self._stop.clear()
+            self.started_at = datetime.now()
+            # Prime cpu_percent so the first non-blocking read is meaningful
+            psutil.cpu_percent(interval=None)
+
+            # Take one sample synchronously so readers never see an empty buffer
+            self._record(self._collect())
+
+            self._thread = threading.Thread(
+                target=self._run,
+                name="system-metrics-sampler",
+                daemon=True
+            )
+            self._thread.start()
+            logger.info(f"📈 System metrics sampler started ({self.interval}s cadence)")
+
+    def stop(self) -> None:
+        """Stop the sampler and flush any pending points"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.interval + 1)
+            self._thread = None
+        self._flush(force=True)
+
+    def _run(self) -> None:
+        """Sampling loop, scheduled against a monotonic clock to avoid drift"""
+        next_tick = time.monotonic() + self.interval
+        while not self._stop.wait(max(0.0, next_tick - time.monotonic())):
+            next_tick += self.interval
+            try:
+                self._record(self._collect())
+            except Exception as e:
+                logger.error(f"Failed to sample system metrics: {e}")
+
+    # ============================================
+    # SAMPLING
+    # ============================================
+
+    def _collect(self) -> Dict[str, Any]:
+        """Collect one sample; never blocks on cpu_percent"""
+        memory = psutil.virtual_memory()
+        disk = psutil.disk_usage('/')
+        net_io = psutil.net_io_counters()
+        gpu = self._collect_gpu()
+
+        return {
+            "timestamp": datetime.now(),
+            "cpu_percent": psutil.cpu_percent(interval=None),
+            "cpu_count": psutil.cpu_count(),
+            "memory_percent": memory.percent,
+            "memory_used_gb": memory.used / (1024 ** 3),
+            "memory_total_gb": memory.total / (1024 ** 3),
+            "disk_percent": disk.percent,
+            "disk_used_gb": disk.used / (1024 ** 3),
+            "disk_total_gb": disk.total / (1024 ** 3),
+            "gpu_percent": gpu[0] if gpu else None,
+            "gpu_memory_used_mb": gpu[1] if gpu else 0,
+            "gpu_memory_total_mb": gpu[2] if gpu else 0,
+            "bytes_sent": net_io.bytes_sent,
+            "bytes_recv": net_io.bytes_recv,
+            "packets_sent": net_io.packets_sent,
+            "packets_recv": net_io.packets_recv,
+        }
+
+    def _collect_gpu(self) -> Optional[Tuple[float, float, float]]:
+        """Query nvidia-smi, returns (utilization, memory_used, memory_total)"""
+        if not self._gpu_enabled:
+            return None
+
+        try:
+            result = subprocess.run(
+                ["nvidia-smi", "--query-gpu=utilization.gpu,memory.used,memory.total",
+                 "--format=csv,noheader,nounits"],
+                capture_output=True,
+                text=True,
+                timeout=5
+            )
+            if result.returncode == 0:
+                gpu_data = result.stdout.strip().splitlines()[0].split(',')
+                return float(gpu_data[0]), float(gpu_data[1]), float(gpu_data[2])
+        except FileNotFoundError:
+            logger.info("nvidia-smi not found, GPU sampling disabled")
+            self._gpu_enabled = False
+        except Exception:
+            pass
+
+        return None
+
+    def _record(self, sample: Dict[str, Any]) -> None:
+        """Append a sample to the ring buffer and downsample for persistence"""
+        with self._lock:
+            self.buffer.append(sample)
+
+            self._pending_samples.append(sample)
+            if len(self._pending_samples) < self.downsample_factor:
+                return
+            self._downsample()
+            points = self._take_points(force=False)
+        
+        if points:
+            universal_logger.log_monitoring_metrics_batch(points)
+
+    def _downsample(self) -> None:
+        """Average pending samples into one persisted point per metric"""
+        samples, self._pending_samples = self._pending_samples, []
+        if not samples:
+            return
+
+        timestamp = samples[-1]["timestamp"]
+        for metric_name, unit in PERSISTED_METRICS.items():
+            values = [s[metric_name] for s in samples if s.get(metric_name) is not None]
+            if values:
+                self._pending_points.append(
+                    (timestamp, "system", metric_name, sum(values) / len(values), unit)
+                )
+
+    def _flush(self, force: bool = False) -> None:
+        """Write downsampled points once a full batch is pending"""
+        with self._lock:
+            if force:
+                self._downsample()
+            points = self._take_points(force)
+        
+        if points:
+            universal_logger.log_monitoring_metrics_batch(points)
+
+    def _take_points(self, force: bool) -> List[Tuple[datetime, str, str, float, str]]:
+        """Pending points to write now (call with the lock held; written outside it)"""
+        if not self._pending_points:
+            return []
+        if not force and len(self._pending_points) < self.persist_batch_size * len(PERSISTED_METRICS):
+            return []
+
+        points, self._pending_points = self._pending_points, []
+        return points
+
+    # ============================================
+    # READS (served from memory)
+    # ============================================
+
+    def latest(self) -> Optional[Dict[str, Any]]:
+        """Most recent sample (None until the sampler has been started at app startup)"""
+        buffer = list(self.buffer)
+        return buffer[-1] if buffer else None
+
+    def window(self, since: datetime) -> List[Dict[str, Any]]:
+        """All buffered samples newer than `since`, oldest first"""
+        return [s for s in list(self.buffer) if s["timestamp"] >= since]
+
+    def covers(self, since: datetime) -> bool:
+        """
+        True if the ring buffer holds every sample since `since`
+        
+        The buffer starts at the sampler's start time, or at its oldest sample
+        once it has wrapped; anything older is only in the database.
+        """
+        buffer = list(self.buffer)
+        if not buffer or self.started_at is None:
+            return False
+        oldest = max(self.started_at, buffer[0]["timestamp"])
+        # Samples are discrete: allow one interval between `since` and the first sample
+        return oldest - timedelta(seconds=self.interval) <= since
+
+    def history(
+        self,
+        hours: float,
+        metric_name: Optional[str] = None
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        Buffered history in the monitoring_metrics row shape
+
+        Returns None if the requested window is older than the buffer,
+        so callers can fall back to the database.
+        """
+        since = datetime.now() - timedelta(hours=hours)
+        if not self.covers(since):
+            return None
+
+        names = [metric_name] if metric_name else list(PERSISTED_METRICS)
+        history = []
+        for sample in self.window(since):
+            for name in names:
+                value = sample.get(name)
+                if value is None:
+                    continue
+                history.append({
+                    'timestamp': sample["timestamp"].isoformat(),
+                    'metric_name': name,
+                    'value': float(value),
+                    'unit': PERSISTED_METRICS.get(name)
+                })
+        return history
+
+
+# Global sampler instance (one per process)
+system_metrics_sampler = SystemMetricsSampler()
@@ -10,9 +10,9 @@ import os
 import logging
 from logging.handlers import TimedRotatingFileHandler
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple
 import psycopg2
-from psycopg2.extras import Json
+from psycopg2.extras import Json, execute_values
 import uuid
 
 # Configure file logging
@@ -318,7 +318,43 @@ class UniversalLogger:
             
         except Exception as e:
             self.logger.error(f"Failed to log monitoring metric: {e}")
-    
+
+    def log_monitoring_metrics_batch(
+        self,
+        metrics: List[Tuple[datetime, str, str, float, Optional[str]]],
+        town_id: str = "aurora"
+    ) -> None:
+        """
+        Log many monitoring metrics in a single round trip
+
+        Args:
+            metrics: (timestamp, metric_type, metric_name, metric_value, metric_unit) tuples
+            town_id: Town generating the metrics
+        """
+        if not metrics:
+            return
+
+        try:
+            conn = self._get_db_connection()
+            cursor = conn.cursor()
+
+            execute_values(cursor, """
+                INSERT INTO monitoring_metrics (
+                    timestamp, metric_type, metric_name, metric_value,
+                    metric_unit, town_id, metadata
+                ) VALUES %s
+            """, [
+                (timestamp, metric_type, metric_name, metric_value, metric_unit, town_id, Json({}))
+                for timestamp, metric_type, metric_name, metric_value, metric_unit in metrics
+            ])
+
+            conn.commit()
+            cursor.close()
+            conn.close()
+
+        except Exception as e:
+            self.logger.error(f"Failed to log monitoring metrics batch: {e}")
+
     def get_recent_blocks(self, limit: int = 10) -> list:
         """Get recent gatekeeper blocks"""
         try:
@@ -0,0 +1,371 @@
+"""
+Aurora RobbieVerse - WebSocket Fan-out Broadcaster
+Serialize once, enqueue per client, never let one slow socket stall the rest.
+
+Each connection gets a bounded send queue drained by its own writer task.
+A client whose queue fills up (or whose send times out) is evicted.
+Messages are published to topics ("all", "conversation:<id>", "user:<id>",
+"client:<id>") and optionally relayed across nodes over Redis pub/sub, so
+any node can deliver to a client connected anywhere in the town. Nodes
+announce which topics they have subscribers for over the same channel, so
+a publisher can skip topics nobody in the town is listening to.
+"""
+import asyncio
+import json
+import os
+import socket
+import time
+import uuid
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+import structlog
+from fastapi import WebSocket
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # Redis relay is optional on single-node installs
+    aioredis = None
+
+logger = structlog.get_logger()
+
+SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))
+SEND_TIMEOUT_SECONDS = float(os.getenv("WS_SEND_TIMEOUT", "5"))
+RELAY_CHANNEL = os.getenv("WS_RELAY_CHANNEL", "robbie:ws:broadcast")
+NODE_ID = os.getenv("NODE_NAME", socket.gethostname())
+
+# ConnectionManager's broadcast topic (other managers use their own)
+BROADCAST_TOPIC = "all"
+
+# Relay-only topic carrying each node's subscribed topics
+INTEREST_TOPIC = "\x00interest"
+INTEREST_REFRESH_SECONDS = float(os.getenv("WS_INTEREST_REFRESH", "30"))
+INTEREST_TTL_SECONDS = INTEREST_REFRESH_SECONDS * 3
+
+# Close code for evicted slow consumers ("try again later")
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+
+class ClientChannel:
+    """One WebSocket plus its bounded send queue and writer task"""
+
+    def __init__(self, websocket: WebSocket, client_id: str, broadcaster: "Broadcaster",
+                 queue_size: int = SEND_QUEUE_SIZE):
+        self.websocket = websocket
+        self.client_id = client_id
+        self.broadcaster = broadcaster
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.topics: Set[str] = set()
+        self.closed = False
+        self.sent = 0
+        self.writer = asyncio.create_task(self._write_loop())
+
+    def offer(self, message: str) -> bool:
+        """Enqueue without waiting; evicts the client if its queue is full"""
+        if self.closed:
+            return False
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            logger.warning("Evicting slow WebSocket consumer",
+                           client_id=self.client_id,
+                           queued=self.queue.qsize())
+            self.evict()
+            return False
+
+    def evict(self):
+        """Detach immediately, then close the socket in the background"""
+        if self.closed:
+            return
+        self.broadcaster.evictions += 1
+        self._detach()
+        asyncio.create_task(self._close_socket(SLOW_CONSUMER_CLOSE_CODE))
+
+    async def _write_loop(self):
+        send = None
+        try:
+            while True:
+                message = await self.queue.get()
+                # asyncio.wait rather than wait_for: wait_for can swallow a cancel
+                # that lands as the send completes, leaving the writer running
+                send = asyncio.ensure_future(self.websocket.send_text(message))
+                done, _ = await asyncio.wait({send}, timeout=SEND_TIMEOUT_SECONDS)
+                if not done:
+                    raise asyncio.TimeoutError()
+                send.result()
+                send = None
+                self.sent += 1
+        except asyncio.CancelledError:
+            pass
+        except asyncio.TimeoutError:
+            logger.warning("WebSocket send timed out", client_id=self.client_id)
+            self.evict()
+        except Exception as e:
+            logger.info("WebSocket writer stopped", client_id=self.client_id, error=str(e))
+            asyncio.create_task(self.close())
+        finally:
+            if send is not None:
+                send.cancel()
+
+    def _detach(self):
+        self.closed = True
+        self.broadcaster.unregister(self)
+        if self.writer is not asyncio.current_task():
+            self.writer.cancel()
+
+    async def _close_socket(self, code: int):
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
+
+    async def close(self, code: Optional[int] = None):
+        """Stop the writer and drop the channel from every topic"""
+        if self.closed:
+            return
+        self._detach()
+        if code is not None:
+            await self._close_socket(code)
+
+
+class Broadcaster:
+    """Topic-based fan-out with per-client queues and optional Redis relay"""
+
+    def __init__(self, redis_url: Optional[str] = None, node_id: str = NODE_ID):
+        self.redis_url = redis_url if redis_url is not None else os.getenv("REDIS_URL")
+        self.node_id = node_id
+        self.channels: Dict[str, ClientChannel] = {}
+        self.topics: Dict[str, Set[ClientChannel]] = {}
+
+        self.redis = None
+        self._relay_task: Optional[asyncio.Task] = None
+
+        # Topics other nodes have subscribers for: node_id -> (expires at, topics)
+        self.remote_topics: Dict[str, Tuple[float, Set[str]]] = {}
+        self._interest_changes: Dict[str, bool] = {}
+        self._interest_flush: Optional[asyncio.Task] = None
+        self._interest_task: Optional[asyncio.Task] = None
+
+        # Stats
+        self.published = 0
+        self.delivered = 0
+        self.relayed_in = 0
+        self.evictions = 0
+
+    # ============================================
+    # CONNECTIONS
+    # ============================================
+
+    def register(self, websocket: WebSocket, client_id: Optional[str] = None,
+                 topics: Iterable[str] = ()) -> ClientChannel:
+        """Attach an accepted WebSocket to "client:<id>" plus the given topics"""
+        client_id = client_id or uuid.uuid4().hex
+        existing = self.channels.get(client_id)
+        if existing:
+            asyncio.create_task(existing.close())
+
+        channel = ClientChannel(websocket, client_id, self)
+        self.channels[client_id] = channel
+        for topic in (f"client:{client_id}", *topics):
+            self.subscribe(channel, topic)
+        return channel
+
+    def subscribe(self, channel: ClientChannel, topic: str):
+        channel.topics.add(topic)
+        subscribers = self.topics.get(topic)
+        if subscribers is None:
+            subscribers = self.topics[topic] = set()
+            self._interest_changed(topic, True)
+        subscribers.add(channel)
+
+    def unsubscribe(self, channel: ClientChannel, topic: str):
+        channel.topics.discard(topic)
+        subscribers = self.topics.get(topic)
+        if subscribers is not None:
+            subscribers.discard(channel)
+            if not subscribers:
+                del self.topics[topic]
+                self._interest_changed(topic, False)
+
+    def unregister(self, channel: ClientChannel):
+        for topic in list(channel.topics):
+            self.unsubscribe(channel, topic)
+        if self.channels.get(channel.client_id) is channel:
+            del self.channels[channel.client_id]
+
+    def channel_for(self, websocket: WebSocket) -> Optional[ClientChannel]:
+        for channel in self.channels.values():
+            if channel.websocket is websocket:
+                return channel
+        return None
+
+    def has_subscribers(self, topic: str) -> bool:
+        """
+        True if anyone on this node, or on a node that has announced the
+        topic over the relay, is listening
+
+        A subscription made on another node is seen once its announcement
+        arrives (one relay hop), so an event published in that gap is skipped.
+        """
+        if self.topics.get(topic):
+            return True
+        now = time.monotonic()
+        return any(
+            expires > now and topic in topics
+            for expires, topics in self.remote_topics.values()
+        )
+
+    # ============================================
+    # PUBLISHING
+    # ============================================
+
+    async def publish(self, topic: str, payload: Any):
+        """Serialize once, deliver locally, and relay to the other nodes"""
+        message = payload if isinstance(payload, str) else json.dumps(payload, default=str)
+        self.published += 1
+        self.deliver_local(topic, message)
+
+        if self.redis is not None:
+            try:
+                await self.redis.publish(RELAY_CHANNEL, f"{self.node_id}\n{topic}\n{message}")
+            except Exception as e:
+                logger.error("WebSocket relay publish failed", error=str(e))
+        else:
+            # Let writer tasks drain between back-to-back publishes
+            await asyncio.sleep(0)
+
+    def deliver_local(self, topic: str, message: str) -> int:
+        """Enqueue to every local subscriber; never awaits a socket"""
+        delivered = 0
+        for channel in list(self.topics.get(topic, ())):
+            if channel.offer(message):
+                delivered += 1
+        self.delivered += delivered
+        return delivered
+
+    # ============================================
+    # CROSS-NODE RELAY
+    # ============================================
+
+    async def start(self):
+        """Connect the Redis relay (no-op without redis or REDIS_URL)"""
+        if self._relay_task or not self.redis_url:
+            return
+        if aioredis is None:
+            logger.warning("redis package not installed, WebSocket relay disabled")
+            return
+
+        try:
+            self.redis = aioredis.from_url(self.redis_url, decode_responses=True)
+            pubsub = self.redis.pubsub()
+            await pubsub.subscribe(RELAY_CHANNEL)
+            self._relay_task = asyncio.create_task(self._relay_loop(pubsub))
+            self._interest_task = asyncio.create_task(self._interest_loop())
+            logger.info("WebSocket relay connected", node_id=self.node_id, channel=RELAY_CHANNEL)
+        except Exception as e:
+            logger.error("WebSocket relay unavailable, delivering locally only", error=str(e))
+            self.redis = None
+
+    async def stop(self):
+        for task in (self._relay_task, self._interest_task, self._interest_flush):
+            if task:
+                task.cancel()
+        self._relay_task = self._interest_task = self._interest_flush = None
+        if self.redis is not None:
+            await self.redis.aclose()
+            self.redis = None
+        for channel in list(self.channels.values()):
+            await channel.close()
+
+    async def _relay_loop(self, pubsub):
+        try:
+            async for item in pubsub.listen():
+                if item.get("type") != "message":
+                    continue
+                origin, topic, message = item["data"].split("\n", 2)
+                if origin == self.node_id:
+                    continue
+                if topic == INTEREST_TOPIC:
+                    self._apply_interest(origin, json.loads(message))
+                    continue
+                self.relayed_in += 1
+                self.deliver_local(topic, message)
+        except asyncio.CancelledError:
+            await pubsub.unsubscribe(RELAY_CHANNEL)
+        except Exception as e:
+            logger.error("WebSocket relay loop stopped", error=str(e))
+
+    # ============================================
+    # TOPIC INTEREST (which topics other nodes serve)
+    # ============================================
+
+    def _interest_changed(self, topic: str, subscribed: bool):
+        """Queue a topic gaining its first / losing its last local subscriber"""
+        if self.redis is None:
+            return
+        self._interest_changes[topic] = subscribed
+        if self._interest_flush is None:
+            self._interest_flush = asyncio.create_task(self._flush_interest())
+            self._interest_flush.add_done_callback(_log_task_error)
+
+    async def _flush_interest(self):
+        """Announce every change made since the last flush in one message"""
+        await asyncio.sleep(0)
+        changes, self._interest_changes = self._interest_changes, {}
+        self._interest_flush = None
+        await self._announce({
+            "add": [topic for topic, subscribed in changes.items() if subscribed],
+            "remove": [topic for topic, subscribed in changes.items() if not subscribed]
+        })
+
+    async def _interest_loop(self):
+        """Full snapshot on start (asking the others for theirs), then periodically"""
+        await self._announce({"full": list(self.topics), "hello": True})
+        while True:
+            await asyncio.sleep(INTEREST_REFRESH_SECONDS)
+            await self._announce({"full": list(self.topics)})
+
+    async def _announce(self, update: Dict[str, Any]):
+        if self.redis is None:
+            return
+        try:
+            await self.redis.publish(RELAY_CHANNEL, f"{self.node_id}\n{INTEREST_TOPIC}\n{json.dumps(update)}")
+        except Exception as e:
+            logger.error("WebSocket interest announce failed", error=str(e))
+
+    def _apply_interest(self, origin: str, update: Dict[str, Any]):
+        if "full" in update:
+            topics = set(update["full"])
+        else:
+            _, topics = self.remote_topics.get(origin, (0.0, set()))
+            topics = (topics | set(update.get("add", ()))) - set(update.get("remove", ()))
+        self.remote_topics[origin] = (time.monotonic() + INTEREST_TTL_SECONDS, topics)
+
+        if update.get("hello"):
+            # A node just joined: tell it what we serve without waiting for the next refresh
+            task = asyncio.create_task(self._announce({"full": list(self.topics)}))
+            task.add_done_callback(_log_task_error)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "node_id": self.node_id,
+            "connections": len(self.channels),
+            "topics": len(self.topics),
+            "published": self.published,
+            "delivered": self.delivered,
+            "relayed_in": self.relayed_in,
+            "evictions": self.evictions,
+            "relay_enabled": self.redis is not None,
+            "remote_nodes": len(self.remote_topics),
+            "queued": sum(c.queue.qsize() for c in self.channels.values())
+        }
+
+
+def _log_task_error(task: asyncio.Task):
+    """Done-callback for fire-and-forget tasks, so their failures are logged"""
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("WebSocket background task failed", error=str(task.exception()))
+
+
+# Global instance shared by every WebSocket manager in the process
+broadcaster = Broadcaster()
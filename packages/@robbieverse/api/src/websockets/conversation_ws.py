@@ -4,28 +4,40 @@ Real-time updates for conversation context, rollback, and branching
 """
 import json
 import asyncio
-from typing import Dict, Set, Any
-from fastapi import WebSocket, WebSocketDisconnect
+from typing import Dict, List, Set, Any, Tuple
+from fastapi import WebSocket
 from datetime import datetime
 import structlog
 
-from app.services.conversation_context import ConversationContextManager
-from app.websockets.manager import ConnectionManager
+from ..services.conversation_context import ConversationContextManager
+from .broadcaster import Broadcaster, ClientChannel, broadcaster as shared_broadcaster
 
 logger = structlog.get_logger()
 
+# Events for the same conversation arriving within this window share one stats lookup
+STATS_COALESCE_SECONDS = 0.05
+
 class ConversationWebSocketManager:
     """Manages WebSocket connections for conversation updates"""
     
-    def __init__(self):
-        self.connection_manager = ConnectionManager()
+    def __init__(self, broadcaster: Broadcaster = None):
+        self.broadcaster = broadcaster or shared_broadcaster
         self.context_manager = ConversationContextManager()
         self.conversation_connections: Dict[str, Set[WebSocket]] = {}
         self.user_connections: Dict[str, Set[WebSocket]] = {}
+        self.channels: Dict[WebSocket, ClientChannel] = {}
+        
+        # Per-conversation events waiting for a shared conversation_stats lookup
+        self._pending_stats_events: Dict[str, List[Tuple[str, Dict[str, Any]]]] = {}
+        self._stats_flushes: Dict[str, asyncio.Task] = {}
     
     async def connect(self, websocket: WebSocket, conversation_id: str, user_id: str = None):
         """Connect a WebSocket to a conversation"""
-        await self.connection_manager.connect(websocket)
+        await websocket.accept()
+        topics = [f"conversation:{conversation_id}"]
+        if user_id:
+            topics.append(f"user:{user_id}")
+        self.channels[websocket] = self.broadcaster.register(websocket, topics=topics)
         
         # Add to conversation connections
         if conversation_id not in self.conversation_connections:
@@ -45,7 +57,9 @@ class ConversationWebSocketManager:
     
     async def disconnect(self, websocket: WebSocket, conversation_id: str, user_id: str = None):
         """Disconnect a WebSocket from a conversation"""
-        await self.connection_manager.disconnect(websocket)
+        channel = self.channels.pop(websocket, None)
+        if channel:
+            await channel.close()
         
         # Remove from conversation connections
         if conversation_id in self.conversation_connections:
@@ -64,98 +78,104 @@ class ConversationWebSocketManager:
                    user_id=user_id)
     
     async def broadcast_to_conversation(self, conversation_id: str, event: str, data: Dict[str, Any]):
-        """Broadcast an event to all connected clients for a conversation"""
-        if conversation_id not in self.conversation_connections:
+        """Broadcast an event to all connected clients for a conversation (on any node)"""
+        topic = f"conversation:{conversation_id}"
+        if not self.broadcaster.has_subscribers(topic):
             return
         
-        message = {
+        # Serialized once; each client's writer task does the actual send
+        await self.broadcaster.publish(topic, {
             "event": event,
             "conversation_id": conversation_id,
             "data": data,
             "timestamp": datetime.utcnow().isoformat()
-        }
-        
-        disconnected = set()
-        for websocket in self.conversation_connections[conversation_id]:
-            try:
-                await websocket.send_text(json.dumps(message))
-            except WebSocketDisconnect:
-                disconnected.add(websocket)
-            except Exception as e:
-                logger.error("Error broadcasting to WebSocket", error=str(e))
-                disconnected.add(websocket)
-        
-        # Clean up disconnected connections
-        for websocket in disconnected:
-            self.conversation_connections[conversation_id].discard(websocket)
+        })
     
     async def broadcast_to_user(self, user_id: str, event: str, data: Dict[str, Any]):
-        """Broadcast an event to all connected clients for a user"""
-        if user_id not in self.user_connections:
+        """Broadcast an event to all connected clients for a user (on any node)"""
+        topic = f"user:{user_id}"
+        if not self.broadcaster.has_subscribers(topic):
             return
         
-        message = {
+        await self.broadcaster.publish(topic, {
             "event": event,
             "user_id": user_id,
             "data": data,
             "timestamp": datetime.utcnow().isoformat()
-        }
+        })
+    
+    async def _broadcast_with_stats(self, conversation_id: str, event: str, data: Dict[str, Any]):
+        """
+        Queue an event that carries conversation_stats
         
-        disconnected = set()
-        for websocket in self.user_connections[user_id]:
-            try:
-                await websocket.send_text(json.dumps(message))
-            except WebSocketDisconnect:
-                disconnected.add(websocket)
-            except Exception as e:
-                logger.error("Error broadcasting to user WebSocket", error=str(e))
-                disconnected.add(websocket)
+        Events for one conversation that land within STATS_COALESCE_SECONDS
+        share a single get_conversation_context lookup, taken after the
+        last of them so every event reports the same, current stats.
+        """
+        if not self.broadcaster.has_subscribers(f"conversation:{conversation_id}"):
+            return
         
-        # Clean up disconnected connections
-        for websocket in disconnected:
-            self.user_connections[user_id].discard(websocket)
+        self._pending_stats_events.setdefault(conversation_id, []).append((event, data))
+        if conversation_id not in self._stats_flushes:
+            flush = asyncio.create_task(self._flush_stats_events(conversation_id))
+            flush.add_done_callback(self._log_flush_error)
+            self._stats_flushes[conversation_id] = flush
+    
+    @staticmethod
+    def _log_flush_error(task: asyncio.Task):
+        """Nobody awaits the flush task, so log what it raised"""
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Conversation stats broadcast failed", error=str(task.exception()))
+    
+    async def _flush_stats_events(self, conversation_id: str):
+        """Fetch stats once and broadcast every pending event for the conversation"""
+        try:
+            await asyncio.sleep(STATS_COALESCE_SECONDS)
+        finally:
+            # Later events start a fresh batch while this one is in flight
+            events = self._pending_stats_events.pop(conversation_id, [])
+            self._stats_flushes.pop(conversation_id, None)
+        
+        stats = await self._get_conversation_stats(conversation_id)
+        for event, data in events:
+            data["conversation_stats"] = stats
+            await self.broadcast_to_conversation(conversation_id, event, data)
     
     async def handle_message_added(self, conversation_id: str, message_data: Dict[str, Any]):
         """Handle message added event"""
-        await self.broadcast_to_conversation(conversation_id, "message_added", {
-            "message": message_data,
-            "conversation_stats": await self._get_conversation_stats(conversation_id)
+        await self._broadcast_with_stats(conversation_id, "message_added", {
+            "message": message_data
         })
     
     async def handle_message_rolled_back(self, conversation_id: str, message_id: str, reason: str):
         """Handle message rolled back event"""
-        await self.broadcast_to_conversation(conversation_id, "message_rolled_back", {
+        await self._broadcast_with_stats(conversation_id, "message_rolled_back", {
             "message_id": message_id,
-            "reason": reason,
-            "conversation_stats": await self._get_conversation_stats(conversation_id)
+            "reason": reason
         })
     
     async def handle_message_restored(self, conversation_id: str, message_id: str):
         """Handle message restored event"""
-        await self.broadcast_to_conversation(conversation_id, "message_restored", {
-            "message_id": message_id,
-            "conversation_stats": await self._get_conversation_stats(conversation_id)
+        await self._broadcast_with_stats(conversation_id, "message_restored", {
+            "message_id": message_id
         })
     
     async def handle_branch_created(self, conversation_id: str, branch_data: Dict[str, Any]):
         """Handle branch created event"""
-        await self.broadcast_to_conversation(conversation_id, "branch_created", {
-            "branch": branch_data,
-            "conversation_stats": await self._get_conversation_stats(conversation_id)
+        await self._broadcast_with_stats(conversation_id, "branch_created", {
+            "branch": branch_data
         })
     
     async def handle_branch_switched(self, conversation_id: str, branch_id: str):
         """Handle branch switched event"""
-        await self.broadcast_to_conversation(conversation_id, "branch_switched", {
-            "branch_id": branch_id,
-            "conversation_stats": await self._get_conversation_stats(conversation_id)
+        await self._broadcast_with_stats(conversation_id, "branch_switched", {
+            "branch_id": branch_id
         })
     
     async def handle_context_compressed(self, conversation_id: str, compression_data: Dict[str, Any]):
         """Handle context compressed event"""
-        await self.broadcast_to_conversation(conversation_id, "context_compressed", {
-            "compression": compression_data,
-            "conversation_stats": await self._get_conversation_stats(conversation_id)
+        await self._broadcast_with_stats(conversation_id, "context_compressed", {
+            "compression": compression_data
         })
     
     async def _get_conversation_stats(self, conversation_id: str) -> Dict[str, Any]:
@@ -177,6 +197,14 @@ class ConversationWebSocketManager:
                 "active_branch": None
             }
     
+    async def _send(self, websocket: WebSocket, payload: Dict[str, Any]):
+        """Reply to one client through its send queue (keeps ordering with broadcasts)"""
+        channel = self.channels.get(websocket)
+        if channel:
+            channel.offer(json.dumps(payload, default=str))
+        else:
+            await websocket.send_text(json.dumps(payload, default=str))
+    
     async def handle_websocket_message(self, websocket: WebSocket, message: str, conversation_id: str, user_id: str = None):
         """Handle incoming WebSocket messages"""
         try:
@@ -184,62 +212,63 @@ class ConversationWebSocketManager:
             event_type = data.get("event")
             
             if event_type == "ping":
-                await websocket.send_text(json.dumps({
+                await self._send(websocket, {
                     "event": "pong",
                     "timestamp": datetime.utcnow().isoformat()
-                }))
+                })
             
             elif event_type == "get_context":
                 context = await self.context_manager.get_conversation_context(conversation_id)
-                await websocket.send_text(json.dumps({
+                await self._send(websocket, {
                     "event": "context_update",
                     "conversation_id": conversation_id,
                     "data": context,
                     "timestamp": datetime.utcnow().isoformat()
-                }))
+                })
             
             elif event_type == "get_branches":
                 branches = await self.context_manager.get_conversation_branches(conversation_id)
-                await websocket.send_text(json.dumps({
+                await self._send(websocket, {
                     "event": "branches_update",
                     "conversation_id": conversation_id,
                     "data": branches,
                     "timestamp": datetime.utcnow().isoformat()
-                }))
+                })
             
             elif event_type == "get_rollback_history":
                 history = await self.context_manager.get_rollback_history(conversation_id)
-                await websocket.send_text(json.dumps({
+                await self._send(websocket, {
                     "event": "rollback_history_update",
                     "conversation_id": conversation_id,
                     "data": history,
                     "timestamp": datetime.utcnow().isoformat()
-                }))
+                })
             
             else:
-                await websocket.send_text(json.dumps({
+                await self._send(websocket, {
                     "event": "error",
                     "message": f"Unknown event type: {event_type}",
                     "timestamp": datetime.utcnow().isoformat()
-                }))
+                })
         
         except json.JSONDecodeError:
-            await websocket.send_text(json.dumps({
+            await self._send(websocket, {
                 "event": "error",
                 "message": "Invalid JSON format",
                 "timestamp": datetime.utcnow().isoformat()
-            }))
+            })
         except Exception as e:
             logger.error("Error handling WebSocket message", error=str(e))
-            await websocket.send_text(json.dumps({
+            await self._send(websocket, {
                 "event": "error",
                 "message": "Internal server error",
                 "timestamp": datetime.utcnow().isoformat()
-            }))
+            })
     
     def get_connection_stats(self) -> Dict[str, Any]:
         """Get WebSocket connection statistics"""
         return {
+            "broadcaster": self.broadcaster.get_stats(),
             "total_conversations": len(self.conversation_connections),
             "total_users": len(self.user_connections),
             "conversation_connections": {
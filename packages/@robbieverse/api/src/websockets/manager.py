@@ -6,45 +6,37 @@ from fastapi import WebSocket
 import json
 import asyncio
 
+from .broadcaster import Broadcaster, ClientChannel, BROADCAST_TOPIC, broadcaster as shared_broadcaster
+
 class ConnectionManager:
     """WebSocket connection manager for real-time communication"""
     
-    def __init__(self):
-        self.active_connections: Dict[str, WebSocket] = {}
+    def __init__(self, broadcaster: Broadcaster = None, broadcast_topic: str = BROADCAST_TOPIC):
+        self.broadcaster = broadcaster or shared_broadcaster
+        # Only this manager's clients subscribe here, so broadcast() never reaches other managers' sockets
+        self.broadcast_topic = broadcast_topic
+        self.active_connections: Dict[str, ClientChannel] = {}
     
     async def connect(self, websocket: WebSocket, client_id: str):
         """Accept WebSocket connection and add to active connections"""
         await websocket.accept()
-        self.active_connections[client_id] = websocket
+        self.active_connections[client_id] = self.broadcaster.register(
+            websocket, client_id, topics=[self.broadcast_topic]
+        )
     
     def disconnect(self, client_id: str):
         """Remove connection from active connections"""
-        if client_id in self.active_connections:
-            del self.active_connections[client_id]
+        channel = self.active_connections.pop(client_id, None)
+        if channel:
+            asyncio.create_task(channel.close())
     
     async def send_personal_message(self, message: str, client_id: str):
-        """Send message to specific client"""
-        if client_id in self.active_connections:
-            try:
-                await self.active_connections[client_id].send_text(message)
-            except Exception as e:
-                # Connection might be closed, remove it
-                self.disconnect(client_id)
+        """Send message to specific client (on any node when relaying)"""
+        await self.broadcaster.publish(f"client:{client_id}", message)
     
     async def broadcast(self, message: str):
-        """Broadcast message to all connected clients"""
-        disconnected_clients = []
-        
-        for client_id, connection in self.active_connections.items():
-            try:
-                await connection.send_text(message)
-            except Exception as e:
-                # Connection closed, mark for removal
-                disconnected_clients.append(client_id)
-        
-        # Remove disconnected clients
-        for client_id in disconnected_clients:
-            self.disconnect(client_id)
+        """Broadcast message to all connected clients (enqueue, never blocks on a socket)"""
+        await self.broadcaster.publish(self.broadcast_topic, message)
     
     async def send_json(self, data: dict, client_id: str):
         """Send JSON data to specific client"""
@@ -56,10 +48,17 @@ class ConnectionManager:
         message = json.dumps(data)
         await self.broadcast(message)
     
+    def _prune_closed(self):
+        """Forget channels the broadcaster has evicted or closed"""
+        for client_id in [cid for cid, ch in self.active_connections.items() if ch.closed]:
+            del self.active_connections[client_id]
+    
     def get_connection_count(self) -> int:
         """Get number of active connections"""
+        self._prune_closed()
         return len(self.active_connections)
     
     def get_connected_clients(self) -> List[str]:
         """Get list of connected client IDs"""
+        self._prune_closed()
         return list(self.active_connections.keys())
@@ -5,6 +5,9 @@ Aurora AI GPU Mesh Coordinator
 """
 
 import asyncio
+import bisect
+import heapq
+import itertools
 import json
 import logging
 import time
@@ -54,21 +57,108 @@ class Task:
     created_at: datetime
     assigned_node: Optional[str] = None
     status: str = "pending"
+    business_category: Optional[str] = None  # Key into business_weights; orders tasks within a priority
+    queued_at: Optional[datetime] = None
+    assigned_at: Optional[datetime] = None
+    reserved_load: float = 0.0
+
+class QueueWaitHistogram:
+    """Queue wait (pending → assigned) counts per latency bucket, in ms"""
+
+    BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, wait_ms: float):
+        self.counts[bisect.bisect_left(self.BUCKETS_MS, wait_ms)] += 1
+        self.count += 1
+        self.total_ms += wait_ms
+        self.max_ms = max(self.max_ms, wait_ms)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-th percentile"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return self.BUCKETS_MS[i] if i < len(self.BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+    def to_dict(self) -> Dict:
+        buckets = {f"le_{b}ms": n for b, n in zip(self.BUCKETS_MS, self.counts)}
+        buckets[f"gt_{self.BUCKETS_MS[-1]}ms"] = self.counts[-1]
+        return {
+            "buckets": buckets,
+            "count": self.count,
+            "avg_ms": round(self.total_ms / self.count, 2) if self.count else 0.0,
+            "max_ms": round(self.max_ms, 2),
+            "p50_ms": self.percentile(0.50),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99)
+        }
+
+class NodeRanking:
+    """
+    Dispatchable nodes kept in score order, re-ranked only when a node changes
+
+    A node's score doesn't depend on the task, so the first node in score
+    order that can take a task is the best one for it.
+    """
+
+    def __init__(self):
+        self._order: List[Tuple[float, str]] = []
+        self._keys: Dict[str, Tuple[float, str]] = {}
+
+    def update(self, node_id: str, score: Optional[float]):
+        """Re-rank a node; score None removes it from dispatch"""
+        self.discard(node_id)
+        if score is not None:
+            key = (-score, node_id)
+            bisect.insort(self._order, key)
+            self._keys[node_id] = key
+
+    def discard(self, node_id: str):
+        key = self._keys.pop(node_id, None)
+        if key is not None:
+            del self._order[bisect.bisect_left(self._order, key)]
+
+    def __iter__(self):
+        return (node_id for _, node_id in list(self._order))
+
+    def __len__(self):
+        return len(self._order)
 
 class GPUMeshCoordinator:
     def __init__(self, redis_host="localhost", redis_port=6379):
         self.redis_client = redis.Redis(host=redis_host, port=redis_port, decode_responses=True)
         self.nodes: Dict[str, GPUNode] = {}
         self.task_queue: List[Task] = []
+        self.tasks_by_id: Dict[str, Task] = {}
         self.running = False
         
+        # Pending tasks as a heap of (priority, -business weight, seq, task);
+        # dispatch wakes on submit, completion and node state changes instead of polling
+        self._pending: List[Tuple[int, float, int, Task]] = []
+        self._pending_seq = itertools.count()
+        self._dispatch_wakeup = asyncio.Event()
+        self.node_ranking = NodeRanking()
+        self.queue_wait = QueueWaitHistogram()
+        
         # Performance metrics
         self.metrics = {
             "total_tasks_processed": 0,
             "average_task_duration": 0.0,
             "node_utilization": {},
             "failover_count": 0,
-            "last_health_check": None
+            "last_health_check": None,
+            "queue_wait": self.queue_wait.to_dict()
         }
         
         # Business priority weights
@@ -146,7 +236,10 @@ class GPUMeshCoordinator:
                 performance_score=1.0
             )
             self.nodes[node.node_id] = node
+            self._rerank_node(node)
             logger.info(f"📡 Registered node: {node.node_id} at {node.host}:{node.port}")
+        
+        self._wake_dispatcher()
 
     async def _health_monitor(self):
         """Continuously monitor GPU node health"""
@@ -165,6 +258,10 @@ class GPUMeshCoordinator:
                     
                     node.status = health_status
                     node.last_heartbeat = datetime.now()
+                    
+                    # Load / status moved: re-rank and let queued work try again
+                    self._rerank_node(node)
+                    self._wake_dispatcher()
                 
                 self.metrics["last_health_check"] = datetime.now()
                 
@@ -199,68 +296,68 @@ class GPUMeshCoordinator:
             return NodeStatus.FAILED
 
     async def _load_balancer(self):
-        """Distribute tasks across healthy nodes"""
+        """Distribute pending tasks whenever a submit, completion or node change wakes us"""
         while self.running:
+            await self._dispatch_wakeup.wait()
+            self._dispatch_wakeup.clear()
+            
             try:
-                # Get pending tasks
-                pending_tasks = [task for task in self.task_queue if task.status == "pending"]
-                
-                if pending_tasks:
-                    # Sort by priority (Critical first)
-                    pending_tasks.sort(key=lambda t: t.priority.value)
-                    
-                    # Assign tasks to best available nodes
-                    for task in pending_tasks:
-                        best_node = await self._find_best_node(task)
-                        if best_node:
-                            await self._assign_task(task, best_node)
-                        else:
-                            logger.warning(f"⚠️ No available nodes for task {task.task_id}")
-                
-                await asyncio.sleep(5)  # Check every 5 seconds
-                
+                await self._dispatch_pending()
             except Exception as e:
                 logger.error(f"❌ Load balancer error: {e}")
 
-    async def _find_best_node(self, task: Task) -> Optional[GPUNode]:
-        """Find the best available node for a task"""
-        available_nodes = [
-            node for node in self.nodes.values()
-            if node.status == NodeStatus.HEALTHY and self._node_can_handle_task(node, task)
-        ]
-        
-        if not available_nodes:
-            return None
-        
-        # Score nodes based on multiple factors
-        scored_nodes = []
-        for node in available_nodes:
-            score = self._calculate_node_score(node, task)
-            scored_nodes.append((score, node))
-        
-        # Return highest scoring node
-        scored_nodes.sort(key=lambda x: x[0], reverse=True)
-        return scored_nodes[0][1]
-
-    def _calculate_node_score(self, node: GPUNode, task: Task) -> float:
-        """Calculate node suitability score for a task"""
-        # Base score from performance
-        score = node.performance_score
+    def _wake_dispatcher(self):
+        self._dispatch_wakeup.set()
+
+    def _push_pending(self, task: Task):
+        task.status = "pending"
+        task.queued_at = datetime.now()
+        self._queue_pending(task)
+
+    def _queue_pending(self, task: Task):
+        weight = self.business_weights.get(task.business_category, 0.0)
+        heapq.heappush(self._pending, (task.priority.value, -weight, next(self._pending_seq), task))
+
+    async def _dispatch_pending(self):
+        """Assign pending tasks in priority order (Critical first, then by business weight, then FIFO)"""
+        deferred = []
+        while self._pending and len(self.node_ranking):
+            task = heapq.heappop(self._pending)[-1]
+            if task.status != "pending":
+                continue
+            
+            best_node = await self._find_best_node(task)
+            if best_node:
+                await self._assign_task(task, best_node)
+            else:
+                deferred.append(task)
         
-        # Penalize high utilization
+        # Anything that fit nowhere waits for the next node change or completion
+        for task in deferred:
+            self._queue_pending(task)
+        if deferred:
+            logger.warning(f"⚠️ No available nodes for {len(deferred)} pending tasks")
+
+    async def _find_best_node(self, task: Task) -> Optional[GPUNode]:
+        """Find the best available node for a task (first fit in score order)"""
+        for node_id in self.node_ranking:
+            node = self.nodes[node_id]
+            if self._node_can_handle_task(node, task):
+                return node
+        return None
+
+    def _node_base_score(self, node: GPUNode) -> float:
+        """Node score used for dispatch ranking (the same for every task)"""
         utilization_penalty = node.current_load * 0.5
         memory_penalty = (node.memory_used / 100) * 0.3
-        
-        # Bonus for business-critical tasks
-        business_bonus = 0.0
-        if "revenue" in task.task_id.lower() or "deal" in task.task_id.lower():
-            business_bonus = 0.2
-        
-        # Capability matching bonus
-        capability_bonus = 0.1 if self._node_has_required_capabilities(node, task) else 0.0
-        
-        final_score = score - utilization_penalty - memory_penalty + business_bonus + capability_bonus
-        return max(0.0, final_score)
+        return node.performance_score - utilization_penalty - memory_penalty
+
+    def _rerank_node(self, node: GPUNode):
+        """Keep the ranking in step with a node's status and load"""
+        if node.status == NodeStatus.HEALTHY and node.current_load <= 90:
+            self.node_ranking.update(node.node_id, self._node_base_score(node))
+        else:
+            self.node_ranking.discard(node.node_id)
 
     def _node_can_handle_task(self, node: GPUNode, task: Task) -> bool:
         """Check if node can handle the task requirements"""
@@ -280,19 +377,20 @@ class GPUMeshCoordinator:
         
         return True
 
-    def _node_has_required_capabilities(self, node: GPUNode, task: Task) -> bool:
-        """Check if node has all required capabilities"""
-        required_capabilities = task.node_requirements.get("capabilities", [])
-        return all(cap in node.capabilities for cap in required_capabilities)
-
     async def _assign_task(self, task: Task, node: GPUNode):
         """Assign task to a specific node"""
         task.assigned_node = node.node_id
         task.status = "assigned"
+        task.assigned_at = datetime.now()
+        
+        queued_at = task.queued_at or task.created_at
+        self.queue_wait.observe((task.assigned_at - queued_at).total_seconds() * 1000)
         
         # Update node load
         estimated_load = task.estimated_duration * 0.1  # Rough estimate
+        task.reserved_load = min(100 - node.current_load, estimated_load)
         node.current_load = min(100, node.current_load + estimated_load)
+        self._rerank_node(node)
         
         logger.info(f"📋 Assigned task {task.task_id} to node {node.node_id}")
         
@@ -318,14 +416,17 @@ class GPUMeshCoordinator:
         failed_tasks = [task for task in self.task_queue if task.assigned_node == node_id]
         
         for task in failed_tasks:
-            task.status = "pending"
             task.assigned_node = None
+            task.reserved_load = 0.0
+            self._push_pending(task)
             logger.info(f"🔄 Requeuing task {task.task_id} from failed node {node_id}")
         
         self.metrics["failover_count"] += 1
         
         # Update node status
         self.nodes[node_id].status = NodeStatus.FAILED
+        self._rerank_node(self.nodes[node_id])
+        self._wake_dispatcher()
 
     async def _handle_node_recovery(self, node_id: str):
         """Handle node recovery"""
@@ -335,6 +436,8 @@ class GPUMeshCoordinator:
         self.nodes[node_id].current_load = 0.0
         self.nodes[node_id].memory_used = 0.0
         self.nodes[node_id].status = NodeStatus.HEALTHY
+        self._rerank_node(self.nodes[node_id])
+        self._wake_dispatcher()
         
         logger.info(f"✅ Node {node_id} recovered successfully")
 
@@ -351,6 +454,7 @@ class GPUMeshCoordinator:
                     "total_nodes": total_nodes,
                     "healthy_nodes": healthy_nodes,
                     "average_utilization": avg_utilization,
+                    "queue_wait": self.queue_wait.to_dict(),
                     "timestamp": datetime.now().isoformat()
                 })
                 
@@ -362,27 +466,60 @@ class GPUMeshCoordinator:
             except Exception as e:
                 logger.error(f"❌ Metrics collection error: {e}")
 
-    async def submit_task(self, task_id: str, priority: TaskPriority, requirements: Dict, estimated_duration: float) -> bool:
-        """Submit a new task to the mesh"""
+    async def submit_task(self, task_id: str, priority: TaskPriority, requirements: Dict, estimated_duration: float,
+                          business_category: Optional[str] = None) -> bool:
+        """Submit a new task to the mesh (dispatched as soon as the balancer wakes)"""
         task = Task(
             task_id=task_id,
             priority=priority,
             node_requirements=requirements,
             estimated_duration=estimated_duration,
-            created_at=datetime.now()
+            created_at=datetime.now(),
+            business_category=business_category
         )
         
         self.task_queue.append(task)
+        self.tasks_by_id[task_id] = task
+        self._push_pending(task)
+        self._wake_dispatcher()
         logger.info(f"📥 Submitted task {task_id} with priority {priority.name}")
         
         return True
 
+    async def complete_task(self, task_id: str, success: bool = True) -> bool:
+        """Mark a task finished, give its load back to the node and dispatch more work"""
+        task = self.tasks_by_id.get(task_id)
+        if task is None or task.status != "assigned":
+            return False
+        
+        node = self.nodes.get(task.assigned_node)
+        if node:
+            node.current_load = max(0.0, node.current_load - task.reserved_load)
+            self._rerank_node(node)
+        task.reserved_load = 0.0
+        task.status = "completed" if success else "failed"
+        
+        if success and task.assigned_at:
+            processed = self.metrics["total_tasks_processed"]
+            duration = (datetime.now() - task.assigned_at).total_seconds()
+            self.metrics["average_task_duration"] = (
+                (self.metrics["average_task_duration"] * processed + duration) / (processed + 1)
+            )
+            self.metrics["total_tasks_processed"] = processed + 1
+        
+        self.task_queue.remove(task)
+        del self.tasks_by_id[task_id]
+        
+        self._wake_dispatcher()
+        return True
+
     def get_mesh_status(self) -> Dict:
         """Get current mesh status"""
         return {
             "nodes": {node_id: asdict(node) for node_id, node in self.nodes.items()},
             "metrics": self.metrics,
             "task_queue_size": len([t for t in self.task_queue if t.status == "pending"]),
+            "queue_wait": self.queue_wait.to_dict(),
             "timestamp": datetime.now().isoformat()
         }
 
@@ -390,6 +527,7 @@ class GPUMeshCoordinator:
         """Stop the GPU mesh coordinator"""
         logger.info("🛑 Stopping GPU Mesh Coordinator...")
         self.running = False
+        self._wake_dispatcher()
 
 # Main execution
 async def main():
@@ -406,7 +544,8 @@ async def main():
                 "gpu_memory": 8,
                 "capabilities": ["llm_inference", "business_processing"]
             },
-            estimated_duration=30.0
+            estimated_duration=30.0,
+            business_category="deal_processing"
         )
         
         # Keep running
@@ -0,0 +1 @@
+../packages/@robbie/mcp-servers/hybrid_memory.py
\ No newline at end of file
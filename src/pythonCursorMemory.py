@@ -2,6 +2,7 @@
 """
 Python Cursor Memory System
 Saves and searches our Cursor conversation history
+(hybrid BM25 + vector search via the shared hybrid_memory engine)
 """
 
 import sqlite3
@@ -10,16 +11,28 @@ import hashlib
 import re
 from datetime import datetime
 from pathlib import Path
-from typing import List, Dict, Optional, Any
+from typing import Awaitable, Callable, List, Dict, Optional, Any
 import asyncio
 
+try:
+    from .hybrid_memory import AccessCounter, HybridMemory
+except ImportError:  # run as a script from src/
+    from hybrid_memory import AccessCounter, HybridMemory
+
 class PythonCursorMemory:
-    def __init__(self, db_path: str = "./data/cursor_chat_memory.db"):
+    def __init__(self, db_path: str = "./data/cursor_chat_memory.db",
+                 embedder: Optional[Callable[[str], Awaitable[Optional[List[float]]]]] = None):
         self.db_path = Path(db_path)
         self.db_path.parent.mkdir(exist_ok=True)
         self.conn = None
         self.is_initialized = False
         
+        # Optional async text -> embedding; without it search is keyword-only
+        self.embedder = embedder
+        self.memory: Optional[HybridMemory] = None
+        self.access_counts: Optional[AccessCounter] = None
+        self._training: Optional[asyncio.Task] = None
+        
         # Message types
         self.message_types = {
             'USER_QUERY': 'user_query',
@@ -41,6 +54,14 @@ class PythonCursorMemory:
             
             await self._setup_database()
             
+            self.memory = HybridMemory(
+                self.conn, 'cursor_conversations', ['searchable_text', 'keywords', 'topics'],
+                vector_path=self.db_path.with_name('cursor_chat_vectors')
+            )
+            self.access_counts = AccessCounter(
+                self.conn, 'cursor_conversations', 'id', touched_column='last_accessed'
+            )
+            
             self.is_initialized = True
             print('✅ Python Cursor Memory System initialized successfully')
             
@@ -248,7 +269,9 @@ class PythonCursorMemory:
             ))
             
             self.conn.commit()
+            rowid = cursor.lastrowid
             cursor.close()
+            await self._embed_message(rowid, query)
             
             print(f'💾 Saved user query: {query[:50]}...')
             return message_id
@@ -298,7 +321,9 @@ class PythonCursorMemory:
             ))
             
             self.conn.commit()
+            rowid = cursor.lastrowid
             cursor.close()
+            await self._embed_message(rowid, response)
             
             print(f'💾 Saved assistant response: {response[:50]}...')
             return message_id
@@ -313,33 +338,32 @@ class PythonCursorMemory:
             if not self.is_initialized:
                 raise Exception('Memory system not initialized')
             
-            cursor = self.conn.cursor()
+            # BM25 over searchable text, keywords and topics, fused with vector hits
+            query_vector = await self.embedder(query) if self.embedder else None
+            ranked = [rowid for rowid, _ in self.memory.search(query, query_vector, limit)]
+            if not ranked:
+                return []
             
-            # Search in searchable text, keywords, and topics
-            cursor.execute('''
+            cursor = self.conn.cursor()
+            placeholders = ', '.join('?' for _ in ranked)
+            cursor.execute(f'''
                 SELECT 
-                    id, session_id, message_type, content, content_hash,
+                    rowid, id, session_id, message_type, content, content_hash,
                     file_context, metadata, searchable_text, keywords, topics, importance_score,
                     created_at, access_count, last_accessed
                 FROM cursor_conversations
-                WHERE searchable_text LIKE ? OR keywords LIKE ? OR topics LIKE ?
-                ORDER BY 
-                    importance_score DESC,
-                    CASE WHEN searchable_text LIKE ? THEN 1 ELSE 0 END DESC,
-                    created_at DESC
-                LIMIT ?
-            ''', (f'%{query}%', f'%{query}%', f'%{query}%', f'%{query}%', limit))
-            
-            results = cursor.fetchall()
-            
-            # Update access counts
-            for result in results:
-                await self._update_access_count(result['id'])
+                WHERE rowid IN ({placeholders})
+            ''', ranked)
             
+            rows = {row['rowid']: row for row in cursor.fetchall()}
             cursor.close()
+            results = [rows[rowid] for rowid in ranked if rowid in rows]
             
-            # Convert to list of dictionaries
-            return [dict(result) for result in results]
+            # Update access counts (buffered, written in batches)
+            self.access_counts.record(result['id'] for result in results)
+            
+            # Convert to list of dictionaries, in fused rank order
+            return [{key: result[key] for key in result.keys() if key != 'rowid'} for result in results]
             
         except Exception as error:
             print(f'❌ Error searching conversations: {error}')
@@ -430,22 +454,43 @@ class PythonCursorMemory:
     async def _update_access_count(self, message_id: str):
         """Update access count for a message"""
         try:
-            cursor = self.conn.cursor()
-            cursor.execute('''
-                UPDATE cursor_conversations 
-                SET access_count = access_count + 1, last_accessed = CURRENT_TIMESTAMP
-                WHERE id = ?
-            ''', (message_id,))
-            self.conn.commit()
-            cursor.close()
+            self.access_counts.record([message_id])
         except Exception as error:
             print(f'❌ Error updating access count: {error}')
     
+    async def _embed_message(self, rowid: int, content: str):
+        """Store a message's embedding in the vector index, if an embedder is configured"""
+        if not self.embedder:
+            return
+        try:
+            vector = await self.embedder(content)
+            self.memory.add_vector(rowid, vector)
+            vectors = self.memory.vectors
+            if vectors is not None and vectors.needs_training and not self._training:
+                # Clustering re-reads every vector: keep it off the save path
+                self._training = asyncio.create_task(self._train_vectors())
+        except Exception as error:
+            print(f'⚠️ Embedding failed, message is keyword-searchable only: {error}')
+    
+    async def _train_vectors(self):
+        try:
+            await asyncio.to_thread(self.memory.vectors.train)
+        except Exception as error:
+            print(f'⚠️ Vector index training failed, search stays brute force: {error}')
+        finally:
+            self._training = None
+    
     async def shutdown(self):
         """Shutdown the memory system"""
         print('🛑 Shutting down Python Cursor Memory System...')
         
+        if self._training:
+            await self._training
         if self.conn:
+            if self.access_counts:
+                self.access_counts.flush()
+            if self.memory:
+                self.memory.flush()
             self.conn.close()
         
         self.is_initialized = False
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Agent router latency model: recorded-trace replay against the old static
+estimate, and learned per-node speed
+"""
+import heapq
+import os
+import random
+import statistics
+import sys
+from collections import defaultdict, deque
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../deployment/aurora-standard-node/services/agent-router'))
+
+from latency_model import LatencyModel
+
+
+def synthetic_traces(count: int, seed: int) -> List[Dict]:
+    """
+    A mesh where the names and GPU flags mislead the static model: one GPU
+    node is much slower than the others, and one has a slow first token
+    """
+    rng = random.Random(seed)
+    nodes = {
+        "aurora": {"has_gpu": True, "tps": 35, "ttft": 400, "net": 25},
+        "runpod-tx": {"has_gpu": True, "tps": 110, "ttft": 150, "net": 40},
+        "vengeance": {"has_gpu": True, "tps": 80, "ttft": 900, "net": 8},
+        "robbiebook1": {"has_gpu": False, "tps": 12, "ttft": 600, "net": 5},
+    }
+    models = {"llama3.1:8b": 1.0, "qwen2.5:14b": 0.55}
+
+    traces, ts = [], 0.0
+    for _ in range(count):
+        ts += rng.expovariate(1 / 4.0)  # ~one request every 4s
+        node = rng.choice(list(nodes))
+        spec = nodes[node]
+        model = rng.choice(list(models))
+        max_tokens = rng.choice([128, 256, 512, 1024])
+        eval_count = int(max_tokens * rng.uniform(0.3, 1.0))
+        tps = spec["tps"] * models[model] * rng.uniform(0.8, 1.2)
+        traces.append({
+            "ts": ts,
+            "node": node,
+            "model": model,
+            "max_tokens": max_tokens,
+            "has_gpu": spec["has_gpu"],
+            "eval_count": eval_count,
+            "eval_ms": eval_count / tps * 1000,
+            "ttft_ms": spec["ttft"] * rng.uniform(0.7, 1.5),
+            "network_ms": spec["net"] * rng.uniform(0.8, 1.5),
+        })
+    return traces
+
+
+class NodeBehaviour:
+    """Empirical samples per node (and per node + model) drawn on replay"""
+
+    def __init__(self, traces: List[Dict], seed: int):
+        self.rng = random.Random(seed)
+        self.by_node_model: Dict[Tuple[str, str], List[Dict]] = defaultdict(list)
+        self.by_node: Dict[str, List[Dict]] = defaultdict(list)
+        self.has_gpu: Dict[str, bool] = {}
+        for t in traces:
+            if t.get("eval_count", 0) <= 0 or t.get("eval_ms", 0) <= 0:
+                continue
+            self.by_node_model[(t["node"], t["model"])].append(t)
+            self.by_node[t["node"]].append(t)
+            self.has_gpu[t["node"]] = bool(t.get("has_gpu"))
+
+    @property
+    def nodes(self) -> List[str]:
+        return sorted(self.by_node)
+
+    def sample(self, node: str, model: str, tokens: int) -> Tuple[float, float, float]:
+        """(ttft_ms, generation_ms, network_ms) for `tokens` output tokens on node"""
+        pool = self.by_node_model.get((node, model)) or self.by_node[node]
+        t = self.rng.choice(pool)
+        tps = t["eval_count"] / (t["eval_ms"] / 1000)
+        return t["ttft_ms"], tokens / tps * 1000, t.get("network_ms") or 0.0
+
+
+def static_estimate(node: str, has_gpu: bool, max_tokens: int, active_jobs: int) -> float:
+    """The router's original fixed-constant estimate"""
+    base_time_ms = (max_tokens / 100) * (100 if has_gpu else 1000)
+    queue_time_ms = active_jobs * 500
+    if "aurora" in node:
+        network_ms = 20
+    elif "runpod" in node:
+        network_ms = 30
+    else:
+        network_ms = 10
+    return base_time_ms + queue_time_ms + network_ms
+
+
+def replay(traces: List[Dict], behaviour: NodeBehaviour, policy: str) -> List[float]:
+    """Completion times (ms) for every request under one routing policy"""
+    model = LatencyModel()
+    free_at = {node: 0.0 for node in behaviour.nodes}
+    in_system: Dict[str, deque] = {node: deque() for node in behaviour.nodes}
+    finished: List[Tuple[float, int, Dict]] = []  # results not yet visible to the model
+    node_infos = [{"name": n, "capabilities": {"gpu": behaviour.has_gpu[n]}} for n in behaviour.nodes]
+    latencies = []
+
+    for i, t in enumerate(traces):
+        now_ms = t["ts"] * 1000
+
+        # Requests that finished by now report back (and leave the queue)
+        while finished and finished[0][0] <= now_ms:
+            _, _, obs = heapq.heappop(finished)
+            model.end(obs["node"], obs["ticket"], now=obs["done"] / 1000)
+            model.record(obs["node"], obs["model"], obs["max_tokens"], obs["eval_count"],
+                         obs["eval_ms"], obs["ttft_ms"], obs["network_ms"], now=obs["done"] / 1000)
+        for node, queue in in_system.items():
+            while queue and queue[0] <= now_ms:
+                queue.popleft()
+
+        if policy == "static":
+            node = min(behaviour.nodes, key=lambda n: static_estimate(
+                n, behaviour.has_gpu[n], t["max_tokens"], len(in_system[n])))
+            service_ms = 0.0
+        else:
+            best = model.rank(node_infos, t["model"], t["max_tokens"], now=now_ms / 1000)[0]
+            node, service_ms = best["node_name"], best["breakdown"]["service_time"]
+
+        tokens = t.get("eval_count") or t["max_tokens"]
+        ttft_ms, gen_ms, network_ms = behaviour.sample(node, t["model"], tokens)
+        start = max(now_ms, free_at[node])
+        free_at[node] = start + ttft_ms + gen_ms
+        done = free_at[node] + network_ms
+        latencies.append(done - now_ms)
+
+        in_system[node].append(done)
+        ticket = model.begin(node, service_ms, now=now_ms / 1000)
+        heapq.heappush(finished, (done, i, {
+            "ticket": ticket,
+            "node": node, "model": t["model"], "max_tokens": t["max_tokens"],
+            "eval_count": tokens, "eval_ms": gen_ms, "ttft_ms": ttft_ms,
+            "network_ms": network_ms, "done": done
+        }))
+
+    return latencies
+
+
+def test_learned_model_beats_static_estimate_on_replay():
+    traces = synthetic_traces(3000, seed=7)
+    behaviour = NodeBehaviour(traces, seed=7)
+
+    means = {}
+    for policy in ("static", "learned"):
+        behaviour.rng.seed(7)  # same service-time draws for both policies
+        means[policy] = statistics.fmean(replay(traces, behaviour, policy))
+
+    assert means["learned"] < means["static"] * 0.9
+
+
+def test_slow_gpu_node_ranks_below_fast_one():
+    model = LatencyModel()
+    for _ in range(10):
+        model.record("slow-gpu", "llama3.1:8b", 256, 256, 256 / 30 * 1000, 400, 20, now=100.0)
+        model.record("fast-gpu", "llama3.1:8b", 256, 256, 256 / 110 * 1000, 150, 20, now=100.0)
+
+    nodes = [{"name": name, "capabilities": {"gpu": True}} for name in ("slow-gpu", "fast-gpu")]
+    ranked = model.rank(nodes, "llama3.1:8b", 256, now=100.0)
+
+    assert [p["node_name"] for p in ranked] == ["fast-gpu", "slow-gpu"]
+    assert ranked[0]["observations"] == 10
+
+
+def test_backlog_counts_against_a_node_until_it_finishes():
+    model = LatencyModel()
+    nodes = [{"name": name, "capabilities": {"gpu": True}} for name in ("a", "b")]
+    ticket = model.begin("a", 5000, now=10.0)
+
+    assert model.rank(nodes, "m", 100, now=11.0)[0]["node_name"] == "b"
+    assert model.backlog_ms("a", now=11.0) == 4000
+
+    model.end("a", ticket, now=12.0)
+    assert model.queue_depth("a") == 0
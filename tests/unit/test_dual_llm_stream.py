@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Dual LLM streaming: speculative generation is cancelled by a blocked input,
+a rejected segment ends the stream, strict mode filters the whole reply
+before releasing any of it, and the chat route streams it as JSON lines
+"""
+import asyncio
+import json
+import os
+import sys
+
+import pytest
+
+for module in ("fastapi", "httpx", "structlog"):
+    pytest.importorskip(module)
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../packages/@robbieverse/api'))
+
+from src.ai.dual_llm_coordinator import DualLLMCoordinator
+
+SENTENCES = ["The weather is fine today. ", "Bring a light jacket anyway. ", "BAD advice follows here. ",
+             "Nothing else to add now. ", "See you at the meeting soon. "]
+
+
+class FakeRobbie:
+    """Streams a word at a time and records how far it got"""
+
+    def __init__(self, sentences=SENTENCES):
+        self.tokens = [word + " " for sentence in sentences for word in sentence.split()]
+        self.started = False
+        self.finished = False
+        self.cancelled = False
+        self.sent = 0
+
+    async def stream_tokens(self, message, user_id="default", context=None):
+        self.started = True
+        try:
+            for token in self.tokens:
+                await asyncio.sleep(0.001)
+                self.sent += 1
+                yield token
+            self.finished = True
+        except (asyncio.CancelledError, GeneratorExit):
+            self.cancelled = True
+            raise
+
+
+class FakeGatekeeper:
+    def __init__(self, safe=True, reject=None, check_delay=0.02):
+        self.safe = safe
+        self.reject = reject
+        self.check_delay = check_delay
+        self.filtered = []
+
+    async def safety_check(self, message, user_id="default"):
+        await asyncio.sleep(self.check_delay)
+        return {"safe": self.safe, "issues": [] if self.safe else ["Detected sensitive pattern"]}
+
+    async def response_filter(self, response, context=None):
+        self.filtered.append(response)
+        approved = not (self.reject and self.reject in response)
+        return {"approved": approved, "filtered_response": response, "confidence": 1.0, "modifications": []}
+
+    async def generate_safety_response(self, issue_type):
+        return "Sorry, I cannot process that request for safety reasons."
+
+
+def coordinator(mode, robbie, gatekeeper):
+    dual = DualLLMCoordinator()
+    dual.robbie, dual.gatekeeper = robbie, gatekeeper
+    dual.set_safety_mode(mode)
+    return dual
+
+
+def collect(dual, on_content=None):
+    async def run():
+        events = []
+        async for line in dual.stream_user_message("hello", "allan"):
+            event = json.loads(line)
+            if event["type"] == "content" and on_content:
+                on_content(event)
+            events.append(event)
+        await asyncio.sleep(0.01)  # let the cancelled generation unwind
+        return events
+
+    return asyncio.run(run())
+
+
+def test_blocked_input_cancels_speculative_generation():
+    robbie = FakeRobbie()
+    dual = coordinator("permissive", robbie, FakeGatekeeper(safe=False))
+
+    events = collect(dual)
+
+    assert [e["type"] for e in events] == ["blocked"]
+    assert events[0]["safety_status"] == "blocked"
+    assert robbie.started and robbie.cancelled and not robbie.finished
+
+
+def test_rejected_segment_ends_the_stream():
+    robbie = FakeRobbie()
+    gatekeeper = FakeGatekeeper(reject="BAD")
+    dual = coordinator("permissive", robbie, gatekeeper)
+
+    events = collect(dual)
+    types = [e["type"] for e in events]
+
+    assert types[-1] == "blocked" and "done" not in types
+    assert events[-1]["safety_status"] == "filtered"
+    assert all("BAD" not in e["content"] for e in events if e["type"] == "content")
+    assert "content" in types  # approved segments before it were released
+    assert robbie.cancelled and robbie.sent < len(robbie.tokens)
+
+
+def test_strict_mode_holds_output_until_the_whole_reply_is_filtered():
+    robbie = FakeRobbie(SENTENCES[:2] + SENTENCES[3:])
+    gatekeeper = FakeGatekeeper()
+    dual = coordinator("strict", robbie, gatekeeper)
+    seen_finished = []
+
+    events = collect(dual, on_content=lambda event: seen_finished.append(robbie.finished))
+
+    assert [e["type"] for e in events] == ["content", "done"]
+    assert seen_finished == [True]
+    assert gatekeeper.filtered == ["".join(robbie.tokens)]
+    assert events[0]["content"] == "".join(robbie.tokens)
+    assert events[1]["speculative"] is False
+
+
+def test_chat_stream_route_sends_json_lines_and_records_the_reply(monkeypatch):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from src.routes import conversation_routes
+
+    recorded = []
+
+    async def record(conversation_id, message, client_id, result):
+        recorded.append((conversation_id, message, result["response"], result["safety_status"]))
+        return "user-msg", "ai-msg"
+
+    monkeypatch.setattr(conversation_routes, "dual_llm", coordinator("moderate", FakeRobbie(SENTENCES[:2]), FakeGatekeeper()))
+    monkeypatch.setattr(conversation_routes, "_record_exchange", record)
+    app = FastAPI()
+    app.include_router(conversation_routes.router)
+
+    response = TestClient(app).post("/conversations/c1/chat/stream", params={"message": "hello", "use_context": False})
+    events = [json.loads(line) for line in response.text.splitlines()]
+
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert events[-1]["type"] == "done"
+    reply = "".join(e["content"] for e in events if e["type"] == "content")
+    assert reply == "".join(FakeRobbie(SENTENCES[:2]).tokens)
+    assert recorded == [("c1", "hello", reply, "approved")]
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+GPU mesh dispatch: tasks go out on submit without polling, Critical first
+and then by business category, to the best-ranked node that fits
+"""
+import asyncio
+import importlib.util
+import os
+from datetime import datetime
+
+import pytest
+
+for module in ("aiohttp", "redis", "fakeredis"):
+    pytest.importorskip(module)
+
+import fakeredis
+
+# Loaded under its own name: the gpu-coordinator service also has a coordinator module
+spec = importlib.util.spec_from_file_location(
+    "gpu_mesh_coordinator",
+    os.path.join(os.path.dirname(__file__), '../../services/gpu-mesh/coordinator.py')
+)
+mesh = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(mesh)
+
+
+def make_coordinator(nodes):
+    coordinator = mesh.GPUMeshCoordinator()
+    coordinator.redis_client = fakeredis.FakeRedis(decode_responses=True)
+    for node_id, performance, capabilities in nodes:
+        node = mesh.GPUNode(
+            node_id=node_id, host="localhost", port=8000, gpu_count=1, gpu_memory=24,
+            status=mesh.NodeStatus.HEALTHY, current_load=0.0, memory_used=0.0,
+            last_heartbeat=datetime.now(), capabilities=capabilities, performance_score=performance
+        )
+        coordinator.nodes[node_id] = node
+        coordinator._rerank_node(node)
+    return coordinator
+
+
+def test_business_category_orders_tasks_within_a_priority():
+    async def scenario():
+        coordinator = make_coordinator([("only", 100.0, ["llm"])])
+        coordinator.node_ranking.discard("only")  # nothing dispatchable while we queue
+
+        normal = mesh.TaskPriority.NORMAL
+        await coordinator.submit_task("analysis", normal, {}, 1.0, business_category="background_analysis")
+        await coordinator.submit_task("plain", normal, {}, 1.0)
+        await coordinator.submit_task("deal", normal, {}, 1.0, business_category="deal_processing")
+        await coordinator.submit_task("urgent", mesh.TaskPriority.CRITICAL, {}, 1.0)
+        await coordinator.submit_task("revenue", normal, {}, 1.0, business_category="revenue_generation")
+
+        assigned = []
+        original = coordinator._assign_task
+
+        async def record(task, node):
+            assigned.append(task.task_id)
+            await original(task, node)
+
+        coordinator._assign_task = record
+        coordinator._rerank_node(coordinator.nodes["only"])
+        await coordinator._dispatch_pending()
+        return assigned
+
+    assert asyncio.run(scenario()) == ["urgent", "revenue", "deal", "analysis", "plain"]
+
+
+def test_submit_dispatches_to_the_best_node_that_fits():
+    async def scenario():
+        coordinator = make_coordinator([("fast", 100.0, ["llm"]), ("vision", 50.0, ["llm", "vision"])])
+        coordinator.running = True
+        balancer = asyncio.create_task(coordinator._load_balancer())
+
+        await coordinator.submit_task("chat", mesh.TaskPriority.NORMAL, {"capabilities": ["llm"]}, 1.0)
+        await coordinator.submit_task("image", mesh.TaskPriority.NORMAL, {"capabilities": ["vision"]}, 1.0)
+        await asyncio.sleep(0.01)
+
+        coordinator.running = False
+        balancer.cancel()
+        return {task_id: task.assigned_node for task_id, task in coordinator.tasks_by_id.items()}, coordinator
+
+    assignments, coordinator = asyncio.run(scenario())
+    assert assignments == {"chat": "fast", "image": "vision"}
+    assert coordinator.queue_wait.count == 2
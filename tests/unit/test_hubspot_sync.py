@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+HubSpot contact sync against a fake HubSpot API: search paging past the
+result cap, batch pushes matched back to local ids, and 429 retries
+"""
+import asyncio
+import itertools
+import os
+import random
+import sys
+import time
+from collections import Counter, deque
+from datetime import datetime, timezone
+
+import pytest
+
+for module in ("aiohttp", "asyncpg", "redis", "pydantic", "aiosmtplib"):
+    pytest.importorskip(module)
+
+from aiohttp import ClientSession, web
+from aiohttp.test_utils import TestServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../deployment/aurora-standard-node/services/integration-sync'))
+
+import sync_engine
+from sync_engine import IntegrationSyncEngine, _parse_hubspot_timestamp
+
+SEARCH_MAX_LIMIT = 200
+BATCH_MAX_INPUTS = 100
+
+
+def iso_millis(ms: int) -> str:
+    return datetime.fromtimestamp(ms / 1000, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.") + f"{ms % 1000:03d}Z"
+
+
+class FakeHubSpot:
+    def __init__(self, contacts: int, rate: int = 0, seed: int = 7, search_cap: int = 10000,
+                 window: float = 0.2):
+        self.rng = random.Random(seed)
+        self.rate = rate
+        self.window = window
+        self.search_cap = search_cap
+        self.recent = deque()
+        self.stats = Counter()
+        self.contacts = {}
+        self._ids = itertools.count(1001)
+
+        # Seed contacts with modification times spread over the last 30 days
+        now_ms = int(time.time() * 1000)
+        for i in range(contacts):
+            self._store({
+                "firstname": f"First{i}",
+                "lastname": f"Last{i}",
+                "email": f"contact{i}@example.com",
+                "phone": f"555-{i:07d}"
+            }, now_ms - self.rng.randint(0, 30 * 86400 * 1000))
+
+    def _store(self, properties: dict, modified_ms: int, contact_id: str = None) -> dict:
+        contact_id = contact_id or str(next(self._ids))
+        existing = self.contacts.get(contact_id)
+        props = dict(existing["properties"]) if existing else {}
+        props.update({k: v for k, v in properties.items() if v is not None})
+        props["hs_lastmodifieddate"] = iso_millis(modified_ms)
+        props["hs_object_id"] = contact_id
+        contact = {
+            "id": contact_id,
+            "properties": props,
+            "createdAt": existing["createdAt"] if existing else iso_millis(modified_ms),
+            "updatedAt": iso_millis(modified_ms),
+            "archived": False,
+            "_modified_ms": modified_ms
+        }
+        self.contacts[contact_id] = contact
+        return contact
+
+    @staticmethod
+    def _public(contact: dict, properties=None) -> dict:
+        props = contact["properties"]
+        if properties:
+            props = {k: props.get(k) for k in set(properties) | {"hs_object_id"}}
+        return {k: v for k, v in contact.items() if not k.startswith("_")} | {"properties": props}
+
+    # ============================================
+    # MIDDLEWARE
+    # ============================================
+
+    @web.middleware
+    async def rate_limit(self, request, handler):
+        if request.path.startswith("/__"):
+            return await handler(request)
+
+        self.stats[f"{request.method} {request.path}"] += 1
+        if not request.headers.get("Authorization", "").startswith("Bearer "):
+            return web.json_response({"status": "error", "category": "INVALID_AUTHENTICATION"}, status=401)
+
+        now = time.monotonic()
+        while self.recent and now - self.recent[0] > self.window:
+            self.recent.popleft()
+        if self.rate and len(self.recent) >= self.rate:
+            self.stats["429"] += 1
+            return web.json_response(
+                {"status": "error", "category": "RATE_LIMITS", "message": "You have reached your secondly limit."},
+                status=429, headers={"Retry-After": str(self.window)}
+            )
+        self.recent.append(now)
+        return await handler(request)
+
+    # ============================================
+    # ENDPOINTS
+    # ============================================
+
+    async def search(self, request):
+        body = await request.json()
+        limit = min(int(body.get("limit", 10)), SEARCH_MAX_LIMIT)
+        after = int(body.get("after", 0))
+        if after >= self.search_cap:
+            return web.json_response({"status": "error", "category": "VALIDATION_ERROR",
+                                      "message": f"after must be below {self.search_cap}"}, status=400)
+
+        matches = list(self.contacts.values())
+        for group in body.get("filterGroups", [])[:1]:
+            for f in group.get("filters", []):
+                if f["propertyName"] != "hs_lastmodifieddate":
+                    continue
+                value = int(f["value"])
+                op = {
+                    "GT": lambda m: m > value, "GTE": lambda m: m >= value,
+                    "LT": lambda m: m < value, "LTE": lambda m: m <= value,
+                    "EQ": lambda m: m == value
+                }[f["operator"]]
+                matches = [c for c in matches if op(c["_modified_ms"])]
+
+        sorts = body.get("sorts") or [{"propertyName": "hs_object_id", "direction": "ASCENDING"}]
+        descending = sorts[0].get("direction") == "DESCENDING"
+        if sorts[0]["propertyName"] == "hs_lastmodifieddate":
+            matches.sort(key=lambda c: (c["_modified_ms"], int(c["id"])), reverse=descending)
+        else:
+            matches.sort(key=lambda c: int(c["id"]), reverse=descending)
+
+        page = matches[after:after + limit]
+        response = {
+            "total": len(matches),
+            "results": [self._public(c, body.get("properties")) for c in page]
+        }
+        if after + limit < len(matches):
+            response["paging"] = {"next": {"after": str(after + limit)}}
+        return web.json_response(response)
+
+    async def batch_create(self, request):
+        inputs = (await request.json()).get("inputs", [])
+        if len(inputs) > BATCH_MAX_INPUTS:
+            return web.json_response({"status": "error", "category": "VALIDATION_ERROR",
+                                      "message": f"at most {BATCH_MAX_INPUTS} inputs"}, status=400)
+
+        now_ms = int(time.time() * 1000)
+        results = [self._public(self._store(item.get("properties", {}), now_ms)) for item in inputs]
+        self.rng.shuffle(results)
+        return web.json_response({"status": "COMPLETE", "results": results}, status=201)
+
+    async def batch_update(self, request):
+        inputs = (await request.json()).get("inputs", [])
+        if len(inputs) > BATCH_MAX_INPUTS:
+            return web.json_response({"status": "error", "category": "VALIDATION_ERROR",
+                                      "message": f"at most {BATCH_MAX_INPUTS} inputs"}, status=400)
+
+        now_ms = int(time.time() * 1000)
+        results, errors = [], []
+        for item in inputs:
+            if item.get("id") in self.contacts:
+                results.append(self._public(self._store(item.get("properties", {}), now_ms, item["id"])))
+            else:
+                errors.append({"status": "error", "category": "OBJECT_NOT_FOUND",
+                               "message": f"Contact {item.get('id')} not found"})
+
+        response = {"status": "COMPLETE", "results": results}
+        if errors:
+            response["errors"] = errors
+        return web.json_response(response, status=207 if errors else 200)
+
+    def app(self) -> web.Application:
+        app = web.Application(middlewares=[self.rate_limit])
+        app.router.add_post("/crm/v3/objects/contacts/search", self.search)
+        app.router.add_post("/crm/v3/objects/contacts/batch/create", self.batch_create)
+        app.router.add_post("/crm/v3/objects/contacts/batch/update", self.batch_update)
+        return app
+
+
+async def run_against(fake: FakeHubSpot, monkeypatch, scenario):
+    server = TestServer(fake.app())
+    await server.start_server()
+    monkeypatch.setattr(sync_engine, "HUBSPOT_BASE_URL", str(server.make_url("")).rstrip("/"))
+    monkeypatch.setattr(sync_engine, "HUBSPOT_API_KEY", "fake")
+    engine = IntegrationSyncEngine()
+    engine.session = ClientSession()
+    try:
+        return await scenario(engine)
+    finally:
+        await engine.session.close()
+        await server.close()
+
+
+def test_pull_pages_past_the_search_cap(monkeypatch):
+    monkeypatch.setattr(sync_engine, "HUBSPOT_PAGE_SIZE", 20)
+    monkeypatch.setattr(sync_engine, "HUBSPOT_SEARCH_RESULT_CAP", 100)
+    fake = FakeHubSpot(contacts=250, search_cap=100)
+    seen = set()
+
+    async def scenario(engine):
+        async def get_watermark(system, entity_type):
+            return None
+
+        async def upsert(contacts, watermark):
+            for contact in contacts:
+                seen.add(contact["id"])
+                modified = _parse_hubspot_timestamp(contact["properties"]["hs_lastmodifieddate"])
+                watermark = max(watermark, modified) if watermark else modified
+            return watermark
+
+        async def publish(channel, events):
+            pass
+
+        engine._get_watermark = get_watermark
+        engine._upsert_contacts_from_hubspot = upsert
+        engine._publish_sync_events = publish
+        await engine._pull_hubspot_contacts()
+
+    asyncio.run(run_against(fake, monkeypatch, scenario))
+    assert seen == set(fake.contacts)
+
+
+def test_batch_create_results_map_back_by_email(monkeypatch):
+    fake = FakeHubSpot(contacts=0)
+    local = [
+        {"hubspot_id": f"local-{i}", "first_name": f"F{i}", "last_name": f"L{i}",
+         "email": f"Person{i}@Example.com", "phone": None}
+        for i in range(30)
+    ]
+
+    async def scenario(engine):
+        return await engine._push_contact_batch("create", local)
+
+    synced = asyncio.run(run_against(fake, monkeypatch, scenario))
+
+    assert len(synced) == 30
+    for local_id, external_id in synced:
+        i = local_id.split("-")[1]
+        assert fake.contacts[external_id]["properties"]["email"] == f"Person{i}@Example.com"
+
+
+def test_rate_limited_updates_are_retried(monkeypatch):
+    fake = FakeHubSpot(contacts=40, rate=3)
+    existing = [
+        {"hubspot_id": f"local-{cid}", "external_id": cid, "first_name": "Renamed",
+         "last_name": None, "email": None, "phone": None}
+        for cid in list(fake.contacts)[:40]
+    ]
+
+    async def scenario(engine):
+        batches = [existing[i:i + 4] for i in range(0, len(existing), 4)]
+        results = await asyncio.gather(*(engine._push_contact_batch("update", b) for b in batches))
+        return [pair for batch in results for pair in batch]
+
+    synced = asyncio.run(run_against(fake, monkeypatch, scenario))
+
+    assert fake.stats["429"] > 0
+    assert len(synced) == 40
+    assert all(c["properties"]["firstname"] == "Renamed" for c in fake.contacts.values())
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Hybrid memory engine: BM25 ranking, new-term visibility and vector index
+training off the insert path
+"""
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../packages/@robbie/mcp-servers'))
+
+import hybrid_memory
+from hybrid_memory import HybridMemory, rrf_fuse
+
+
+def memory_table(rows):
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE memories (id INTEGER PRIMARY KEY, content TEXT)")
+    conn.executemany("INSERT INTO memories (content) VALUES (?)", [(row,) for row in rows])
+    conn.commit()
+    return conn, HybridMemory(conn, "memories", ["content"], rowid_column="id")
+
+
+def small_table():
+    rows = [f"weekly notes on topic {i} and other chores" for i in range(14)]
+    rows += [
+        "kubernetes deploy rollout stuck on pending pods",
+        "kubernetes deploy with helm charts",
+        "python deploy script for the kubernetes cluster",
+        "python packaging with poetry",
+        "python virtualenv setup",
+        "kubernetes deploy of the robbie api",
+    ]
+    return memory_table(rows)
+
+
+def test_small_table_ranks_every_term():
+    conn, memory = small_table()
+
+    results = memory.keyword_search("python deploy", 10)
+    contents = [conn.execute("SELECT content FROM memories WHERE id = ?", (rowid,)).fetchone()[0]
+                for rowid, _ in results]
+
+    assert contents[0] == "python deploy script for the kubernetes cluster"
+    assert "kubernetes deploy with helm charts" in contents
+    assert "python virtualenv setup" in contents
+
+
+def test_new_term_is_searchable_after_insert():
+    conn, memory = small_table()
+    assert memory.keyword_search("terraform", 10) == []
+
+    with conn:
+        rowid = conn.execute("INSERT INTO memories (content) VALUES ('terraform plan for the mesh')").lastrowid
+
+    assert [r for r, _ in memory.keyword_search("terraform", 10)] == [rowid]
+
+
+def test_only_common_term_counts_are_cached(monkeypatch):
+    monkeypatch.setattr(hybrid_memory, "DOC_COUNT_CACHE_MIN", 5)
+    conn, memory = small_table()
+    memory.keyword_search("kubernetes python chores", 10)
+
+    assert set(memory._doc_counts) == {"chores"}
+
+
+def test_large_table_drops_common_terms(monkeypatch):
+    monkeypatch.setattr(hybrid_memory, "RANKED_DOC_BUDGET", 50)
+    rows = [f"status update {i}" for i in range(200)] + ["status update about the gpu mesh"]
+    conn, memory = memory_table(rows)
+
+    expression, by_recency = memory._match_expression("status gpu")
+    assert (expression, by_recency) == ('"gpu"', False)
+
+    expression, by_recency = memory._match_expression("status update")
+    assert by_recency and expression in ('"status"', '"update"')
+
+
+def test_rrf_prefers_items_ranked_high_in_both_lists():
+    fused = rrf_fuse([1, 2, 3], [3, 1, 4])
+    assert [item for item, _ in fused][:2] == [1, 3]
+
+
+def test_vector_add_leaves_training_to_the_caller(tmp_path, monkeypatch):
+    np = pytest.importorskip("numpy")
+    monkeypatch.setattr(hybrid_memory, "IVF_TRAIN_AT", 64)
+    index = hybrid_memory.VectorIndex(tmp_path / "vectors")
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(100, 8)).astype(np.float32)
+
+    index.add(list(range(100)), vectors)
+    assert index.centroids is None and index.needs_training
+    assert index.search(vectors[7], 1)[0][0] == 7
+
+    index.train()
+    assert not index.needs_training
+    assert index.search(vectors[7], 1)[0][0] == 7
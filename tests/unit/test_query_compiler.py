@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+:name query compiler and query stats bounds
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../packages/@robbieverse/api'))
+
+from src.db.query import compile_query
+
+
+def test_named_params_compile_to_positions():
+    compiled = compile_query("SELECT * FROM t WHERE a = :a AND b = :b OR a2 = :a")
+
+    assert compiled.sql == "SELECT * FROM t WHERE a = $1 AND b = $2 OR a2 = $1"
+    assert compiled.bind({"b": 2, "a": 1}) == [1, 2]
+
+
+def test_casts_literals_and_comments_are_left_alone():
+    compiled = compile_query("SELECT ':x', :id::uuid, '{}'::jsonb -- :y\nFROM t")
+
+    assert compiled.sql == "SELECT ':x', $1::uuid, '{}'::jsonb -- :y\nFROM t"
+    assert compiled.param_names == ("id",)
+
+
+def test_array_slices():
+    assert compile_query("SELECT arr[lo:hi] FROM t").sql == "SELECT arr[lo:hi] FROM t"
+    assert compile_query("SELECT arr[:lo : :hi] FROM t").sql == "SELECT arr[$1 : $2] FROM t"
+
+    with pytest.raises(ValueError):
+        compile_query("SELECT arr[:lo:hi] FROM t")
+
+
+def test_query_stats_are_bounded(monkeypatch):
+    pytest.importorskip("asyncpg")
+    from src.db import database as database_module
+
+    monkeypatch.setattr(database_module, "QUERY_STATS_SIZE", 3)
+    db = database_module.Database()
+    for query in ("q1", "q2", "q3", "q1", "q4"):
+        db._record(query, 0.0)
+
+    assert list(db.query_stats) == ["q3", "q1", "q4"]
+    assert db.query_stats["q1"].calls == 2
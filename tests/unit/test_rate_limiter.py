@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Gatekeeper rate limiter: both backends apply the same limits, idle
+in-memory buckets are dropped, and counts survive a failed mirror flush
+"""
+import asyncio
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("asyncpg")
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../packages/@robbieverse/api'))
+
+from src.services import rate_limiter
+from src.services.rate_limiter import MemoryRateLimitBackend, RateLimiter, RedisRateLimitBackend
+
+
+class FakeClock:
+    """Stands in for the time module so windows can pass instantly"""
+
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limiter, "time", clock)
+    return clock
+
+
+def memory_backend():
+    return MemoryRateLimitBackend()
+
+
+def redis_backend():
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    original = rate_limiter.aioredis.from_url
+    rate_limiter.aioredis.from_url = lambda url, **kw: fakeredis.aioredis.FakeRedis(**kw)
+    try:
+        return RedisRateLimitBackend("redis://fake")
+    finally:
+        rate_limiter.aioredis.from_url = original
+
+
+BACKENDS = [memory_backend, redis_backend]
+
+
+@pytest.mark.parametrize("make_backend", BACKENDS)
+def test_steady_overload_still_gets_the_limit_through(clock, make_backend):
+    # 10 per minute allowed, 15 per minute attempted, for 10 minutes
+    async def scenario():
+        backend = make_backend()
+        allowed = 0
+        for _ in range(150):
+            ok, excessive = await backend.hit("api_call:allan:chat", 10, 60)
+            allowed += ok
+            assert not excessive
+            clock.now += 4
+        await backend.close()
+        return allowed
+
+    assert 95 <= asyncio.run(scenario()) <= 110
+
+
+@pytest.mark.parametrize("make_backend", BACKENDS)
+def test_burst_past_twice_the_limit_is_excessive(clock, make_backend):
+    async def scenario():
+        backend = make_backend()
+        results = [await backend.hit("email_send:allan:chat", 10, 300) for _ in range(25)]
+        await backend.close()
+        return results
+
+    results = asyncio.run(scenario())
+    assert results[:10] == [(True, False)] * 10
+    assert results[10:20] == [(False, False)] * 10
+    assert results[20:] == [(False, True)] * 5
+
+
+def test_idle_buckets_are_dropped(clock):
+    async def scenario():
+        backend = MemoryRateLimitBackend()
+        await backend.hit("api_call:a:chat", 10, 60)
+        await backend.hit("email_send:b:chat", 10, 300)
+
+        clock.now += 61
+        await backend.hit("api_call:c:chat", 10, 60)
+        assert set(backend.buckets) == {"email_send:b:chat", "api_call:c:chat"}
+
+        clock.now += 300
+        await backend.hit("api_call:c:chat", 10, 60)
+        assert set(backend.buckets) == {"api_call:c:chat"}
+
+    asyncio.run(scenario())
+
+
+class FakeConnection:
+    def __init__(self, pool):
+        self.pool = pool
+
+    async def executemany(self, query, rows):
+        if self.pool.fail:
+            raise ConnectionError("postgres down")
+        self.pool.rows.extend(rows)
+
+
+class FakePool:
+    def __init__(self):
+        self.fail = True
+        self.rows = []
+        self.closed = False
+
+    def acquire(self):
+        pool = self
+
+        class Acquire:
+            async def __aenter__(self):
+                return FakeConnection(pool)
+
+            async def __aexit__(self, *exc):
+                return False
+
+        return Acquire()
+
+    async def close(self):
+        self.closed = True
+
+
+def test_failed_flush_requeues_counts_and_close_writes_them(clock):
+    async def scenario():
+        limiter = RateLimiter({"email_send": {"limit": 2, "window_minutes": 5}}, "postgresql://unused",
+                              backend="memory", redis_url="")
+        limiter.pool = pool = FakePool()
+
+        for _ in range(3):
+            await limiter.check("allan", "chat", "email_send")
+        with pytest.raises(ConnectionError):
+            await limiter.flush()
+        assert limiter.counters[("allan", "chat", "email_send")][:2] == [3, 1]
+
+        await limiter.check("allan", "chat", "email_send")
+        pool.fail = False
+        await limiter.close()
+
+        assert pool.closed and limiter.counters == {}
+        (user_id, source, action_type, attempts, _, _, exceeded, threshold), = pool.rows
+        assert (user_id, source, action_type, attempts, exceeded, threshold) == ("allan", "chat", "email_send", 4, True, 2)
+
+    asyncio.run(scenario())
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+RobbieBlocks compiled page cache - templates, ETags and invalidation
+"""
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../packages/@robbieverse/api'))
+
+from src.services.robbieblocks_page_cache import CompiledPageCache, PageTemplate, etag_matches, make_etag
+
+
+def test_template_fills_slots_only_in_personalized_parts():
+    template = PageTemplate(["<title>{{name}}</title>", ("Hi {{name}} at {{company}}", True)])
+
+    assert template.slots == {"name", "company"}
+    assert template.render({"name": "Allan"}) == "<title>{{name}}</title>Hi Allan at {{company}}"
+    assert template.slot_values({"name": "Allan", "utm": "x"}) == {"name": "Allan"}
+
+
+def test_new_version_replaces_stale_entries():
+    cache = CompiledPageCache()
+    cache.put("home", "node", 1, "v1")
+    cache.put("home", "other-node", 1, "other")
+    cache.put("home", "node", 2, "v2")
+
+    assert cache.get("home", "node", 1) is None
+    assert cache.get("home", "node", 2) == "v2"
+    assert cache.get("home", "other-node", 1) == "other"
+
+
+def test_etag_follows_version():
+    etag = make_etag("home", "node", (1, "2026-01-01"))
+
+    assert etag_matches(f'"x", {etag}', etag)
+    assert not etag_matches(etag, make_etag("home", "node", (1, "2026-01-02")))
+
+
+class FakeCMSStore:
+    """Content version and build counter standing in for the database"""
+
+    def __init__(self):
+        self.version = (1, "page", 1, "component-v1", "branding-v1", 33, "tokens-v1")
+        self.builds = 0
+
+    async def content_version(self, page_key, node_id):
+        return self.version
+
+    async def build(self, page_key, node_id):
+        self.builds += 1
+        return {"success": True, "page": {"version": 1}, "blocks": [{"code": f"build {self.builds}"}]}
+
+
+@pytest.fixture
+def cms(monkeypatch):
+    pytest.importorskip("asyncpg")
+    from src.services.robbieblocks_cms import RobbieBlocksCMS
+
+    store = FakeCMSStore()
+    cms = RobbieBlocksCMS()
+    monkeypatch.setattr(cms, "_content_version", store.content_version)
+    monkeypatch.setattr(cms, "_build_page_definition", store.build)
+    return cms, store
+
+
+def test_page_definition_built_once_per_content_version(cms):
+    cms, store = cms
+
+    first = asyncio.run(cms.get_page_definition("home", "node"))
+    second = asyncio.run(cms.get_page_definition("home", "node"))
+
+    assert store.builds == 1
+    assert first == second
+
+
+@pytest.mark.parametrize("changed", [3, 4, 6])  # component, branding, style tokens
+def test_component_branding_and_token_edits_invalidate(cms, changed):
+    cms, store = cms
+    asyncio.run(cms.get_page_definition("home", "node"))
+
+    version = list(store.version)
+    version[changed] = "edited"
+    store.version = tuple(version)
+    definition = asyncio.run(cms.get_page_definition("home", "node"))
+
+    assert store.builds == 2
+    assert definition["blocks"][0]["code"] == "build 2"
+
+
+def test_cached_definition_is_a_copy(cms):
+    cms, store = cms
+
+    version, definition = asyncio.run(cms.get_versioned_page_definition("home", "node"))
+    definition["blocks"].clear()
+    _, again = asyncio.run(cms.get_versioned_page_definition("home", "node"))
+
+    assert version == store.version
+    assert again["blocks"] == [{"code": "build 1"}]
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Skill runtime: generated code can't smuggle in statements, the validator
+rejects code that runs on load, and the bytecode cache only trusts files
+it signed itself
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+for module in ("fastapi", "httpx", "jinja2", "redis"):
+    pytest.importorskip(module)
+
+os.environ.setdefault('SKILL_CACHE_DIR', os.path.join(tempfile.mkdtemp(), 'skill-cache'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../deployment/aurora-standard-node/services/skill-manager'))
+
+import skill_manager
+from skill_manager import NewSkillRequest
+from skill_runtime import SkillError, SkillRuntime
+
+INJECTED = 'x"""\nimport os; os.environ["SKILL_PWNED"] = "1"\n"""'
+
+
+def skill_request(**fields):
+    values = {
+        "skill_id": "lookup-weather",
+        "name": "Weather",
+        "description": "Looks up the weather",
+        "category": "integration",
+        "service_endpoint": "http://weather:8000/api/lookup",
+        "capabilities": ["weather"],
+        "parameters": {"city": "string"},
+        "auto_deploy": False,
+    }
+    values.update(fields)
+    return NewSkillRequest(**values)
+
+
+def test_custom_skill_fields_stay_literals(tmp_path, monkeypatch):
+    monkeypatch.delenv("SKILL_PWNED", raising=False)
+    request = skill_request(
+        description=INJECTED,
+        name='Weather\nimport os; os.environ["SKILL_PWNED"] = "1"',
+        service_endpoint='http://x", json=0)\nimport os  #',
+        parameters={"city": '\nimport os; os.environ["SKILL_PWNED"] = "1"'},
+    )
+
+    code = skill_manager.skill_manager._generate_custom_skill_code(request)
+    skill = SkillRuntime(cache_dir=tmp_path).load(request.skill_id, code)
+
+    assert skill.entrypoint.__doc__ == INJECTED
+    assert skill.entrypoint.__code__.co_consts.count(request.service_endpoint) == 1
+    assert "SKILL_PWNED" not in os.environ
+
+
+def test_skill_id_must_be_a_function_name():
+    with pytest.raises(SkillError):
+        skill_manager.skill_manager._generate_custom_skill_code(skill_request(skill_id="x(p):\n    pass\nasync def y"))
+
+
+@pytest.mark.parametrize("source", [
+    "import os\nos.system('id')\nasync def run(parameters):\n    return {}\n",
+    "@print\nasync def run(parameters):\n    return {}\n",
+    "async def run(parameters, hook=__import__('os').system('id')):\n    return {}\n",
+    "def helper(*, hook=print('loaded')):\n    pass\nasync def run(parameters):\n    return {}\n",
+    "class Run:\n    pass\nasync def run(parameters):\n    return {}\n",
+])
+def test_validator_rejects_code_that_runs_on_load(tmp_path, source):
+    with pytest.raises(SkillError):
+        SkillRuntime(cache_dir=tmp_path).load("injected", source)
+
+
+def test_annotations_are_not_evaluated(tmp_path, monkeypatch):
+    monkeypatch.delenv("SKILL_PWNED", raising=False)
+    source = "async def run(parameters: __import__('os').environ.setdefault('SKILL_PWNED', '1')):\n    return {}\n"
+
+    SkillRuntime(cache_dir=tmp_path).load("annotated", source)
+    assert "SKILL_PWNED" not in os.environ
+
+
+def test_tampered_or_malformed_bytecode_is_a_cache_miss(tmp_path):
+    source = "async def run(parameters):\n    return {'ok': True}\n"
+    runtime = SkillRuntime(cache_dir=tmp_path)
+    version = runtime.load("ok", source).version
+    path = runtime._cache_path(version)
+
+    data = path.read_bytes()
+    path.write_bytes(data[:-1] + bytes([data[-1] ^ 1]))
+    fresh = SkillRuntime(cache_dir=tmp_path)
+    fresh.load("ok", source)
+    assert fresh.cache_stats["rejected"] == 1 and fresh.cache_stats["compiles"] == 1
+
+    # Correctly signed, but not a (name, code) pair
+    payload = b"\xe9\x01\x00\x00\x00"
+    path.write_bytes(fresh._signature(version, payload) + payload)
+    fresh = SkillRuntime(cache_dir=tmp_path)
+    fresh.load("ok", source)
+    assert fresh.cache_stats["rejected"] == 1 and fresh.cache_stats["compiles"] == 1
+
+    fresh = SkillRuntime(cache_dir=tmp_path)
+    fresh.load("ok", source)
+    assert fresh.cache_stats["disk_hits"] == 1 and fresh.cache_stats["compiles"] == 0
+
+
+def test_shared_cache_directory_is_refused(tmp_path):
+    shared = tmp_path / "shared"
+    shared.mkdir()
+    shared.chmod(0o777)
+
+    runtime = SkillRuntime(cache_dir=shared)
+    runtime.load("ok", "async def run(parameters):\n    return {}\n")
+
+    assert runtime.cache_dir is None
+    assert list(shared.iterdir()) == []
+
+
+def test_invoke_requires_the_api_key(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    monkeypatch.setattr(skill_manager, "API_KEY", "secret")
+    client = TestClient(skill_manager.app)
+
+    assert client.post("/api/skills/missing/invoke", json={}).status_code in (401, 422)
+    assert client.post("/api/skills/missing/invoke", json={}, headers={"X-API-Key": "wrong"}).status_code == 401
+    assert client.post("/api/skills/missing/invoke", json={}, headers={"X-API-Key": "secret"}).status_code == 404
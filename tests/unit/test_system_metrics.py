@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+System metrics sampler - ring buffer coverage and history
+"""
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("psutil")
+pytest.importorskip("psycopg2")
+
+os.environ.setdefault("ROBBIE_LOG_DIR", tempfile.mkdtemp())
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../packages/@robbieverse/api'))
+
+from src.services import system_metrics
+from src.services.system_metrics import SystemMetricsSampler, PERSISTED_METRICS
+
+
+def _sample(timestamp):
+    return {
+        "timestamp": timestamp,
+        "cpu_percent": 10.0,
+        "memory_percent": 20.0,
+        "disk_percent": 30.0,
+        "gpu_percent": None,
+    }
+
+
+def _sampler(samples, every=2, buffer_size=10, started_ago=None, **kwargs):
+    """A sampler fed `samples` fake samples `every` seconds apart, ending now"""
+    sampler = SystemMetricsSampler(interval=every, buffer_size=buffer_size, **kwargs)
+    now = datetime.now()
+    sampler.started_at = now - timedelta(seconds=started_ago if started_ago is not None else (samples - 1) * every)
+    for i in range(samples):
+        sampler._record(_sample(now - timedelta(seconds=(samples - 1 - i) * every)))
+    return sampler, now
+
+
+@pytest.fixture(autouse=True)
+def no_database(monkeypatch):
+    written = []
+    monkeypatch.setattr(system_metrics.universal_logger, "log_monitoring_metrics_batch", written.extend)
+    return written
+
+
+def test_not_started_covers_nothing():
+    sampler = SystemMetricsSampler()
+    assert not sampler.covers(datetime.now())
+    assert sampler.history(1) is None
+    assert sampler.latest() is None
+
+
+def test_partial_buffer_only_covers_since_start():
+    sampler, now = _sampler(5)  # 8 seconds of samples, buffer not full
+
+    assert sampler.covers(now - timedelta(seconds=8))
+    assert not sampler.covers(now - timedelta(minutes=5))
+    assert sampler.history(24) is None
+
+
+def test_wrapped_buffer_covers_from_oldest_sample():
+    sampler, now = _sampler(30)  # 58 seconds sampled, last 18 seconds kept
+
+    assert sampler.covers(now - timedelta(seconds=18))
+    assert not sampler.covers(now - timedelta(seconds=30))
+
+
+def test_restart_does_not_cover_the_gap():
+    sampler, now = _sampler(5, started_ago=2)  # old samples from before a restart
+
+    assert not sampler.covers(now - timedelta(seconds=8))
+
+
+def test_default_buffer_holds_a_full_hour():
+    assert system_metrics.BUFFER_SIZE * system_metrics.SAMPLE_INTERVAL_SECONDS > 3600
+
+    sampler, now = _sampler(2000, buffer_size=2000)
+    history = sampler.history(1)
+    assert history is not None
+    assert {h['metric_name'] for h in history} == {"cpu_percent", "memory_percent", "disk_percent"}
+
+
+def test_history_shape_and_metric_filter():
+    sampler, now = _sampler(5)
+
+    history = sampler.history(9 / 3600, "cpu_percent")
+    assert len(history) == 5
+    assert history[0] == {
+        'timestamp': history[0]['timestamp'],
+        'metric_name': "cpu_percent",
+        'value': 10.0,
+        'unit': PERSISTED_METRICS["cpu_percent"]
+    }
+
+
+def test_downsampled_points_written_in_batches(no_database):
+    sampler, now = _sampler(4, downsample_factor=2, persist_batch_size=2)
+    assert no_database == []  # two points per metric pending, below one batch
+
+    sampler._record(_sample(now))
+    sampler._record(_sample(now))
+    assert len(no_database) == 3 * 3  # three averaged points for each non-empty metric
+
+    sampler._record(_sample(now))
+    sampler._flush(force=True)
+    assert len(no_database) == 4 * 3
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+WebSocket broadcaster - topic isolation, subscriber tracking and slow consumers
+"""
+import asyncio
+import json
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("structlog")
+pytest.importorskip("fastapi")
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../packages/@robbieverse/api'))
+
+from src.websockets import broadcaster as broadcaster_module
+from src.websockets.broadcaster import Broadcaster
+from src.websockets.manager import ConnectionManager
+
+
+class FakeWebSocket:
+    """Records what was sent; optionally never finishes a send"""
+
+    def __init__(self, stall: bool = False):
+        self.sent = []
+        self.stall = stall
+        self.closed_with = None
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message: str):
+        if self.stall:
+            await asyncio.Event().wait()
+        self.sent.append(message)
+
+    async def close(self, code: int = 1000):
+        self.closed_with = code
+
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_manager_broadcast_stays_on_its_own_topic():
+    async def scenario():
+        broadcaster = Broadcaster(redis_url="")
+        manager = ConnectionManager(broadcaster)
+        dashboard, conversation = FakeWebSocket(), FakeWebSocket()
+
+        await manager.connect(dashboard, "dashboard")
+        broadcaster.register(conversation, topics=["conversation:c1"])
+
+        await manager.broadcast("hello everyone")
+        await broadcaster.publish("conversation:c1", {"event": "message_added"})
+        await _settle()
+        return dashboard.sent, conversation.sent
+
+    dashboard_sent, conversation_sent = asyncio.run(scenario())
+
+    assert dashboard_sent == ["hello everyone"]
+    assert [json.loads(m)["event"] for m in conversation_sent] == ["message_added"]
+
+
+def test_has_subscribers_tracks_local_topics():
+    async def scenario():
+        broadcaster = Broadcaster(redis_url="")
+        channel = broadcaster.register(FakeWebSocket(), topics=["conversation:c1"])
+        before = broadcaster.has_subscribers("conversation:c1"), broadcaster.has_subscribers("conversation:c2")
+        await channel.close()
+        return before, broadcaster.has_subscribers("conversation:c1")
+
+    (c1, c2), after_close = asyncio.run(scenario())
+
+    assert c1 and not c2
+    assert not after_close
+
+
+def test_has_subscribers_sees_other_nodes_topics(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(
+        broadcaster_module.aioredis, "from_url",
+        lambda url, **kwargs: fakeredis.FakeAsyncRedis(server=server, **kwargs)
+    )
+
+    async def scenario():
+        node_a = Broadcaster(redis_url="redis://fake", node_id="a")
+        node_b = Broadcaster(redis_url="redis://fake", node_id="b")
+        await node_a.start()
+        await node_b.start()
+        await asyncio.sleep(0.05)
+
+        remote = FakeWebSocket()
+        channel = node_b.register(remote, topics=["conversation:c1"])
+        await asyncio.sleep(0.05)
+        seen = node_a.has_subscribers("conversation:c1"), node_a.has_subscribers("conversation:c2")
+
+        await node_a.publish("conversation:c1", {"event": "message_added"})
+        await asyncio.sleep(0.05)
+
+        await channel.close()
+        await asyncio.sleep(0.05)
+        after_close = node_a.has_subscribers("conversation:c1")
+
+        await node_a.stop()
+        await node_b.stop()
+        return seen, remote.sent, after_close
+
+    (c1, c2), delivered, after_close = asyncio.run(scenario())
+
+    assert c1 and not c2
+    assert len(delivered) == 1
+    assert not after_close
+
+
+def test_slow_consumer_is_evicted_without_stalling_others():
+    async def scenario():
+        broadcaster = Broadcaster(redis_url="")
+        fast, slow = FakeWebSocket(), FakeWebSocket(stall=True)
+        broadcaster.register(fast, "fast", topics=["t"])
+        slow_channel = broadcaster.register(slow, "slow", topics=["t"])
+
+        for i in range(slow_channel.queue.maxsize + 2):
+            await broadcaster.publish("t", str(i))
+        for _ in range(100):
+            if len(fast.sent) == slow_channel.queue.maxsize + 2:
+                break
+            await asyncio.sleep(0.01)
+        await broadcaster.stop()
+        return fast.sent, slow_channel.closed, broadcaster.evictions, slow.closed_with
+
+    fast_sent, slow_closed, evictions, close_code = asyncio.run(scenario())
+
+    assert len(fast_sent) == broadcaster_module.SEND_QUEUE_SIZE + 2
+    assert slow_closed and evictions == 1
+    assert close_code == broadcaster_module.SLOW_CONSUMER_CLOSE_CODE